@@ -1,9 +1,9 @@
 """
 Configuración del servicio de embeddings.
-Solo configuraciones esenciales para OpenAI.
+Modelos de OpenAI y modelos locales en CPU.
 """
 
-from typing import Dict
+from typing import Dict, List, Optional
 from pydantic import Field
 from common.config import Settings as BaseSettings
 from common.config import get_service_settings as get_base_settings
@@ -11,22 +11,48 @@ from common.config import get_service_settings as get_base_settings
 # Modelos de OpenAI soportados
 OPENAI_MODELS = {
     "text-embedding-3-small": {
+        "provider": "openai",
         "dimensions": 1536,
         "max_tokens": 8191,
+        "matryoshka": True,
         "description": "Modelo de uso general con excelente balance costo/rendimiento"
     },
     "text-embedding-3-large": {
+        "provider": "openai",
         "dimensions": 3072,
         "max_tokens": 8191,
+        "matryoshka": True,
         "description": "Modelo de alta precisión para tareas complejas"
     },
     "text-embedding-ada-002": {
+        "provider": "openai",
         "dimensions": 1536,
         "max_tokens": 8191,
         "description": "Compatibilidad con sistemas legacy"
     }
 }
 
+# Modelos locales ejecutados en CPU (sentence-transformers, backend ONNX)
+LOCAL_MODELS = {
+    "all-MiniLM-L6-v2": {
+        "provider": "local",
+        "model_path": "sentence-transformers/all-MiniLM-L6-v2",
+        "dimensions": 384,
+        "max_tokens": 256,
+        "description": "Modelo local pequeño y rápido para consultas en inglés"
+    },
+    "paraphrase-multilingual-MiniLM-L12-v2": {
+        "provider": "local",
+        "model_path": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+        "dimensions": 384,
+        "max_tokens": 128,
+        "description": "Modelo local multilingüe (incluye español) para consultas cortas"
+    }
+}
+
+# Todos los modelos disponibles, con el proveedor que los sirve
+EMBEDDING_MODELS = {**OPENAI_MODELS, **LOCAL_MODELS}
+
 class EmbeddingServiceSettings(BaseSettings):
     """Configuración mínima para el servicio de embeddings."""
     
@@ -37,9 +63,34 @@ class EmbeddingServiceSettings(BaseSettings):
         description="Modelo de embedding predeterminado"
     )
     
+    # Modelos locales en CPU
+    local_embedding_backend: str = Field("onnx", description="Backend de sentence-transformers: onnx o torch")
+    local_embedding_threads: int = Field(2, description="Hilos dedicados a la inferencia local")
+    local_embedding_batch_size: int = Field(32, description="Textos por paso de inferencia local")
+    local_models_dir: Optional[str] = Field(None, description="Directorio de caché de los modelos locales")
+    local_models_preload: List[str] = Field(default_factory=list, description="Modelos locales a cargar al arrancar")
+    
     # Límites operacionales
-    max_batch_size: int = Field(100, description="Número máximo de textos por batch")
-    max_text_length: int = Field(8000, description="Longitud máxima de texto en caracteres")
+    max_batch_size: int = Field(100, description="Número máximo de textos por llamada al proveedor")
+    max_request_texts: int = Field(5000, description="Número máximo de textos por petición (se divide en sub-lotes)")
+    long_text_strategy: str = Field(
+        "error",
+        description="Textos que superan el máximo de tokens del modelo: error, truncate o window"
+    )
+    
+    # Caché de embeddings (memoria local + Redis)
+    embedding_cache_enabled: bool = Field(True, description="Reutilizar embeddings ya generados")
+    embedding_cache_local_max_entries: int = Field(5000, description="Vectores máximos en la LRU en memoria")
+    embedding_cache_ttl_seconds: int = Field(7 * 24 * 3600, description="TTL de los vectores en Redis")
+    
+    # Agrupación dinámica de peticiones concurrentes
+    dynamic_batching_enabled: bool = Field(True, description="Unir textos de peticiones concurrentes en una llamada")
+    batch_max_wait_ms: float = Field(5.0, description="Espera máxima para completar un lote (ms)")
+    batch_max_tokens: int = Field(100000, description="Tokens máximos por llamada (OpenAI admite 300.000)")
+    batch_max_concurrency: int = Field(8, description="Sub-lotes simultáneos en vuelo hacia el proveedor")
+    
+    # Dimensión reducida por colección (Matryoshka)
+    collection_dimensions_ttl: int = Field(300, description="Segundos que se recuerda la dimensión de una colección")
     
     # Timeouts
     openai_timeout_seconds: int = Field(30, description="Timeout para llamadas a OpenAI")
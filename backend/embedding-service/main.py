@@ -12,6 +12,9 @@ from common.errors import setup_error_handling
 from common.utils.logging import init_logging
 from common.db.supabase import init_supabase
 from config.settings import get_settings
+from services.embedding_cache import shutdown_embedding_cache
+from services.embedding_batcher import shutdown_embedding_batcher
+from provider import get_embedding_provider, shutdown_embedding_providers
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -24,14 +27,26 @@ async def lifespan(app: FastAPI):
     # Inicializar Supabase (para tracking)
     await init_supabase()
     
+    # Cargar los modelos locales configurados para no pagar la carga en la primera consulta
+    for model in settings.local_models_preload:
+        try:
+            await get_embedding_provider(model).load()
+        except Exception as e:
+            logger.error(f"Error cargando el modelo local {model}: {str(e)}")
+    
     yield
     
+    # Enviar los lotes pendientes y liberar la caché de embeddings
+    await shutdown_embedding_batcher()
+    await shutdown_embedding_cache()
+    await shutdown_embedding_providers()
+    
     logger.info(f"{settings.service_name} detenido")
 
 # Crear aplicación
 app = FastAPI(
     title="Embedding Service",
-    description="Servicio para generación de embeddings con OpenAI",
+    description="Servicio para generación de embeddings con OpenAI o modelos locales en CPU",
     version=settings.service_version,
     lifespan=lifespan
 )
@@ -17,6 +17,14 @@ class EnhancedEmbeddingRequest(BaseModel):
     collection_id: Optional[UUID] = Field(None, description="ID de colección")
     chunk_ids: Optional[List[str]] = Field(None, description="IDs de chunks")
     metadata: Optional[Dict[str, Any]] = Field(None, description="Metadatos adicionales")
+    dimensions: Optional[int] = Field(
+        None,
+        description="Dimensión de salida (None = la de la colección o la nativa del modelo)"
+    )
+    long_text_strategy: Optional[str] = Field(
+        None,
+        description="Textos que superan el máximo de tokens: error, truncate o window (None = configurada)"
+    )
     
     @validator('texts')
     def validate_texts(cls, v):
@@ -27,7 +35,9 @@ class EnhancedEmbeddingRequest(BaseModel):
 
 class EnhancedEmbeddingResponse(BaseResponse):
     """Response con embeddings generados."""
-    embeddings: List[List[float]] = Field(..., description="Vectores de embedding")
+    embeddings: List[List[float]] = Field(default_factory=list, description="Vectores de embedding (JSON)")
+    embeddings_b64: Optional[str] = Field(None, description="Vectores en base64 (formato binario negociado)")
+    embedding_format: Optional[str] = Field(None, description="Formato de embeddings_b64: float32 o float16")
     model: str = Field(..., description="Modelo utilizado")
     dimensions: int = Field(..., description="Dimensiones de los vectores")
     processing_time: float = Field(..., description="Tiempo de procesamiento")
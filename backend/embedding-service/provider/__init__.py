@@ -1,8 +1,50 @@
 """
 Proveedores de embeddings.
+
+El modelo pedido determina el proveedor según el campo "provider" de sus
+metadatos en EMBEDDING_MODELS; los modelos desconocidos se envían a OpenAI.
 """
 
+from typing import Dict, Optional, Type
+
+from config.settings import get_settings, EMBEDDING_MODELS
+from .base import EmbeddingProvider
 from .openai import OpenAIEmbeddingProvider
+from .local import LocalEmbeddingProvider, shutdown_local_executor
+
+# Implementación de cada tipo de proveedor
+PROVIDERS: Dict[str, Type[EmbeddingProvider]] = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": LocalEmbeddingProvider
+}
+
+# Una instancia por modelo (los modelos locales se cargan una sola vez)
+_providers: Dict[str, EmbeddingProvider] = {}
+
+
+def get_embedding_provider(model: Optional[str] = None) -> EmbeddingProvider:
+    """Proveedor compartido del modelo indicado (None = modelo predeterminado)."""
+    model = model or get_settings().default_embedding_model
+    provider = _providers.get(model)
+    if provider is None:
+        provider_type = EMBEDDING_MODELS.get(model, {}).get("provider", "openai")
+        provider = _providers[model] = PROVIDERS[provider_type](model=model)
+    return provider
+
+
+async def shutdown_embedding_providers():
+    """Libera los proveedores y el pool de inferencia local."""
+    for provider in _providers.values():
+        await provider.close()
+    _providers.clear()
+    await shutdown_local_executor()
 
-__all__ = ['OpenAIEmbeddingProvider']
 
+__all__ = [
+    'EmbeddingProvider',
+    'OpenAIEmbeddingProvider',
+    'LocalEmbeddingProvider',
+    'PROVIDERS',
+    'get_embedding_provider',
+    'shutdown_embedding_providers'
+]
@@ -0,0 +1,55 @@
+"""
+Interfaz común de los proveedores de embeddings.
+"""
+
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+
+from config.settings import EMBEDDING_MODELS
+from utils.token_counters import Tokenizer, model_max_tokens
+
+
+class EmbeddingProvider(ABC):
+    """
+    Proveedor de embeddings para un modelo concreto.
+
+    Las rutas, la caché y el agrupador solo usan esta interfaz: el modelo
+    pedido determina el proveedor (ver provider.get_embedding_provider).
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @abstractmethod
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        tenant_id: str,
+        track_usage: bool = True,
+        token_counts: Optional[List[int]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Genera embeddings para una lista de textos.
+
+        Returns:
+            Dict con 'embeddings' (en el orden de los textos) y 'usage'
+        """
+
+    def _get_dimensions(self) -> int:
+        """Obtiene las dimensiones del modelo actual."""
+        return EMBEDDING_MODELS[self.model]["dimensions"]
+
+    def get_tokenizer(self) -> Tokenizer:
+        """Tokenizador con el que el modelo mide sus textos (cl100k_base por defecto)."""
+        return Tokenizer()
+
+    def max_input_tokens(self) -> int:
+        """Tokens máximos por texto medidos con get_tokenizer()."""
+        return model_max_tokens(self.model)
+
+    async def load(self):
+        """Prepara el proveedor antes de la primera petición (si lo necesita)."""
+
+    async def close(self):
+        """Libera los recursos del proveedor."""
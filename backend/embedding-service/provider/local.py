@@ -0,0 +1,171 @@
+"""
+Proveedor de embeddings con modelos locales en CPU.
+
+Ejecuta modelos pequeños de sentence-transformers (backend ONNX por defecto)
+dentro del propio servicio: los embeddings de consultas no dependen de una
+API remota y sirven a tenants sin salida a internet.
+
+- El modelo se carga una sola vez por proceso, la primera vez que se usa (o
+  al arrancar si figura en local_models_preload).
+- La inferencia se ejecuta por lotes en un pool de hilos dedicado para no
+  bloquear el bucle de eventos; ONNX Runtime libera el GIL durante el cálculo.
+- Los vectores se devuelven normalizados, como los de OpenAI.
+- Los límites de tokens se miden con el tokenizador del propio modelo y
+  descontando sus tokens especiales: sentence-transformers recorta en
+  silencio lo que supera max_seq_length, así que las estrategias de textos
+  largos tienen que aplicarse con esa misma medida.
+
+sentence-transformers es una dependencia opcional: solo se importa al cargar
+un modelo local.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from common.errors import ServiceError
+
+from config.settings import get_settings, LOCAL_MODELS
+from provider.base import EmbeddingProvider
+from utils.token_counters import Tokenizer, HuggingFaceTokenizer
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Pool compartido por todos los modelos locales
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.local_embedding_threads,
+            thread_name_prefix="local-embeddings"
+        )
+    return _executor
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Proveedor de embeddings con un modelo sentence-transformers en CPU."""
+
+    def __init__(self, model: str):
+        if model not in LOCAL_MODELS:
+            raise ServiceError(f"Modelo local no soportado: {model}")
+        super().__init__(model)
+        self.model_path = LOCAL_MODELS[model]["model_path"]
+        self._encoder = None
+        self._tokenizer: Optional[HuggingFaceTokenizer] = None
+        self._load_lock = asyncio.Lock()
+
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        tenant_id: str,
+        track_usage: bool = True,
+        token_counts: Optional[List[int]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Genera embeddings en local.
+
+        Returns:
+            Dict con 'embeddings' y 'usage' (sin tokens facturables)
+        """
+        if not texts:
+            return {"embeddings": [], "usage": {"total_tokens": 0}}
+
+        encoder = await self.load()
+        start_time = time.time()
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                _get_executor(), self._encode, encoder, texts
+            )
+        except Exception as e:
+            logger.error(f"Error en la inferencia local con {self.model}: {str(e)}")
+            raise ServiceError(f"Error generando embeddings locales: {str(e)}")
+
+        logger.debug(f"{len(texts)} embeddings locales con {self.model} en {time.time() - start_time:.3f}s")
+        return {
+            "embeddings": vectors,
+            "usage": {"total_tokens": 0}
+        }
+
+    def get_tokenizer(self) -> Tokenizer:
+        """Tokenizador del modelo (requiere haberlo cargado con load())."""
+        if self._encoder is None:
+            raise ServiceError(f"El modelo local {self.model} no está cargado")
+        # Una sola instancia por modelo: su lock serializa el tokenizador
+        if self._tokenizer is None:
+            self._tokenizer = HuggingFaceTokenizer(self._encoder.tokenizer)
+        return self._tokenizer
+
+    def max_input_tokens(self) -> int:
+        """Longitud máxima del modelo sin sus tokens especiales ([CLS], [SEP]...)."""
+        max_tokens = LOCAL_MODELS[self.model]["max_tokens"]
+        if self._encoder is not None:
+            max_tokens = min(max_tokens, self._encoder.max_seq_length)
+            special_tokens = self._encoder.tokenizer.num_special_tokens_to_add(pair=False)
+        else:
+            special_tokens = 2
+        return max_tokens - special_tokens
+
+    async def load(self):
+        """Carga el modelo (una sola vez) en el pool de inferencia."""
+        if self._encoder is not None:
+            return self._encoder
+
+        async with self._load_lock:
+            if self._encoder is None:
+                start_time = time.time()
+                self._encoder = await asyncio.get_running_loop().run_in_executor(
+                    _get_executor(), self._load_model
+                )
+                logger.info(f"Modelo local {self.model} cargado en {time.time() - start_time:.2f}s")
+        return self._encoder
+
+    async def close(self):
+        """Libera el modelo cargado."""
+        self._encoder = None
+        self._tokenizer = None
+
+    def _load_model(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ServiceError(
+                "sentence-transformers no está instalado: necesario para los modelos locales"
+            )
+
+        return SentenceTransformer(
+            self.model_path,
+            device="cpu",
+            backend=settings.local_embedding_backend,
+            cache_folder=settings.local_models_dir
+        )
+
+    def _encode(self, encoder, texts: List[str]) -> List[List[float]]:
+        # Los textos vacíos mantienen el vector cero, como en OpenAI
+        positions = [i for i, text in enumerate(texts) if text.strip()]
+        vectors = [[0.0] * self._get_dimensions() for _ in texts]
+        if positions:
+            encoded = encoder.encode(
+                [texts[i] for i in positions],
+                batch_size=settings.local_embedding_batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            for i, vector in zip(positions, encoded.tolist()):
+                vectors[i] = vector
+        return vectors
+
+
+async def shutdown_local_executor():
+    """Detiene el pool de inferencia local."""
+    global _executor
+    if _executor:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
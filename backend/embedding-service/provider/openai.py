@@ -3,22 +3,43 @@ Proveedor simple de embeddings usando OpenAI.
 Implementación directa y simple.
 """
 
+import asyncio
 import logging
 import aiohttp
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from common.errors import ServiceError
 from common.tracking import track_token_usage
 from config.settings import get_settings, OPENAI_MODELS
+from provider.base import EmbeddingProvider
+from utils.token_counters import estimate_embedding_tokens_batch
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-class OpenAIEmbeddingProvider:
+def plan_sub_batches(token_counts: List[int], max_texts: int, max_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Divide una lista de textos en rangos [inicio, fin) consecutivos que no
+    superan max_texts textos ni max_tokens tokens (un texto mayor que el
+    presupuesto va solo en su rango).
+    """
+    ranges = []
+    start = 0
+    batch_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        if i > start and (i - start >= max_texts or batch_tokens + tokens > max_tokens):
+            ranges.append((start, i))
+            start, batch_tokens = i, 0
+        batch_tokens += tokens
+    if start < len(token_counts):
+        ranges.append((start, len(token_counts)))
+    return ranges
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
     """Proveedor simple de embeddings usando OpenAI."""
     
     def __init__(self, model: str = None):
-        self.model = model or settings.default_embedding_model
+        super().__init__(model or settings.default_embedding_model)
         self.api_key = settings.openai_api_key
         self.api_url = "https://api.openai.com/v1/embeddings"
         
@@ -26,11 +47,20 @@ class OpenAIEmbeddingProvider:
         self,
         texts: List[str],
         tenant_id: str,
+        track_usage: bool = True,
+        token_counts: Optional[List[int]] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
         Genera embeddings para una lista de textos.
         
+        Args:
+            texts: Textos a embeber
+            tenant_id: ID del tenant al que se imputan los tokens
+            track_usage: Registrar el uso de tokens (el agrupador lo registra
+                por tenant cuando un lote mezcla varios)
+            token_counts: Tokens de cada texto si el llamador ya los contó
+        
         Returns:
             Dict con 'embeddings' y 'usage'
         """
@@ -42,69 +72,26 @@ class OpenAIEmbeddingProvider:
                 "usage": {"total_tokens": 0}
             }
         
-        # Preparar request
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "input": non_empty_texts,
-            "model": self.model,
-            "encoding_format": "float"
-        }
-        
-        # Hacer request a OpenAI
+        # Dividir en sub-lotes según textos y tokens, enviados en paralelo acotado
+        if token_counts is None:
+            token_counts = await asyncio.to_thread(estimate_embedding_tokens_batch, non_empty_texts)
+        else:
+            token_counts = [tokens for text, tokens in zip(texts, token_counts) if text.strip()]
+        sub_batches = plan_sub_batches(
+            token_counts,
+            settings.max_batch_size,
+            settings.batch_max_tokens
+        )
+        semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
         timeout = aiohttp.ClientTimeout(total=settings.openai_timeout_seconds)
         
         try:
             async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    if response.status != 200:
-                        error_data = await response.json()
-                        raise ServiceError(
-                            f"OpenAI API error: {error_data.get('error', {}).get('message', 'Unknown error')}"
-                        )
-                    
-                    result = await response.json()
-                    
-                    # Extraer embeddings
-                    embeddings_data = result.get("data", [])
-                    embeddings = [item["embedding"] for item in embeddings_data]
-                    
-                    # Reconstruir lista completa (incluyendo vectores cero para textos vacíos)
-                    full_embeddings = []
-                    non_empty_idx = 0
-                    
-                    for text in texts:
-                        if text.strip():
-                            full_embeddings.append(embeddings[non_empty_idx])
-                            non_empty_idx += 1
-                        else:
-                            full_embeddings.append([0.0] * self._get_dimensions())
-                    
-                    # Tracking de tokens
-                    usage = result.get("usage", {})
-                    total_tokens = usage.get("total_tokens", 0)
-                    
-                    if total_tokens > 0:
-                        await track_token_usage(
-                            tenant_id=tenant_id,
-                            tokens=total_tokens,
-                            model=self.model,
-                            token_type="embedding",
-                            operation="generate",
-                            metadata={
-                                "batch_size": len(texts),
-                                "non_empty_texts": len(non_empty_texts)
-                            }
-                        )
-                    
-                    return {
-                        "embeddings": full_embeddings,
-                        "usage": usage
-                    }
-                    
+                async def run(start: int, end: int) -> Dict[str, Any]:
+                    async with semaphore:
+                        return await self._request_batch(session, non_empty_texts[start:end])
+                
+                results = await asyncio.gather(*[run(start, end) for start, end in sub_batches])
         except aiohttp.ClientError as e:
             logger.error(f"Network error calling OpenAI: {str(e)}")
             raise ServiceError(f"Error de red con OpenAI: {str(e)}")
@@ -113,6 +100,71 @@ class OpenAIEmbeddingProvider:
                 raise
             logger.error(f"Unexpected error: {str(e)}")
             raise ServiceError(f"Error generando embeddings: {str(e)}")
+        
+        embeddings = [embedding for result in results for embedding in result["embeddings"]]
+        
+        # Reconstruir lista completa (incluyendo vectores cero para textos vacíos)
+        full_embeddings = []
+        non_empty_idx = 0
+        
+        for text in texts:
+            if text.strip():
+                full_embeddings.append(embeddings[non_empty_idx])
+                non_empty_idx += 1
+            else:
+                full_embeddings.append([0.0] * self._get_dimensions())
+        
+        # Tracking de tokens
+        total_tokens = sum(result["total_tokens"] for result in results)
+        usage = {"prompt_tokens": total_tokens, "total_tokens": total_tokens}
+        
+        if track_usage and total_tokens > 0:
+            await track_token_usage(
+                tenant_id=tenant_id,
+                tokens=total_tokens,
+                model=self.model,
+                token_type="embedding",
+                operation="generate",
+                metadata={
+                    "batch_size": len(texts),
+                    "non_empty_texts": len(non_empty_texts),
+                    "sub_batches": len(sub_batches)
+                }
+            )
+        
+        return {
+            "embeddings": full_embeddings,
+            "usage": usage
+        }
+    
+    async def _request_batch(self, session: aiohttp.ClientSession, texts: List[str]) -> Dict[str, Any]:
+        """Una llamada a la API de OpenAI; devuelve 'embeddings' y 'total_tokens'."""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        payload = {
+            "input": texts,
+            "model": self.model,
+            "encoding_format": "float"
+        }
+        
+        async with session.post(self.api_url, headers=headers, json=payload) as response:
+            if response.status != 200:
+                error_data = await response.json()
+                raise ServiceError(
+                    f"OpenAI API error: {error_data.get('error', {}).get('message', 'Unknown error')}"
+                )
+            
+            result = await response.json()
+        
+        # OpenAI devuelve los vectores con su índice de entrada
+        embeddings_data = sorted(result.get("data", []), key=lambda item: item.get("index", 0))
+        return {
+            "embeddings": [item["embedding"] for item in embeddings_data],
+            "total_tokens": result.get("usage", {}).get("total_tokens", 0)
+        }
     
     def _get_dimensions(self) -> int:
         """Obtiene las dimensiones del modelo actual."""
@@ -2,12 +2,18 @@
 Endpoint único para generación de embeddings.
 """
 
+import asyncio
 import logging
 import time
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, Request, Response
 
 from models.embeddings import EnhancedEmbeddingRequest, EnhancedEmbeddingResponse
-from provider.openai import OpenAIEmbeddingProvider
+from provider import get_embedding_provider
+from services.wire_format import EMBEDDING_FORMAT_HEADER, negotiate_format, encode_embeddings
+from services.embedding_cache import generate_with_cache, get_embedding_cache
+from services.embedding_batcher import get_embedding_batcher
+from services.long_text import expand_long_texts, expanded_token_counts, combine_embeddings
+from services.dimensions import resolve_dimensions, reduce_embeddings
 from common.errors import handle_errors, ServiceError
 from common.context import with_context, Context
 from config.settings import get_settings
@@ -20,6 +26,8 @@ settings = get_settings()
 @handle_errors(error_type="json", log_traceback=True)
 @with_context
 async def generate_embeddings(
+    http_request: Request,
+    http_response: Response,
     request: EnhancedEmbeddingRequest = Body(...),
     ctx: Context = None
 ) -> EnhancedEmbeddingResponse:
@@ -28,6 +36,16 @@ async def generate_embeddings(
     
     Este endpoint es usado exclusivamente por el servicio de agentes
     para generar embeddings que luego se pasan al servicio de query.
+    
+    Con la cabecera X-Embedding-Format (float32 o float16) los vectores se
+    devuelven en embeddings_b64 como un bloque binario en base64.
+    
+    Si la petición o su colección declaran una dimensión reducida, los
+    vectores se truncan a ella y se vuelven a normalizar (Matryoshka).
+    
+    Las peticiones grandes se dividen en sub-lotes por número de textos y
+    tokens; los textos que superan el máximo del modelo se rechazan, recortan
+    o dividen en ventanas según long_text_strategy.
     """
     start_time = time.time()
     
@@ -35,43 +53,80 @@ async def generate_embeddings(
     if not request.texts:
         raise ServiceError("No se proporcionaron textos")
     
-    # Validar longitud de textos
-    for i, text in enumerate(request.texts):
-        if len(text) > settings.max_text_length:
-            raise ServiceError(
-                f"Texto {i} excede el límite de {settings.max_text_length} caracteres"
-            )
-    
-    # Validar tamaño de batch
-    if len(request.texts) > settings.max_batch_size:
+    # Validar tamaño de la petición (se divide en sub-lotes al llamar al proveedor)
+    if len(request.texts) > settings.max_request_texts:
         raise ServiceError(
-            f"Batch excede el límite de {settings.max_batch_size} textos"
+            f"La petición excede el límite de {settings.max_request_texts} textos"
         )
     
     try:
         # Crear proveedor
-        provider = OpenAIEmbeddingProvider(model=request.model)
+        provider = get_embedding_provider(request.model)
         
-        # Generar embeddings
-        result = await provider.generate_embeddings(
-            texts=request.texts,
-            tenant_id=request.tenant_id,
-            collection_id=str(request.collection_id) if request.collection_id else None,
-            chunk_ids=request.chunk_ids,
-            metadata=request.metadata
+        # Ajustar al máximo de tokens del modelo los textos demasiado largos
+        # (tokenizar miles de textos es CPU: fuera del bucle de eventos)
+        # con el tokenizador del propio modelo (los locales deben estar cargados)
+        await provider.load()
+        texts, groups, long_texts = await asyncio.to_thread(
+            expand_long_texts,
+            request.texts,
+            provider.model,
+            request.long_text_strategy,
+            provider.get_tokenizer(),
+            provider.max_input_tokens()
         )
+        tokens_by_text = dict(zip(texts, expanded_token_counts(groups)))
+        dimensions = await resolve_dimensions(
+            provider.model,
+            request.dimensions,
+            request.tenant_id,
+            str(request.collection_id) if request.collection_id else None
+        )
+        
+        async def generate(texts):
+            # Los tokens ya contados viajan con los textos que faltan en caché
+            token_counts = [tokens_by_text[text] for text in texts]
+            # Los textos de peticiones concurrentes comparten llamada al proveedor
+            if settings.dynamic_batching_enabled:
+                return await get_embedding_batcher().embed(texts, request.tenant_id, provider.model, token_counts)
+            return await provider.generate_embeddings(
+                texts=texts,
+                tenant_id=request.tenant_id,
+                token_counts=token_counts,
+                collection_id=str(request.collection_id) if request.collection_id else None,
+                chunk_ids=request.chunk_ids,
+                metadata=request.metadata
+            )
+        
+        # Generar embeddings (solo los que no están en caché)
+        result = await generate_with_cache(provider.model, texts, generate)
+        embeddings = combine_embeddings(result["embeddings"], groups)
+        if dimensions:
+            embeddings = reduce_embeddings(embeddings, dimensions)
         
         # Preparar respuesta
         processing_time = time.time() - start_time
         
+        embedding_format = negotiate_format(http_request.headers.get(EMBEDDING_FORMAT_HEADER))
+        if embedding_format:
+            http_response.headers[EMBEDDING_FORMAT_HEADER] = embedding_format
+        
         return EnhancedEmbeddingResponse(
             success=True,
             message="Embeddings generados correctamente",
-            embeddings=result["embeddings"],
+            embeddings=[] if embedding_format else embeddings,
+            embeddings_b64=encode_embeddings(embeddings, embedding_format) if embedding_format else None,
+            embedding_format=embedding_format,
             model=provider.model,
-            dimensions=provider._get_dimensions(),
+            dimensions=dimensions or provider._get_dimensions(),
             processing_time=processing_time,
-            total_tokens=result["usage"].get("total_tokens", 0)
+            total_tokens=result["usage"].get("total_tokens", 0),
+            metadata={
+                "cache": result["cache"],
+                "long_texts": long_texts,
+                "cache_totals": get_embedding_cache().get_stats(),
+                "batching": get_embedding_batcher().get_stats() if settings.dynamic_batching_enabled else None
+            }
         )
         
     except Exception as e:
@@ -2,6 +2,32 @@
 Servicios para el servicio de embeddings.
 """
 
-from .embedding_provider import CachedEmbeddingProvider
+from .wire_format import EMBEDDING_FORMAT_HEADER, negotiate_format, encode_embeddings
+from .embedding_cache import (
+    EmbeddingCache,
+    get_embedding_cache,
+    shutdown_embedding_cache,
+    generate_with_cache
+)
+from .embedding_batcher import EmbeddingBatcher, get_embedding_batcher, shutdown_embedding_batcher
+from .long_text import expand_long_texts, expanded_token_counts, combine_embeddings
+from .dimensions import get_collection_dimensions, resolve_dimensions, reduce_embeddings
 
-__all__ = ['CachedEmbeddingProvider']
\ No newline at end of file
+__all__ = [
+    'EMBEDDING_FORMAT_HEADER',
+    'negotiate_format',
+    'encode_embeddings',
+    'EmbeddingCache',
+    'get_embedding_cache',
+    'shutdown_embedding_cache',
+    'generate_with_cache',
+    'EmbeddingBatcher',
+    'get_embedding_batcher',
+    'shutdown_embedding_batcher',
+    'expand_long_texts',
+    'expanded_token_counts',
+    'combine_embeddings',
+    'get_collection_dimensions',
+    'resolve_dimensions',
+    'reduce_embeddings'
+]
@@ -0,0 +1,89 @@
+"""
+Embeddings de dimensión reducida por colección (Matryoshka).
+
+Los modelos text-embedding-3 concentran la información en las primeras
+dimensiones: truncar el vector y volver a normalizarlo equivale a pedirlo con
+el parámetro dimensions de OpenAI. Una colección puede declarar su dimensión
+(ai.collections.embedding_dimensions, p. ej. 256 o 512) y todos sus vectores,
+tanto los de chunks como los de consultas, se reducen a ella.
+
+La reducción se aplica después de la caché: los vectores completos se
+comparten entre colecciones con distinta dimensión.
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.errors import ServiceError
+from common.db.supabase import get_supabase_client
+from common.db.tables import get_table_name
+
+from config.settings import get_settings, EMBEDDING_MODELS
+
+logger = logging.getLogger(__name__)
+
+# Dimensión de cada colección y momento de la consulta
+_collection_dimensions: Dict[Tuple[str, str], Tuple[Optional[int], float]] = {}
+
+
+async def get_collection_dimensions(tenant_id: str, collection_id: str) -> Optional[int]:
+    """Dimensión declarada por una colección (None = la nativa del modelo)."""
+    key = (tenant_id, collection_id)
+    cached = _collection_dimensions.get(key)
+    if cached and time.time() - cached[1] < get_settings().collection_dimensions_ttl:
+        return cached[0]
+
+    supabase = await get_supabase_client()
+    response = await supabase.table(get_table_name("collections")) \
+        .select("embedding_dimensions") \
+        .eq("tenant_id", tenant_id) \
+        .eq("collection_id", collection_id) \
+        .limit(1) \
+        .execute()
+
+    dimensions = response.data[0].get("embedding_dimensions") if response.data else None
+    _collection_dimensions[key] = (dimensions, time.time())
+    return dimensions
+
+
+async def resolve_dimensions(
+    model: str,
+    requested: Optional[int],
+    tenant_id: str,
+    collection_id: Optional[str]
+) -> Optional[int]:
+    """
+    Dimensión de salida de una petición: la pedida explícitamente o la de su
+    colección. None si se devuelven los vectores completos.
+    """
+    dimensions = requested
+    if dimensions is None and collection_id:
+        try:
+            dimensions = await get_collection_dimensions(tenant_id, collection_id)
+        except Exception as e:
+            raise ServiceError(f"Error obteniendo la dimensión de la colección {collection_id}: {str(e)}")
+
+    model_info = EMBEDDING_MODELS.get(model, EMBEDDING_MODELS["text-embedding-3-small"])
+    if dimensions is None or dimensions == model_info["dimensions"]:
+        return None
+
+    if not model_info.get("matryoshka"):
+        raise ServiceError(f"El modelo {model} no admite embeddings de dimensión reducida")
+    if not 0 < dimensions < model_info["dimensions"]:
+        raise ServiceError(
+            f"Dimensión {dimensions} no válida para el modelo {model} (máximo {model_info['dimensions']})"
+        )
+    return dimensions
+
+
+def reduce_embeddings(embeddings: List[List[float]], dimensions: int) -> List[List[float]]:
+    """Trunca los vectores a sus primeras dimensiones y los vuelve a normalizar."""
+    if not embeddings:
+        return []
+    matrix = np.asarray(embeddings, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Los vectores cero (textos vacíos) se mantienen
+    return (matrix / np.where(norms == 0, 1, norms)).tolist()
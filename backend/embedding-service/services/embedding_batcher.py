@@ -0,0 +1,239 @@
+"""
+Agrupación dinámica de peticiones concurrentes de embeddings.
+
+Cada petición HTTP se convertía en su propia llamada a OpenAI: cincuenta
+preguntas de agentes llegando a la vez eran cincuenta peticiones al
+proveedor. El agrupador retiene los textos unos milisegundos, los une por
+modelo en una sola llamada que respeta max_batch_size y un presupuesto de
+tokens, y devuelve a cada llamador sus propios vectores.
+
+Un lote puede mezclar textos de varios tenants: el uso de tokens que informa
+OpenAI se reparte entre ellos en proporción a los tokens de sus textos y se
+registra por tenant.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional, Set
+
+from common.tracking import track_token_usage
+
+from config.settings import get_settings
+from provider import get_embedding_provider
+from utils.token_counters import estimate_embedding_tokens_batch
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    """Texto pendiente de embedding y el futuro donde se entrega su vector."""
+
+    __slots__ = ("text", "tokens", "tenant_id", "future")
+
+    def __init__(self, text: str, tokens: int, tenant_id: str, future: asyncio.Future):
+        self.text = text
+        self.tokens = tokens
+        self.tenant_id = tenant_id
+        self.future = future
+
+
+class EmbeddingBatcher:
+    """
+    Une en lotes por modelo los textos de peticiones concurrentes.
+
+    Un lote se envía cuando alcanza max_batch_size textos, cuando el siguiente
+    texto superaría max_batch_tokens o cuando vence max_wait_ms desde que
+    llegó su primer texto. Como mucho max_concurrency lotes están en vuelo.
+    """
+
+    def __init__(self):
+        settings = get_settings()
+        self.max_batch_size = settings.max_batch_size
+        self.max_batch_tokens = settings.batch_max_tokens
+        self.max_wait = settings.batch_max_wait_ms / 1000
+
+        self._semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+        self._pending: Dict[str, List[_Entry]] = {}
+        self._pending_tokens: Dict[str, int] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._in_flight: Set[asyncio.Task] = set()
+        self._metrics = {
+            "requests": 0,
+            "batches": 0,
+            "texts": 0,
+            "failed_batches": 0,
+            "flush_size": 0,
+            "flush_tokens": 0,
+            "flush_deadline": 0
+        }
+
+    async def embed(
+        self,
+        texts: List[str],
+        tenant_id: str,
+        model: str,
+        token_counts: Optional[List[int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Obtiene los embeddings de una petición a través de lotes compartidos.
+
+        Args:
+            texts: Textos a embeber
+            tenant_id: ID del tenant
+            model: Modelo de embedding
+            token_counts: Tokens de cada texto si el llamador ya los contó
+
+        Returns:
+            Dict con 'embeddings' (en el orden de los textos) y 'usage' (tokens
+            imputados a esta petición)
+        """
+        if not texts:
+            return {"embeddings": [], "usage": {"total_tokens": 0}}
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        self._metrics["requests"] += 1
+
+        if token_counts is None:
+            token_counts = await asyncio.to_thread(estimate_embedding_tokens_batch, texts)
+
+        for text, tokens in zip(texts, token_counts):
+            # Cerrar el lote actual si este texto excede el presupuesto de tokens
+            if self._pending.get(model) and self._pending_tokens[model] + tokens > self.max_batch_tokens:
+                self._flush(model, "flush_tokens")
+
+            future = loop.create_future()
+            self._pending.setdefault(model, []).append(_Entry(text, tokens, tenant_id, future))
+            self._pending_tokens[model] = self._pending_tokens.get(model, 0) + tokens
+            futures.append(future)
+
+            if len(self._pending[model]) >= self.max_batch_size:
+                self._flush(model, "flush_size")
+            elif model not in self._timers:
+                self._timers[model] = loop.call_later(self.max_wait, self._flush, model, "flush_deadline")
+
+        results = await asyncio.gather(*futures)
+        return {
+            "embeddings": [embedding for embedding, _ in results],
+            "usage": {"total_tokens": round(sum(tokens for _, tokens in results))}
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene métricas del agrupador.
+
+        Returns:
+            Dict[str, Any]: Contadores de lotes, textos, motivos de envío y carga actual
+        """
+        batches = self._metrics["batches"]
+        return {
+            **self._metrics,
+            "avg_batch_size": round(self._metrics["texts"] / batches, 2) if batches else 0,
+            "requests_per_batch": round(self._metrics["requests"] / batches, 2) if batches else 0,
+            "pending_texts": sum(len(entries) for entries in self._pending.values()),
+            "in_flight_batches": len(self._in_flight)
+        }
+
+    async def close(self):
+        """Envía los lotes pendientes y espera a que terminen los que están en vuelo."""
+        for model in list(self._pending):
+            self._flush(model, "flush_deadline")
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _flush(self, model: str, reason: str):
+        """Saca el lote pendiente de un modelo y lo despacha en segundo plano."""
+        timer = self._timers.pop(model, None)
+        if timer:
+            timer.cancel()
+
+        entries = self._pending.pop(model, None)
+        self._pending_tokens.pop(model, None)
+        if not entries:
+            return
+
+        self._metrics[reason] += 1
+        task = asyncio.ensure_future(self._dispatch(model, entries))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, model: str, entries: List[_Entry]):
+        """Envía un lote al proveedor y reparte vectores y tokens."""
+        provider = get_embedding_provider(model)
+
+        async with self._semaphore:
+            start_time = time.time()
+            try:
+                result = await provider.generate_embeddings(
+                    texts=[entry.text for entry in entries],
+                    tenant_id=entries[0].tenant_id,
+                    track_usage=False,
+                    token_counts=[entry.tokens for entry in entries]
+                )
+
+                # Reparto del uso real en proporción a los tokens de cada texto
+                total_tokens = result["usage"].get("total_tokens", 0)
+                batch_tokens = sum(entry.tokens for entry in entries)
+                tenant_tokens: Dict[str, float] = {}
+                for entry, embedding in zip(entries, result["embeddings"]):
+                    share = total_tokens * entry.tokens / batch_tokens if batch_tokens else 0
+                    tenant_tokens[entry.tenant_id] = tenant_tokens.get(entry.tenant_id, 0) + share
+                    if not entry.future.done():
+                        entry.future.set_result((embedding, share))
+
+                self._metrics["batches"] += 1
+                self._metrics["texts"] += len(entries)
+                logger.debug(
+                    f"Lote de {len(entries)} textos ({batch_tokens} tokens, {len(tenant_tokens)} tenants) "
+                    f"embebido en {time.time() - start_time:.2f}s"
+                )
+            except Exception as e:
+                self._metrics["failed_batches"] += 1
+                logger.error(f"Error embebiendo lote de {len(entries)} textos: {str(e)}")
+                for entry in entries:
+                    if not entry.future.done():
+                        entry.future.set_exception(e)
+                return
+
+        await self._track_usage(model, tenant_tokens, len(entries))
+
+    async def _track_usage(self, model: str, tenant_tokens: Dict[str, float], batch_size: int):
+        """Registra los tokens del lote imputados a cada tenant."""
+        for tenant_id, tokens in tenant_tokens.items():
+            if round(tokens) <= 0:
+                continue
+            try:
+                await track_token_usage(
+                    tenant_id=tenant_id,
+                    tokens=round(tokens),
+                    model=model,
+                    token_type="embedding",
+                    operation="generate",
+                    metadata={
+                        "batch_size": batch_size,
+                        "batched": True
+                    }
+                )
+            except Exception as e:
+                logger.warning(f"Error registrando tokens del tenant {tenant_id}: {str(e)}")
+
+
+# Instancia compartida del agrupador
+_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Obtiene la instancia compartida del agrupador de embeddings."""
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher()
+    return _batcher
+
+
+async def shutdown_embedding_batcher():
+    """Vacía y libera el agrupador de embeddings compartido."""
+    global _batcher
+    if _batcher:
+        await _batcher.close()
+        _batcher = None
@@ -0,0 +1,247 @@
+"""
+Caché de embeddings en dos niveles: memoria del proceso y Redis.
+
+Los agentes vuelven a pedir constantemente los mismos textos (preguntas
+repetidas, prompts de sistema), y cada uno costaba una llamada a OpenAI. La
+caché se consulta por lotes antes de llamar al proveedor:
+
+1. LRU en memoria del proceso, sin red.
+2. Redis con un único MGET para todo lo que falte; los nuevos vectores se
+   guardan con un pipeline de SET.
+
+La clave es el modelo más el hash SHA-256 del texto y el valor es el vector
+empaquetado en float32 little-endian (4 bytes por dimensión), mucho más
+compacto que JSON. Si Redis no está disponible se sigue con la memoria local.
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Callable, Awaitable
+
+import numpy as np
+import redis.asyncio as redis
+
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "embedding_cache"
+
+# Segundos sin reintentar la conexión a Redis tras un fallo
+REDIS_RETRY_INTERVAL = 30.0
+
+
+def cache_key(model: str, text: str) -> str:
+    """Clave de un texto para un modelo."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}:{model}:{digest}"
+
+
+def pack_embedding(embedding: Sequence[float]) -> bytes:
+    """Vector como float32 little-endian."""
+    return np.asarray(embedding, dtype="<f4").tobytes()
+
+
+def unpack_embedding(data: bytes) -> List[float]:
+    """Vector empaquetado con pack_embedding."""
+    return np.frombuffer(data, dtype="<f4").tolist()
+
+
+class EmbeddingCache:
+    """Caché de embeddings con LRU local y Redis compartido."""
+
+    def __init__(self):
+        settings = get_settings()
+        self.enabled = settings.embedding_cache_enabled
+        self.local_max_entries = settings.embedding_cache_local_max_entries
+        self.ttl = settings.embedding_cache_ttl_seconds
+        self.redis_url = settings.redis_url
+
+        self._local: "OrderedDict[str, bytes]" = OrderedDict()
+        self._redis: Optional[redis.Redis] = None
+        self._redis_retry_at = 0.0
+        self._metrics = {"lookups": 0, "local_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0}
+
+    async def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Busca los embeddings de varios textos.
+
+        Returns:
+            List[Optional[List[float]]]: Vector de cada texto, o None si no está en caché
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if not self.enabled or not texts:
+            return results
+
+        keys = [cache_key(model, text) for text in texts]
+        pending: List[int] = []
+        for i, key in enumerate(keys):
+            data = self._local.get(key)
+            if data is None:
+                pending.append(i)
+                continue
+            self._local.move_to_end(key)
+            results[i] = unpack_embedding(data)
+            self._metrics["local_hits"] += 1
+
+        client = await self._get_redis() if pending else None
+        if client:
+            try:
+                values = await client.mget([keys[i] for i in pending])
+                still_pending = []
+                for i, data in zip(pending, values):
+                    if data is None:
+                        still_pending.append(i)
+                        continue
+                    self._remember(keys[i], data)
+                    results[i] = unpack_embedding(data)
+                    self._metrics["redis_hits"] += 1
+                pending = still_pending
+            except Exception as e:
+                self._on_redis_error(e)
+
+        self._metrics["lookups"] += len(texts)
+        self._metrics["misses"] += len(pending)
+        return results
+
+    async def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Guarda los embeddings de varios textos en ambos niveles."""
+        if not self.enabled or not texts:
+            return
+
+        entries = {cache_key(model, text): pack_embedding(embedding) for text, embedding in zip(texts, embeddings)}
+        for key, data in entries.items():
+            self._remember(key, data)
+
+        client = await self._get_redis()
+        if client:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for key, data in entries.items():
+                    pipe.set(key, data, ex=self.ttl)
+                await pipe.execute()
+            except Exception as e:
+                self._on_redis_error(e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de la caché con la proporción de aciertos por nivel."""
+        lookups = self._metrics["lookups"]
+        hits = self._metrics["local_hits"] + self._metrics["redis_hits"]
+        return {
+            **self._metrics,
+            "local_entries": len(self._local),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "local_hit_ratio": round(self._metrics["local_hits"] / lookups, 4) if lookups else 0.0,
+            "redis_hit_ratio": round(self._metrics["redis_hits"] / lookups, 4) if lookups else 0.0,
+            "redis_available": self._redis is not None
+        }
+
+    async def close(self):
+        """Cierra la conexión a Redis y vacía la memoria local."""
+        if self._redis:
+            await self._redis.close()
+            self._redis = None
+        self._local.clear()
+
+    def _remember(self, key: str, data: bytes):
+        self._local[key] = data
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_max_entries:
+            self._local.popitem(last=False)
+
+    async def _get_redis(self) -> Optional[redis.Redis]:
+        """
+        Cliente Redis propio en modo binario (el compartido decodifica las
+        respuestas como texto y no admite vectores empaquetados).
+        """
+        if self._redis is not None or time.time() < self._redis_retry_at:
+            return self._redis
+        try:
+            client = redis.from_url(self.redis_url, decode_responses=False, socket_timeout=2.0)
+            await client.ping()
+            self._redis = client
+        except Exception as e:
+            logger.warning(f"Redis no disponible para la caché de embeddings: {str(e)}")
+            self._redis_retry_at = time.time() + REDIS_RETRY_INTERVAL
+        return self._redis
+
+    def _on_redis_error(self, error: Exception):
+        """Sigue solo con la memoria local hasta el próximo reintento."""
+        self._metrics["redis_errors"] += 1
+        logger.warning(f"Error en Redis en la caché de embeddings: {str(error)}")
+        self._redis = None
+        self._redis_retry_at = time.time() + REDIS_RETRY_INTERVAL
+
+
+async def generate_with_cache(
+    model: str,
+    texts: List[str],
+    generate: Callable[[List[str]], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """
+    Genera embeddings llamando al proveedor solo para los textos sin caché.
+
+    Los textos repetidos dentro del lote se piden una sola vez y los vacíos
+    no se cachean (el proveedor devuelve para ellos un vector cero sin coste).
+
+    Args:
+        model: Modelo de embedding (forma parte de la clave)
+        texts: Textos a embeber
+        generate: Genera los textos que faltan; devuelve 'embeddings' y 'usage'
+
+    Returns:
+        Dict con 'embeddings', 'usage' y 'cache' (aciertos del lote)
+    """
+    cache = get_embedding_cache()
+    embeddings = await cache.get_many(model, texts)
+
+    missing: Dict[str, List[int]] = {}
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing.setdefault(texts[i], []).append(i)
+
+    usage: Dict[str, Any] = {"total_tokens": 0}
+    if missing:
+        missing_texts = list(missing)
+        result = await generate(missing_texts)
+        usage = result["usage"]
+        for text, embedding in zip(missing_texts, result["embeddings"]):
+            for i in missing[text]:
+                embeddings[i] = embedding
+
+        cacheable = [(text, embedding) for text, embedding in zip(missing_texts, result["embeddings"]) if text.strip()]
+        if cacheable:
+            await cache.set_many(model, [text for text, _ in cacheable], [embedding for _, embedding in cacheable])
+
+    misses = sum(len(positions) for positions in missing.values())
+    return {
+        "embeddings": embeddings,
+        "usage": usage,
+        "cache": {
+            "hits": len(texts) - misses,
+            "misses": misses,
+            "hit_ratio": round((len(texts) - misses) / len(texts), 4) if texts else 0.0
+        }
+    }
+
+
+# Instancia compartida de la caché
+_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Obtiene la instancia compartida de la caché de embeddings."""
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+
+async def shutdown_embedding_cache():
+    """Libera la caché de embeddings."""
+    global _cache
+    if _cache:
+        await _cache.close()
+        _cache = None
@@ -0,0 +1,111 @@
+"""
+Textos que superan el máximo de tokens del modelo de embedding.
+
+Según la estrategia de la petición (o long_text_strategy por defecto):
+
+- "error": la petición se rechaza indicando el texto y sus tokens.
+- "truncate": el texto se recorta a los primeros tokens admitidos.
+- "window": el texto se divide en ventanas consecutivas que caben en el
+  modelo; cada ventana se embebe como un texto más (y se cachea por
+  separado) y el vector final es la media ponderada por tokens de las
+  ventanas, normalizada.
+
+La tokenización es CPU pura (hasta max_request_texts textos): expand_long_texts
+se ejecuta fuera del bucle de eventos y los tokens que cuenta se reutilizan
+al agrupar y dividir los lotes, sin volver a tokenizar.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.errors import ServiceError
+
+from config.settings import get_settings
+from utils.token_counters import Tokenizer, model_max_tokens
+
+STRATEGIES = ("error", "truncate", "window")
+
+# Posiciones de cada texto original en la lista expandida y tokens de cada una
+TextGroups = List[List[Tuple[int, int]]]
+
+
+def expand_long_texts(
+    texts: List[str],
+    model: str,
+    strategy: Optional[str] = None,
+    tokenizer: Optional[Tokenizer] = None,
+    max_tokens: Optional[int] = None
+) -> Tuple[List[str], TextGroups, Dict[str, int]]:
+    """
+    Prepara los textos para el modelo según la estrategia.
+
+    Los tokens se miden con el tokenizador del modelo (ver
+    EmbeddingProvider.get_tokenizer y max_input_tokens); sin él, con
+    cl100k_base y el máximo de la tabla de modelos.
+
+    Returns:
+        Tuple: Textos a embeber, grupos para recomponer cada texto original
+        y recuento de textos recortados o divididos
+    """
+    strategy = strategy or get_settings().long_text_strategy
+    if strategy not in STRATEGIES:
+        raise ServiceError(f"Estrategia de textos largos no soportada: {strategy} (use {', '.join(STRATEGIES)})")
+
+    encoder = tokenizer or Tokenizer()
+    max_tokens = max_tokens or model_max_tokens(model)
+    expanded: List[str] = []
+    groups: TextGroups = []
+    stats = {"truncated": 0, "windowed": 0}
+
+    for i, (text, tokens) in enumerate(zip(texts, encoder.encode_batch(texts))):
+        if len(tokens) <= max_tokens:
+            groups.append([(len(expanded), len(tokens))])
+            expanded.append(text)
+            continue
+
+        if strategy == "error":
+            raise ServiceError(
+                f"Texto {i} excede el límite de {max_tokens} tokens del modelo {model} ({len(tokens)} tokens)"
+            )
+
+        if strategy == "truncate":
+            stats["truncated"] += 1
+            groups.append([(len(expanded), max_tokens)])
+            expanded.append(encoder.decode(tokens[:max_tokens]))
+            continue
+
+        stats["windowed"] += 1
+        group = []
+        for start in range(0, len(tokens), max_tokens):
+            window = tokens[start:start + max_tokens]
+            group.append((len(expanded), len(window)))
+            expanded.append(encoder.decode(window))
+        groups.append(group)
+
+    return expanded, groups, stats
+
+
+def expanded_token_counts(groups: TextGroups) -> List[int]:
+    """Tokens de cada texto de la lista expandida, en su orden."""
+    counts = [0] * sum(len(group) for group in groups)
+    for group in groups:
+        for position, tokens in group:
+            counts[position] = tokens
+    return counts
+
+
+def combine_embeddings(embeddings: List[List[float]], groups: TextGroups) -> List[List[float]]:
+    """Un vector por texto original: los divididos en ventanas se promedian."""
+    combined = []
+    for group in groups:
+        if len(group) == 1:
+            combined.append(embeddings[group[0][0]])
+            continue
+
+        vectors = np.asarray([embeddings[position] for position, _ in group], dtype=np.float32)
+        weights = np.asarray([tokens for _, tokens in group], dtype=np.float32)
+        average = np.average(vectors, axis=0, weights=weights)
+        norm = np.linalg.norm(average)
+        combined.append((average / norm if norm else average).tolist())
+    return combined
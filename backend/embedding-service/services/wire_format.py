@@ -0,0 +1,47 @@
+"""
+Formato binario compacto para transportar embeddings.
+
+Un vector de 1536 dimensiones ocupa ~30KB como array JSON de floats y su
+parseo cuesta CPU en cada servicio. Si el cliente lo pide con la cabecera
+X-Embedding-Format, la respuesta incluye todos los vectores del lote en un
+único bloque base64 de floats little-endian (float32, o float16 para reducir
+el tamaño a la mitad a costa de precisión) en lugar del array JSON.
+"""
+
+import base64
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Cabecera con la que el cliente pide (y el servicio confirma) el formato
+EMBEDDING_FORMAT_HEADER = "X-Embedding-Format"
+
+# Formatos admitidos y su tipo NumPy little-endian
+SUPPORTED_FORMATS = {
+    "float32": "<f4",
+    "float16": "<f2"
+}
+
+
+def negotiate_format(header_value: Optional[str]) -> Optional[str]:
+    """
+    Elige el formato binario a partir de la cabecera del cliente.
+
+    La cabecera admite una lista por orden de preferencia ("float16, float32").
+
+    Returns:
+        Optional[str]: Formato elegido, o None para responder en JSON
+    """
+    if not header_value:
+        return None
+    for candidate in header_value.split(","):
+        candidate = candidate.strip().lower()
+        if candidate in SUPPORTED_FORMATS:
+            return candidate
+    return None
+
+
+def encode_embeddings(embeddings: Sequence[Sequence[float]], embedding_format: str) -> str:
+    """Codifica los vectores de un lote en un único bloque base64."""
+    array = np.asarray(embeddings, dtype=SUPPORTED_FORMATS[embedding_format])
+    return base64.b64encode(array.tobytes()).decode("ascii")
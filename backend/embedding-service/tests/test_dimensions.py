@@ -0,0 +1,22 @@
+"""Pruebas de la reducción de dimensión de los embeddings (Matryoshka)."""
+
+import numpy as np
+import pytest
+
+from services.dimensions import reduce_embeddings
+
+
+def test_reduce_embeddings_truncates_and_normalizes():
+    reduced = reduce_embeddings([[3.0, 4.0, 12.0], [0.0, 2.0, 5.0]], 2)
+
+    np.testing.assert_allclose(reduced, [[0.6, 0.8], [0.0, 1.0]], rtol=1e-6)
+    assert all(len(vector) == 2 for vector in reduced)
+    assert all(np.linalg.norm(vector) == pytest.approx(1.0) for vector in reduced)
+
+
+def test_reduce_embeddings_keeps_zero_vectors():
+    assert reduce_embeddings([[0.0, 0.0, 1.0]], 2) == [[0.0, 0.0]]
+
+
+def test_reduce_embeddings_empty():
+    assert reduce_embeddings([], 256) == []
@@ -0,0 +1,102 @@
+"""Pruebas de la agrupación dinámica de peticiones de embeddings."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import embedding_batcher
+from services.embedding_batcher import EmbeddingBatcher
+
+
+class FakeProvider:
+    """Proveedor que devuelve un vector por texto y 1 token real por token estimado."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def generate_embeddings(self, texts, tenant_id, track_usage, token_counts):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("proveedor caído")
+        return {
+            "embeddings": [[float(len(text))] for text in texts],
+            "usage": {"total_tokens": sum(token_counts)}
+        }
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = FakeProvider()
+    tracked = []
+
+    async def track_token_usage(tenant_id, tokens, **kwargs):
+        tracked.append((tenant_id, tokens))
+
+    settings = SimpleNamespace(
+        max_batch_size=3,
+        batch_max_tokens=100,
+        batch_max_wait_ms=10,
+        batch_max_concurrency=2
+    )
+    monkeypatch.setattr(embedding_batcher, "get_settings", lambda: settings)
+    monkeypatch.setattr(embedding_batcher, "get_embedding_provider", lambda model: provider)
+    monkeypatch.setattr(embedding_batcher, "track_token_usage", track_token_usage)
+    provider.tracked = tracked
+    return provider
+
+
+def test_concurrent_requests_share_one_upstream_call(provider):
+    async def scenario():
+        batcher = EmbeddingBatcher()
+        results = await asyncio.gather(
+            batcher.embed(["a", "bb"], "tenant-1", "model", token_counts=[10, 20]),
+            batcher.embed(["ccc"], "tenant-2", "model", token_counts=[30])
+        )
+        await batcher.close()
+        return results, batcher.get_stats()
+
+    (first, second), stats = asyncio.run(scenario())
+    assert provider.batches == [["a", "bb", "ccc"]]
+    assert first == {"embeddings": [[1.0], [2.0]], "usage": {"total_tokens": 30}}
+    assert second == {"embeddings": [[3.0]], "usage": {"total_tokens": 30}}
+    assert sorted(provider.tracked) == [("tenant-1", 30), ("tenant-2", 30)]
+    assert stats["batches"] == 1
+    assert stats["flush_size"] == 1
+
+
+def test_batches_respect_size_and_token_budget(provider):
+    async def scenario():
+        batcher = EmbeddingBatcher()
+        by_size = await batcher.embed(["a", "b", "c", "d"], "tenant-1", "model", token_counts=[1, 1, 1, 1])
+        by_tokens = await batcher.embed(["e", "f"], "tenant-1", "model", token_counts=[60, 60])
+        await batcher.close()
+        return by_size, by_tokens, batcher.get_stats()
+
+    by_size, by_tokens, stats = asyncio.run(scenario())
+    assert provider.batches == [["a", "b", "c"], ["d"], ["e"], ["f"]]
+    assert len(by_size["embeddings"]) == 4
+    assert len(by_tokens["embeddings"]) == 2
+    assert stats["flush_size"] == 1
+    assert stats["flush_tokens"] == 1
+    assert stats["flush_deadline"] == 2
+
+
+def test_provider_error_reaches_every_caller(provider):
+    provider.fail = True
+
+    async def scenario():
+        batcher = EmbeddingBatcher()
+        results = await asyncio.gather(
+            batcher.embed(["a"], "tenant-1", "model", token_counts=[1]),
+            batcher.embed(["b"], "tenant-2", "model", token_counts=[1]),
+            return_exceptions=True
+        )
+        return results, batcher.get_stats()
+
+    results, stats = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert provider.batches == [["a", "b"]]
+    assert stats["failed_batches"] == 1
+    assert provider.tracked == []
@@ -0,0 +1,35 @@
+"""Pruebas del formato binario de los embeddings en las respuestas."""
+
+import base64
+
+import numpy as np
+
+from services.wire_format import encode_embeddings, negotiate_format
+
+
+def _decode(encoded, dtype, dimensions):
+    return np.frombuffer(base64.b64decode(encoded), dtype=dtype).reshape(-1, dimensions)
+
+
+def test_negotiate_format():
+    assert negotiate_format(None) is None
+    assert negotiate_format("") is None
+    assert negotiate_format("float32") == "float32"
+    assert negotiate_format(" Float16 , float32") == "float16"
+    assert negotiate_format("float64, float32") == "float32"
+    assert negotiate_format("json") is None
+
+
+def test_float32_round_trip():
+    embeddings = [[0.1, -0.2, 0.3], [1.0, 0.0, -1.0]]
+    decoded = _decode(encode_embeddings(embeddings, "float32"), "<f4", 3)
+    np.testing.assert_array_equal(decoded, np.asarray(embeddings, dtype=np.float32))
+
+
+def test_float16_round_trip_halves_the_payload():
+    embeddings = [[0.1, -0.2, 0.3, 0.4]] * 4
+    encoded16 = encode_embeddings(embeddings, "float16")
+    encoded32 = encode_embeddings(embeddings, "float32")
+
+    assert len(base64.b64decode(encoded16)) * 2 == len(base64.b64decode(encoded32))
+    np.testing.assert_allclose(_decode(encoded16, "<f2", 4), embeddings, rtol=1e-3)
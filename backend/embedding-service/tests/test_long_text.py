@@ -0,0 +1,78 @@
+"""Pruebas de las estrategias para textos que superan el máximo del modelo."""
+
+import numpy as np
+import pytest
+
+from common.errors import ServiceError
+from services.long_text import combine_embeddings, expand_long_texts, expanded_token_counts
+from utils.token_counters import Tokenizer
+
+
+class WordTokenizer(Tokenizer):
+    """Un token por palabra, para controlar los límites en las pruebas."""
+
+    def encode_batch(self, texts):
+        return [text.split() for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def _words(count, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def _expand(texts, strategy):
+    return expand_long_texts(texts, "test-model", strategy, tokenizer=WordTokenizer(), max_tokens=4)
+
+
+def test_short_texts_pass_through():
+    texts = ["uno dos", _words(4)]
+    expanded, groups, stats = _expand(texts, "error")
+
+    assert expanded == texts
+    assert groups == [[(0, 2)], [(1, 4)]]
+    assert stats == {"truncated": 0, "windowed": 0}
+
+
+def test_error_strategy_rejects_long_text():
+    with pytest.raises(ServiceError):
+        _expand(["corto", _words(5)], "error")
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ServiceError):
+        _expand(["corto"], "summarize")
+
+
+def test_truncate_strategy_keeps_first_tokens():
+    expanded, groups, stats = _expand([_words(10)], "truncate")
+
+    assert expanded == [_words(4)]
+    assert groups == [[(0, 4)]]
+    assert stats["truncated"] == 1
+
+
+def test_window_strategy_splits_into_consecutive_windows():
+    expanded, groups, stats = _expand(["corto", _words(10), "otro"], "window")
+
+    assert expanded == ["corto", "w0 w1 w2 w3", "w4 w5 w6 w7", "w8 w9", "otro"]
+    assert groups == [[(0, 1)], [(1, 4), (2, 4), (3, 2)], [(4, 1)]]
+    assert stats["windowed"] == 1
+    assert expanded_token_counts(groups) == [1, 4, 4, 2, 1]
+
+
+def test_combine_embeddings_weights_windows_by_tokens():
+    embeddings = [
+        [1.0, 0.0],
+        [1.0, 0.0],
+        [0.0, 1.0],
+    ]
+    groups = [[(0, 1)], [(1, 3), (2, 1)]]
+    combined = combine_embeddings(embeddings, groups)
+
+    # Los textos sin dividir conservan su vector tal cual
+    assert combined[0] == [1.0, 0.0]
+    expected = np.asarray([3.0, 1.0]) / np.linalg.norm([3.0, 1.0])
+    np.testing.assert_allclose(combined[1], expected, rtol=1e-6)
+    assert np.linalg.norm(combined[1]) == pytest.approx(1.0)
@@ -0,0 +1,34 @@
+"""Pruebas de la división de peticiones en sub-lotes por textos y tokens."""
+
+from provider.openai import plan_sub_batches
+
+
+def test_single_batch_when_everything_fits():
+    assert plan_sub_batches([10, 20, 30], max_texts=10, max_tokens=100) == [(0, 3)]
+
+
+def test_splits_by_text_count():
+    assert plan_sub_batches([1] * 5, max_texts=2, max_tokens=100) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_splits_by_token_budget():
+    assert plan_sub_batches([40, 40, 40, 10], max_texts=10, max_tokens=100) == [(0, 2), (2, 4)]
+
+
+def test_oversized_text_goes_alone():
+    assert plan_sub_batches([10, 500, 10], max_texts=10, max_tokens=100) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_ranges_cover_every_text_once():
+    token_counts = [7, 93, 1, 50, 50, 50, 120, 3, 3, 3]
+    ranges = plan_sub_batches(token_counts, max_texts=3, max_tokens=100)
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(token_counts)
+    assert all(previous[1] == current[0] for previous, current in zip(ranges, ranges[1:]))
+    for start, end in ranges:
+        assert end - start <= 3
+        assert end - start == 1 or sum(token_counts[start:end]) <= 100
+
+
+def test_empty_input():
+    assert plan_sub_batches([], max_texts=10, max_tokens=100) == []
@@ -9,11 +9,17 @@ funciones ubicadas anteriormente en common/llm.
 from .token_counters import (
     count_embedding_tokens,
     estimate_embedding_tokens_batch,
-    check_embedding_context_limit
+    check_embedding_context_limit,
+    model_max_tokens,
+    Tokenizer,
+    HuggingFaceTokenizer
 )
 
 __all__ = [
     'count_embedding_tokens',
     'estimate_embedding_tokens_batch',
-    'check_embedding_context_limit'
+    'check_embedding_context_limit',
+    'model_max_tokens',
+    'Tokenizer',
+    'HuggingFaceTokenizer'
 ]
@@ -0,0 +1,88 @@
+"""
+Conteo de tokens para los modelos de embedding de OpenAI.
+
+Los modelos text-embedding-3 y ada-002 usan el codificador cl100k_base, que
+se carga una sola vez y se comparte entre todas las peticiones. Los modelos
+locales usan el tokenizador de su propio modelo (ver provider.local): con
+cl100k_base sus límites de 128 o 256 tokens se medirían mal y
+sentence-transformers recortaría en silencio los textos más largos.
+"""
+
+import threading
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+from config.settings import get_settings, EMBEDDING_MODELS
+
+
+@lru_cache(maxsize=1)
+def get_encoder():
+    """Codificador compartido (cargarlo es costoso)."""
+    return tiktoken.get_encoding("cl100k_base")
+
+
+class Tokenizer:
+    """Tokenizador con el que se miden y recortan los textos de un modelo."""
+
+    def encode_batch(self, texts: List[str]) -> List[List[int]]:
+        """Tokens de cada texto."""
+        return get_encoder().encode_batch(texts, disallowed_special=())
+
+    def decode(self, tokens: List[int]) -> str:
+        """Texto de una secuencia de tokens."""
+        return get_encoder().decode(tokens)
+
+
+class HuggingFaceTokenizer(Tokenizer):
+    """
+    Tokenizador de un modelo local, sin contar los tokens especiales.
+
+    Los tokenizadores rápidos de Hugging Face no admiten llamadas concurrentes
+    desde varios hilos: se serializan con un lock.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self._lock = threading.Lock()
+
+    def encode_batch(self, texts: List[str]) -> List[List[int]]:
+        if not texts:
+            return []
+        with self._lock:
+            return self.tokenizer(
+                texts,
+                add_special_tokens=False,
+                return_attention_mask=False,
+                return_token_type_ids=False
+            )["input_ids"]
+
+    def decode(self, tokens: List[int]) -> str:
+        with self._lock:
+            return self.tokenizer.decode(tokens, skip_special_tokens=True)
+
+
+def count_embedding_tokens(text: str) -> int:
+    """Número de tokens de un texto."""
+    if not text:
+        return 0
+    return len(get_encoder().encode(text, disallowed_special=()))
+
+
+def estimate_embedding_tokens_batch(texts: List[str]) -> List[int]:
+    """Número de tokens de cada texto de un lote."""
+    if not texts:
+        return []
+    return [len(tokens) for tokens in get_encoder().encode_batch(texts, disallowed_special=())]
+
+
+def model_max_tokens(model: Optional[str] = None) -> int:
+    """Tokens máximos por texto que admite un modelo."""
+    model_info = EMBEDDING_MODELS.get(model or get_settings().default_embedding_model, EMBEDDING_MODELS["text-embedding-3-small"])
+    return model_info["max_tokens"]
+
+
+def check_embedding_context_limit(text: str, model: Optional[str] = None) -> bool:
+    """Indica si un texto cabe en el contexto del modelo."""
+    return count_embedding_tokens(text) <= model_max_tokens(model)
@@ -31,6 +31,67 @@ from config.constants import (
     MAX_QUEUE_SIZE,
     WORKER_CONCURRENCY,
     
+    # Pipeline concurrente por etapas
+    PIPELINE_ENABLED,
+    PIPELINE_STAGE_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    
+    # Pool de procesos de extracción
+    EXTRACTION_POOL_ENABLED,
+    EXTRACTION_POOL_WORKERS,
+    
+    # Procesamiento en streaming de documentos grandes
+    STREAMING_ENABLED,
+    STREAMING_THRESHOLD_MB,
+    STREAMING_MAX_DOC_SIZE_MB,
+    STREAMING_PAGES_PER_BATCH,
+    STREAMING_EMBED_BATCH_SIZE,
+    
+    # Deduplicación por contenido de documentos y chunks
+    DEDUP_ENABLED,
+    DEDUP_INDEX_TTL,
+    
+    # Reingesta incremental de documentos actualizados
+    INCREMENTAL_REINGESTION_ENABLED,
+    
+    # Agrupación adaptativa de peticiones de embeddings
+    EMBEDDING_BATCHER_ENABLED,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_BATCH_MAX_WAIT_MS,
+    EMBEDDING_BATCH_CONCURRENCY,
+    EMBEDDING_MODEL_MAX_TOKENS,
+    
+    # Transporte binario de embeddings
+    EMBEDDING_WIRE_FORMAT,
+    
+    # Escritura masiva en document_chunks
+    VECTOR_BULK_WRITE_ENABLED,
+    VECTOR_WRITE_BATCH_SIZE,
+    VECTOR_DB_POOL_MIN_SIZE,
+    VECTOR_DB_POOL_MAX_SIZE,
+    
+    # Configuración de la cola fiable de trabajos
+    QUEUE_VISIBILITY_TIMEOUT,
+    QUEUE_BLOCK_TIMEOUT,
+    QUEUE_RECOVERY_INTERVAL,
+    QUEUE_MAX_DELIVERIES,
+    QUEUE_JOB_LEASE_TIMEOUT,
+    
+    # Planificación justa de trabajos entre tenants
+    FAIR_SCHEDULING_ENABLED,
+    QUEUE_DISPATCH_WINDOW,
+    QUEUE_DISPATCH_INTERVAL_MS,
+    QUEUE_PRIORITY_MAX_SIZE_KB,
+    QUEUE_PRIORITY_SHARE,
+    TENANT_QUEUE_WEIGHTS,
+    
+    # Escritura diferida de estados de trabajos y documentos
+    STATUS_WRITE_BEHIND_ENABLED,
+    STATUS_FLUSH_INTERVAL_MS,
+    STATUS_FLUSH_MAX_BATCH,
+    STATUS_WRITE_MAX_ATTEMPTS,
+    
     # Configuración de modelos
     DEFAULT_EMBEDDING_MODEL,
     DEFAULT_EMBEDDING_DIMENSION,
@@ -74,6 +135,67 @@ __all__ = [
     "MAX_QUEUE_SIZE",
     "WORKER_CONCURRENCY",
     
+    # Pipeline concurrente por etapas
+    "PIPELINE_ENABLED",
+    "PIPELINE_STAGE_WORKERS",
+    "PIPELINE_QUEUE_SIZE",
+    
+    # Pool de procesos de extracción
+    "EXTRACTION_POOL_ENABLED",
+    "EXTRACTION_POOL_WORKERS",
+    
+    # Procesamiento en streaming de documentos grandes
+    "STREAMING_ENABLED",
+    "STREAMING_THRESHOLD_MB",
+    "STREAMING_MAX_DOC_SIZE_MB",
+    "STREAMING_PAGES_PER_BATCH",
+    "STREAMING_EMBED_BATCH_SIZE",
+    
+    # Deduplicación por contenido de documentos y chunks
+    "DEDUP_ENABLED",
+    "DEDUP_INDEX_TTL",
+    
+    # Reingesta incremental de documentos actualizados
+    "INCREMENTAL_REINGESTION_ENABLED",
+    
+    # Agrupación adaptativa de peticiones de embeddings
+    "EMBEDDING_BATCHER_ENABLED",
+    "EMBEDDING_BATCH_MAX_SIZE",
+    "EMBEDDING_BATCH_MAX_TOKENS",
+    "EMBEDDING_BATCH_MAX_WAIT_MS",
+    "EMBEDDING_BATCH_CONCURRENCY",
+    "EMBEDDING_MODEL_MAX_TOKENS",
+    
+    # Transporte binario de embeddings
+    "EMBEDDING_WIRE_FORMAT",
+    
+    # Escritura masiva en document_chunks
+    "VECTOR_BULK_WRITE_ENABLED",
+    "VECTOR_WRITE_BATCH_SIZE",
+    "VECTOR_DB_POOL_MIN_SIZE",
+    "VECTOR_DB_POOL_MAX_SIZE",
+    
+    # Configuración de la cola fiable de trabajos
+    "QUEUE_VISIBILITY_TIMEOUT",
+    "QUEUE_BLOCK_TIMEOUT",
+    "QUEUE_RECOVERY_INTERVAL",
+    "QUEUE_MAX_DELIVERIES",
+    "QUEUE_JOB_LEASE_TIMEOUT",
+    
+    # Planificación justa de trabajos entre tenants
+    "FAIR_SCHEDULING_ENABLED",
+    "QUEUE_DISPATCH_WINDOW",
+    "QUEUE_DISPATCH_INTERVAL_MS",
+    "QUEUE_PRIORITY_MAX_SIZE_KB",
+    "QUEUE_PRIORITY_SHARE",
+    "TENANT_QUEUE_WEIGHTS",
+    
+    # Escritura diferida de estados de trabajos y documentos
+    "STATUS_WRITE_BEHIND_ENABLED",
+    "STATUS_FLUSH_INTERVAL_MS",
+    "STATUS_FLUSH_MAX_BATCH",
+    "STATUS_WRITE_MAX_ATTEMPTS",
+    
     # Configuración de modelos
     "DEFAULT_EMBEDDING_MODEL",
     "DEFAULT_EMBEDDING_DIMENSION",
@@ -24,6 +24,82 @@ JOBS_QUEUE_KEY = "ingestion:jobs"  # Clave para la cola de trabajos principal
 MAX_QUEUE_SIZE = 1000  # Tamaño máximo de la cola de trabajos
 WORKER_CONCURRENCY = MAX_WORKERS  # Número de workers concurrentes
 
+# Pipeline concurrente por etapas (extracción → chunking → embeddings → almacenamiento)
+PIPELINE_ENABLED = True  # Usar el pipeline por etapas en lugar de workers secuenciales
+PIPELINE_STAGE_WORKERS = {
+    "extract": 2,  # Extracción de texto (CPU y descarga desde Storage)
+    "chunk": 2,    # División en chunks (CPU)
+    "embed": 4,    # Llamadas HTTP al servicio de embeddings
+    "store": 2     # Escrituras en el vector store
+}
+PIPELINE_QUEUE_SIZE = 8  # Capacidad de cada cola entre etapas (backpressure)
+
+# Pool de procesos para extracción de texto y chunking
+EXTRACTION_POOL_ENABLED = True  # Ejecutar lectores y SentenceSplitter fuera del event loop
+EXTRACTION_POOL_WORKERS = 0     # Procesos del pool (0 = todos los núcleos disponibles)
+
+# Procesamiento en streaming de documentos grandes
+STREAMING_ENABLED = True         # Procesar documentos grandes página a página
+STREAMING_THRESHOLD_MB = 5       # Tamaño (MB) a partir del cual se usa streaming
+STREAMING_MAX_DOC_SIZE_MB = 100  # Tamaño máximo (MB) de documentos con streaming
+STREAMING_PAGES_PER_BATCH = 10   # Páginas de PDF extraídas por lote
+STREAMING_EMBED_BATCH_SIZE = 64  # Chunks enviados a embeddings y almacenados por lote
+
+# Deduplicación por contenido de documentos y chunks
+DEDUP_ENABLED = True          # Reutilizar documentos y embeddings con el mismo contenido
+DEDUP_INDEX_TTL = 30 * 86400  # Vigencia (segundos) de las entradas del índice de archivos subidos
+
+# Reingesta incremental de documentos actualizados
+INCREMENTAL_REINGESTION_ENABLED = True  # Reescribir solo los chunks nuevos o modificados
+
+# Agrupación adaptativa de peticiones de embeddings
+EMBEDDING_BATCHER_ENABLED = True     # Agrupar textos de varios documentos por petición
+EMBEDDING_BATCH_MAX_SIZE = 100       # Textos por petición (max_batch_size del servicio de embeddings)
+EMBEDDING_BATCH_MAX_TOKENS = 100000  # Presupuesto de tokens por petición
+EMBEDDING_BATCH_MAX_WAIT_MS = 50     # Espera máxima (ms) antes de enviar un lote incompleto
+EMBEDDING_BATCH_CONCURRENCY = 4      # Lotes enviados en paralelo
+# Tokens máximos por texto de cada modelo (OPENAI_MODELS del servicio de embeddings)
+EMBEDDING_MODEL_MAX_TOKENS = {
+    "text-embedding-3-small": 8191,
+    "text-embedding-3-large": 8191,
+    "text-embedding-ada-002": 8191
+}
+
+# Transporte binario de embeddings desde el servicio de embeddings
+EMBEDDING_WIRE_FORMAT = "float32"  # float32, float16 o "" para recibir arrays JSON
+
+# Escritura masiva en document_chunks
+VECTOR_BULK_WRITE_ENABLED = True  # Upsert por lotes en document_chunks en lugar de LlamaIndex
+VECTOR_WRITE_BATCH_SIZE = 500     # Chunks por sentencia INSERT ... ON CONFLICT
+VECTOR_DB_POOL_MIN_SIZE = 1       # Conexiones mínimas del pool de Postgres
+VECTOR_DB_POOL_MAX_SIZE = 10      # Conexiones máximas del pool de Postgres
+
+# Configuración de la cola fiable de trabajos
+QUEUE_VISIBILITY_TIMEOUT = 30                 # Segundos sin latido tras los que se reentregan los trabajos de un consumidor
+QUEUE_BLOCK_TIMEOUT = 5                       # Espera bloqueante máxima al extraer un trabajo (segundos)
+QUEUE_RECOVERY_INTERVAL = 10                  # Frecuencia del recuperador de trabajos abandonados (segundos)
+QUEUE_MAX_DELIVERIES = MAX_QUEUE_RETRIES + 1  # Entregas máximas antes de mover un trabajo a fallidos
+QUEUE_JOB_LEASE_TIMEOUT = 1800                # Segundos que un consumidor vivo puede retener un trabajo sin confirmarlo
+
+# Planificación justa de trabajos entre tenants
+FAIR_SCHEDULING_ENABLED = True     # Repartir la cola entre tenants con colas por tenant y carril prioritario
+QUEUE_DISPATCH_WINDOW = 8          # Trabajos planificados como máximo en la cola compartida
+QUEUE_DISPATCH_INTERVAL_MS = 200   # Espera máxima del planificador entre rondas sin avisos
+QUEUE_PRIORITY_MAX_SIZE_KB = 1024  # Subidas individuales hasta este tamaño van al carril prioritario
+QUEUE_PRIORITY_SHARE = 0.5         # Fracción de los huecos de cada ronda reservada al carril prioritario
+TENANT_QUEUE_WEIGHTS = {  # Peso por tier (si los límites del tier no definen queue_weight)
+    "free": 1,
+    "pro": 2,
+    "business": 4,
+    "enterprise": 4
+}
+
+# Escritura diferida de estados de trabajos y documentos
+STATUS_WRITE_BEHIND_ENABLED = True  # Agrupar actualizaciones de estado y escribirlas por lotes
+STATUS_FLUSH_INTERVAL_MS = 500      # Intervalo de volcado de estados no finales
+STATUS_FLUSH_MAX_BATCH = 200        # Filas máximas por sentencia de actualización
+STATUS_WRITE_MAX_ATTEMPTS = 5       # Volcados fallidos tras los que se descarta una fila
+
 # Configuración de modelos
 # OpenAI
 DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"  # Modelo de embedding predeterminado para OpenAI
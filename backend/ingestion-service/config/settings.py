@@ -23,7 +23,57 @@ from config.constants import (
     # Nuevas constantes para la cola de trabajos
     JOBS_QUEUE_KEY,
     MAX_QUEUE_SIZE,
-    WORKER_CONCURRENCY
+    WORKER_CONCURRENCY,
+    # Pipeline concurrente por etapas
+    PIPELINE_ENABLED,
+    PIPELINE_STAGE_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    # Pool de procesos de extracción
+    EXTRACTION_POOL_ENABLED,
+    EXTRACTION_POOL_WORKERS,
+    # Procesamiento en streaming de documentos grandes
+    STREAMING_ENABLED,
+    STREAMING_THRESHOLD_MB,
+    STREAMING_MAX_DOC_SIZE_MB,
+    STREAMING_PAGES_PER_BATCH,
+    STREAMING_EMBED_BATCH_SIZE,
+    # Deduplicación por contenido de documentos y chunks
+    DEDUP_ENABLED,
+    DEDUP_INDEX_TTL,
+    # Reingesta incremental de documentos actualizados
+    INCREMENTAL_REINGESTION_ENABLED,
+    # Agrupación adaptativa de peticiones de embeddings
+    EMBEDDING_BATCHER_ENABLED,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_BATCH_MAX_WAIT_MS,
+    EMBEDDING_BATCH_CONCURRENCY,
+    EMBEDDING_MODEL_MAX_TOKENS,
+    # Transporte binario de embeddings
+    EMBEDDING_WIRE_FORMAT,
+    # Escritura masiva en document_chunks
+    VECTOR_BULK_WRITE_ENABLED,
+    VECTOR_WRITE_BATCH_SIZE,
+    VECTOR_DB_POOL_MIN_SIZE,
+    VECTOR_DB_POOL_MAX_SIZE,
+    # Configuración de la cola fiable de trabajos
+    QUEUE_VISIBILITY_TIMEOUT,
+    QUEUE_BLOCK_TIMEOUT,
+    QUEUE_RECOVERY_INTERVAL,
+    QUEUE_MAX_DELIVERIES,
+    QUEUE_JOB_LEASE_TIMEOUT,
+    # Planificación justa de trabajos entre tenants
+    FAIR_SCHEDULING_ENABLED,
+    QUEUE_DISPATCH_WINDOW,
+    QUEUE_DISPATCH_INTERVAL_MS,
+    QUEUE_PRIORITY_MAX_SIZE_KB,
+    QUEUE_PRIORITY_SHARE,
+    TENANT_QUEUE_WEIGHTS,
+    # Escritura diferida de estados de trabajos y documentos
+    STATUS_WRITE_BEHIND_ENABLED,
+    STATUS_FLUSH_INTERVAL_MS,
+    STATUS_FLUSH_MAX_BATCH,
+    STATUS_WRITE_MAX_ATTEMPTS
 )
 
 logger = logging.getLogger(__name__)
@@ -40,6 +90,77 @@ class IngestionSettings(CommonSettings):
     max_queue_size: int = Field(MAX_QUEUE_SIZE, description="Tamaño máximo de la cola de trabajos")
     worker_concurrency: int = Field(WORKER_CONCURRENCY, description="Número de workers concurrentes")
     
+    # Pipeline concurrente por etapas
+    pipeline_enabled: bool = Field(PIPELINE_ENABLED, description="Procesar trabajos con el pipeline por etapas")
+    pipeline_stage_workers: Dict[str, int] = Field(
+        default_factory=lambda: dict(PIPELINE_STAGE_WORKERS),
+        description="Número de workers por etapa (extract, chunk, embed, store)"
+    )
+    pipeline_queue_size: int = Field(PIPELINE_QUEUE_SIZE, description="Capacidad de las colas entre etapas")
+    
+    # Pool de procesos para extracción y chunking
+    extraction_pool_enabled: bool = Field(EXTRACTION_POOL_ENABLED, description="Extraer y dividir documentos en un pool de procesos")
+    extraction_pool_workers: int = Field(EXTRACTION_POOL_WORKERS, description="Procesos del pool de extracción (0 = todos los núcleos)")
+    
+    # Procesamiento en streaming de documentos grandes
+    streaming_enabled: bool = Field(STREAMING_ENABLED, description="Procesar documentos grandes en streaming")
+    streaming_threshold_mb: float = Field(STREAMING_THRESHOLD_MB, description="Tamaño en MB a partir del cual se procesa en streaming")
+    streaming_max_doc_size_mb: float = Field(STREAMING_MAX_DOC_SIZE_MB, description="Tamaño máximo en MB de documentos con streaming habilitado")
+    streaming_pages_per_batch: int = Field(STREAMING_PAGES_PER_BATCH, description="Páginas de PDF extraídas por llamada al pool")
+    streaming_embed_batch_size: int = Field(STREAMING_EMBED_BATCH_SIZE, description="Chunks por lote de embeddings y almacenamiento en streaming")
+    
+    # Deduplicación por contenido de documentos y chunks
+    dedup_enabled: bool = Field(DEDUP_ENABLED, description="Deduplicar documentos y chunks por hash de contenido")
+    dedup_index_ttl: int = Field(DEDUP_INDEX_TTL, description="TTL en segundos del índice de archivos ya subidos por colección")
+    
+    # Reingesta incremental de documentos actualizados
+    incremental_reingestion_enabled: bool = Field(INCREMENTAL_REINGESTION_ENABLED, description="Embeber y escribir solo los chunks que cambian al reprocesar un documento")
+    
+    # Agrupación adaptativa de peticiones de embeddings
+    embedding_batcher_enabled: bool = Field(EMBEDDING_BATCHER_ENABLED, description="Agrupar peticiones de embeddings de documentos concurrentes")
+    embedding_batch_max_size: int = Field(EMBEDDING_BATCH_MAX_SIZE, description="Número máximo de textos por petición de embeddings")
+    embedding_batch_max_tokens: int = Field(EMBEDDING_BATCH_MAX_TOKENS, description="Presupuesto de tokens por petición de embeddings")
+    embedding_batch_max_wait_ms: float = Field(EMBEDDING_BATCH_MAX_WAIT_MS, description="Espera máxima en ms antes de enviar un lote incompleto")
+    embedding_batch_concurrency: int = Field(EMBEDDING_BATCH_CONCURRENCY, description="Número máximo de lotes de embeddings en vuelo")
+    embedding_model_max_tokens: Dict[str, int] = Field(
+        default_factory=lambda: dict(EMBEDDING_MODEL_MAX_TOKENS),
+        description="Tokens máximos por texto para cada modelo de embeddings"
+    )
+    
+    # Transporte binario de embeddings
+    embedding_wire_format: str = Field(EMBEDDING_WIRE_FORMAT, description="Formato binario pedido al servicio de embeddings (float32, float16 o vacío para JSON)")
+    
+    # Escritura masiva en document_chunks
+    vector_bulk_write_enabled: bool = Field(VECTOR_BULK_WRITE_ENABLED, description="Escribir chunks con upsert por lotes en document_chunks")
+    vector_write_batch_size: int = Field(VECTOR_WRITE_BATCH_SIZE, description="Chunks por sentencia de escritura vectorial")
+    vector_db_pool_min_size: int = Field(VECTOR_DB_POOL_MIN_SIZE, description="Conexiones mínimas del pool de Postgres")
+    vector_db_pool_max_size: int = Field(VECTOR_DB_POOL_MAX_SIZE, description="Conexiones máximas del pool de Postgres")
+    supabase_connection_string: Optional[str] = Field(None, description="Cadena de conexión Postgres de Supabase para escritura vectorial")
+    
+    # Configuración de la cola fiable de trabajos
+    queue_visibility_timeout: int = Field(QUEUE_VISIBILITY_TIMEOUT, description="Timeout de visibilidad de los trabajos entregados (segundos)")
+    queue_block_timeout: int = Field(QUEUE_BLOCK_TIMEOUT, description="Espera bloqueante máxima al extraer un trabajo (segundos)")
+    queue_recovery_interval: int = Field(QUEUE_RECOVERY_INTERVAL, description="Frecuencia del recuperador de trabajos abandonados (segundos)")
+    queue_max_deliveries: int = Field(QUEUE_MAX_DELIVERIES, description="Entregas máximas de un trabajo antes de descartarlo")
+    queue_job_lease_timeout: int = Field(QUEUE_JOB_LEASE_TIMEOUT, description="Plazo de un trabajo entregado antes de reentregarlo aunque su consumidor siga vivo (segundos)")
+    
+    # Planificación justa de trabajos entre tenants
+    fair_scheduling_enabled: bool = Field(FAIR_SCHEDULING_ENABLED, description="Habilitar la planificación justa de trabajos entre tenants")
+    queue_dispatch_window: int = Field(QUEUE_DISPATCH_WINDOW, description="Trabajos planificados como máximo en la cola compartida")
+    queue_dispatch_interval_ms: int = Field(QUEUE_DISPATCH_INTERVAL_MS, description="Espera máxima del planificador entre rondas (milisegundos)")
+    queue_priority_max_size_kb: int = Field(QUEUE_PRIORITY_MAX_SIZE_KB, description="Tamaño máximo (KB) de las subidas del carril prioritario")
+    queue_priority_share: float = Field(QUEUE_PRIORITY_SHARE, description="Fracción de los huecos de cada ronda reservada al carril prioritario")
+    tenant_queue_weights: Dict[str, float] = Field(
+        default_factory=lambda: dict(TENANT_QUEUE_WEIGHTS),
+        description="Peso de planificación por tier"
+    )
+    
+    # Escritura diferida de estados de trabajos y documentos
+    status_write_behind_enabled: bool = Field(STATUS_WRITE_BEHIND_ENABLED, description="Habilitar la escritura diferida de estados")
+    status_flush_interval_ms: int = Field(STATUS_FLUSH_INTERVAL_MS, description="Intervalo de volcado de estados no finales (milisegundos)")
+    status_flush_max_batch: int = Field(STATUS_FLUSH_MAX_BATCH, description="Filas máximas por sentencia de actualización de estados")
+    status_write_max_attempts: int = Field(STATUS_WRITE_MAX_ATTEMPTS, description="Volcados fallidos tras los que se descarta una actualización de estado")
+    
     # Otras configuraciones específicas del servicio de ingestión
     # que podrían añadirse en el futuro
 
@@ -30,6 +30,10 @@ from common.swagger import configure_swagger_ui
 from routes import register_routes
 from services.queue import initialize_queue, shutdown_queue
 from services.worker import start_worker_pool, stop_worker_pool
+from services.extraction_engine import init_extraction_engine, shutdown_extraction_engine
+from services.embedding_batcher import shutdown_embedding_batcher
+from services.vector_writer import close_vector_pool
+from services.status_writer import shutdown_status_writer
 
 # Configuración
 settings = get_settings()
@@ -76,6 +80,9 @@ async def lifespan(app: FastAPI):
                 error_context = {"service": settings.service_name}
                 logger.error(f"Error cargando configuraciones: {config_err}", extra=error_context)
         
+        # Arrancar el pool de procesos de extracción antes que los workers
+        await init_extraction_engine()
+        
         # Iniciar workers para procesamiento en segundo plano
         await start_worker_pool(settings.max_workers)
         
@@ -89,6 +96,18 @@ async def lifespan(app: FastAPI):
         # Detener workers
         await stop_worker_pool()
         
+        # Detener el pool de procesos de extracción
+        shutdown_extraction_engine()
+        
+        # Enviar los lotes de embeddings pendientes
+        await shutdown_embedding_batcher()
+        
+        # Escribir los estados pendientes antes de cerrar el pool de Postgres
+        await shutdown_status_writer()
+        
+        # Cerrar el pool de conexiones de escritura vectorial
+        await close_vector_pool()
+        
         # Limpieza de recursos
         await shutdown_queue()
         logger.info(f"Servicio {settings.service_name} detenido correctamente")
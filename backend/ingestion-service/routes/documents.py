@@ -17,6 +17,9 @@ from common.auth import verify_tenant
 from common.db.supabase import get_supabase_client
 from common.db.tables import get_table_name
 
+from services.deduplication import release_document_hash
+from services.storage import mark_collection_updated
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
@@ -297,6 +300,12 @@ async def delete_document(
             .eq("document_id", document_id) \
             .eq("tenant_id", tenant_id) \
             .execute()
+        
+        # Liberar el hash del contenido para permitir volver a subirlo
+        await release_document_hash(tenant_id, document_id)
+        
+        # Las respuestas cacheadas de la colección pueden citar el documento
+        await mark_collection_updated(tenant_id, collection_id)
             
         return DeleteDocumentResponse(
             success=True,
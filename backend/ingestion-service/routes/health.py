@@ -30,6 +30,11 @@ from common.db.tables import get_table_name
 
 # Importar configuración centralizada del servicio
 from config.settings import get_settings, get_health_status
+from services.worker import get_pipeline_stats
+from services.embedding_batcher import get_embedding_batcher
+from services.job_queue import get_job_queue
+from services.queue import get_job_scheduler
+from services.status_writer import get_status_writer
 from config.constants import (
     MAX_WORKERS,
     SUPPORTED_MIMETYPES,
@@ -41,7 +46,6 @@ from config.constants import (
     METRICS_CONFIG,
     TIMEOUTS,
     # Importar constantes para la cola de trabajos
-    JOBS_QUEUE_KEY,
     MAX_QUEUE_SIZE,
     WORKER_CONCURRENCY
 )
@@ -290,18 +294,14 @@ async def check_jobs_queue() -> str:
             logger.warning("No se pudo obtener cliente Redis para la cola de trabajos")
             return "unavailable"
         
-        # Verificar acceso a la cola usando directamente las constantes
-        queue_key = JOBS_QUEUE_KEY
-        processing_key = f"{queue_key}:processing"
-        failed_key = f"{queue_key}:failed"
-        
         # Intentar ping y acceso a la cola
         await redis_client.ping()
         
-        # Verificar varios aspectos de la cola
-        pending_jobs = await redis_client.llen(queue_key)
-        processing_jobs = await redis_client.hlen(processing_key)
-        failed_jobs = await redis_client.llen(failed_key)
+        # Verificar varios aspectos de la cola (pendientes, en procesamiento por consumidor y fallidos)
+        depths = await get_job_queue().get_depths()
+        pending_jobs = depths["pending"]
+        processing_jobs = depths["processing"]
+        failed_jobs = depths["failed"]
         
         # Registrar backlog actual para métricas
         record_queue_backlog(pending_jobs)
@@ -476,13 +476,18 @@ async def get_queue_metrics() -> Dict[str, Any]:
             return metrics
         
         # Obtener información actual
-        queue_key = settings.jobs_queue_key
-        processing_key = f"{queue_key}:processing"
-        failed_key = f"{queue_key}:failed"
-        
-        metrics["current_backlog"] = await redis_client.llen(queue_key)
-        metrics["processing_jobs"] = await redis_client.hlen(processing_key)
-        metrics["failed_jobs"] = await redis_client.llen(failed_key)
+        depths = await get_job_queue().get_depths()
+        metrics["current_backlog"] = depths["pending"]
+        metrics["processing_jobs"] = depths["processing"]
+        metrics["failed_jobs"] = depths["failed"]
+        metrics["active_consumers"] = depths["consumers"]
+        metrics["delivery"] = get_job_queue().get_stats()
+        metrics["waiting_jobs"] = depths["waiting"]
+        metrics["waiting_tenants"] = depths["tenants"]
+        if settings.fair_scheduling_enabled:
+            metrics["scheduler"] = get_job_scheduler().get_stats()
+        if settings.status_write_behind_enabled:
+            metrics["status_writes"] = get_status_writer().get_stats()
         
         # Calcular backlog promedio
         global queue_backlog_history
@@ -506,6 +511,15 @@ async def get_queue_metrics() -> Dict[str, Any]:
             previous = queue_backlog_history[0]
             metrics["backlog_trend"] = "increasing" if current > previous else "decreasing" if current < previous else "stable"
         
+        # Añadir métricas por etapa del pipeline si está activo
+        pipeline_stats = get_pipeline_stats()
+        if pipeline_stats:
+            metrics["pipeline"] = pipeline_stats
+        
+        # Métricas del agrupador de peticiones de embeddings
+        if settings.embedding_batcher_enabled:
+            metrics["embedding_batcher"] = get_embedding_batcher().get_stats()
+        
         return metrics
     except Exception as e:
         logger.warning(f"Error obteniendo métricas de cola: {str(e)}")
@@ -3,6 +3,7 @@ Endpoints para la ingesta de documentos.
 """
 
 import logging
+import os
 import uuid
 import time
 from typing import List, Optional
@@ -33,6 +34,7 @@ from config.constants import (
 
 from services.queue import queue_document_processing_job
 from services.chunking import validate_file
+from services.deduplication import claim_document_hash, register_document_hash, release_document_hash
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -80,6 +82,7 @@ async def upload_document(
         "collection_id": collection_id,
         "file_name": file.filename
     }
+    spool_path = None
     
     try:
         # 0. Verificar límites del tier
@@ -118,25 +121,47 @@ async def upload_document(
                 }
             )
         
-        # 1. Validar archivo
+        # 1. Validar archivo (queda copiado en un temporal, sin cargarlo en memoria)
         file_info = await validate_file(file, ctx=ctx)
-        
-        # Procesar tags si están presentes
-        tag_list = tags.split(",") if tags else []
+        spool_path = file_info["path"]
         
         # Generar document_id único
         document_id = str(uuid.uuid4())
         
-        # 2. Subir a Supabase Storage
+        # Un archivo idéntico ya subido a la colección no se vuelve a procesar
+        # (la reserva del hash es atómica frente a subidas simultáneas)
+        duplicate = await claim_document_hash(
+            tenant_id, collection_id, file_info["hash"], document_id, file_info["filename"]
+        )
+        if duplicate:
+            logger.info(
+                f"Archivo duplicado en la colección, reutilizando documento {duplicate['document_id']}",
+                extra=error_context
+            )
+            return FileUploadResponse(
+                success=True,
+                message="El documento ya existe en la colección",
+                document_id=duplicate["document_id"],
+                collection_id=collection_id,
+                file_name=file.filename,
+                job_id=duplicate.get("job_id"),
+                status="duplicate"
+            )
+        
+        # Procesar tags si están presentes
+        tag_list = tags.split(",") if tags else []
+        
+        # 2. Subir a Supabase Storage desde el temporal (una ruta se envía por bloques)
         try:
             file_key = await upload_to_storage(
                 tenant_id=tenant_id,
                 collection_id=collection_id,
-                file_content=await file.read(),
+                file_content=spool_path,
                 file_name=file.filename
             )
         except Exception as storage_err:
             logger.error(f"Error al subir a Storage: {str(storage_err)}", extra=error_context)
+            await release_document_hash(tenant_id, document_id)
             raise DocumentProcessingError(
                 message="Error al almacenar el archivo",
                 details=error_context
@@ -146,13 +171,28 @@ async def upload_document(
         try:
             job_id = await queue_document_processing_job(
                 tenant_id=tenant_id,
+                tier=tenant_info.tier,
                 document_id=document_id,
                 collection_id=collection_id,
                 file_key=file_key,
-                file_info={"type": file_info.mimetype, "size": file_info.file_size, "name": file_info.filename}
+                file_info={
+                    "type": file_info["content_type"],
+                    "size": file_info["size"],
+                    "name": file_info["filename"],
+                    "hash": file_info["hash"]
+                }
+            )
+            await register_document_hash(
+                tenant_id=tenant_id,
+                collection_id=collection_id,
+                file_hash=file_info["hash"],
+                document_id=document_id,
+                job_id=job_id,
+                file_name=file_info["filename"]
             )
         except Exception as queue_err:
             logger.error(f"Error al encolar trabajo: {str(queue_err)}", extra=error_context)
+            await release_document_hash(tenant_id, document_id)
             raise DocumentProcessingError(
                 message="Error al encolar el procesamiento",
                 details={**error_context, "document_id": document_id}
@@ -187,6 +227,9 @@ async def upload_document(
             message=f"Error al cargar documento: {str(e)}",
             details=error_context
         )
+    finally:
+        if spool_path and os.path.exists(spool_path):
+            os.unlink(spool_path)
 
 @router.post(
     "/ingest-url",
@@ -252,6 +295,7 @@ async def ingest_url(
         # Encolamos el trabajo de procesamiento
         job_id = await queue_document_processing_job(
             tenant_id=tenant_id,
+            tier=tenant_info.tier,
             document_id=document_id,
             collection_id=request.collection_id,
             url=request.url,
@@ -348,6 +392,7 @@ async def ingest_text(
         # Encolamos el trabajo de procesamiento
         job_id = await queue_document_processing_job(
             tenant_id=tenant_id,
+            tier=tenant_info.tier,
             document_id=document_id,
             collection_id=request.collection_id,
             text_content=request.text,
@@ -373,6 +418,98 @@ async def ingest_text(
             details={"text_length": len(request.text)}
         )
 
+class TextUpdateRequest(BaseModel):
+    text: str
+
+@router.put(
+    "/documents/{document_id}/text",
+    response_model=None,
+    response_model_exclude_none=True,
+    summary="Actualizar texto de un documento",
+    description="Reprocesa un documento con nuevo texto reescribiendo solo los chunks modificados"
+)
+@with_context(tenant=True)
+@handle_errors(error_type="simple", log_traceback=False)
+async def update_document_text(
+    document_id: str,
+    request: TextUpdateRequest,
+    tenant_info: TenantInfo = Depends(verify_tenant),
+    ctx: Context = None
+):
+    """
+    Encola la reingesta de un documento existente con un texto actualizado.
+    
+    El trabajo conserva el document_id, por lo que el almacenamiento compara
+    los chunks con la versión anterior y solo embebe y escribe los que cambian.
+    
+    Args:
+        document_id: ID del documento a actualizar
+        request: Nuevo texto del documento
+        tenant_info: Información del tenant
+        
+    Returns:
+        FileUploadResponse: Resultado de la operación
+    """
+    tenant_id = tenant_info.tenant_id
+    
+    if not request.text.strip():
+        raise ValidationError(
+            message="El texto no puede estar vacío",
+            details={"text_length": 0}
+        )
+    
+    try:
+        supabase = get_supabase_client()
+        result = await supabase.table(get_table_name("documents")) \
+            .select("document_id, collection_id, file_name") \
+            .eq("document_id", document_id) \
+            .eq("tenant_id", tenant_id) \
+            .single() \
+            .execute()
+        
+        if not result.data:
+            raise ValidationError(
+                message=f"Documento con ID {document_id} no encontrado",
+                details={"document_id": document_id}
+            )
+        
+        document = result.data
+        
+        await supabase.table(get_table_name("documents")) \
+            .update({"status": "pending"}) \
+            .eq("document_id", document_id) \
+            .eq("tenant_id", tenant_id) \
+            .execute()
+        
+        job_id = await queue_document_processing_job(
+            tenant_id=tenant_id,
+            tier=tenant_info.tier,
+            document_id=document_id,
+            collection_id=document["collection_id"],
+            text_content=request.text,
+            file_info={"type": "text", "size": len(request.text)},
+            metadata={"update": True}
+        )
+        
+        return FileUploadResponse(
+            success=True,
+            message="Actualización del documento encolada para procesamiento",
+            document_id=document_id,
+            collection_id=document["collection_id"],
+            file_name=document.get("file_name"),
+            job_id=job_id,
+            status="pending"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error al actualizar texto del documento {document_id}: {str(e)}")
+        if isinstance(e, (DocumentProcessingError, ValidationError)):
+            raise
+        raise DocumentProcessingError(
+            message=f"Error al actualizar documento: {str(e)}",
+            details={"document_id": document_id}
+        )
+
 class BatchUrlsRequest(BaseModel):
     urls: List[str]
     collection_id: str
@@ -452,6 +589,7 @@ async def batch_process_urls(
             # Encolar trabajo de procesamiento
             job_id = await queue_document_processing_job(
                 tenant_id=tenant_id,
+                tier=tenant_info.tier,
                 document_id=document_id,
                 collection_id=request.collection_id,
                 url=url,
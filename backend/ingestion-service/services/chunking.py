@@ -9,6 +9,7 @@ Este módulo unifica todas las operaciones de procesamiento documental:
 Implementa patrones de caché optimizados para reducir procesamiento redundante.
 """
 
+import asyncio
 import logging
 import os
 import tempfile
@@ -16,24 +17,11 @@ import mimetypes
 import hashlib
 import time
 import tiktoken
-from typing import List, Dict, Any, Optional, Union, BinaryIO, Tuple
+from typing import List, Dict, Any, Optional, Union, BinaryIO, Tuple, AsyncIterator
 from pathlib import Path
 
 from fastapi import UploadFile
 
-# Herramientas de LlamaIndex para procesamiento documental
-from llama_index.core import (
-    Document, VectorStoreIndex, Settings, 
-    ServiceContext, StorageContext, SimpleDirectoryReader
-)
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.readers.file import (
-    PDFReader, DocxReader, CSVReader, 
-    PandasExcelReader, MarkdownReader, ImageReader
-)
-# BeautifulSoup para procesamiento HTML personalizado
-from bs4 import BeautifulSoup
-
 # Componentes internos del sistema
 from common.errors import ServiceError, ErrorCode, DocumentProcessingError, ValidationError, handle_errors
 from common.config.tiers import get_tier_limits
@@ -47,6 +35,10 @@ from common.cache import (
     standardize_llama_metadata
 )
 
+# Motor de extracción y chunking en procesos separados
+from services.extraction_engine import LLAMA_READER_MIMETYPES, get_extraction_engine
+from services.deduplication import compute_chunk_hash
+
 # Importar configuración centralizada del servicio
 from config.settings import get_settings
 from config.constants import (
@@ -62,51 +54,10 @@ from config.constants import (
 
 logger = logging.getLogger(__name__)
 
-# Implementación personalizada de HTMLReader
-class CustomHTMLReader:
-    """Lector personalizado para contenido HTML usando BeautifulSoup."""
-    
-    def load_data(self, file_path=None, html_str=None):
-        """Carga y procesa contenido HTML ya sea desde un archivo o desde una cadena."""
-        if file_path is None and html_str is None:
-            raise ValueError("Debe proporcionar file_path o html_str")
-        
-        content = ""
-        if file_path:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        else:
-            content = html_str
-        
-        # Procesar con BeautifulSoup
-        soup = BeautifulSoup(content, 'html.parser')
-        
-        # Eliminar scripts, estilos y otros elementos no deseados
-        for element in soup(["script", "style", "header", "footer", "nav"]):
-            element.decompose()
-        
-        # Extraer texto limpio
-        text = soup.get_text(separator=" ", strip=True)
-        
-        # Crear documento
-        return [Document(text=text)]
-
-# Mapa de tipos MIME a lectores de LlamaIndex
-LLAMA_READERS = {
-    'application/pdf': PDFReader(),
-    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': DocxReader(),
-    'text/csv': CSVReader(),
-    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': PandasExcelReader(),
-    'application/vnd.ms-excel': PandasExcelReader(),
-    'text/markdown': MarkdownReader(),
-    'text/html': CustomHTMLReader(),
-    'text/plain': SimpleDirectoryReader,
-    'image/jpeg': ImageReader(),
-    'image/png': ImageReader(),
-    'image/gif': ImageReader(),
-}
-
 # Extensiones para detectar tipos MIME
+# Tamaño de bloque para leer archivos subidos durante la validación
+VALIDATION_READ_BLOCK_SIZE = 1024 * 1024
+
 MIME_EXTENSIONS = {
     '.md': 'text/markdown',
     '.txt': 'text/plain',
@@ -225,6 +176,101 @@ async def split_document_intelligently(
             details={"document_id": document_id}
         )
 
+def _resolve_chunking_params(
+    metadata: Dict[str, Any],
+    chunk_size: Optional[int],
+    chunk_overlap: Optional[int],
+    ctx: Context = None
+) -> Tuple[Optional[str], str, int, int]:
+    """
+    Determina tenant, tier y parámetros de chunking según los límites del tier.
+    
+    Returns:
+        Tuple[Optional[str], str, int, int]: tenant_id, tier, chunk_size y chunk_overlap
+    """
+    # Obtener tenant_id del metadata o contexto
+    tenant_id = metadata.get("tenant_id")
+    if not tenant_id and ctx and hasattr(ctx, "tenant_id"):
+        tenant_id = ctx.tenant_id
+    
+    # Obtener tier para determinar los parámetros de chunking
+    tier = "free"  # Valor por defecto
+    if ctx and hasattr(ctx, 'tenant_info') and ctx.tenant_info:
+        tier = ctx.tenant_info.tier
+    
+    # Obtener límites del tier
+    tier_limits = get_tier_limits(tier, tenant_id=tenant_id)
+    
+    # Usar valores proporcionados o predeterminados según tier
+    chunk_size = chunk_size or tier_limits.get("default_chunk_size", 1024)
+    chunk_overlap = chunk_overlap or tier_limits.get("default_chunk_overlap", 200)
+    
+    return tenant_id, tier, chunk_size, chunk_overlap
+
+def _build_chunk(
+    node_text: str,
+    node_metadata_raw: Dict[str, Any],
+    index: int,
+    document_id: str,
+    tenant_id: Optional[str],
+    collection_id: Optional[str],
+    ctx: Context = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Convierte un nodo de LlamaIndex al formato unificado de chunk.
+    
+    Returns:
+        Optional[Dict[str, Any]]: Chunk con id, texto y metadatos, o None si está vacío
+    """
+    node_text = node_text.strip()
+    if not node_text:
+        return None
+        
+    # Generar chunk_id consistente (formato estandarizado: document_id_índice)
+    chunk_id = f"{document_id}_{index}"
+    
+    # CRÍTICO: Estandarizar metadatos para garantizar consistencia en caché y tracking
+    # Esta estandarización asegura campos obligatorios como tenant_id y document_id
+    # y mantiene el formato consistente en todos los servicios (embedding, query, etc.)
+    try:
+        node_metadata = standardize_llama_metadata(
+            metadata=node_metadata_raw,
+            tenant_id=tenant_id,  # Campo crítico para multitenancy
+            document_id=document_id,  # Obligatorio para chunks, permite trazabilidad
+            chunk_id=chunk_id,  # Identificador único para este fragmento
+            collection_id=collection_id,  # Necesario para caché jerárquica
+            ctx=ctx  # Contexto para valores por defecto si faltan campos
+        )
+    except ValueError as ve:
+        # Errores específicos de metadatos (campos faltantes o formato incorrecto)
+        logger.error(f"Error en estandarización de metadatos: {str(ve)}",
+                   extra={"document_id": document_id, "chunk_id": chunk_id})
+        # Reintentar con metadatos básicos para evitar fallo total
+        node_metadata = standardize_llama_metadata(
+            metadata={},  # Metadatos mínimos
+            tenant_id=tenant_id,
+            document_id=document_id,
+            chunk_id=chunk_id
+        )
+    except Exception as e:
+        # Otros errores inesperados
+        logger.error(f"Error inesperado en estandarización: {str(e)}",
+                   extra={"document_id": document_id})
+        raise DocumentProcessingError(f"Error en metadatos: {str(e)}")
+        
+    # Añadir campos adicionales específicos que no maneja la función estándar
+    # Estos campos son específicos de la ingestion y no forman parte del estándar común
+    node_metadata["chunk_index"] = index
+    # Hash del contenido para deduplicar embeddings entre documentos y versiones
+    node_metadata["content_hash"] = compute_chunk_hash(node_text)
+    
+    # Añadir el chunk con metadatos estandarizados
+    return {
+        "id": node_metadata["chunk_id"],
+        "text": node_text,
+        "metadata": node_metadata
+    }
+
 @with_context(tenant=True)
 @handle_errors(error_type="service", log_traceback=True)
 async def split_text_with_llama_index(
@@ -249,26 +295,9 @@ async def split_text_with_llama_index(
     Returns:
         List[Dict[str, Any]]: Lista de chunks con texto y metadata
     """
-    # Obtener tenant_id del metadata o contexto
-    tenant_id = metadata.get("tenant_id")
-    if not tenant_id and ctx and hasattr(ctx, "tenant_id"):
-        tenant_id = ctx.tenant_id
-    
-    # Obtener tier para determinar los parámetros de chunking
-    tier = "free"  # Valor por defecto
-    if ctx and hasattr(ctx, 'tenant_info') and ctx.tenant_info:
-        tier = ctx.tenant_info.tier
-    
-    # Obtener límites del tier
-    tier_limits = get_tier_limits(tier, tenant_id=tenant_id)
-    
-    # Determinar tamaño y solapamiento de chunks según tier
-    default_chunk_size = tier_limits.get("default_chunk_size", 1024)
-    default_chunk_overlap = tier_limits.get("default_chunk_overlap", 200)
-    
-    # Usar valores proporcionados o predeterminados
-    chunk_size = chunk_size or default_chunk_size
-    chunk_overlap = chunk_overlap or default_chunk_overlap
+    tenant_id, tier, chunk_size, chunk_overlap = _resolve_chunking_params(
+        metadata, chunk_size, chunk_overlap, ctx
+    )
     
     try:
         # Normalizar el texto para evitar problemas
@@ -277,17 +306,6 @@ async def split_text_with_llama_index(
             logger.warning(f"Texto vacío para documento {document_id}")
             return []
         
-        # Crear un nodo Document para LlamaIndex
-        document = Document(text=text, metadata=metadata)
-        
-        # Usar SentenceSplitter para chunks de tamaño adecuado
-        splitter = SentenceSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            paragraph_separator="\n\n",  # Respeta párrafos
-            secondary_chunking_regex="[^,.;:\n]+[,.;:\n]",  # Divide por frases
-        )
-        
         # Calcular tokens para tracking antes del chunking (solo si se usara LLM, pero podemos trackear el texto de entrada)
         # Esto permitirá entender el costo de procesamiento y chunking del documento
         text_tokens = await estimate_prompt_tokens(text)
@@ -315,69 +333,27 @@ async def split_text_with_llama_index(
             }
         )
         
-        # Dividir documento
-        nodes = splitter.get_nodes_from_documents([document])
-        
-        # Primero, estandarizar los metadatos base del documento
-        # Importamos del módulo completo para facilitar futuras refactorizaciones
-        from common.cache import standardize_llama_metadata
-        
-        # Obtener tenant_id de los metadatos o contexto
-        tenant_id = metadata.get("tenant_id")
-        if not tenant_id and ctx and hasattr(ctx, "tenant_id"):
-            tenant_id = ctx.tenant_id
+        # Dividir documento con SentenceSplitter en el motor de extracción
+        # para no bloquear el event loop con el trabajo CPU-bound
+        nodes = await get_extraction_engine().split_text(
+            text=text,
+            metadata=metadata,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
         
-        collection_id = metadata.get("collection_id")
-            
         # Convertir nodos a formato unificado
         chunks = []
-        for i, node in enumerate(nodes):
-            node_text = node.text.strip()
-            if not node_text:
-                continue
-                
-            # Generar chunk_id consistente (formato estandarizado: document_id_índice)
-            chunk_id = f"{document_id}_{i}"
-            
-            # CRÍTICO: Estandarizar metadatos para garantizar consistencia en caché y tracking
-            # Esta estandarización asegura campos obligatorios como tenant_id y document_id
-            # y mantiene el formato consistente en todos los servicios (embedding, query, etc.)
-            try:
-                node_metadata = standardize_llama_metadata(
-                    metadata=dict(node.metadata),
-                    tenant_id=tenant_id,  # Campo crítico para multitenancy
-                    document_id=document_id,  # Obligatorio para chunks, permite trazabilidad
-                    chunk_id=chunk_id,  # Identificador único para este fragmento
-                    collection_id=collection_id,  # Necesario para caché jerárquica
-                    ctx=ctx  # Contexto para valores por defecto si faltan campos
-                )
-            except ValueError as ve:
-                # Errores específicos de metadatos (campos faltantes o formato incorrecto)
-                logger.error(f"Error en estandarización de metadatos: {str(ve)}",
-                           extra={"document_id": document_id, "chunk_id": chunk_id})
-                # Reintentar con metadatos básicos para evitar fallo total
-                node_metadata = standardize_llama_metadata(
-                    metadata={},  # Metadatos mínimos
-                    tenant_id=tenant_id,
-                    document_id=document_id,
-                    chunk_id=chunk_id
-                )
-            except Exception as e:
-                # Otros errores inesperados
-                logger.error(f"Error inesperado en estandarización: {str(e)}",
-                           extra={"document_id": document_id})
-                raise DocumentProcessingError(f"Error en metadatos: {str(e)}")
-                
-            # Añadir campos adicionales específicos que no maneja la función estándar
-            # Estos campos son específicos de la ingestion y no forman parte del estándar común
-            node_metadata["chunk_index"] = i
-            
-            # Añadir el chunk con metadatos estandarizados
-            chunks.append({
-                "id": node_metadata["chunk_id"],
-                "text": node_text,
-                "metadata": node_metadata
-            })
+        for i, (node_text, node_metadata_raw) in enumerate(nodes):
+            chunk = _build_chunk(
+                node_text, node_metadata_raw, i,
+                document_id=document_id,
+                tenant_id=tenant_id,
+                collection_id=collection_id,
+                ctx=ctx
+            )
+            if chunk:
+                chunks.append(chunk)
         
         logger.info(f"Documento {document_id} dividido en {len(chunks)} chunks")
         
@@ -413,12 +389,17 @@ async def validate_file(
     """
     Valida un archivo subido para determinar si puede ser procesado.
     
+    El archivo se copia por bloques a un temporal mientras se calculan su
+    tamaño y su hash, sin cargarlo completo en memoria. El llamador es
+    responsable de eliminar el temporal (file_info["path"]).
+    
     Args:
         file: Archivo subido mediante FastAPI
         ctx: Contexto de la operación
         
     Returns:
-        Dict[str, Any]: Información del archivo validado incluyendo mimetype, tamaño, etc.
+        Dict[str, Any]: Información del archivo validado incluyendo mimetype,
+        tamaño, hash y ruta de la copia temporal
         
     Raises:
         ValidationError: Si el archivo no es válido por alguna razón
@@ -442,7 +423,7 @@ async def validate_file(
         content_type = MIME_EXTENSIONS.get(file_ext, "application/octet-stream")
     
     # Verificar si el tipo de archivo es soportado
-    if content_type not in LLAMA_READERS and file_ext not in MIME_EXTENSIONS:
+    if content_type not in LLAMA_READER_MIMETYPES and file_ext not in MIME_EXTENSIONS:
         raise ValidationError(
             f"Tipo de archivo no soportado: {content_type}",
             details={
@@ -452,24 +433,33 @@ async def validate_file(
             }
         )
     
-    # Leer y verificar el tamaño del archivo
+    # Los documentos grandes se procesan en streaming, por lo que el límite
+    # de tamaño es mayor cuando el streaming está habilitado
+    settings = get_settings()
+    max_size_mb = settings.streaming_max_doc_size_mb if settings.streaming_enabled else MAX_DOC_SIZE_MB
+    max_size = int(max_size_mb * 1024 * 1024)
+    
+    # Copiar por bloques a un temporal calculando tamaño y hash
+    spool = tempfile.NamedTemporaryFile(prefix="upload_", suffix=file_ext, delete=False)
     try:
-        file_content = await file.read()
-        file_size = len(file_content)
-        
-        # Rebobinar el archivo para uso futuro
-        await file.seek(0)
-        
-        # Verificar tamaño máximo (10MB por defecto)
-        max_size = 10 * 1024 * 1024  # 10MB
-        if file_size > max_size:
-            raise ValidationError(
-                f"El archivo excede el tamaño máximo permitido de {max_size/1024/1024:.1f}MB",
-                details={"size": file_size, "max_size": max_size}
-            )
+        file_size = 0
+        hasher = hashlib.md5()
+        with spool:
+            while True:
+                block = await file.read(VALIDATION_READ_BLOCK_SIZE)
+                if not block:
+                    break
+                file_size += len(block)
+                if file_size > max_size:
+                    raise ValidationError(
+                        f"El archivo excede el tamaño máximo permitido de {max_size/1024/1024:.1f}MB",
+                        details={"size": file_size, "max_size": max_size}
+                    )
+                hasher.update(block)
+                await asyncio.to_thread(spool.write, block)
         
-        # Calcular hash para identificación única
-        file_hash = hashlib.md5(file_content).hexdigest()
+        # Hash para identificación única
+        file_hash = hasher.hexdigest()
         
         # Devolver información del archivo validado
         return {
@@ -477,10 +467,12 @@ async def validate_file(
             "content_type": content_type,
             "size": file_size,
             "hash": file_hash,
-            "extension": file_ext
+            "extension": file_ext,
+            "path": spool.name
         }
         
     except Exception as e:
+        os.unlink(spool.name)
         if isinstance(e, ValidationError):
             raise
         
@@ -518,33 +510,23 @@ async def extract_text_from_file(
     if mimetype == "application/octet-stream" and file_ext in MIME_EXTENSIONS:
         mimetype = MIME_EXTENSIONS[file_ext]
     
-    # Obtener el lector adecuado
-    reader = LLAMA_READERS.get(mimetype)
-    if not reader:
+    # Verificar que existe un lector adecuado
+    if mimetype not in LLAMA_READER_MIMETYPES:
         raise DocumentProcessingError(f"No hay un lector disponible para {mimetype}")
     
     try:
-        # Extraer documentos
-        documents = []
-        
-        # SimpleDirectoryReader requiere un tratamiento especial
-        if mimetype == "text/plain":
-            # Leer el contenido directamente para archivos de texto
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                text = f.read()
-                documents = [Document(text=text, metadata=metadata or {})]
-        else:
-            # Usar el lector específico
-            documents = reader.load_data(file_path)
+        # Los lectores de LlamaIndex se ejecutan en el pool de procesos
+        full_text = await get_extraction_engine().extract_text(
+            file_path=file_path,
+            mimetype=mimetype,
+            metadata=metadata
+        )
         
         # Verificar resultados
-        if not documents:
+        if not full_text:
             logger.warning(f"No se extrajeron documentos del archivo {file_path}")
             return ""
         
-        # Concatenar texto de todos los documentos
-        full_text = "\n\n".join(doc.text for doc in documents if doc.text)
-        
         logger.info(f"Texto extraído correctamente de {os.path.basename(file_path)}: {len(full_text)} caracteres")
         return full_text
         
@@ -555,6 +537,157 @@ async def extract_text_from_file(
             details={"file": file_path, "mimetype": mimetype, "error": str(e)}
         )
 
+async def stream_file_sections(
+    file_path: str,
+    mimetype: str,
+    metadata: Dict[str, Any] = None
+) -> AsyncIterator[str]:
+    """
+    Extrae el texto de un archivo sección a sección (páginas en PDF).
+    
+    A diferencia de extract_text_from_file nunca materializa el texto completo,
+    lo que permite procesar documentos grandes con memoria acotada.
+    
+    Args:
+        file_path: Ruta al archivo en el sistema
+        mimetype: Tipo MIME del archivo
+        metadata: Metadatos adicionales
+        
+    Yields:
+        str: Texto de cada sección del archivo
+    """
+    if not os.path.exists(file_path):
+        raise DocumentProcessingError(f"Archivo no encontrado: {file_path}")
+    
+    # Verificar extensión si el mimetype no es claro
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if mimetype == "application/octet-stream" and file_ext in MIME_EXTENSIONS:
+        mimetype = MIME_EXTENSIONS[file_ext]
+    
+    if mimetype not in LLAMA_READER_MIMETYPES:
+        raise DocumentProcessingError(f"No hay un lector disponible para {mimetype}")
+    
+    async for section in get_extraction_engine().iter_sections(
+        file_path=file_path,
+        mimetype=mimetype,
+        metadata=metadata,
+        pages_per_batch=get_settings().streaming_pages_per_batch
+    ):
+        yield section
+
+async def stream_chunks_with_llama_index(
+    sections: AsyncIterator[str],
+    document_id: str,
+    metadata: Dict[str, Any],
+    chunk_size: int = None,
+    chunk_overlap: int = None,
+    ctx: Context = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Divide en chunks un flujo de secciones de texto a medida que llegan.
+    
+    El último nodo de cada sección puede quedar cortado en la frontera, por lo
+    que se arrastra y se vuelve a dividir junto con la sección siguiente. Así
+    los chunks y su solapamiento son equivalentes a los de split_text_with_llama_index
+    sin mantener el documento completo en memoria.
+    
+    Args:
+        sections: Iterador asíncrono de secciones de texto
+        document_id: ID del documento
+        metadata: Metadatos a incluir en cada chunk
+        chunk_size: Tamaño de cada chunk
+        chunk_overlap: Solapamiento entre chunks
+        ctx: Contexto de la operación
+        
+    Yields:
+        List[Dict[str, Any]]: Chunks generados a partir de cada sección
+    """
+    tenant_id, tier, chunk_size, chunk_overlap = _resolve_chunking_params(
+        metadata, chunk_size, chunk_overlap, ctx
+    )
+    collection_id = metadata.get("collection_id")
+    engine = get_extraction_engine()
+    
+    carry = ""
+    index = 0
+    text_length = 0
+    text_tokens = 0
+    
+    def build_batch(nodes: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        nonlocal index
+        batch = []
+        for node_text, node_metadata_raw in nodes:
+            chunk = _build_chunk(
+                node_text, node_metadata_raw, index,
+                document_id=document_id,
+                tenant_id=tenant_id,
+                collection_id=collection_id,
+                ctx=ctx
+            )
+            index += 1
+            if chunk:
+                batch.append(chunk)
+        return batch
+    
+    async for section in sections:
+        section = section.strip()
+        if not section:
+            continue
+        
+        text_length += len(section)
+        text_tokens += await estimate_prompt_tokens(section)
+        
+        buffer = f"{carry}\n\n{section}" if carry else section
+        nodes = await engine.split_text(
+            text=buffer,
+            metadata=metadata,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        
+        if len(nodes) < 2:
+            # Aún no hay un chunk completo, seguir acumulando
+            carry = buffer
+            continue
+        
+        carry = nodes[-1][0]
+        batch = build_batch(nodes[:-1])
+        if batch:
+            yield batch
+    
+    if carry.strip():
+        nodes = await engine.split_text(
+            text=carry,
+            metadata=metadata,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        batch = build_batch(nodes)
+        if batch:
+            yield batch
+    
+    logger.info(f"Documento {document_id} dividido en streaming en {index} chunks ({text_length} caracteres)")
+    
+    # Registrar el uso de tokens una sola vez para todo el documento
+    await track_token_usage(
+        tenant_id=tenant_id,
+        tokens=text_tokens,
+        model="text-chunking-processor",
+        token_type=TOKEN_TYPE_LLM,
+        operation=OPERATION_GENERATION,
+        collection_id=collection_id,
+        idempotency_key=f"chunk:{tenant_id}:{document_id}:stream:{int(time.time())}",
+        metadata={
+            "document_id": document_id,
+            "operation": "chunking",
+            "streaming": True,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "text_length": text_length,
+            "tier": tier
+        }
+    )
+
 @with_context(tenant=True)
 @handle_errors(error_type="service", log_traceback=True)
 async def process_file_from_storage(
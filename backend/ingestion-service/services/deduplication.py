@@ -0,0 +1,292 @@
+"""
+Índice de contenido por tenant y colección para evitar reprocesar duplicados.
+
+- Hash del archivo subido -> documento que ya lo contiene, en Redis, para que
+  una segunda subida idéntica no vuelva a extraerse, dividirse ni embeberse.
+  La entrada se reserva con SET NX al comprobarla: de dos subidas simultáneas
+  del mismo archivo solo una la obtiene y la otra se trata como duplicada.
+- Hash normalizado de cada chunk -> vector ya almacenado en la colección,
+  resuelto en document_chunks por metadata->>'content_hash', para que solo se
+  soliciten al servicio de embeddings los textos que no se han visto antes.
+
+Ambos índices son una optimización: un fallo solo implica volver a procesar
+el contenido, por lo que los errores se registran y no se propagan.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+from common.cache.manager import get_redis_client
+
+from config.settings import get_settings
+from services.storage import get_collection_embeddings_by_hash
+
+logger = logging.getLogger(__name__)
+
+# Prefijos de las claves del índice de documentos en Redis
+DOCUMENT_HASH_KEY_PREFIX = "ingestion:document_hash"
+DOCUMENT_HASH_REF_KEY_PREFIX = "ingestion:document_hash_ref"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_chunk_text(text: str) -> str:
+    """
+    Normaliza el texto de un chunk para que variaciones irrelevantes
+    (espacios, saltos de línea, formas Unicode) produzcan el mismo hash.
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def compute_chunk_hash(text: str) -> str:
+    """
+    Calcula el hash estable del contenido de un chunk.
+
+    Args:
+        text: Texto del chunk
+
+    Returns:
+        str: Hash hexadecimal del texto normalizado
+    """
+    return hashlib.md5(normalize_chunk_text(text).encode("utf-8")).hexdigest()
+
+
+def get_chunk_hash(chunk: Dict[str, Any]) -> str:
+    """Obtiene el hash de un chunk, calculándolo si no viene en sus metadatos."""
+    metadata = chunk.get("metadata") or {}
+    return metadata.get("content_hash") or compute_chunk_hash(chunk["text"])
+
+
+def _document_hash_key(tenant_id: str, collection_id: str, file_hash: str) -> str:
+    return f"{DOCUMENT_HASH_KEY_PREFIX}:{tenant_id}:{collection_id}:{file_hash}"
+
+
+def _document_ref_key(tenant_id: str, document_id: str) -> str:
+    return f"{DOCUMENT_HASH_REF_KEY_PREFIX}:{tenant_id}:{document_id}"
+
+
+async def claim_document_hash(
+    tenant_id: str,
+    collection_id: str,
+    file_hash: str,
+    document_id: str,
+    file_name: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Reserva el hash de un archivo para un documento nuevo de la colección.
+
+    La reserva es atómica (SET NX): si otra subida del mismo contenido ya la
+    tiene, se devuelve su documento en lugar de procesar el archivo otra vez.
+
+    Args:
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        file_hash: Hash del archivo calculado por validate_file
+        document_id: ID del documento que se va a crear
+        file_name: Nombre original del archivo
+
+    Returns:
+        Optional[Dict[str, Any]]: Datos del documento existente, o None si la
+        reserva es de este documento (o la deduplicación no está disponible)
+    """
+    settings = get_settings()
+    if not settings.dedup_enabled or not file_hash:
+        return None
+
+    key = _document_hash_key(tenant_id, collection_id, file_hash)
+    entry = {
+        "document_id": document_id,
+        "job_id": None,
+        "file_name": file_name,
+        "created_at": int(time.time())
+    }
+
+    try:
+        redis = await get_redis_client()
+        if not redis:
+            return None
+
+        if await redis.set(key, json.dumps(entry), nx=True, ex=settings.dedup_index_ttl):
+            # Referencia inversa para poder liberar el hash al eliminar el documento
+            await redis.set(
+                _document_ref_key(tenant_id, document_id),
+                json.dumps({"collection_id": collection_id, "file_hash": file_hash}),
+                ex=settings.dedup_index_ttl
+            )
+            return None
+
+        existing = await redis.get(key)
+        # La reserva pudo liberarse entre SET NX y GET: se procesa el archivo
+        return json.loads(existing) if existing else None
+    except Exception as e:
+        logger.warning(f"Error reservando hash del documento {document_id}: {str(e)}")
+        return None
+
+
+async def register_document_hash(
+    tenant_id: str,
+    collection_id: str,
+    file_hash: str,
+    document_id: str,
+    job_id: Optional[str] = None,
+    file_name: Optional[str] = None
+) -> None:
+    """
+    Completa la reserva del hash de un documento recién encolado con su trabajo.
+
+    Args:
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        file_hash: Hash del archivo
+        document_id: ID del documento creado
+        job_id: ID del trabajo de procesamiento
+        file_name: Nombre original del archivo
+    """
+    settings = get_settings()
+    if not settings.dedup_enabled or not file_hash:
+        return
+
+    try:
+        redis = await get_redis_client()
+        if not redis:
+            return
+
+        # Solo se actualiza una reserva existente (XX): si se liberó, no se recrea
+        await redis.set(
+            _document_hash_key(tenant_id, collection_id, file_hash),
+            json.dumps({
+                "document_id": document_id,
+                "job_id": job_id,
+                "file_name": file_name,
+                "created_at": int(time.time())
+            }),
+            xx=True,
+            ex=settings.dedup_index_ttl
+        )
+    except Exception as e:
+        logger.warning(f"Error registrando hash del documento {document_id}: {str(e)}")
+
+
+async def release_document_hash(tenant_id: str, document_id: str) -> None:
+    """
+    Elimina un documento del índice de duplicados.
+
+    Se usa cuando el documento se elimina o su procesamiento falla, para que
+    una nueva subida del mismo archivo vuelva a procesarse. La entrada del hash
+    solo se borra si sigue siendo de este documento.
+
+    Args:
+        tenant_id: ID del tenant
+        document_id: ID del documento
+    """
+    try:
+        redis = await get_redis_client()
+        if not redis:
+            return
+
+        ref_key = _document_ref_key(tenant_id, document_id)
+        ref = await redis.get(ref_key)
+        if not ref:
+            return
+
+        ref = json.loads(ref)
+        key = _document_hash_key(tenant_id, ref["collection_id"], ref["file_hash"])
+        entry = await redis.get(key)
+        if entry and json.loads(entry).get("document_id") == document_id:
+            await redis.delete(key)
+        await redis.delete(ref_key)
+    except Exception as e:
+        logger.warning(f"Error liberando hash del documento {document_id}: {str(e)}")
+
+
+async def lookup_chunk_embeddings(
+    chunks: List[Dict[str, Any]],
+    tenant_id: str,
+    collection_id: Optional[str],
+    model: str
+) -> Dict[str, List[float]]:
+    """
+    Recupera los vectores ya almacenados en la colección para los chunks de una lista.
+
+    Args:
+        chunks: Chunks con texto y metadatos
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        model: Modelo de embeddings (los vectores no son intercambiables entre modelos)
+
+    Returns:
+        Dict[str, List[float]]: Embedding por hash de chunk para los encontrados
+    """
+    if not get_settings().dedup_enabled or not chunks or not collection_id:
+        return {}
+
+    hashes = sorted({get_chunk_hash(chunk) for chunk in chunks})
+    return await get_collection_embeddings_by_hash(tenant_id, collection_id, hashes, model)
+
+
+def build_chunk_manifest(chunks: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Construye el manifiesto (chunk_id -> hash de contenido) de una lista de chunks.
+
+    Args:
+        chunks: Chunks con id, texto y metadatos
+
+    Returns:
+        Dict[str, str]: Hash de contenido por chunk_id
+    """
+    return {chunk["id"]: get_chunk_hash(chunk) for chunk in chunks}
+
+
+def _chunk_position(chunk_id: str, default: int) -> int:
+    """Posición de un chunk a partir de su id (document_id_índice)."""
+    suffix = chunk_id.rsplit("_", 1)[-1]
+    return int(suffix) if suffix.isdigit() else default
+
+
+def diff_chunks(
+    previous: Dict[str, str],
+    chunks: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], Dict[str, str], List[str]]:
+    """
+    Compara una nueva versión de los chunks de un documento con la almacenada.
+
+    Los chunks se emparejan por hash de contenido y no por id: los ids son
+    posicionales, así que un párrafo insertado al principio desplaza todos los
+    chunks siguientes sin cambiar su contenido. Si varios chunks almacenados
+    tienen el mismo hash se prefiere el del mismo id y después el más cercano.
+
+    Args:
+        previous: Manifiesto de los chunks almacenados
+        chunks: Chunks de la nueva versión
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Dict[str, str], List[str]]: Chunks con
+        contenido nuevo (requieren embedding), chunks desplazados (id nuevo ->
+        id almacenado con el mismo contenido, cuyo vector se reutiliza) e IDs
+        de los chunks almacenados que ya no existen
+    """
+    ids_by_hash: Dict[str, List[str]] = {}
+    positions: Dict[str, int] = {}
+    for position, (chunk_id, chunk_hash) in enumerate(previous.items()):
+        ids_by_hash.setdefault(chunk_hash, []).append(chunk_id)
+        positions[chunk_id] = _chunk_position(chunk_id, position)
+
+    changed: List[Dict[str, Any]] = []
+    moved: Dict[str, str] = {}
+    for position, chunk in enumerate(chunks):
+        candidates = ids_by_hash.get(get_chunk_hash(chunk))
+        if not candidates:
+            changed.append(chunk)
+        elif chunk["id"] not in candidates:
+            target = _chunk_position(chunk["id"], position)
+            moved[chunk["id"]] = min(candidates, key=lambda chunk_id: abs(positions[chunk_id] - target))
+
+    current_ids = {chunk["id"] for chunk in chunks}
+    removed = [chunk_id for chunk_id in previous if chunk_id not in current_ids]
+    return changed, moved, removed
@@ -7,11 +7,12 @@ Este módulo centraliza todas las operaciones relacionadas con:
 - Integración con el patrón cache-aside optimizado
 """
 
+import asyncio
 import logging
 import time
 import hashlib
 import json
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import List, Dict, Any, Optional, Tuple, Union, AsyncIterator
 
 from common.errors import (
     ServiceError, EmbeddingGenerationError,
@@ -22,6 +23,24 @@ from common.utils.http import call_service
 from common.cache import invalidate_document_update
 from common.tracking import track_token_usage, TOKEN_TYPE_EMBEDDING, OPERATION_EMBEDDING
 
+from services.embedding_batcher import get_embedding_batcher
+from services.wire_format import embedding_format_headers, decode_embeddings
+from services.vector_writer import bulk_upsert_chunks
+from services.deduplication import (
+    get_chunk_hash,
+    lookup_chunk_embeddings,
+    build_chunk_manifest,
+    diff_chunks
+)
+from services.storage import (
+    get_document_chunk_manifest,
+    get_document_chunk_embeddings,
+    save_document_chunk_manifest,
+    delete_document_chunks,
+    invalidate_chunk_cache,
+    mark_collection_updated
+)
+
 # Importar configuración centralizada del servicio
 from config.settings import get_settings
 from config.constants import (
@@ -48,6 +67,10 @@ async def generate_embeddings_for_chunks(
     """
     Genera embeddings para una lista de fragmentos.
     
+    Los fragmentos cuyo contenido ya tiene un vector almacenado en la
+    colección lo reutilizan, y los textos repetidos dentro de la lista se
+    solicitan una sola vez al servicio de embeddings.
+    
     Args:
         chunks: Lista de fragmentos con texto y metadatos
         tenant_id: ID del tenant
@@ -65,6 +88,61 @@ async def generate_embeddings_for_chunks(
     if not chunks:
         return []
     
+    index_model = model or DEFAULT_EMBEDDING_MODEL
+    known = await lookup_chunk_embeddings(chunks, tenant_id, collection_id, index_model)
+    
+    # Un fragmento por cada contenido sin embedding conocido
+    pending: Dict[str, Dict[str, Any]] = {}
+    for chunk in chunks:
+        chunk_hash = get_chunk_hash(chunk)
+        if chunk_hash not in known and chunk_hash not in pending:
+            pending[chunk_hash] = chunk
+    
+    if pending:
+        generated = await _request_embeddings(
+            chunks=list(pending.values()),
+            tenant_id=tenant_id,
+            model=model,
+            collection_id=collection_id,
+            ctx=ctx
+        )
+        known.update(
+            (chunk_hash, chunk["embedding"])
+            for chunk_hash, chunk in zip(pending, generated)
+        )
+    
+    reused = len(chunks) - len(pending)
+    if reused:
+        logger.info(f"Reutilizados embeddings de {reused} de {len(chunks)} fragmentos por contenido duplicado")
+    
+    result = []
+    for chunk in chunks:
+        chunk_with_embedding = chunk.copy()
+        chunk_with_embedding["embedding"] = known[get_chunk_hash(chunk)]
+        result.append(chunk_with_embedding)
+    
+    return result
+
+async def _request_embeddings(
+    chunks: List[Dict[str, Any]],
+    tenant_id: str,
+    model: Optional[str] = None,
+    collection_id: Optional[str] = None,
+    ctx: Context = None
+) -> List[Dict[str, Any]]:
+    """
+    Solicita al servicio de embeddings los vectores de una lista de fragmentos.
+    
+    Args:
+        chunks: Lista de fragmentos con texto y metadatos
+        tenant_id: ID del tenant
+        model: Modelo de embedding a utilizar
+        collection_id: ID de la colección para caché
+        ctx: Contexto de la operación
+        
+    Returns:
+        List[Dict[str, Any]]: Lista de fragmentos con embeddings
+    """
     try:
         # Preparar textos y chunk_ids para el batch
         texts = [chunk["text"] for chunk in chunks]
@@ -81,12 +159,23 @@ async def generate_embeddings_for_chunks(
                 chunks[i]["id"] = chunk_id
             chunk_id_list.append(chunk_id)
         
+        # Agrupar con los textos de otros documentos en curso
+        if get_settings().embedding_batcher_enabled:
+            embeddings = await get_embedding_batcher().embed(
+                texts=texts,
+                tenant_id=tenant_id,
+                model=model,
+                collection_id=collection_id,
+                chunk_ids=chunk_id_list
+            )
+            return [dict(chunk, embedding=embedding) for chunk, embedding in zip(chunks, embeddings)]
+        
         # Llamar directamente al servicio de embeddings centralizado
         start_time = time.time()
         response = await call_service(
             url=f"{get_settings().embedding_service_url}/internal/embed",
             method="POST",
-            headers={"x-tenant-id": tenant_id},
+            headers={"x-tenant-id": tenant_id, **embedding_format_headers()},
             json={
                 "texts": texts,
                 "model": model,
@@ -96,14 +185,14 @@ async def generate_embeddings_for_chunks(
             ctx=ctx
         )
         
-        if not response.get("embeddings"):
+        # Extraer embeddings (JSON o formato binario) y metadatos
+        embeddings = decode_embeddings(response)
+        if not embeddings:
             raise EmbeddingGenerationError(
                 message="El servicio de embeddings no devolvió datos válidos",
                 details={"response": response}
             )
         
-        # Extraer embeddings y metadatos
-        embeddings = response.get("embeddings", [])
         metadata = response.get("metadata", {})
         
         # Registrar uso de tokens si está disponible
@@ -200,6 +289,9 @@ async def process_and_store_chunks(
 # Cualquier uso de esta función debe reemplazarse por una llamada directa a
 # call_service con el endpoint /internal/embed del servicio de embedding.
 
+# Vector stores ya creados por tenant, colección y dimensión
+_vector_stores: Dict[Tuple[str, str, int], Any] = {}
+
 # Implementación para crear vector stores en Supabase
 async def create_supabase_vector_store(
     tenant_id: str,
@@ -221,6 +313,11 @@ async def create_supabase_vector_store(
     """
     from llama_index_vector_stores_supabase import SupabaseVectorStore
     
+    # Reutilizar la instancia (y su conexión) de la colección si ya existe
+    cache_key = (tenant_id, collection_id, embedding_dimension)
+    if cache_key in _vector_stores:
+        return _vector_stores[cache_key]
+    
     try:
         # Construir el nombre de la tabla de vectores
         table_name = f"vectors_{tenant_id}_{collection_id}"
@@ -228,12 +325,13 @@ async def create_supabase_vector_store(
         
         # Crear instancia de SupabaseVectorStore
         vector_store = SupabaseVectorStore(
-            postgres_connection_string=settings.supabase_connection_string,
+            postgres_connection_string=get_settings().supabase_connection_string,
             collection_name=table_name,
             dimension=embedding_dimension,
             engine="vecs"  # Asegurarse de usar el motor vecs
         )
         
+        _vector_stores[cache_key] = vector_store
         return vector_store
     
     except Exception as e:
@@ -256,6 +354,7 @@ async def store_chunks_in_vector_store(
     collection_id: str,
     document_id: str,
     embedding_model: str = None,
+    invalidate_cache: bool = True,
     ctx: Context = None
 ) -> Dict[str, Any]:
     """
@@ -267,12 +366,14 @@ async def store_chunks_in_vector_store(
         collection_id: ID de la colección
         document_id: ID del documento
         embedding_model: Modelo de embeddings a utilizar
+        invalidate_cache: Si se invalida la caché del documento al terminar
         ctx: Contexto de la operación
         
     Returns:
         Dict[str, Any]: Estadísticas del procesamiento
     """
     start_time = time.time()
+    embedding_model = embedding_model or DEFAULT_EMBEDDING_MODEL
     
     # Validaciones básicas
     if not chunks:
@@ -284,83 +385,105 @@ async def store_chunks_in_vector_store(
         }
     
     try:
-        # Generar embeddings si no los tienen
+        # Generar embeddings solo para los chunks que no los tienen
         chunks_with_embeddings = chunks
-        if any("embedding" not in chunk for chunk in chunks):
-            logger.info("Generando embeddings para chunks sin ellos")
-            chunks_with_embeddings = await generate_embeddings_for_chunks(
-                chunks=chunks,
+        missing = [chunk for chunk in chunks if "embedding" not in chunk]
+        if missing:
+            logger.info(f"Generando embeddings para {len(missing)} chunks sin ellos")
+            generated = iter(await generate_embeddings_for_chunks(
+                chunks=missing,
                 tenant_id=tenant_id,
                 model=embedding_model,
                 collection_id=collection_id,
                 ctx=ctx
-            )
+            ))
+            chunks_with_embeddings = [
+                next(generated) if "embedding" not in chunk else chunk
+                for chunk in chunks
+            ]
         
-        # Crear documentos para LlamaIndex
-        llama_docs = []
+        # Normalizar metadatos de cada chunk
+        embedding_timestamp = int(time.time())
+        records = []
         for chunk in chunks_with_embeddings:
-            # Extraer texto y embedding
             text = chunk["text"]
-            embedding = chunk.get("embedding")
             
-            # Crear metadata normalizada
             metadata = chunk.get("metadata", {}).copy()
             metadata.update({
                 "document_id": document_id,
                 "chunk_id": chunk.get("id", hashlib.md5(text.encode()).hexdigest()[:10]),
                 "tenant_id": tenant_id,
                 "collection_id": collection_id,
-                "embedding_model": embedding_model or settings.default_embedding_model,  # Registrar modelo utilizado
-                "embedding_timestamp": int(time.time())  # Registrar cuándo se creó el embedding
+                "embedding_model": embedding_model,  # Registrar modelo utilizado
+                "embedding_timestamp": embedding_timestamp  # Registrar cuándo se creó el embedding
             })
+            records.append({
+                "id": metadata["chunk_id"],
+                "text": text,
+                "embedding": chunk.get("embedding"),
+                "metadata": metadata
+            })
+        
+        if get_settings().vector_bulk_write_enabled:
+            # Upsert por lotes en document_chunks sobre el pool compartido
+            await bulk_upsert_chunks(
+                chunks=records,
+                tenant_id=tenant_id,
+                collection_id=collection_id,
+                document_id=document_id
+            )
+        else:
+            # Crear documentos para LlamaIndex
+            llama_docs = [
+                Document(
+                    text=record["text"],
+                    metadata=record["metadata"],
+                    embedding=record["embedding"],
+                    id_=record["id"],  # Usar el chunk_id para consistencia
+                    embedding_model=embedding_model  # Incluir explicitamente el modelo usado
+                )
+                for record in records
+            ]
             
-            # Crear documento de LlamaIndex
-            llama_doc = Document(
-                text=text,
-                metadata=metadata,
-                embedding=embedding,
-                id_=metadata["chunk_id"],  # Usar el chunk_id para consistencia
-                embedding_model=embedding_model or settings.default_embedding_model  # Incluir explicitamente el modelo usado
+            # Crear o acceder al vector store
+            embedding_dim = len(records[0].get("embedding") or []) or DEFAULT_EMBEDDING_DIMENSION
+            vector_store = await create_supabase_vector_store(
+                tenant_id=tenant_id,
+                collection_id=collection_id,
+                embedding_dimension=embedding_dim,
+                ctx=ctx
             )
-            llama_docs.append(llama_doc)
-        
-        # Crear o acceder al vector store
-        embedding_dim = len(chunks_with_embeddings[0].get("embedding", [])) if chunks_with_embeddings else 1536
-        vector_store = await create_supabase_vector_store(
-            tenant_id=tenant_id,
-            collection_id=collection_id,
-            embedding_dimension=embedding_dim,
-            ctx=ctx
-        )
-        
-        # Almacenar en Supabase
-        from llama_index.core import VectorStoreIndex, StorageContext
-        
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        index = VectorStoreIndex(llama_docs, storage_context=storage_context)
+            
+            # Almacenar en Supabase
+            from llama_index.core import VectorStoreIndex, StorageContext
+            
+            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+            VectorStoreIndex(llama_docs, storage_context=storage_context)
         
         # Invalidación estratégica de caché utilizando las funciones centralizadas
         # Esta invalidación asegura que cualquier consulta que dependa de este documento
         # obtenga resultados actualizados tras esta modificación
-        await invalidate_document_update(
-            tenant_id=tenant_id,
-            collection_id=collection_id,
-            document_id=document_id,
-            metadata={
-                "updated_chunks": len(llama_docs),
-                "timestamp": int(time.time())
-            },
-            ctx=ctx
-        )
+        if invalidate_cache:
+            await invalidate_document_update(
+                tenant_id=tenant_id,
+                collection_id=collection_id,
+                document_id=document_id,
+                metadata={
+                    "updated_chunks": len(records),
+                    "timestamp": int(time.time())
+                },
+                ctx=ctx
+            )
+            await mark_collection_updated(tenant_id, collection_id)
         
         execution_time = time.time() - start_time
         result = {
-            "chunks_stored": len(llama_docs),
+            "chunks_stored": len(records),
             "execution_time": execution_time,
             "document_id": document_id
         }
         
-        logger.info(f"Almacenados {len(llama_docs)} chunks en {execution_time:.2f}s")
+        logger.info(f"Almacenados {len(records)} chunks en {execution_time:.2f}s")
         return result
         
     except Exception as e:
@@ -377,4 +500,308 @@ async def store_chunks_in_vector_store(
                 "document_id": document_id,
                 "chunks_count": len(chunks)
             }
-        )
\ No newline at end of file
+        )
+
+async def store_chunk_stream(
+    chunk_batches: AsyncIterator[List[Dict[str, Any]]],
+    tenant_id: str,
+    collection_id: str,
+    document_id: str,
+    embedding_model: str = None,
+    batch_size: int = None,
+    ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Genera embeddings y almacena chunks a medida que los produce el chunking.
+    
+    Los chunks se agrupan en lotes de tamaño fijo que un consumidor embebe y
+    almacena mientras se sigue extrayendo el documento. La cola entre ambos
+    está acotada, de modo que la extracción no se adelanta más de unos pocos
+    lotes y la memoria queda acotada. La caché del documento se invalida una
+    sola vez al final.
+    
+    Args:
+        chunk_batches: Iterador asíncrono de listas de chunks
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        document_id: ID del documento
+        embedding_model: Modelo de embeddings a utilizar
+        batch_size: Chunks por lote de embeddings y almacenamiento
+        ctx: Contexto de la operación
+        
+    Returns:
+        Dict[str, Any]: Estadísticas del procesamiento
+    """
+    start_time = time.time()
+    batch_size = batch_size or get_settings().streaming_embed_batch_size
+    stats = {"chunks_stored": 0, "chunks_unchanged": 0, "chunks_moved": 0, "batches": 0}
+    previous = await _get_previous_manifest(document_id, tenant_id, collection_id, ctx)
+    manifest: Dict[str, str] = {}
+    written_ids: List[str] = []
+    state = {"error": None}
+    pending: asyncio.Queue = asyncio.Queue(maxsize=2)
+    done = object()
+    
+    async def consume():
+        while True:
+            batch = await pending.get()
+            if batch is done:
+                break
+            # Tras un error se descartan los lotes restantes para no bloquear al productor
+            if state["error"]:
+                continue
+            try:
+                manifest.update(build_chunk_manifest(batch))
+                changed, moved, _ = diff_chunks(previous, batch)
+                stats["chunks_unchanged"] += len(batch) - len(changed) - len(moved)
+                stats["chunks_moved"] += len(moved)
+                if not changed and not moved:
+                    continue
+                
+                to_store = changed + await _attach_stored_embeddings(
+                    batch, moved, tenant_id, collection_id, document_id
+                )
+                written_ids.extend(chunk["id"] for chunk in to_store)
+                result = await store_chunks_in_vector_store(
+                    chunks=to_store,
+                    tenant_id=tenant_id,
+                    collection_id=collection_id,
+                    document_id=document_id,
+                    embedding_model=embedding_model,
+                    invalidate_cache=False,
+                    ctx=ctx
+                )
+                stats["chunks_stored"] += result.get("chunks_stored", 0)
+                stats["batches"] += 1
+            except Exception as e:
+                state["error"] = e
+        
+        if state["error"]:
+            raise state["error"]
+    
+    consumer = asyncio.create_task(consume())
+    try:
+        buffer: List[Dict[str, Any]] = []
+        async for chunks in chunk_batches:
+            if state["error"]:
+                break
+            buffer.extend(chunks)
+            while len(buffer) >= batch_size:
+                await pending.put(buffer[:batch_size])
+                buffer = buffer[batch_size:]
+        
+        if buffer and not state["error"]:
+            await pending.put(buffer)
+        await pending.put(done)
+        await consumer
+    except BaseException:
+        consumer.cancel()
+        raise
+    
+    stats.update(await _apply_manifest(
+        previous=previous,
+        manifest=manifest,
+        updated_ids=written_ids,
+        tenant_id=tenant_id,
+        collection_id=collection_id,
+        document_id=document_id,
+        ctx=ctx
+    ))
+    stats["chunks_total"] = len(manifest)
+    stats["execution_time"] = time.time() - start_time
+    stats["document_id"] = document_id
+    
+    logger.info(
+        f"Almacenados en streaming {stats['chunks_stored']} chunks en {stats['batches']} lotes "
+        f"({stats['chunks_unchanged']} sin cambios, {stats['chunks_moved']} desplazados) "
+        f"en {stats['execution_time']:.2f}s"
+    )
+    return stats
+
+async def _attach_stored_embeddings(
+    chunks: List[Dict[str, Any]],
+    moved: Dict[str, str],
+    tenant_id: str,
+    collection_id: str,
+    document_id: str
+) -> List[Dict[str, Any]]:
+    """
+    Devuelve los chunks desplazados con el vector que ya tenía su contenido.
+    
+    Los que no encuentran su vector almacenado se devuelven sin él y se
+    embeben al almacenarlos.
+    """
+    if not moved:
+        return []
+    
+    stored = await get_document_chunk_embeddings(
+        document_id, tenant_id, collection_id, sorted(set(moved.values()))
+    )
+    result = []
+    for chunk in chunks:
+        if chunk["id"] not in moved:
+            continue
+        chunk = chunk.copy()
+        embedding = stored.get(get_chunk_hash(chunk))
+        if embedding:
+            chunk["embedding"] = embedding
+        result.append(chunk)
+    return result
+
+async def _get_previous_manifest(
+    document_id: str,
+    tenant_id: str,
+    collection_id: str,
+    ctx: Context = None
+) -> Dict[str, str]:
+    """Manifiesto de la versión almacenada si la reingesta incremental está habilitada."""
+    if not get_settings().incremental_reingestion_enabled:
+        return {}
+    
+    try:
+        return await get_document_chunk_manifest(document_id, tenant_id, collection_id, ctx=ctx)
+    except Exception as e:
+        # Sin manifiesto se almacena el documento completo
+        logger.warning(f"Error obteniendo manifiesto de chunks del documento {document_id}: {str(e)}")
+        return {}
+
+async def _apply_manifest(
+    previous: Dict[str, str],
+    manifest: Dict[str, str],
+    updated_ids: List[str],
+    tenant_id: str,
+    collection_id: str,
+    document_id: str,
+    ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Elimina los chunks que ya no existen, invalida solo los chunks reescritos
+    y la versión de la colección, y guarda el manifiesto de la nueva versión
+    del documento.
+    
+    Returns:
+        Dict[str, Any]: Número de chunks eliminados
+    """
+    removed_ids = [chunk_id for chunk_id in previous if chunk_id not in manifest]
+    
+    deleted = 0
+    if removed_ids:
+        deleted = await delete_document_chunks(
+            document_id=document_id,
+            tenant_id=tenant_id,
+            collection_id=collection_id,
+            chunk_ids=removed_ids,
+            ctx=ctx
+        )
+    
+    if updated_ids or removed_ids:
+        # Los chunks eliminados ya se invalidaron al borrarlos
+        if previous:
+            await invalidate_chunk_cache(tenant_id, updated_ids)
+        
+        # Las consultas sobre la colección pueden devolver contenido distinto:
+        # el cambio de versión invalida sus resultados en caché
+        await mark_collection_updated(tenant_id, collection_id)
+    else:
+        logger.info(f"Documento {document_id} sin cambios en sus chunks, no se invalida la caché")
+    
+    await save_document_chunk_manifest(document_id, tenant_id, manifest)
+    return {"chunks_deleted": deleted}
+
+async def select_changed_chunks(
+    chunks: List[Dict[str, Any]],
+    tenant_id: str,
+    collection_id: str,
+    document_id: str,
+    ctx: Context = None
+) -> List[Dict[str, Any]]:
+    """
+    Devuelve los chunks nuevos o modificados respecto a la versión almacenada.
+    
+    Args:
+        chunks: Chunks de la nueva versión del documento
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        document_id: ID del documento
+        ctx: Contexto de la operación
+        
+    Returns:
+        List[Dict[str, Any]]: Chunks que requieren embedding y almacenamiento
+    """
+    previous = await _get_previous_manifest(document_id, tenant_id, collection_id, ctx)
+    changed, _, _ = diff_chunks(previous, chunks)
+    return changed
+
+@with_context(tenant=True, validate_tenant=True)
+@handle_errors(error_type="service", log_traceback=True)
+async def store_chunks_incremental(
+    chunks: List[Dict[str, Any]],
+    tenant_id: str,
+    collection_id: str,
+    document_id: str,
+    embedding_model: str = None,
+    ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Almacena una nueva versión de un documento escribiendo solo lo que cambió.
+    
+    Compara los hashes de contenido de los chunks con el manifiesto de la
+    versión almacenada: los chunks idénticos no se embeben ni se reescriben,
+    los desplazados se reescriben con el vector que ya tenía su contenido, los
+    eliminados se borran y solo se invalidan las entradas de caché afectadas.
+    Sin versión previa equivale a store_chunks_in_vector_store.
+    
+    Args:
+        chunks: Chunks de la nueva versión del documento
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        document_id: ID del documento
+        embedding_model: Modelo de embeddings a utilizar
+        ctx: Contexto de la operación
+        
+    Returns:
+        Dict[str, Any]: Estadísticas del procesamiento
+    """
+    start_time = time.time()
+    previous = await _get_previous_manifest(document_id, tenant_id, collection_id, ctx)
+    changed, moved, _ = diff_chunks(previous, chunks)
+    to_store = changed + await _attach_stored_embeddings(
+        chunks, moved, tenant_id, collection_id, document_id
+    )
+    
+    stats = {"chunks_stored": 0}
+    if to_store:
+        stats = await store_chunks_in_vector_store(
+            chunks=to_store,
+            tenant_id=tenant_id,
+            collection_id=collection_id,
+            document_id=document_id,
+            embedding_model=embedding_model,
+            invalidate_cache=False,
+            ctx=ctx
+        )
+    
+    stats.update(await _apply_manifest(
+        previous=previous,
+        manifest=build_chunk_manifest(chunks),
+        updated_ids=[chunk["id"] for chunk in to_store],
+        tenant_id=tenant_id,
+        collection_id=collection_id,
+        document_id=document_id,
+        ctx=ctx
+    ))
+    stats.update({
+        "chunks_total": len(chunks),
+        "chunks_unchanged": len(chunks) - len(to_store),
+        "chunks_moved": len(moved),
+        "incremental": bool(previous),
+        "execution_time": time.time() - start_time,
+        "document_id": document_id
+    })
+    
+    if previous:
+        logger.info(
+            f"Actualización incremental del documento {document_id}: {len(to_store)} chunks escritos "
+            f"({len(moved)} desplazados), {stats['chunks_unchanged']} sin cambios, {stats['chunks_deleted']} eliminados"
+        )
+    return stats
@@ -0,0 +1,299 @@
+"""
+Agrupador adaptativo de peticiones al servicio de embeddings.
+
+Los documentos que se procesan a la vez (workers del pipeline, lotes en
+streaming) piden embeddings de forma independiente. El agrupador reúne sus
+textos en lotes por tenant, colección y modelo que respetan el número máximo
+de textos por petición y un presupuesto de tokens, los envía en cuanto se
+llenan o vence un plazo corto, despacha varios lotes en paralelo y devuelve
+a cada llamador los vectores de sus propios textos.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import tiktoken
+
+from common.errors import EmbeddingGenerationError
+from common.utils.http import call_service
+from common.tracking import track_token_usage, TOKEN_TYPE_EMBEDDING, OPERATION_EMBEDDING
+
+from config.settings import get_settings
+from config.constants import DEFAULT_EMBEDDING_MODEL
+from services.wire_format import embedding_format_headers, decode_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Clave de agrupación: los lotes no mezclan tenants, colecciones ni modelos
+BatchKey = Tuple[str, Optional[str], str]
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """Codificador compartido para estimar tokens (cargarlo es costoso)."""
+    return tiktoken.get_encoding("cl100k_base")
+
+
+class _Entry:
+    """Texto pendiente de embedding y el futuro donde se entrega su vector."""
+
+    __slots__ = ("text", "tokens", "chunk_id", "future")
+
+    def __init__(self, text: str, tokens: int, chunk_id: Optional[str], future: asyncio.Future):
+        self.text = text
+        self.tokens = tokens
+        self.chunk_id = chunk_id
+        self.future = future
+
+
+class EmbeddingBatcher:
+    """
+    Agrupa textos de varios llamadores en peticiones al servicio de embeddings.
+
+    Un lote se envía cuando alcanza max_batch_size textos, cuando el siguiente
+    texto superaría max_batch_tokens o cuando vence max_wait_ms desde que
+    llegó su primer texto. Como mucho max_concurrency lotes están en vuelo.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        max_concurrency: Optional[int] = None
+    ):
+        settings = get_settings()
+        self.max_batch_size = max_batch_size or settings.embedding_batch_max_size
+        self.max_batch_tokens = max_batch_tokens or settings.embedding_batch_max_tokens
+        self.max_wait = (max_wait_ms or settings.embedding_batch_max_wait_ms) / 1000
+        self.model_max_tokens = settings.embedding_model_max_tokens
+
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.embedding_batch_concurrency)
+        self._pending: Dict[BatchKey, List[_Entry]] = {}
+        self._pending_tokens: Dict[BatchKey, int] = {}
+        self._timers: Dict[BatchKey, asyncio.TimerHandle] = {}
+        self._in_flight: Set[asyncio.Task] = set()
+        self._metrics = {
+            "batches": 0,
+            "texts": 0,
+            "tokens": 0,
+            "failed_batches": 0,
+            "truncated_texts": 0,
+            "flush_size": 0,
+            "flush_tokens": 0,
+            "flush_deadline": 0
+        }
+
+    async def embed(
+        self,
+        texts: List[str],
+        tenant_id: str,
+        model: Optional[str] = None,
+        collection_id: Optional[str] = None,
+        chunk_ids: Optional[List[str]] = None
+    ) -> List[List[float]]:
+        """
+        Obtiene los embeddings de una lista de textos a través de lotes compartidos.
+
+        Args:
+            texts: Textos a embeber
+            tenant_id: ID del tenant
+            model: Modelo de embedding (None = modelo predeterminado)
+            collection_id: ID de la colección
+            chunk_ids: IDs de los chunks, en el mismo orden que los textos
+
+        Returns:
+            List[List[float]]: Embeddings en el mismo orden que los textos
+        """
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        key: BatchKey = (tenant_id, collection_id, model or DEFAULT_EMBEDDING_MODEL)
+        chunk_ids = chunk_ids or [None] * len(texts)
+        futures = []
+
+        # Tokenizar cientos de chunks lleva milisegundos de CPU: fuera del bucle de eventos
+        fitted, truncated = await asyncio.to_thread(self._fit_texts, texts, key[2])
+        self._metrics["truncated_texts"] += truncated
+
+        for (text, tokens), chunk_id in zip(fitted, chunk_ids):
+            # Cerrar el lote actual si este texto excede el presupuesto de tokens
+            if self._pending.get(key) and self._pending_tokens[key] + tokens > self.max_batch_tokens:
+                self._flush(key, "flush_tokens")
+
+            future = loop.create_future()
+            self._pending.setdefault(key, []).append(_Entry(text, tokens, chunk_id, future))
+            self._pending_tokens[key] = self._pending_tokens.get(key, 0) + tokens
+            futures.append(future)
+
+            if len(self._pending[key]) >= self.max_batch_size:
+                self._flush(key, "flush_size")
+            elif key not in self._timers:
+                self._timers[key] = loop.call_later(self.max_wait, self._flush, key, "flush_deadline")
+
+        return list(await asyncio.gather(*futures))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene métricas del agrupador.
+
+        Returns:
+            Dict[str, Any]: Contadores de lotes, textos, motivos de envío y carga actual
+        """
+        batches = self._metrics["batches"]
+        return {
+            **self._metrics,
+            "avg_batch_size": round(self._metrics["texts"] / batches, 2) if batches else 0,
+            "pending_texts": sum(len(entries) for entries in self._pending.values()),
+            "in_flight_batches": len(self._in_flight)
+        }
+
+    async def close(self):
+        """Envía los lotes pendientes y espera a que terminen los que están en vuelo."""
+        for key in list(self._pending):
+            self._flush(key, "flush_deadline")
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _fit_texts(self, texts: List[str], model: str) -> Tuple[List[Tuple[str, int]], int]:
+        """
+        Cuenta los tokens de cada texto y recorta los que superan el máximo del modelo.
+
+        Se ejecuta en un hilo: tiktoken libera el GIL mientras codifica.
+
+        Returns:
+            Tuple[List[Tuple[str, int]], int]: Texto y tokens de cada entrada, y
+            número de textos recortados
+        """
+        encoder = _get_encoder()
+        max_tokens = self.model_max_tokens.get(model)
+        fitted = []
+        truncated = 0
+
+        for text, tokens in zip(texts, encoder.encode_batch(texts, disallowed_special=())):
+            if max_tokens and len(tokens) > max_tokens:
+                truncated += 1
+                logger.warning(f"Texto de {len(tokens)} tokens recortado a {max_tokens} para el modelo {model}")
+                tokens = tokens[:max_tokens]
+                text = encoder.decode(tokens)
+            fitted.append((text, len(tokens)))
+
+        return fitted, truncated
+
+    def _flush(self, key: BatchKey, reason: str):
+        """Saca el lote pendiente de una clave y lo despacha en segundo plano."""
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+
+        entries = self._pending.pop(key, None)
+        self._pending_tokens.pop(key, None)
+        if not entries:
+            return
+
+        self._metrics[reason] += 1
+        task = asyncio.ensure_future(self._dispatch(key, entries))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, key: BatchKey, entries: List[_Entry]):
+        """Envía un lote al servicio de embeddings y reparte los resultados."""
+        tenant_id, collection_id, model = key
+
+        async with self._semaphore:
+            start_time = time.time()
+            try:
+                embeddings = await self._request(tenant_id, collection_id, model, entries)
+
+                for entry, embedding in zip(entries, embeddings):
+                    if not entry.future.done():
+                        entry.future.set_result(embedding)
+
+                batch_tokens = sum(entry.tokens for entry in entries)
+                self._metrics["batches"] += 1
+                self._metrics["texts"] += len(entries)
+                self._metrics["tokens"] += batch_tokens
+
+                logger.debug(
+                    f"Lote de {len(entries)} textos ({batch_tokens} tokens) embebido "
+                    f"en {time.time() - start_time:.2f}s"
+                )
+            except Exception as e:
+                self._metrics["failed_batches"] += 1
+                logger.error(f"Error embebiendo lote de {len(entries)} textos: {str(e)}")
+                for entry in entries:
+                    if not entry.future.done():
+                        entry.future.set_exception(e)
+
+    async def _request(
+        self,
+        tenant_id: str,
+        collection_id: Optional[str],
+        model: str,
+        entries: List[_Entry]
+    ) -> List[List[float]]:
+        """Petición HTTP al servicio de embeddings y registro de tokens del lote."""
+        response = await call_service(
+            url=f"{get_settings().embedding_service_url}/internal/embed",
+            method="POST",
+            headers={"x-tenant-id": tenant_id, **embedding_format_headers()},
+            json={
+                "texts": [entry.text for entry in entries],
+                "model": model,
+                "collection_id": collection_id,
+                "chunk_id": [entry.chunk_id for entry in entries]
+            }
+        )
+
+        embeddings = decode_embeddings(response)
+        if len(embeddings) != len(entries):
+            raise EmbeddingGenerationError(
+                message=f"Discrepancia en el número de embeddings: {len(embeddings)} vs {len(entries)} textos",
+                details={"texts_count": len(entries), "embeddings_count": len(embeddings)}
+            )
+
+        metadata = response.get("metadata", {})
+        if "token_usage" in metadata:
+            await track_token_usage(
+                tenant_id=tenant_id,
+                tokens=metadata["token_usage"],
+                model=metadata.get("model", model),
+                collection_id=collection_id,
+                token_type=TOKEN_TYPE_EMBEDDING,
+                operation=OPERATION_EMBEDDING,
+                metadata={
+                    "chunk_count": len(entries),
+                    "service": "ingestion",
+                    "batched": True
+                },
+                # Clave nueva por lote: no colisiona con la de otros lotes, pero no
+                # deduplica reintentos (cada reintento del lote genera otra clave)
+                idempotency_key=f"{tenant_id}:{model}:{collection_id}:batch:{uuid.uuid4().hex}"
+            )
+
+        return embeddings
+
+
+# Instancia compartida del agrupador
+_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Obtiene la instancia compartida del agrupador de embeddings."""
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher()
+    return _batcher
+
+
+async def shutdown_embedding_batcher():
+    """Vacía y libera el agrupador de embeddings compartido."""
+    global _batcher
+    if _batcher:
+        await _batcher.close()
+        _batcher = None
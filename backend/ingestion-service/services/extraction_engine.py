@@ -0,0 +1,407 @@
+"""
+Motor de extracción y chunking ejecutado en un pool de procesos.
+
+Los lectores de LlamaIndex (PDFReader, DocxReader, PandasExcelReader...) y el
+SentenceSplitter son CPU-bound y bloquean el event loop si se ejecutan dentro
+de una corrutina. Este módulo los despacha a un ProcessPoolExecutor cuyos
+procesos importan los lectores una sola vez al arrancar, de modo que la API
+sigue respondiendo mientras los workers saturan los núcleos disponibles.
+
+Las funciones de nivel de módulo se ejecutan dentro de los procesos del pool,
+por lo que no deben depender del contexto asíncrono ni de la caché.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, Callable, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+PDF_MIMETYPE = "application/pdf"
+
+# Lectores construidos una vez por proceso worker
+_worker_readers: Optional[Dict[str, Any]] = None
+
+
+class CustomHTMLReader:
+    """Lector personalizado para contenido HTML usando BeautifulSoup."""
+
+    def load_data(self, file_path=None, html_str=None):
+        """Carga y procesa contenido HTML ya sea desde un archivo o desde una cadena."""
+        from bs4 import BeautifulSoup
+        from llama_index.core import Document
+
+        if file_path is None and html_str is None:
+            raise ValueError("Debe proporcionar file_path o html_str")
+
+        content = ""
+        if file_path:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        else:
+            content = html_str
+
+        # Procesar con BeautifulSoup
+        soup = BeautifulSoup(content, 'html.parser')
+
+        # Eliminar scripts, estilos y otros elementos no deseados
+        for element in soup(["script", "style", "header", "footer", "nav"]):
+            element.decompose()
+
+        # Extraer texto limpio
+        text = soup.get_text(separator=" ", strip=True)
+
+        # Crear documento
+        return [Document(text=text)]
+
+
+# Tipos MIME con lector de LlamaIndex (las claves de build_llama_readers)
+LLAMA_READER_MIMETYPES = frozenset({
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'text/csv',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.ms-excel',
+    'text/markdown',
+    'text/html',
+    'text/plain',
+    'image/jpeg',
+    'image/png',
+    'image/gif',
+})
+
+
+def build_llama_readers() -> Dict[str, Any]:
+    """
+    Construye el mapa de tipos MIME a lectores de LlamaIndex.
+
+    Solo lo usan los procesos del motor de extracción; para comprobar si un
+    tipo está soportado basta con LLAMA_READER_MIMETYPES.
+
+    Returns:
+        Dict[str, Any]: Lector a utilizar para cada tipo MIME
+    """
+    from llama_index.core import SimpleDirectoryReader
+    from llama_index.readers.file import (
+        PDFReader, DocxReader, CSVReader,
+        PandasExcelReader, MarkdownReader, ImageReader
+    )
+
+    return {
+        'application/pdf': PDFReader(),
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document': DocxReader(),
+        'text/csv': CSVReader(),
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': PandasExcelReader(),
+        'application/vnd.ms-excel': PandasExcelReader(),
+        'text/markdown': MarkdownReader(),
+        'text/html': CustomHTMLReader(),
+        'text/plain': SimpleDirectoryReader,
+        'image/jpeg': ImageReader(),
+        'image/png': ImageReader(),
+        'image/gif': ImageReader(),
+    }
+
+
+def _init_worker():
+    """Inicializador de cada proceso del pool: importa y construye los lectores."""
+    global _worker_readers
+    _worker_readers = build_llama_readers()
+
+
+def _get_worker_readers() -> Dict[str, Any]:
+    """Obtiene los lectores del proceso actual, construyéndolos si es necesario."""
+    global _worker_readers
+    if _worker_readers is None:
+        _worker_readers = build_llama_readers()
+    return _worker_readers
+
+
+def _ping() -> int:
+    """Tarea vacía usada para arrancar los procesos del pool por adelantado."""
+    return os.getpid()
+
+
+@lru_cache(maxsize=16)
+def _get_splitter(chunk_size: int, chunk_overlap: int):
+    """Obtiene un SentenceSplitter reutilizable para unos parámetros dados."""
+    from llama_index.core.node_parser import SentenceSplitter
+
+    return SentenceSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        paragraph_separator="\n\n",  # Respeta párrafos
+        secondary_chunking_regex="[^,.;:\n]+[,.;:\n]",  # Divide por frases
+    )
+
+
+def load_sections_from_file(
+    file_path: str,
+    mimetype: str,
+    metadata: Optional[Dict[str, Any]] = None
+) -> List[str]:
+    """
+    Extrae el texto de cada documento (página, hoja, sección) de un archivo.
+
+    Args:
+        file_path: Ruta al archivo en el sistema
+        mimetype: Tipo MIME ya resuelto del archivo
+        metadata: Metadatos para los documentos de texto plano
+
+    Returns:
+        List[str]: Texto de cada documento devuelto por el lector
+    """
+    from llama_index.core import Document
+
+    reader = _get_worker_readers().get(mimetype)
+    if not reader:
+        raise ValueError(f"No hay un lector disponible para {mimetype}")
+
+    # SimpleDirectoryReader requiere un tratamiento especial
+    if mimetype == "text/plain":
+        # Leer el contenido directamente para archivos de texto
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            documents = [Document(text=f.read(), metadata=metadata or {})]
+    else:
+        # Usar el lector específico
+        documents = reader.load_data(file_path)
+
+    return [doc.text for doc in documents or [] if doc.text]
+
+
+def load_text_from_file(
+    file_path: str,
+    mimetype: str,
+    metadata: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Extrae el texto completo de un archivo con el lector adecuado.
+
+    Args:
+        file_path: Ruta al archivo en el sistema
+        mimetype: Tipo MIME ya resuelto del archivo
+        metadata: Metadatos para los documentos de texto plano
+
+    Returns:
+        str: Texto extraído o cadena vacía si no se obtuvieron documentos
+    """
+    # Concatenar texto de todos los documentos
+    return "\n\n".join(load_sections_from_file(file_path, mimetype, metadata))
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Obtiene el número de páginas de un PDF sin extraer su texto."""
+    from pypdf import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+
+def load_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """
+    Extrae el texto de un rango de páginas de un PDF.
+
+    pypdf analiza las páginas de forma perezosa, por lo que solo se procesa
+    el rango solicitado y la memoria queda acotada por el tamaño de la ventana.
+
+    Args:
+        file_path: Ruta al PDF
+        start: Primera página (incluida)
+        end: Última página (excluida)
+
+    Returns:
+        List[str]: Texto de cada página del rango
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    end = min(end, len(reader.pages))
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def split_text_into_nodes(
+    text: str,
+    metadata: Dict[str, Any],
+    chunk_size: int,
+    chunk_overlap: int
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Divide un texto con SentenceSplitter.
+
+    Args:
+        text: Texto a dividir
+        metadata: Metadatos del documento
+        chunk_size: Tamaño de cada chunk
+        chunk_overlap: Solapamiento entre chunks
+
+    Returns:
+        List[Tuple[str, Dict[str, Any]]]: Texto y metadatos de cada nodo
+    """
+    from llama_index.core import Document
+
+    splitter = _get_splitter(chunk_size, chunk_overlap)
+    nodes = splitter.get_nodes_from_documents([Document(text=text, metadata=metadata)])
+    return [(node.text, dict(node.metadata)) for node in nodes]
+
+
+class ExtractionEngine:
+    """
+    Pool de procesos para extracción de texto y chunking.
+
+    Si el pool está deshabilitado las mismas funciones se ejecutan en el
+    executor de hilos por defecto para no bloquear el event loop.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, enabled: Optional[bool] = None):
+        from config.settings import get_settings
+        settings = get_settings()
+
+        configured_workers = max_workers if max_workers is not None else settings.extraction_pool_workers
+        self.max_workers = configured_workers or os.cpu_count() or 1
+        self.enabled = settings.extraction_pool_enabled if enabled is None else enabled
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Crea el pool de procesos si está habilitado."""
+        if not self.enabled or self._pool is not None:
+            return
+
+        # spawn evita heredar el event loop y los hilos del proceso principal
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        logger.info(f"Pool de extracción iniciado con {self.max_workers} procesos")
+
+    async def warm_up(self):
+        """Arranca todos los procesos del pool para que importen los lectores."""
+        if not self._pool:
+            return
+
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(
+            *[loop.run_in_executor(self._pool, _ping) for _ in range(self.max_workers)],
+            return_exceptions=True
+        )
+        logger.info(f"Pool de extracción precalentado ({len(set(p for p in pids if isinstance(p, int)))} procesos)")
+
+    def shutdown(self):
+        """Detiene el pool de procesos."""
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            logger.info("Pool de extracción detenido")
+
+    async def extract_text(
+        self,
+        file_path: str,
+        mimetype: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Extrae texto de un archivo fuera del event loop."""
+        return await self._run(load_text_from_file, file_path, mimetype, metadata)
+
+    async def split_text(
+        self,
+        text: str,
+        metadata: Dict[str, Any],
+        chunk_size: int,
+        chunk_overlap: int
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Divide un texto en nodos fuera del event loop."""
+        return await self._run(split_text_into_nodes, text, metadata, chunk_size, chunk_overlap)
+
+    async def iter_sections(
+        self,
+        file_path: str,
+        mimetype: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        pages_per_batch: int = 10
+    ) -> AsyncIterator[str]:
+        """
+        Extrae el texto de un archivo sección a sección.
+
+        Los PDF se leen por ventanas de páginas, solapando la extracción de la
+        siguiente ventana con el consumo de la actual. El resto de formatos
+        devuelve cada documento generado por su lector.
+
+        Args:
+            file_path: Ruta al archivo
+            mimetype: Tipo MIME ya resuelto del archivo
+            metadata: Metadatos para los documentos de texto plano
+            pages_per_batch: Páginas extraídas por llamada al pool
+
+        Yields:
+            str: Texto de cada página o sección
+        """
+        if mimetype != PDF_MIMETYPE:
+            for section in await self._run(load_sections_from_file, file_path, mimetype, metadata):
+                yield section
+            return
+
+        total_pages = await self._run(count_pdf_pages, file_path)
+        next_window = None
+
+        try:
+            for start in range(0, total_pages, pages_per_batch):
+                window = next_window or asyncio.ensure_future(
+                    self._run(load_pdf_pages, file_path, start, start + pages_per_batch)
+                )
+                next_start = start + pages_per_batch
+                next_window = asyncio.ensure_future(
+                    self._run(load_pdf_pages, file_path, next_start, next_start + pages_per_batch)
+                ) if next_start < total_pages else None
+
+                for page_text in await window:
+                    if page_text:
+                        yield page_text
+        finally:
+            if next_window and not next_window.done():
+                next_window.cancel()
+
+    async def _run(self, func: Callable, *args):
+        """Ejecuta una función en el pool, recreándolo si un proceso murió."""
+        loop = asyncio.get_running_loop()
+
+        if self.enabled and self._pool is None:
+            self.start()
+
+        try:
+            return await loop.run_in_executor(self._pool, func, *args)
+        except BrokenProcessPool:
+            # Un proceso terminó abruptamente (p.ej. OOM): recrear el pool
+            logger.error("Pool de extracción roto, recreando procesos")
+            self.shutdown()
+            self.start()
+            raise
+
+
+# Instancia compartida del motor
+_engine: Optional[ExtractionEngine] = None
+
+
+def get_extraction_engine() -> ExtractionEngine:
+    """Obtiene la instancia compartida del motor de extracción."""
+    global _engine
+    if _engine is None:
+        _engine = ExtractionEngine()
+    return _engine
+
+
+async def init_extraction_engine():
+    """Inicia y precalienta el motor de extracción compartido."""
+    engine = get_extraction_engine()
+    engine.start()
+    await engine.warm_up()
+
+
+def shutdown_extraction_engine():
+    """Detiene el motor de extracción compartido."""
+    global _engine
+    if _engine:
+        _engine.shutdown()
+        _engine = None
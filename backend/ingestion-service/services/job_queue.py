@@ -0,0 +1,537 @@
+"""
+Cola fiable de trabajos de ingesta sobre listas de Redis.
+
+Cada consumidor (worker secuencial o alimentador del pipeline) extrae trabajos
+con BLMOVE, que bloquea hasta que llega un trabajo y lo mueve atómicamente de
+la lista de pendientes a la lista de procesamiento del propio consumidor. El
+trabajo solo desaparece de Redis cuando el consumidor lo confirma (ack).
+
+Los consumidores vivos renuevan periódicamente una clave de latido con TTL
+igual al timeout de visibilidad. Si un proceso muere, su latido expira y el
+recuperador devuelve a la cola los trabajos de su lista de procesamiento, de
+modo que se reentregan en segundos.
+
+El latido es por consumidor: un worker vivo pero bloqueado en un trabajo lo
+seguiría renovando. Por eso cada entrega registra además un plazo por trabajo
+(queue_job_lease_timeout); el recuperador reentrega los trabajos cuyo plazo
+venció aunque su consumidor siga vivo. Si el consumidor original termina
+después, su confirmación ya no tiene efecto. Un trabajo entregado más veces
+del máximo permitido se considera venenoso y se mueve a la lista de fallidos.
+
+Con la planificación justa habilitada, los trabajos nuevos no entran
+directamente en la lista de pendientes: esperan en carriles por tenant
+(prioritario y estándar) y el planificador de services.queue los promueve a
+la lista de pendientes según el peso de cada tenant.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Any, Optional, Set, Tuple, Callable, Awaitable
+
+from common.cache.manager import get_redis_client
+
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Identificador de esta instancia del servicio para nombrar a sus consumidores
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# Carriles de espera por tenant
+PRIORITY_LANE = "priority"
+STANDARD_LANE = "standard"
+
+# Retira un tenant de los activos solo si sus dos carriles siguen vacíos
+# (atómico frente a un encolado concurrente)
+_RETIRE_TENANT_SCRIPT = """
+if redis.call('LLEN', KEYS[2]) == 0 and redis.call('LLEN', KEYS[3]) == 0 then
+    redis.call('HDEL', KEYS[4], ARGV[1])
+    return redis.call('SREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+# Confirma un trabajo solo si sigue en la lista del consumidor (si su plazo
+# venció y se reentregó, la confirmación tardía no toca la nueva entrega)
+_ACK_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 1 then
+    redis.call('HDEL', KEYS[2], ARGV[2])
+    redis.call('HDEL', KEYS[3], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Devuelve a la cola un trabajo con el plazo vencido si la entrega sigue siendo
+# la registrada y el trabajo continúa en la lista del consumidor
+_EXPIRE_LEASE_SCRIPT = """
+if redis.call('HGET', KEYS[3], ARGV[2]) ~= ARGV[3] then
+    return 0
+end
+redis.call('HDEL', KEYS[3], ARGV[2])
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Libera la reserva de planificación solo si sigue siendo de quien la tomó
+# (si expiró, otra instancia puede haberla adquirido)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _decode(value) -> Optional[str]:
+    """Normaliza las respuestas de Redis a str."""
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
+
+
+class ReliableJobQueue:
+    """
+    Cola de trabajos con entrega al menos una vez.
+
+    Claves en Redis (a partir de jobs_queue_key):
+    - {key}: trabajos pendientes (se encolan por la izquierda y se consumen por la derecha)
+    - {key}:processing:{consumidor}: trabajos entregados y no confirmados
+    - {key}:heartbeat:{consumidor}: latido del consumidor con TTL de visibilidad
+    - {key}:deliveries: número de entregas por job_id
+    - {key}:leases: entrega en curso por job_id (consumidor, trabajo y plazo)
+    - {key}:failed: trabajos descartados por exceder el máximo de entregas
+    - {key}:tenant:{tenant}:{carril}: trabajos en espera de planificación
+    - {key}:tenants y {key}:tenant_weights: tenants con trabajos en espera y su peso
+    """
+
+    def __init__(
+        self,
+        queue_key: Optional[str] = None,
+        visibility_timeout: Optional[int] = None,
+        max_deliveries: Optional[int] = None,
+        on_recover: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ):
+        settings = get_settings()
+        self.pending_key = queue_key or settings.jobs_queue_key
+        self.processing_prefix = f"{self.pending_key}:processing:"
+        self.heartbeat_prefix = f"{self.pending_key}:heartbeat:"
+        self.deliveries_key = f"{self.pending_key}:deliveries"
+        self.leases_key = f"{self.pending_key}:leases"
+        self.failed_key = f"{self.pending_key}:failed"
+        self.tenants_key = f"{self.pending_key}:tenants"
+        self.weights_key = f"{self.pending_key}:tenant_weights"
+        self.dispatch_lock_key = f"{self.pending_key}:dispatch_lock"
+
+        self.visibility_timeout = visibility_timeout or settings.queue_visibility_timeout
+        self.max_deliveries = max_deliveries or settings.queue_max_deliveries
+        self.lease_timeout = settings.queue_job_lease_timeout
+        self.block_timeout = settings.queue_block_timeout
+        self.recovery_interval = settings.queue_recovery_interval
+        self.on_recover = on_recover
+
+        self._consumers: Set[str] = set()
+        self._maintenance: Optional[asyncio.Task] = None
+        self._redelivered = 0
+        self._expired_leases = 0
+        self._dead_lettered = 0
+
+    def consumer_id(self, name: str) -> str:
+        """Identificador global de un consumidor de esta instancia."""
+        return f"{INSTANCE_ID}:{name}"
+
+    async def start(self):
+        """Arranca el latido de los consumidores locales y el recuperador."""
+        if self._maintenance is None:
+            self._maintenance = asyncio.create_task(self._maintenance_loop())
+
+    async def stop(self):
+        """Detiene el mantenimiento y devuelve a la cola los trabajos no confirmados."""
+        if self._maintenance:
+            self._maintenance.cancel()
+            await asyncio.gather(self._maintenance, return_exceptions=True)
+            self._maintenance = None
+
+        for consumer in list(self._consumers):
+            await self.release_consumer(consumer)
+
+    async def push(self, job: Dict[str, Any]):
+        """Encola un trabajo."""
+        client = await get_redis_client()
+        await client.lpush(self.pending_key, json.dumps(job))
+
+    def lane_key(self, tenant_id: str, lane: str) -> str:
+        """Clave del carril de espera de un tenant."""
+        return f"{self.pending_key}:tenant:{tenant_id}:{lane}"
+
+    async def push_to_lane(self, job: Dict[str, Any], lane: str, weight: float):
+        """
+        Encola un trabajo en el carril de su tenant, pendiente de planificación.
+
+        Args:
+            job: Datos del trabajo (debe incluir tenant_id)
+            lane: PRIORITY_LANE o STANDARD_LANE
+            weight: Peso de planificación del tenant
+        """
+        tenant_id = job["tenant_id"]
+        client = await get_redis_client()
+        pipe = client.pipeline(transaction=True)
+        pipe.lpush(self.lane_key(tenant_id, lane), json.dumps(job))
+        pipe.hset(self.weights_key, tenant_id, weight)
+        pipe.sadd(self.tenants_key, tenant_id)
+        await pipe.execute()
+
+    async def promote(self, tenant_id: str, lane: str) -> bool:
+        """
+        Mueve el trabajo más antiguo del carril de un tenant a la lista de pendientes.
+
+        Returns:
+            bool: True si había un trabajo que promover
+        """
+        client = await get_redis_client()
+        raw = await client.lmove(self.lane_key(tenant_id, lane), self.pending_key, "RIGHT", "LEFT")
+        return raw is not None
+
+    async def retire_tenant(self, tenant_id: str) -> bool:
+        """Retira a un tenant de los activos si no le quedan trabajos en espera."""
+        client = await get_redis_client()
+        removed = await client.eval(
+            _RETIRE_TENANT_SCRIPT,
+            4,
+            self.tenants_key,
+            self.lane_key(tenant_id, PRIORITY_LANE),
+            self.lane_key(tenant_id, STANDARD_LANE),
+            self.weights_key,
+            tenant_id
+        )
+        return bool(removed)
+
+    async def get_scheduling_state(self) -> Tuple[int, Dict[str, float]]:
+        """
+        Obtiene en una sola ida y vuelta el estado que necesita el planificador.
+
+        Returns:
+            Tuple[int, Dict[str, float]]: Trabajos ya planificados en la lista de
+            pendientes y peso de cada tenant con trabajos en espera
+        """
+        client = await get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.llen(self.pending_key)
+        pipe.smembers(self.tenants_key)
+        pipe.hgetall(self.weights_key)
+        scheduled, tenants, weights = await pipe.execute()
+
+        weights = {_decode(tenant): float(weight) for tenant, weight in (weights or {}).items()}
+        return scheduled, {
+            tenant: weights.get(tenant, 1.0)
+            for tenant in (_decode(member) for member in tenants)
+        }
+
+    async def acquire_dispatch_lock(self, ttl_ms: int) -> Optional[str]:
+        """
+        Reserva la ronda de planificación entre las instancias del servicio.
+
+        Returns:
+            Optional[str]: Token de la reserva (necesario para liberarla) o None
+            si otra instancia la tiene
+        """
+        client = await get_redis_client()
+        token = f"{INSTANCE_ID}:{uuid.uuid4().hex}"
+        if await client.set(self.dispatch_lock_key, token, nx=True, px=ttl_ms):
+            return token
+        return None
+
+    async def release_dispatch_lock(self, token: str):
+        """Libera la reserva de la ronda de planificación si sigue siendo propia."""
+        client = await get_redis_client()
+        await client.eval(_RELEASE_LOCK_SCRIPT, 1, self.dispatch_lock_key, token)
+
+    async def pop(self, consumer: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Espera el siguiente trabajo y lo asigna al consumidor.
+
+        Args:
+            consumer: Identificador del consumidor (ver consumer_id)
+            timeout: Segundos máximos de espera bloqueante
+
+        Returns:
+            Optional[Dict[str, Any]]: Trabajo con las claves internas "_queue_raw",
+            "_queue_consumer" y "_deliveries", o None si no llegó ninguno
+        """
+        timeout = self.block_timeout if timeout is None else timeout
+        client = await get_redis_client()
+
+        if not client:
+            # Sin Redis no hay nada que bloquear: esperar para no girar en vacío
+            await asyncio.sleep(timeout)
+            return None
+
+        if consumer not in self._consumers:
+            self._consumers.add(consumer)
+            await self._heartbeat(client, consumer)
+
+        processing_key = f"{self.processing_prefix}{consumer}"
+        raw = _decode(await client.blmove(self.pending_key, processing_key, timeout, "RIGHT", "LEFT"))
+        if raw is None:
+            return None
+
+        try:
+            job = json.loads(raw)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Trabajo con formato inválido movido a fallidos: {str(e)}")
+            await self._move_to_failed(client, processing_key, raw, None)
+            return None
+
+        job_key = job.get("job_id", raw)
+        lease = json.dumps({"consumer": consumer, "raw": raw, "deadline": time.time() + self.lease_timeout})
+        pipe = client.pipeline(transaction=True)
+        pipe.hincrby(self.deliveries_key, job_key, 1)
+        pipe.hset(self.leases_key, job_key, lease)
+        job["_deliveries"], _ = await pipe.execute()
+        job["_queue_raw"] = raw
+        job["_queue_consumer"] = consumer
+        return job
+
+    async def ack(self, job: Dict[str, Any]):
+        """Confirma un trabajo terminado (con éxito o con fallo ya registrado)."""
+        raw = job.pop("_queue_raw", None)
+        consumer = job.pop("_queue_consumer", None)
+        job.pop("_deliveries", None)
+        if raw is None or consumer is None:
+            return
+
+        client = await get_redis_client()
+        await client.eval(
+            _ACK_SCRIPT,
+            3,
+            f"{self.processing_prefix}{consumer}",
+            self.deliveries_key,
+            self.leases_key,
+            raw,
+            job.get("job_id", raw)
+        )
+
+    async def dead_letter(self, job: Dict[str, Any]):
+        """Mueve un trabajo entregado a la lista de fallidos."""
+        raw = job.pop("_queue_raw", None)
+        consumer = job.pop("_queue_consumer", None)
+        job.pop("_deliveries", None)
+        if raw is None or consumer is None:
+            return
+
+        client = await get_redis_client()
+        await self._move_to_failed(client, f"{self.processing_prefix}{consumer}", raw, job.get("job_id"))
+
+    async def release_consumer(self, consumer: str) -> int:
+        """
+        Devuelve a la cola los trabajos no confirmados de un consumidor y borra su latido.
+
+        Returns:
+            int: Número de trabajos devueltos a la cola
+        """
+        client = await get_redis_client()
+        if not client:
+            return 0
+
+        processing_key = f"{self.processing_prefix}{consumer}"
+        requeued = 0
+        while True:
+            # Por la derecha de pendientes: los trabajos recuperados se reentregan primero
+            raw = _decode(await client.lmove(processing_key, self.pending_key, "RIGHT", "RIGHT"))
+            if raw is None:
+                break
+            requeued += 1
+            await self._recovered(raw)
+
+        await client.delete(f"{self.heartbeat_prefix}{consumer}")
+        self._consumers.discard(consumer)
+        return requeued
+
+    async def recover_abandoned(self) -> int:
+        """
+        Reencola los trabajos de consumidores cuyo latido ha expirado.
+
+        Returns:
+            int: Número de trabajos reencolados
+        """
+        client = await get_redis_client()
+        if not client:
+            return 0
+
+        recovered = 0
+        async for key in client.scan_iter(match=f"{self.processing_prefix}*"):
+            consumer = _decode(key)[len(self.processing_prefix):]
+            if await client.exists(f"{self.heartbeat_prefix}{consumer}"):
+                continue
+
+            count = await self.release_consumer(consumer)
+            if count:
+                logger.warning(f"Reencolados {count} trabajos del consumidor caído {consumer}")
+                recovered += count
+
+        self._redelivered += recovered
+        return recovered
+
+    async def recover_expired_leases(self) -> int:
+        """
+        Reencola los trabajos que superaron su plazo aunque su consumidor siga vivo.
+
+        Returns:
+            int: Número de trabajos reencolados
+        """
+        client = await get_redis_client()
+        if not client:
+            return 0
+
+        now = time.time()
+        recovered = 0
+        for job_key, value in (await client.hgetall(self.leases_key)).items():
+            job_key, value = _decode(job_key), _decode(value)
+            try:
+                lease = json.loads(value)
+            except (TypeError, ValueError):
+                await client.hdel(self.leases_key, job_key)
+                continue
+            if lease["deadline"] > now:
+                continue
+
+            requeued = await client.eval(
+                _EXPIRE_LEASE_SCRIPT,
+                3,
+                f"{self.processing_prefix}{lease['consumer']}",
+                self.pending_key,
+                self.leases_key,
+                lease["raw"],
+                job_key,
+                value
+            )
+            if requeued:
+                logger.warning(
+                    f"Trabajo {job_key} sin confirmar tras {self.lease_timeout}s en el consumidor "
+                    f"{lease['consumer']}: se reentrega"
+                )
+                await self._recovered(lease["raw"])
+                recovered += 1
+
+        self._expired_leases += recovered
+        self._redelivered += recovered
+        return recovered
+
+    async def get_depths(self) -> Dict[str, int]:
+        """
+        Obtiene la profundidad de las listas de la cola.
+
+        Returns:
+            Dict[str, int]: Trabajos pendientes (planificados y en carriles de
+            tenants), en procesamiento y fallidos
+        """
+        client = await get_redis_client()
+        depths = {
+            "pending": 0, "scheduled": 0, "waiting": 0, "processing": 0,
+            "failed": 0, "consumers": 0, "tenants": 0
+        }
+        if not client:
+            return depths
+
+        depths["scheduled"] = await client.llen(self.pending_key)
+        depths["failed"] = await client.llen(self.failed_key)
+
+        tenants = [_decode(member) for member in await client.smembers(self.tenants_key)]
+        if tenants:
+            pipe = client.pipeline(transaction=False)
+            for tenant_id in tenants:
+                pipe.llen(self.lane_key(tenant_id, PRIORITY_LANE))
+                pipe.llen(self.lane_key(tenant_id, STANDARD_LANE))
+            depths["waiting"] = sum(await pipe.execute())
+        depths["tenants"] = len(tenants)
+        depths["pending"] = depths["scheduled"] + depths["waiting"]
+
+        async for key in client.scan_iter(match=f"{self.processing_prefix}*"):
+            depths["processing"] += await client.llen(key)
+            depths["consumers"] += 1
+        return depths
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores locales de reentregas y descartes."""
+        return {
+            "local_consumers": len(self._consumers),
+            "redelivered": self._redelivered,
+            "expired_leases": self._expired_leases,
+            "dead_lettered": self._dead_lettered,
+            "visibility_timeout": self.visibility_timeout,
+            "lease_timeout": self.lease_timeout
+        }
+
+    async def _heartbeat(self, client, consumer: str):
+        await client.set(f"{self.heartbeat_prefix}{consumer}", str(time.time()), ex=self.visibility_timeout)
+
+    async def _recovered(self, raw: str):
+        """
+        Prepara la reentrega de un trabajo devuelto a la cola.
+
+        Su plazo no se borra aquí: la siguiente entrega lo sustituye y, si
+        vence antes, _EXPIRE_LEASE_SCRIPT lo descarta sin efecto.
+        """
+        if self.on_recover:
+            try:
+                await self.on_recover(json.loads(raw))
+            except Exception as e:
+                logger.warning(f"Error preparando la reentrega de un trabajo: {str(e)}")
+
+    async def _move_to_failed(self, client, processing_key: str, raw: str, job_id: Optional[str]):
+        pipe = client.pipeline(transaction=True)
+        pipe.lrem(processing_key, 1, raw)
+        pipe.lpush(self.failed_key, raw)
+        if job_id:
+            pipe.hdel(self.deliveries_key, job_id)
+            pipe.hdel(self.leases_key, job_id)
+        await pipe.execute()
+        self._dead_lettered += 1
+
+    async def _maintenance_loop(self):
+        """Renueva los latidos locales y recupera trabajos de consumidores caídos."""
+        heartbeat_interval = max(1, self.visibility_timeout / 3)
+        last_recovery = 0.0
+
+        while True:
+            try:
+                client = await get_redis_client()
+                if client:
+                    for consumer in list(self._consumers):
+                        await self._heartbeat(client, consumer)
+
+                    if time.time() - last_recovery >= self.recovery_interval:
+                        last_recovery = time.time()
+                        await self.recover_abandoned()
+                        await self.recover_expired_leases()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el mantenimiento de la cola de trabajos: {str(e)}")
+
+            await asyncio.sleep(min(heartbeat_interval, self.recovery_interval))
+
+
+# Instancia compartida de la cola
+_queue: Optional[ReliableJobQueue] = None
+
+
+def get_job_queue() -> ReliableJobQueue:
+    """Obtiene la instancia compartida de la cola de trabajos."""
+    global _queue
+    if _queue is None:
+        _queue = ReliableJobQueue()
+    return _queue
+
+
+def configure_job_queue(on_recover: Callable[[Dict[str, Any]], Awaitable[None]]):
+    """Registra la acción a ejecutar sobre cada trabajo reentregado."""
+    get_job_queue().on_recover = on_recover
@@ -0,0 +1,331 @@
+"""
+Pipeline concurrente por etapas para el procesamiento de trabajos de ingesta.
+
+Cada etapa (extracción, chunking, embeddings y almacenamiento) tiene su propio
+número de workers y se comunica con la siguiente mediante una cola asyncio
+acotada. Así la extracción de un documento se solapa con las llamadas al
+servicio de embeddings y las escrituras vectoriales de otros documentos, y las
+colas acotadas aplican backpressure sobre la cola de Redis.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional
+
+from common.context import Context
+from common.errors import DocumentProcessingError
+from config.settings import get_settings
+from config.constants import PROCESSING_TIMEOUT
+
+from .queue import (
+    pop_next_job,
+    prepare_job,
+    extract_job_text,
+    chunk_job_text,
+    complete_job,
+    fail_job,
+    finish_job,
+    should_stream_job,
+    process_job_streaming
+)
+from .embedding import generate_embeddings_for_chunks, select_changed_chunks, store_chunks_incremental
+from .job_queue import get_job_queue
+
+logger = logging.getLogger(__name__)
+
+# Orden de las etapas del pipeline
+STAGES = ("extract", "chunk", "embed", "store")
+
+
+class PipelineItem:
+    """Estado de un trabajo mientras atraviesa las etapas del pipeline."""
+
+    __slots__ = ("job", "text", "chunks", "stats", "started_at", "streamed")
+
+    def __init__(self, job: Dict[str, Any]):
+        self.job = job
+        # Los trabajos en streaming completan chunking y almacenamiento en la extracción
+        self.streamed = False
+        self.text: Optional[str] = None
+        self.chunks: List[Dict[str, Any]] = []
+        self.stats: Dict[str, Any] = {}
+        self.started_at = time.time()
+
+
+class IngestionPipeline:
+    """
+    Pipeline de ingesta con workers independientes por etapa.
+
+    Un alimentador extrae trabajos de la cola de Redis y los deja en la cola
+    de extracción; cada etapa consume de su cola y entrega a la siguiente.
+    Un fallo en cualquier etapa marca el trabajo como fallido y libera su lock.
+    """
+
+    def __init__(
+        self,
+        stage_workers: Optional[Dict[str, int]] = None,
+        queue_size: Optional[int] = None
+    ):
+        settings = get_settings()
+        configured_workers = stage_workers or settings.pipeline_stage_workers
+
+        self.stage_workers = {
+            stage: max(1, int(configured_workers.get(stage, 1)))
+            for stage in STAGES
+        }
+        self.queue_size = queue_size or settings.pipeline_queue_size
+        self.running = False
+
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._feeder: Optional[asyncio.Task] = None
+        self._handlers = {
+            "extract": self._extract,
+            "chunk": self._chunk,
+            "embed": self._embed,
+            "store": self._store
+        }
+        self._metrics = {
+            stage: {"processed": 0, "failed": 0, "busy_seconds": 0.0}
+            for stage in STAGES
+        }
+        self._completed_jobs = 0
+
+    async def start(self):
+        """Crea las colas entre etapas y arranca los workers y el alimentador."""
+        if self.running:
+            logger.warning("Pipeline de ingesta ya está en ejecución")
+            return
+
+        self.running = True
+        self._queues = {stage: asyncio.Queue(maxsize=self.queue_size) for stage in STAGES}
+
+        for stage in STAGES:
+            for i in range(self.stage_workers[stage]):
+                self._workers.append(asyncio.create_task(self._stage_worker(stage, i + 1)))
+
+        self._feeder = asyncio.create_task(self._feed())
+
+        logger.info(
+            f"Pipeline de ingesta iniciado: workers por etapa {self.stage_workers}, "
+            f"capacidad de colas {self.queue_size}"
+        )
+
+    async def stop(self, timeout: float = PROCESSING_TIMEOUT):
+        """
+        Detiene el alimentador y espera a que terminen los trabajos en curso.
+
+        Args:
+            timeout: Tiempo máximo en segundos para vaciar las colas
+        """
+        if not self.running:
+            return
+
+        self.running = False
+
+        if self._feeder:
+            await asyncio.gather(self._feeder, return_exceptions=True)
+            self._feeder = None
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout vaciando el pipeline de ingesta tras {timeout}s, cancelando workers")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        logger.info("Pipeline de ingesta detenido")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene métricas del pipeline.
+
+        Returns:
+            Dict[str, Any]: Profundidad de colas, workers y contadores por etapa
+        """
+        return {
+            "running": self.running,
+            "completed_jobs": self._completed_jobs,
+            "stages": {
+                stage: {
+                    "workers": self.stage_workers[stage],
+                    "queue_depth": self._queues[stage].qsize() if stage in self._queues else 0,
+                    **self._metrics[stage]
+                }
+                for stage in STAGES
+            }
+        }
+
+    async def _drain(self):
+        """Espera a que cada etapa procese lo que tiene en cola, en orden."""
+        for stage in STAGES:
+            await self._queues[stage].join()
+
+    async def _feed(self):
+        """Extrae trabajos de Redis y los entrega a la etapa de extracción."""
+        consumer_id = get_job_queue().consumer_id("pipeline")
+
+        while self.running:
+            try:
+                # Espera bloqueante: el trabajo llega en cuanto se encola
+                job = await pop_next_job(consumer_id)
+
+                if not job:
+                    continue
+
+                async with Context(
+                    tenant_id=job.get("tenant_id"),
+                    collection_id=job.get("collection_id")
+                ):
+                    ready = await prepare_job(job)
+
+                if ready:
+                    # put bloquea si la etapa está saturada (backpressure)
+                    await self._queues["extract"].put(PipelineItem(job))
+                else:
+                    # Lock en manos de otro worker: confirmar la entrega duplicada
+                    await finish_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error alimentando el pipeline de ingesta: {str(e)}", exc_info=True)
+                await asyncio.sleep(5)
+
+    async def _stage_worker(self, stage: str, worker_id: int):
+        """Consume elementos de una etapa y los entrega a la siguiente."""
+        queue = self._queues[stage]
+        stage_index = STAGES.index(stage)
+        next_queue = self._queues[STAGES[stage_index + 1]] if stage_index + 1 < len(STAGES) else None
+
+        logger.debug(f"Worker {worker_id} de la etapa '{stage}' iniciado")
+
+        while True:
+            item = await queue.get()
+            try:
+                if await self._run_stage(stage, item) and next_queue is not None:
+                    await next_queue.put(item)
+            finally:
+                queue.task_done()
+
+    async def _run_stage(self, stage: str, item: PipelineItem) -> bool:
+        """
+        Ejecuta una etapa sobre un trabajo y gestiona su fallo.
+
+        Returns:
+            bool: True si el trabajo debe continuar a la siguiente etapa
+        """
+        job = item.job
+        start_time = time.time()
+
+        try:
+            async with Context(
+                tenant_id=job["tenant_id"],
+                collection_id=job["collection_id"]
+            ):
+                await self._handlers[stage](item)
+
+            self._metrics[stage]["processed"] += 1
+
+            if stage == STAGES[-1]:
+                self._completed_jobs += 1
+                await finish_job(job)
+            return True
+        except Exception as e:
+            self._metrics[stage]["failed"] += 1
+            logger.error(
+                f"Error en la etapa '{stage}' del trabajo {job.get('job_id')}: {str(e)}",
+                extra={
+                    "job_id": job.get("job_id"),
+                    "tenant_id": job.get("tenant_id"),
+                    "document_id": job.get("document_id"),
+                    "stage": stage
+                },
+                exc_info=True
+            )
+
+            try:
+                await fail_job(job, str(e), cleanup=True)
+            except Exception as cleanup_error:
+                logger.error(f"Error en limpieza tras fallo: {str(cleanup_error)}", exc_info=True)
+
+            await finish_job(job)
+            return False
+        finally:
+            self._metrics[stage]["busy_seconds"] += time.time() - start_time
+
+    async def _extract(self, item: PipelineItem):
+        """Etapa de extracción de texto."""
+        if should_stream_job(item.job):
+            item.stats = await process_job_streaming(item.job)
+            item.streamed = True
+
+            # Una reingesta sin cambios no escribe chunks pero no es un fallo
+            if not item.stats["chunks_total"]:
+                raise DocumentProcessingError("No se pudieron generar chunks para el documento")
+            return
+
+        item.text = await extract_job_text(item.job)
+
+        if not item.text:
+            raise DocumentProcessingError("No se pudo extraer texto del documento")
+
+    async def _chunk(self, item: PipelineItem):
+        """Etapa de división en chunks."""
+        if item.streamed:
+            return
+
+        item.chunks = await chunk_job_text(item.job, item.text)
+        # Liberar el texto completo en cuanto ya no se necesita
+        item.text = None
+
+        if not item.chunks:
+            raise DocumentProcessingError("No se pudieron generar chunks para el documento")
+
+    async def _embed(self, item: PipelineItem):
+        """Etapa de generación de embeddings."""
+        if item.streamed:
+            return
+
+        job = item.job
+
+        # En una reingesta solo se embeben los chunks nuevos o modificados
+        changed = await select_changed_chunks(
+            chunks=item.chunks,
+            tenant_id=job["tenant_id"],
+            collection_id=job["collection_id"],
+            document_id=job["document_id"]
+        )
+        if not changed:
+            return
+
+        embedded = await generate_embeddings_for_chunks(
+            chunks=changed,
+            tenant_id=job["tenant_id"],
+            collection_id=job["collection_id"]
+        )
+        embedded_by_id = {chunk["id"]: chunk for chunk in embedded}
+        item.chunks = [embedded_by_id.get(chunk["id"], chunk) for chunk in item.chunks]
+
+    async def _store(self, item: PipelineItem):
+        """Etapa de almacenamiento vectorial y cierre del trabajo."""
+        job = item.job
+
+        if item.streamed:
+            item.stats["pipeline_time"] = time.time() - item.started_at
+            await complete_job(job, item.stats["chunks_total"], item.stats)
+            return
+
+        logger.info(f"Almacenando {len(item.chunks)} chunks en vector store para documento {job['document_id']}")
+        item.stats = await store_chunks_incremental(
+            chunks=item.chunks,
+            document_id=job["document_id"],
+            tenant_id=job["tenant_id"],
+            collection_id=job["collection_id"]
+        )
+        item.stats["pipeline_time"] = time.time() - item.started_at
+
+        await complete_job(job, len(item.chunks), item.stats)
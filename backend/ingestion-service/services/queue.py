@@ -2,14 +2,12 @@
 Sistema de colas para procesamiento asíncrono de documentos.
 """
 
-import json
 import logging
 import time
 import uuid
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Set
 
-# from common.config import get_tier_limits  # UNUSED
 from config.settings import get_settings
 # from config.constants import (
 #     MAX_QUEUE_RETRIES,
@@ -21,20 +19,26 @@ from common.errors import ServiceError, handle_errors, ErrorCode
 from common.context import Context, with_context
 from common.db import get_supabase_client
 from common.db.tables import get_table_name
+from common.config.tiers import get_tier_limits
 # Importar funciones centralizadas de caché
 from common.cache import (
     get_with_cache_aside,
     CacheManager
 )
-from services.chunking import process_file_from_storage, split_text_with_llama_index
-from services.embedding import store_chunks_in_vector_store
-from services.storage import update_document_status, update_processing_job
+from services.chunking import (
+    process_file_from_storage,
+    split_text_with_llama_index,
+    stream_file_sections,
+    stream_chunks_with_llama_index
+)
+from services.embedding import store_chunks_incremental, store_chunk_stream
+from services.storage import update_document_status, update_processing_job, download_file_from_storage
+from services.deduplication import release_document_hash
+from services.job_queue import get_job_queue, configure_job_queue, PRIORITY_LANE, STANDARD_LANE
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Nombre de la cola
-INGESTION_QUEUE = "ingestion_queue"
 JOB_PREFIX = "job:"
 JOB_STATUS_PREFIX = "job_status:"
 JOB_LOCK_PREFIX = "job_lock"  # Prefijo para los bloqueos de trabajos
@@ -89,6 +93,248 @@ async def release_job_lock(job_id: str, tenant_id: str) -> bool:
     
     return True
 
+def get_tenant_queue_weight(tenant_id: str, tier: Optional[str]) -> float:
+    """
+    Peso de planificación de un tenant según su tier.
+
+    Args:
+        tenant_id: ID del tenant
+        tier: Tier del tenant
+
+    Returns:
+        float: Peso relativo del tenant en el reparto de la cola
+    """
+    tier = tier or "free"
+    tier_limits = get_tier_limits(tier, tenant_id=tenant_id) or {}
+    weight = tier_limits.get("queue_weight") or settings.tenant_queue_weights.get(tier, 1)
+    return max(1.0, float(weight))
+
+def select_job_lane(job: Dict[str, Any]) -> str:
+    """
+    Elige el carril de un trabajo nuevo.
+
+    Las subidas individuales pequeñas (archivos, textos y URLs sueltas) van al
+    carril prioritario; los lotes y los archivos grandes, al estándar.
+    """
+    if (job.get("metadata") or {}).get("batch_id"):
+        return STANDARD_LANE
+
+    size = (job.get("file_info") or {}).get("size") or 0
+    if size <= settings.queue_priority_max_size_kb * 1024:
+        return PRIORITY_LANE
+    return STANDARD_LANE
+
+class FairJobScheduler:
+    """
+    Planificador justo de trabajos entre tenants.
+
+    Los trabajos esperan en carriles por tenant y el planificador los promueve
+    a la lista de pendientes de la cola fiable, manteniendo en ella como mucho
+    dispatch_window trabajos. En cada ronda los carriles prioritarios (un
+    trabajo por tenant y vuelta) se sirven primero pero solo hasta su cuota
+    (priority_share de los huecos); los estándar se reparten con deficit
+    round-robin: cada turno un tenant recibe un cuanto igual a su peso y
+    promueve tantos trabajos como le permita su déficit acumulado. Los huecos
+    que el carril estándar no usa vuelven al prioritario. Así un tenant que
+    importa miles de documentos no retrasa las subidas de los demás, y un
+    flujo continuo de subidas pequeñas tampoco deja sin servicio a los lotes.
+    """
+
+    def __init__(
+        self,
+        dispatch_window: Optional[int] = None,
+        dispatch_interval_ms: Optional[int] = None,
+        priority_share: Optional[float] = None
+    ):
+        self.dispatch_window = dispatch_window or settings.queue_dispatch_window
+        self.dispatch_interval = (dispatch_interval_ms or settings.queue_dispatch_interval_ms) / 1000
+        self.priority_share = settings.queue_priority_share if priority_share is None else priority_share
+
+        self._order: List[str] = []
+        self._cursor = 0
+        self._priority_cursor = 0
+        self._deficits: Dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = {"rounds": 0, "priority_promoted": 0, "standard_promoted": 0}
+
+    async def start(self):
+        """Arranca el bucle de planificación."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detiene el bucle de planificación."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self):
+        """Adelanta la siguiente ronda (trabajo encolado o hueco liberado)."""
+        self._wakeup.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas del planificador."""
+        return {
+            **self._metrics,
+            "active_tenants": len(self._order),
+            "dispatch_window": self.dispatch_window
+        }
+
+    async def dispatch_once(self) -> int:
+        """
+        Ejecuta una ronda de planificación.
+
+        Returns:
+            int: Número de trabajos promovidos a la lista de pendientes
+        """
+        queue = get_job_queue()
+
+        # Una sola instancia planifica cada ronda
+        lock_token = await queue.acquire_dispatch_lock(ttl_ms=max(1000, int(self.dispatch_interval * 5000)))
+        if not lock_token:
+            return 0
+
+        try:
+            scheduled, weights = await queue.get_scheduling_state()
+            self._refresh_order(weights)
+            free_slots = self.dispatch_window - scheduled
+            if free_slots <= 0 or not self._order:
+                return 0
+
+            self._metrics["rounds"] += 1
+            idle_priority: Set[str] = set()
+            idle_standard: Set[str] = set()
+            promoted = 0
+
+            # 1. Carril prioritario, hasta su cuota de la ronda (al menos un hueco)
+            priority_slots = min(free_slots, max(1, int(free_slots * self.priority_share)))
+            count = await self._promote_priority(queue, priority_slots, idle_priority)
+            free_slots -= count
+            promoted += count
+
+            # 2. Carril estándar: deficit round-robin ponderado por tier
+            while free_slots > 0 and len(idle_standard) < len(self._order):
+                tenant_id = self._order[self._cursor % len(self._order)]
+                if tenant_id in idle_standard:
+                    self._cursor += 1
+                    continue
+
+                if self._deficits.get(tenant_id, 0) < 1:
+                    self._deficits[tenant_id] = self._deficits.get(tenant_id, 0) + weights[tenant_id]
+
+                if not await queue.promote(tenant_id, STANDARD_LANE):
+                    # Un tenant sin trabajos no acumula déficit
+                    self._deficits[tenant_id] = 0
+                    idle_standard.add(tenant_id)
+                    self._cursor += 1
+                    continue
+
+                self._deficits[tenant_id] -= 1
+                free_slots -= 1
+                promoted += 1
+                self._metrics["standard_promoted"] += 1
+                if self._deficits[tenant_id] < 1:
+                    self._cursor += 1
+
+            # 3. Los huecos que no usó el carril estándar vuelven al prioritario
+            if free_slots > 0:
+                promoted += await self._promote_priority(queue, free_slots, idle_priority)
+
+            # Retirar a los tenants que ya no tienen trabajos en espera
+            for tenant_id in idle_priority & idle_standard:
+                if await queue.retire_tenant(tenant_id):
+                    self._deficits.pop(tenant_id, None)
+
+            return promoted
+        finally:
+            await queue.release_dispatch_lock(lock_token)
+
+    async def _promote_priority(self, queue, limit: int, idle: Set[str]) -> int:
+        """Promueve hasta limit trabajos prioritarios, uno por tenant y vuelta."""
+        promoted = 0
+        while promoted < limit and len(idle) < len(self._order):
+            tenant_id = self._order[self._priority_cursor % len(self._order)]
+            self._priority_cursor += 1
+            if tenant_id in idle:
+                continue
+            if await queue.promote(tenant_id, PRIORITY_LANE):
+                promoted += 1
+                self._metrics["priority_promoted"] += 1
+            else:
+                idle.add(tenant_id)
+        return promoted
+
+    def _refresh_order(self, weights: Dict[str, float]):
+        """Actualiza el orden de turnos conservando la posición de los tenants existentes."""
+        current = [tenant_id for tenant_id in self._order if tenant_id in weights]
+        current.extend(sorted(tenant_id for tenant_id in weights if tenant_id not in self._order))
+        self._order = current
+        for tenant_id in list(self._deficits):
+            if tenant_id not in weights:
+                del self._deficits[tenant_id]
+
+    async def _run(self):
+        """Bucle de planificación: rondas seguidas mientras haya huecos y trabajos."""
+        while True:
+            try:
+                promoted = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error planificando trabajos de ingesta: {str(e)}")
+                promoted = 0
+
+            if not promoted:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.dispatch_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+# Instancia compartida del planificador
+_scheduler: Optional[FairJobScheduler] = None
+
+def get_job_scheduler() -> FairJobScheduler:
+    """Obtiene la instancia compartida del planificador justo."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairJobScheduler()
+    return _scheduler
+
+async def enqueue_job(job: Dict[str, Any], tier: Optional[str] = None) -> None:
+    """
+    Encola un trabajo en la cola de ingesta.
+
+    Con la planificación justa habilitada el trabajo espera en el carril de su
+    tenant; si no, entra directamente en la lista de pendientes.
+
+    Args:
+        job: Datos del trabajo
+        tier: Tier del tenant, para su peso de planificación
+    """
+    if not settings.fair_scheduling_enabled:
+        await get_job_queue().push(job)
+        return
+
+    await get_job_queue().push_to_lane(
+        job,
+        lane=select_job_lane(job),
+        weight=get_tenant_queue_weight(job["tenant_id"], tier)
+    )
+    get_job_scheduler().notify()
+
+async def _release_recovered_job(job: Dict[str, Any]) -> None:
+    """
+    Libera el lock de un trabajo reencolado desde un consumidor caído.
+    
+    El lock lo tenía el worker que murió; sin liberarlo, la siguiente entrega
+    lo encontraría ocupado y el trabajo se descartaría como ya procesado.
+    """
+    if job.get("job_id") and job.get("tenant_id"):
+        await release_job_lock(job["job_id"], job["tenant_id"])
+
 async def initialize_queue():
     """Inicializa el sistema de colas."""
     # Comprobar la disponibilidad del servicio de caché utilizando CacheManager
@@ -112,6 +358,10 @@ async def initialize_queue():
             test_value = None
     
         if test_value is not None:
+            configure_job_queue(on_recover=_release_recovered_job)
+            await get_job_queue().start()
+            if settings.fair_scheduling_enabled:
+                await get_job_scheduler().start()
             logger.info("Sistema de colas inicializado correctamente")
             return True
         else:
@@ -123,7 +373,9 @@ async def initialize_queue():
 
 async def shutdown_queue():
     """Limpia recursos del sistema de colas."""
-    # No se requiere acción específica para cerrar CacheManager
+    # Devolver a la cola los trabajos no confirmados de los consumidores locales
+    await get_job_scheduler().stop()
+    await get_job_queue().stop()
     logger.info("Sistema de colas cerrado correctamente")
 
 @with_context(tenant=True, validate_tenant=True)
@@ -137,6 +389,8 @@ async def queue_document_processing_job(
     text_content: str = None,
     file_info: Optional[Dict[str, Any]] = None,
     metadata: Optional[Dict[str, Any]] = None,
+    batch_id: Optional[str] = None,
+    tier: Optional[str] = None,
     ctx: Context = None
 ) -> str:
     """
@@ -151,6 +405,8 @@ async def queue_document_processing_job(
         text_content: Texto del documento (para ingestión de texto plano)
         file_info: Información del archivo (tipo, tamaño, etc.)
         metadata: Metadatos adicionales del documento
+        batch_id: ID del lote al que pertenece el trabajo (va al carril estándar)
+        tier: Tier del tenant, para su peso en la planificación justa
         ctx: Contexto proporcionado por el decorador with_context
         
     Returns:
@@ -175,8 +431,10 @@ async def queue_document_processing_job(
             "collection_id": collection_id,
             "status": "pending",
             "created_at": int(time.time()),
-            "metadata": metadata or {}
+            "metadata": dict(metadata or {})
         }
+        if batch_id:
+            job_data["metadata"]["batch_id"] = batch_id
         
         # Agregar información específica según el tipo de fuente
         if file_key:
@@ -217,13 +475,9 @@ async def queue_document_processing_job(
             
         # Encolar el trabajo en Redis para procesamiento con manejo de errores
         try:
-            # Utilizamos el método estático de CacheManager para encolar trabajos
-            # siguiendo el patrón estandarizado de cache unificada
-            await CacheManager.rpush(
-                list_name=INGESTION_QUEUE,
-                value=job_data,
-                tenant_id=tenant_id
-            )
+            if tier is None and ctx and getattr(ctx, "tenant_info", None):
+                tier = ctx.tenant_info.tier
+            await enqueue_job(job_data, tier=tier)
         except Exception as cache_err:
             logger.warning(f"Error al encolar en Redis: {str(cache_err)}")
             
@@ -380,11 +634,11 @@ async def check_stuck_jobs():
     except Exception as e:
         logger.error(f"Error verificando trabajos estancados: {str(e)}", exc_info=True)
 
-async def process_next_job_with_retry(max_retries: int = 3) -> bool:
+async def process_next_job_with_retry(consumer_id: str, max_retries: int = 3) -> bool:
     """Procesa el siguiente trabajo con sistema de reintentos."""
     for attempt in range(max_retries):
         try:
-            return await process_next_job()
+            return await process_next_job(consumer_id)
         except Exception as e:
             if attempt == max_retries - 1:
                 raise
@@ -392,14 +646,361 @@ async def process_next_job_with_retry(max_retries: int = 3) -> bool:
             await asyncio.sleep(2 ** attempt)  # Backoff exponencial
     return False
 
+async def pop_next_job(consumer_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Espera el siguiente trabajo de la cola de ingesta y lo asigna al consumidor.
+    
+    El trabajo permanece en la lista de procesamiento del consumidor hasta que
+    finish_job lo confirma; si el consumidor muere antes, se reentrega. Los
+    trabajos que superan el máximo de entregas se marcan como fallidos.
+    
+    Args:
+        consumer_id: Identificador del consumidor (ver ReliableJobQueue.consumer_id)
+        timeout: Segundos máximos de espera bloqueante
+    
+    Returns:
+        Optional[Dict[str, Any]]: Datos del trabajo o None si no llegó ninguno
+    """
+    queue = get_job_queue()
+    job = await queue.pop(consumer_id, timeout)
+    
+    if not job:
+        return None
+    
+    deliveries = job.get("_deliveries", 1)
+    if deliveries > queue.max_deliveries:
+        logger.error(f"Trabajo {job.get('job_id')} descartado tras {deliveries - 1} entregas sin completarse")
+        await queue.dead_letter(job)
+        await fail_job(job, "Trabajo abandonado repetidamente durante el procesamiento")
+        return None
+    
+    if deliveries > 1:
+        logger.warning(f"Reentrega {deliveries} del trabajo {job.get('job_id')}")
+    
+    return job
+
+async def fail_job(job: Dict[str, Any], error_message: str, cleanup: bool = False) -> None:
+    """
+    Marca un trabajo y su documento como fallidos.
+    
+    Args:
+        job: Datos del trabajo
+        error_message: Mensaje de error a registrar
+        cleanup: Si se deben limpiar los recursos de caché del trabajo
+    """
+    job_id = job.get("job_id")
+    tenant_id = job.get("tenant_id")
+    document_id = job.get("document_id")
+    job["error"] = error_message
+    
+    # Solo intentar actualizar si tenemos la información mínima necesaria
+    if not job_id or not tenant_id:
+        return
+    
+    await update_processing_job(
+        job_id=job_id,
+        tenant_id=tenant_id,
+        status="failed",
+        error=error_message
+    )
+    
+    if document_id:
+        await update_document_status(
+            document_id=document_id,
+            tenant_id=tenant_id,
+            status="failed",
+            metadata={"error": error_message}
+        )
+        # Permitir que una nueva subida del mismo archivo vuelva a procesarse
+        await release_document_hash(tenant_id, document_id)
+    
+    if cleanup:
+        await _cleanup_job_resources(job_id, tenant_id)
+
+async def prepare_job(job: Dict[str, Any]) -> bool:
+    """
+    Adquiere el lock de un trabajo, valida sus datos y lo marca como en procesamiento.
+    
+    Si la validación falla el trabajo se marca como fallido y el lock se libera.
+    Añade al diccionario del trabajo las claves "source_type" y "lock_acquired".
+    
+    Args:
+        job: Datos del trabajo extraídos de la cola
+        
+    Returns:
+        bool: True si el trabajo está listo para procesarse
+    """
+    job_id = job.get("job_id")
+    tenant_id = job.get("tenant_id")
+    document_id = job.get("document_id")
+    collection_id = job.get("collection_id")
+    
+    context = {
+        "job_id": job_id,
+        "tenant_id": tenant_id,
+        "document_id": document_id,
+        "collection_id": collection_id
+    }
+    
+    # Adquirir un lock para este trabajo
+    job["lock_acquired"] = await acquire_job_lock(job_id, tenant_id, JOB_LOCK_EXPIRY)
+    
+    if not job["lock_acquired"]:
+        logger.warning(
+            f"Lock no adquirido para job_id={job_id}, otro worker podría estar procesándolo", 
+            extra=context
+        )
+        return False
+    
+    # Validar que tenemos la información necesaria según el tipo de fuente
+    if job.get("file_key"):
+        source_type = "file"
+    elif job.get("url"):
+        source_type = "url"
+    elif job.get("text_content"):
+        source_type = "text"
+    else:
+        source_type = None
+    
+    error_msg = None
+    if source_type is None:
+        error_msg = "Fuente de documento no especificada (se requiere file_key, url o text_content)"
+    elif not document_id or not collection_id:
+        missing = []
+        if not document_id:
+            missing.append("document_id")
+        if not collection_id:
+            missing.append("collection_id")
+        error_msg = f"Campos requeridos faltantes: {', '.join(missing)}"
+    
+    if error_msg:
+        logger.error(error_msg, extra=context)
+        await fail_job(job, error_msg)
+        await finish_job(job)
+        return False
+    
+    job["source_type"] = source_type
+    
+    # Actualizar el estado del trabajo a "processing"
+    await update_processing_job(
+        job_id=job_id,
+        tenant_id=tenant_id,
+        status="processing"
+    )
+    return True
+
+async def extract_job_text(job: Dict[str, Any], ctx: Context = None) -> Optional[str]:
+    """
+    Obtiene el texto de un trabajo según su tipo de fuente.
+    
+    Args:
+        job: Datos del trabajo ya preparado con prepare_job
+        ctx: Contexto de la operación
+        
+    Returns:
+        Optional[str]: Texto extraído del documento
+    """
+    source_type = job.get("source_type")
+    
+    if source_type == "file":
+        # Procesamiento de archivo almacenado con la función centralizada
+        return await process_file_from_storage(
+            tenant_id=job["tenant_id"],
+            collection_id=job["collection_id"],
+            file_key=job["file_key"],
+            ctx=ctx
+        )
+    
+    if source_type == "url":
+        # Aquí iría el procesamiento para URL (pendiente de implementar)
+        raise ServiceError(
+            message="Procesamiento de URL no implementado",
+            error_code="NOT_IMPLEMENTED",
+            status_code=501,
+            context={"job_id": job.get("job_id"), "source_type": source_type}
+        )
+    
+    # El texto ya está disponible en el propio trabajo
+    return job.get("text_content")
+
+def should_stream_job(job: Dict[str, Any]) -> bool:
+    """
+    Determina si un trabajo debe procesarse en streaming.
+    
+    Solo los archivos cuyo tamaño supera el umbral configurado se procesan
+    sección a sección; el resto sigue el flujo completo en memoria, que
+    aprovecha la caché de texto extraído.
+    
+    Args:
+        job: Datos del trabajo ya preparado con prepare_job
+        
+    Returns:
+        bool: True si el trabajo debe procesarse en streaming
+    """
+    if not settings.streaming_enabled or job.get("source_type") != "file":
+        return False
+    
+    file_size = (job.get("file_info") or {}).get("size") or 0
+    return file_size >= settings.streaming_threshold_mb * 1024 * 1024
+
+def _job_document_metadata(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadatos base del documento que se propagan a cada chunk."""
+    return {
+        "tenant_id": job["tenant_id"], 
+        "collection_id": job["collection_id"],
+        "document_id": job["document_id"],
+        "source_type": job.get("source_type"),
+        "job_id": job["job_id"]
+    }
+
+async def process_job_streaming(job: Dict[str, Any], ctx: Context = None) -> Dict[str, Any]:
+    """
+    Procesa un archivo grande extrayendo, dividiendo y almacenando por secciones.
+    
+    La extracción, el chunking y el almacenamiento se solapan y ninguna etapa
+    mantiene el documento completo en memoria.
+    
+    Args:
+        job: Datos del trabajo ya preparado con prepare_job
+        ctx: Contexto de la operación
+        
+    Returns:
+        Dict[str, Any]: Estadísticas del almacenamiento
+    """
+    document_id = job["document_id"]
+    file_info = job.get("file_info") or {}
+    
+    file_path = await download_file_from_storage(
+        tenant_id=job["tenant_id"],
+        file_key=job["file_key"],
+        ctx=ctx
+    )
+    
+    document_metadata = _job_document_metadata(job)
+    
+    logger.info(
+        f"Procesando en streaming documento {document_id} "
+        f"({file_info.get('size', 0) / 1024 / 1024:.1f}MB)"
+    )
+    sections = stream_file_sections(
+        file_path=file_path,
+        mimetype=file_info.get("type") or "application/octet-stream",
+        metadata=document_metadata
+    )
+    chunk_batches = stream_chunks_with_llama_index(
+        sections=sections,
+        document_id=document_id,
+        metadata=document_metadata,
+        ctx=ctx
+    )
+    
+    processing_stats = await store_chunk_stream(
+        chunk_batches=chunk_batches,
+        tenant_id=job["tenant_id"],
+        collection_id=job["collection_id"],
+        document_id=document_id,
+        ctx=ctx
+    )
+    processing_stats["streaming"] = True
+    return processing_stats
+
+async def chunk_job_text(job: Dict[str, Any], text: str, ctx: Context = None) -> List[Dict[str, Any]]:
+    """
+    Divide en chunks el texto extraído de un trabajo.
+    
+    Args:
+        job: Datos del trabajo
+        text: Texto extraído del documento
+        ctx: Contexto de la operación
+        
+    Returns:
+        List[Dict[str, Any]]: Chunks con texto y metadatos
+    """
+    document_id = job["document_id"]
+    document_metadata = _job_document_metadata(job)
+    
+    logger.info(f"Dividiendo documento {document_id} en chunks")
+    return await split_text_with_llama_index(
+        text=text, 
+        document_id=document_id, 
+        metadata=document_metadata, 
+        ctx=ctx
+    )
+
+async def complete_job(
+    job: Dict[str, Any],
+    chunks_count: int,
+    processing_stats: Dict[str, Any],
+    ctx: Context = None
+) -> None:
+    """
+    Marca un trabajo y su documento como completados.
+    
+    Args:
+        job: Datos del trabajo
+        chunks_count: Número de chunks almacenados
+        processing_stats: Estadísticas devueltas por el almacenamiento
+        ctx: Contexto de la operación
+    """
+    await update_document_status(
+        document_id=job["document_id"],
+        tenant_id=job["tenant_id"],
+        status="completed",
+        metadata={
+            "chunks_count": chunks_count,
+            "processing_stats": processing_stats
+        }
+    )
+    
+    await update_processing_job(
+        job_id=job["job_id"],
+        tenant_id=job["tenant_id"],
+        status="completed",
+        progress=100,
+        processing_stats=processing_stats,
+        ctx=ctx
+    )
+    
+    logger.info(f"Procesamiento completado para documento {job['document_id']}")
+
+async def finish_job(job: Dict[str, Any]) -> None:
+    """
+    Confirma el trabajo en la cola y libera su lock si fue adquirido.
+    
+    Args:
+        job: Datos del trabajo
+    """
+    job_id = job.get("job_id")
+    try:
+        await get_job_queue().ack(job)
+        # El hueco liberado permite planificar el siguiente trabajo
+        get_job_scheduler().notify()
+    except Exception as ack_error:
+        logger.error(f"Error confirmando job_id={job_id} en la cola: {str(ack_error)}")
+    
+    if not job.pop("lock_acquired", False):
+        logger.debug(f"No se requiere liberar lock para job_id={job_id} (no adquirido)")
+        return
+    
+    try:
+        await release_job_lock(job_id, job.get("tenant_id"))
+        logger.debug(f"Lock liberado para job_id={job_id}", extra={"job_id": job_id})
+    except Exception as unlock_error:
+        logger.error(f"Error liberando lock para job_id={job_id}: {str(unlock_error)}")
+
 @with_context(tenant=True, validate_tenant=False)
 @handle_errors(error_type="service", log_traceback=True)
-async def process_next_job(ctx: Context = None) -> bool:
+async def process_next_job(consumer_id: str, ctx: Context = None) -> bool:
     """
     Procesa el siguiente trabajo de la cola de ingesta.
     
-    Toma un trabajo de la cola, lo marca como en procesamiento, y
-    llama al método de procesamiento correspondiente según el tipo de trabajo.
+    Espera un trabajo de la cola, lo marca como en procesamiento, y
+    ejecuta de forma secuencial extracción, chunking y almacenamiento.
+    El pipeline concurrente de services.pipeline reutiliza las mismas
+    etapas para solapar el trabajo de varios documentos.
+    
+    Args:
+        consumer_id: Identificador del consumidor que extrae el trabajo
     
     Returns:
         bool: True si se procesó un trabajo, False si no había trabajos
@@ -407,237 +1008,66 @@ async def process_next_job(ctx: Context = None) -> bool:
     Raises:
         ServiceError: Si no hay un tenant válido en el contexto
     """
-    # Usar la constante JOB_LOCK_EXPIRY en lugar de un atributo que no existe en settings
-    job_lock_expire_seconds = JOB_LOCK_EXPIRY
+    job = await pop_next_job(consumer_id)
     
-    # Tomar el siguiente trabajo de la cola usando CacheManager.lpop
-    job_data = await CacheManager.lpop(
-        list_name=INGESTION_QUEUE
-    )
+    if not job:
+        return False  # No llegó ningún trabajo durante la espera
     
-    if not job_data:
-        return False  # No hay trabajos en la cola
-    
-    # Inicializar variables fuera del bloque try para usarlas en finally
-    job_id = None
-    tenant_id = None
-    document_id = None
-    lock_acquired = False
-    lock_key = None
+    job_id = job.get("job_id")
+    tenant_id = job.get("tenant_id") or (ctx.get_tenant_id() if ctx else None)
+    job["tenant_id"] = tenant_id
+    document_id = job.get("document_id")
     
     try:
-        # Parsear los datos del trabajo
-        job = json.loads(job_data)
-        job_id = job.get("job_id")
-        tenant_id = job.get("tenant_id")
-        document_id = job.get("document_id")
-        collection_id = job.get("collection_id")
-        file_key = job.get("file_key")  # Referencia a Supabase Storage
-        url = job.get("url")            # URL si es ingestión web
-        text_content = job.get("text_content")  # Contenido texto si es directo
-        
         # Propagar contexto del trabajo para logging y errores
         async with Context(
             tenant_id=tenant_id,
-            collection_id=collection_id
+            collection_id=job.get("collection_id")
         ):
-            # Crear contexto para logging y errores
-            context = {
-                "job_id": job_id,
-                "tenant_id": tenant_id,
-                "document_id": document_id,
-                "collection_id": collection_id
-            }
-            
-            # Validar que el tenant sea válido para procesar trabajos
-            if tenant_id is None:
-                tenant_id = ctx.get_tenant_id()
-            
-            # Adquirir un lock para este trabajo
-            lock_key = f"{JOB_LOCK_PREFIX}:{job_id}"
-            lock_acquired = await acquire_job_lock(job_id, tenant_id, JOB_LOCK_EXPIRY)
+            if not await prepare_job(job):
+                # Si otro worker tiene el lock consideramos el trabajo como procesado;
+                # si era inválido ya quedó marcado como fallido
+                return "error" not in job
             
-            if not lock_acquired:
-                logger.warning(
-                    f"Lock no adquirido para job_id={job_id}, otro worker podría estar procesándolo", 
-                    extra=context
-                )
-                return True  # Consideramos el trabajo como procesado y seguimos
-            
-            # Validar que tenemos la información necesaria según el tipo de fuente
-            source_type = None
-            if file_key:
-                source_type = "file"
-            elif url:
-                source_type = "url"
-            elif text_content:
-                source_type = "text"
-            else:
-                error_msg = "Fuente de documento no especificada (se requiere file_key, url o text_content)"
-                logger.error(error_msg, extra=context)
+            # Los archivos grandes se procesan por secciones sin cargarlos completos
+            if should_stream_job(job):
+                processing_stats = await process_job_streaming(job, ctx=ctx)
                 
-                await update_processing_job(
-                    job_id=job_id,
-                    tenant_id=tenant_id,
-                    status="failed",
-                    error=error_msg
-                )
+                # Una reingesta sin cambios no escribe chunks pero no es un fallo
+                if not processing_stats["chunks_total"]:
+                    logger.error(f"No se pudieron generar chunks para el documento {document_id}")
+                    await fail_job(job, "No se pudieron generar chunks para el documento")
+                    return False
                 
-                if document_id:
-                    await update_document_status(
-                        document_id=document_id,
-                        tenant_id=tenant_id,
-                        status="failed",
-                        metadata={"error": error_msg}
-                    )
-                    
-                # No lanzamos excepción para permitir que el finally libere el lock
-                return False
+                await complete_job(job, processing_stats["chunks_total"], processing_stats, ctx=ctx)
+                return True
             
-            context["source_type"] = source_type
-            
-            # Validar que tenemos la información básica necesaria
-            if not document_id or not collection_id:
-                missing = []
-                if not document_id:
-                    missing.append("document_id")
-                if not collection_id:
-                    missing.append("collection_id")
-                    
-                error_msg = f"Campos requeridos faltantes: {', '.join(missing)}"
-                logger.error(error_msg, extra=context)
-                
-                await update_processing_job(
-                    job_id=job_id,
-                    tenant_id=tenant_id,
-                    status="failed",
-                    error=error_msg
-                )
-                
-                if document_id:
-                    await update_document_status(
-                        document_id=document_id,
-                        tenant_id=tenant_id,
-                        status="failed",
-                        metadata={"error": error_msg}
-                    )
-                    
-                # No lanzamos excepción para permitir que el finally libere el lock
-                return False
-                
-            # Actualizar el estado del trabajo a "processing"
-            await update_processing_job(
-                job_id=job_id,
-                tenant_id=tenant_id,
-                status="processing"
-            )
-            
-            # Procesar según el tipo de fuente
-            processed_text = None
-            
-            if source_type == "file":
-                # Procesamiento de archivo almacenado con la función centralizada
-                processed_text = await process_file_from_storage(
-                    tenant_id=tenant_id,
-                    collection_id=collection_id,
-                    file_key=file_key,
-                    ctx=ctx
-                )
-            elif source_type == "url":
-                # Aquí iría el procesamiento para URL (pendiente de implementar)
-                raise ServiceError(
-                    message="Procesamiento de URL no implementado",
-                    error_code="NOT_IMPLEMENTED",
-                    status_code=501,
-                    context=context
-                )
-            elif source_type == "text":
-                # El texto ya está disponible - usar directamente split_text_with_llama_index en lugar de legacy
-                processed_text = text_content
+            processed_text = await extract_job_text(job, ctx=ctx)
                 
             # Verificar que tenemos texto procesado
             if not processed_text:
                 logger.error(f"No se pudo procesar el documento {document_id}")
-                await update_processing_job(
-                    job_id=job_id,
-                    tenant_id=tenant_id,
-                    status="failed",
-                    error="No se pudo extraer texto del documento",
-                    ctx=ctx
-                )
-                await update_document_status(
-                    document_id=document_id,
-                    tenant_id=tenant_id,
-                    status="failed",
-                    metadata={"error": "No se pudo extraer texto del documento"}
-                )
+                await fail_job(job, "No se pudo extraer texto del documento")
                 return False
 
-            # Dividir en chunks y generar embeddings
-            document_metadata = {
-                "tenant_id": tenant_id, 
-                "collection_id": collection_id,
-                "document_id": document_id,
-                "source_type": source_type,
-                "job_id": job_id
-            }
-            
-            logger.info(f"Dividiendo documento {document_id} en chunks")
             # Utilizar la función centralizada de chunking que ya está implementada
-            chunks = await split_text_with_llama_index(
-                text=processed_text, 
-                document_id=document_id, 
-                metadata=document_metadata, 
-                ctx=ctx
-            )
+            chunks = await chunk_job_text(job, processed_text, ctx=ctx)
             
             if not chunks:
                 logger.error(f"No se pudieron generar chunks para el documento {document_id}")
-                await update_processing_job(
-                    job_id=job_id,
-                    tenant_id=tenant_id,
-                    status="failed",
-                    error="No se pudieron generar chunks para el documento",
-                    ctx=ctx
-                )
-                await update_document_status(
-                    document_id=document_id,
-                    tenant_id=tenant_id,
-                    status="failed",
-                    metadata={"error": "No se pudieron generar chunks para el documento"}
-                )
+                await fail_job(job, "No se pudieron generar chunks para el documento")
                 return False
             
             logger.info(f"Almacenando {len(chunks)} chunks en vector store para documento {document_id}")
-            processing_stats = await store_chunks_in_vector_store(
+            processing_stats = await store_chunks_incremental(
                 chunks=chunks,
                 document_id=document_id,
                 tenant_id=tenant_id,
-                collection_id=collection_id,
-                ctx=ctx
-            )
-            
-            # Actualizar estado del documento y trabajo a completado
-            await update_document_status(
-                document_id=document_id,
-                tenant_id=tenant_id,
-                status="completed",
-                metadata={
-                    "chunks_count": len(chunks),
-                    "processing_stats": processing_stats
-                }
-            )
-            
-            await update_processing_job(
-                job_id=job_id,
-                tenant_id=tenant_id,
-                status="completed",
-                progress=100,
-                processing_stats=processing_stats,
+                collection_id=job["collection_id"],
                 ctx=ctx
             )
             
-            logger.info(f"Procesamiento completado para documento {document_id}")
+            await complete_job(job, len(chunks), processing_stats, ctx=ctx)
             return True
     except Exception as e:
         error_context = {
@@ -650,29 +1080,7 @@ async def process_next_job(ctx: Context = None) -> bool:
         logger.error(f"Error procesando trabajo: {str(e)}", extra=error_context, exc_info=True)
 
         try:
-            # Solo intentar actualizar si tenemos la información mínima necesaria
-            if job_id and tenant_id:
-                error_message = str(e)
-                
-                # Actualizar estado del trabajo a fallido
-                await update_processing_job(
-                    job_id=job_id,
-                    tenant_id=tenant_id,
-                    status="failed",
-                    error=error_message
-                )
-
-                # Actualizar estado del documento si tenemos el ID
-                if document_id:
-                    await update_document_status(
-                        document_id=document_id,
-                        tenant_id=tenant_id,
-                        status="failed",
-                        metadata={"error": error_message}
-                    )
-                    
-                # Limpiar recursos de caché asociados al trabajo
-                await _cleanup_job_resources(job_id, tenant_id)
+            await fail_job(job, str(e), cleanup=True)
         except Exception as cleanup_error:
             # Si falla la limpieza, solo registrarlo pero continuar
             logger.error(f"Error en limpieza tras fallo: {str(cleanup_error)}", 
@@ -682,15 +1090,7 @@ async def process_next_job(ctx: Context = None) -> bool:
         return False
     finally:
         # Garantizar que el lock se libere en cualquier circunstancia
-        if lock_acquired and lock_key:
-            try:
-                # Usar la función centralizada para liberar locks
-                await release_job_lock(job_id, tenant_id)
-                logger.debug(f"Lock liberado para job_id={job_id}", extra={"job_id": job_id})
-            except Exception as unlock_error:
-                logger.error(f"Error liberando lock para job_id={job_id}: {str(unlock_error)}")
-        else:
-            logger.debug(f"No se requiere liberar lock para job_id={job_id} (no adquirido)")
+        await finish_job(job)
 
 @with_context(tenant=True, validate_tenant=True)
 @handle_errors(error_type="service", log_traceback=True)
@@ -830,12 +1230,24 @@ async def retry_failed_job(job_id: str, tenant_id: str, ctx: Context = None) ->
             data=job_status
         )
         
-        # Añadir trabajo nuevamente a la cola
-        # TODO: Si se requiere lógica especial de push_to_list, migrar aquí. Usando CacheManager.rpush por ahora.
-        await CacheManager.get_instance().rpush(
-            list_name=INGESTION_QUEUE,
-            value=job_id
-        )
+        # Añadir trabajo nuevamente a la cola con sus datos completos (fuente incluida)
+        supabase = get_supabase_client()
+        result = await supabase.table(get_table_name("processing_jobs")) \
+            .select("*") \
+            .eq("job_id", job_id) \
+            .eq("tenant_id", tenant_id) \
+            .single() \
+            .execute()
+        
+        if not result.data:
+            raise ServiceError(
+                code=ErrorCode.NOT_FOUND,
+                message="Datos del trabajo no encontrados para reintentarlo"
+            )
+        
+        job_data = {**result.data, "status": "pending", "retries": job_status["retries"]}
+        job_data.pop("error", None)
+        await enqueue_job(job_data)
         logger.info(f"Trabajo {job_id} reintentado correctamente")
         return True
     except Exception as e:
@@ -0,0 +1,343 @@
+"""
+Escritura diferida (write-behind) de estados de trabajos y documentos.
+
+Cada trabajo actualiza varias veces su estado y el de su documento
+(processing, progreso, completed/failed). En lugar de una ida y vuelta a
+Supabase y una invalidación de caché por actualización, las actualizaciones
+se acumulan por trabajo y documento (la última gana campo a campo) y se
+escriben en bloque cada pocos cientos de milisegundos, o de inmediato cuando
+un trabajo llega a un estado final. La caché de documentos se invalida una
+sola vez por documento y volcado.
+
+Las filas que no se pueden escribir vuelven al buffer (sin pisar los campos
+más recientes) y se reintentan en el siguiente volcado. Una fila que falla en
+status_write_max_attempts volcados seguidos (p. ej. un valor que Postgres
+rechaza) se descarta con un error para no reintentarla indefinidamente. Un
+estado final solo se da por registrado cuando su fila se ha escrito.
+
+Con cadena de conexión Postgres configurada, cada tabla se actualiza con una
+única sentencia UPDATE ... FROM unnest(...) sobre el pool compartido; sin
+ella se recurre a una actualización por fila a través de Supabase.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from common.db.supabase import get_supabase_client
+from common.db.tables import get_table_name
+from common.cache import CacheManager
+
+from config.settings import get_settings
+from services.vector_writer import get_vector_pool
+
+logger = logging.getLogger(__name__)
+
+# Estados tras los que el trabajo no vuelve a cambiar: se escriben sin esperar
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+# Solo se admiten nombres de columna simples en las sentencias generadas
+_COLUMN_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+# Clave de una actualización pendiente: (tenant_id, id del recurso)
+PendingKey = Tuple[str, str]
+
+
+def _now_iso() -> str:
+    """Marca de tiempo UTC en formato ISO para columnas de fecha."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+class StatusWriteBuffer:
+    """
+    Buffer que agrupa las actualizaciones de estado y las vuelca por lotes.
+
+    Las tablas se identifican por su nombre lógico ("processing_jobs",
+    "documents") junto con la columna que identifica cada fila.
+    """
+
+    def __init__(self, flush_interval_ms: Optional[int] = None, max_batch_size: Optional[int] = None):
+        settings = get_settings()
+        self.flush_interval = (flush_interval_ms or settings.status_flush_interval_ms) / 1000
+        self.max_batch_size = max_batch_size or settings.status_flush_max_batch
+        self.max_attempts = settings.status_write_max_attempts
+
+        self._pending: Dict[str, Dict[PendingKey, Dict[str, Any]]] = {
+            "processing_jobs": {},
+            "documents": {}
+        }
+        self._id_columns = {"processing_jobs": "job_id", "documents": "document_id"}
+        # Volcados fallidos seguidos de cada fila pendiente
+        self._attempts: Dict[str, Dict[PendingKey, int]] = {table: {} for table in self._pending}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._metrics = {"updates": 0, "flushes": 0, "rows_written": 0, "failed_rows": 0, "dropped_rows": 0}
+
+    async def update_job(self, job_id: str, tenant_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        Registra una actualización de un trabajo de procesamiento.
+
+        Returns:
+            bool: False si un estado final no se pudo escribir (queda pendiente de reintento)
+        """
+        return await self._add("processing_jobs", job_id, tenant_id, fields)
+
+    async def update_document(self, document_id: str, tenant_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        Registra una actualización de un documento.
+
+        Returns:
+            bool: False si un estado final no se pudo escribir (queda pendiente de reintento)
+        """
+        return await self._add("documents", document_id, tenant_id, fields)
+
+    async def flush(self) -> int:
+        """
+        Escribe todas las actualizaciones pendientes.
+
+        Returns:
+            int: Número de filas escritas
+        """
+        written, _ = await self._flush()
+        return written
+
+    async def _flush(self) -> Tuple[int, Dict[str, List[PendingKey]]]:
+        """
+        Escribe lo pendiente y devuelve a la cola las filas que fallan.
+
+        Returns:
+            Tuple[int, Dict[str, List[PendingKey]]]: Filas escritas y claves
+            fallidas por tabla
+        """
+        async with self._flush_lock:
+            batches = {table: pending for table, pending in self._pending.items() if pending}
+            if not batches:
+                return 0, {}
+            self._pending = {table: {} for table in self._pending}
+
+            written = 0
+            failed: Dict[str, List[PendingKey]] = {}
+            for table, pending in batches.items():
+                items = list(pending.items())
+                for start in range(0, len(items), self.max_batch_size):
+                    for key, fields in await self._write(table, items[start:start + self.max_batch_size]):
+                        failed.setdefault(table, []).append(key)
+                        self._requeue(table, key, fields)
+                written += len(items) - len(failed.get(table, []))
+
+                failed_keys = set(failed.get(table, []))
+                for key in pending:
+                    if key not in failed_keys:
+                        self._attempts[table].pop(key, None)
+
+            # Una única invalidación por documento escrito y volcado
+            failed_documents = set(failed.get("documents", []))
+            await self._invalidate_documents([
+                key for key in batches.get("documents", {}) if key not in failed_documents
+            ])
+
+            self._metrics["flushes"] += 1
+            self._metrics["rows_written"] += written
+
+        if failed:
+            self._ensure_flusher()
+        return written, failed
+
+    async def close(self):
+        """Detiene el volcado periódico y escribe lo pendiente."""
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas del buffer de estados."""
+        return {
+            **self._metrics,
+            "pending_rows": sum(len(pending) for pending in self._pending.values())
+        }
+
+    async def _add(self, table: str, resource_id: str, tenant_id: str, fields: Dict[str, Any]) -> bool:
+        """Fusiona una actualización con las pendientes del mismo recurso."""
+        key = (str(tenant_id), str(resource_id))
+        self._pending[table].setdefault(key, {}).update(fields)
+        self._metrics["updates"] += 1
+
+        if fields.get("status") in TERMINAL_STATUSES:
+            # Los estados finales se escriben ya: el trabajo deja de producir cambios
+            _, failed = await self._flush()
+            return key not in failed.get(table, []) and key not in self._pending[table]
+
+        self._ensure_flusher()
+        return True
+
+    def _requeue(self, table: str, key: PendingKey, fields: Dict[str, Any]):
+        """
+        Devuelve una fila fallida al buffer sin pisar campos más recientes, o la
+        descarta si ya ha fallado en max_attempts volcados.
+        """
+        attempts = self._attempts[table].get(key, 0) + 1
+        if attempts >= self.max_attempts:
+            self._attempts[table].pop(key, None)
+            self._metrics["dropped_rows"] += 1
+            logger.error(
+                f"Descartada la actualización de {table} {key[1]} tras {attempts} intentos fallidos: "
+                f"{json.dumps(fields, default=str)}"
+            )
+            return
+
+        self._attempts[table][key] = attempts
+        newer = self._pending[table].get(key, {})
+        self._pending[table][key] = {**fields, **newer}
+
+    def _ensure_flusher(self):
+        """Arranca el volcado periódico si no está en marcha."""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """Vuelca periódicamente mientras haya actualizaciones pendientes."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error volcando estados pendientes: {str(e)}")
+
+            if not any(self._pending.values()):
+                return
+
+    async def _write(
+        self,
+        table: str,
+        items: List[Tuple[PendingKey, Dict[str, Any]]]
+    ) -> List[Tuple[PendingKey, Dict[str, Any]]]:
+        """
+        Escribe un lote de una tabla en bloque, o fila a fila si no hay pool.
+
+        Las filas con nombres de columna que no se pueden interpolar en la
+        sentencia generada se escriben siempre fila a fila.
+
+        Returns:
+            List[Tuple[PendingKey, Dict[str, Any]]]: Filas que no se pudieron escribir
+        """
+        if not get_settings().supabase_connection_string:
+            return await self._write_rows(table, items)
+
+        bulk, rows = [], []
+        for item in items:
+            invalid = [column for column in item[1] if not _COLUMN_RE.match(column)]
+            if invalid:
+                logger.warning(
+                    f"Columnas no admitidas en la escritura en bloque de {table} {item[0][1]} "
+                    f"({', '.join(invalid)}): se escribe por filas"
+                )
+                rows.append(item)
+            else:
+                bulk.append(item)
+
+        if bulk:
+            try:
+                await self._write_bulk(table, bulk)
+            except Exception as e:
+                logger.warning(f"Error en la escritura en bloque de {table}, reintentando por filas: {str(e)}")
+                rows.extend(bulk)
+
+        return await self._write_rows(table, rows) if rows else []
+
+    async def _write_bulk(self, table: str, items: List[Tuple[PendingKey, Dict[str, Any]]]) -> int:
+        """
+        Actualiza todas las filas del lote con una sola sentencia.
+
+        jsonb_populate_record combina la fila actual con los campos recibidos,
+        de modo que cada fila conserva los valores de las columnas que no cambia.
+        Los nombres de columna ya se han validado en _write.
+        """
+        columns = sorted({column for _, fields in items for column in fields})
+        if not columns:
+            return 0
+
+        id_column = self._id_columns[table]
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        record_list = ", ".join(f'r."{column}"' for column in columns)
+        sql = f"""
+            UPDATE {get_table_name(table)} AS t
+            SET ({column_list}) = (SELECT {record_list} FROM jsonb_populate_record(t, u.data) AS r)
+            FROM unnest($1::text[], $2::text[], $3::jsonb[]) AS u(resource_id, tenant_id, data)
+            WHERE t."{id_column}"::text = u.resource_id AND t.tenant_id::text = u.tenant_id
+        """
+
+        pool = await get_vector_pool()
+        async with pool.acquire() as connection:
+            await connection.execute(
+                sql,
+                [resource_id for (_, resource_id), _ in items],
+                [tenant_id for (tenant_id, _), _ in items],
+                [json.dumps(fields, default=str) for _, fields in items]
+            )
+        return len(items)
+
+    async def _write_rows(
+        self,
+        table: str,
+        items: List[Tuple[PendingKey, Dict[str, Any]]]
+    ) -> List[Tuple[PendingKey, Dict[str, Any]]]:
+        """Actualiza las filas una a una a través de Supabase y devuelve las fallidas."""
+        supabase = get_supabase_client()
+        id_column = self._id_columns[table]
+        failed = []
+
+        for (tenant_id, resource_id), fields in items:
+            try:
+                result = await supabase.table(get_table_name(table)) \
+                    .update(fields) \
+                    .eq(id_column, resource_id) \
+                    .eq("tenant_id", tenant_id) \
+                    .execute()
+
+                if result.error:
+                    raise RuntimeError(result.error)
+            except Exception as e:
+                self._metrics["failed_rows"] += 1
+                logger.error(f"Error actualizando {table} {resource_id}, se reintentará: {str(e)}")
+                failed.append(((tenant_id, resource_id), fields))
+
+        return failed
+
+    async def _invalidate_documents(self, keys: List[PendingKey]):
+        """Invalida la caché de los documentos escritos en un volcado."""
+        async def invalidate(tenant_id: str, document_id: str):
+            try:
+                await CacheManager.invalidate(
+                    data_type="document",
+                    resource_id=document_id,
+                    tenant_id=tenant_id
+                )
+            except Exception as cache_error:
+                logger.warning(f"Error invalidando caché para documento {document_id}: {str(cache_error)}")
+
+        await asyncio.gather(*(invalidate(tenant_id, document_id) for tenant_id, document_id in keys))
+
+
+# Instancia compartida del buffer
+_writer: Optional[StatusWriteBuffer] = None
+
+
+def get_status_writer() -> StatusWriteBuffer:
+    """Obtiene la instancia compartida del buffer de estados."""
+    global _writer
+    if _writer is None:
+        _writer = StatusWriteBuffer()
+    return _writer
+
+
+async def shutdown_status_writer():
+    """Escribe los estados pendientes y libera el buffer compartido."""
+    global _writer
+    if _writer:
+        await _writer.close()
+        _writer = None
@@ -9,10 +9,13 @@ Este módulo proporciona funciones centralizadas para:
 - Descarga de archivos desde Storage
 """
 
+import json
 import logging
 import os
 import tempfile
+import time
 import uuid
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional, List, Tuple
 # Definir nuestra propia clase StorageException ya que la importación de supabase.storage no está disponible
 class StorageException(Exception):
@@ -30,8 +33,14 @@ from common.cache import (
 )
 from common.context import with_context, Context
 
+from config.settings import get_settings
+from services.status_writer import get_status_writer
+
 logger = logging.getLogger(__name__)
 
+# Hashes de contenido por consulta al buscar vectores ya almacenados
+EMBEDDING_LOOKUP_BATCH = 200
+
 @with_context(tenant=True)
 @handle_errors(error_type="service", log_traceback=True)
 async def update_document_status(
@@ -66,6 +75,10 @@ async def update_document_status(
                 if key not in ["document_id", "tenant_id"]:
                     update_data[key] = value
         
+        # Escritura diferida: se agrupa con otras actualizaciones y se invalida al volcar
+        if get_settings().status_write_behind_enabled:
+            return await get_status_writer().update_document(document_id, tenant_id, update_data)
+        
         # Actualizar estado
         result = await supabase.table(get_table_name("documents")) \
             .update(update_data) \
@@ -140,6 +153,25 @@ async def update_processing_job(
         if status in ["completed", "failed", "cancelled"]:
             update_data["completion_time"] = "NOW()"
         
+        if get_settings().status_write_behind_enabled:
+            writer = get_status_writer()
+            if "completion_time" in update_data:
+                # Un estado final solo se da por registrado (y se publica en
+                # caché) cuando su fila está escrita; si falla queda en el
+                # buffer para reintentarse
+                update_data["completion_time"] = datetime.now(timezone.utc).isoformat()
+                if not await writer.update_job(job_id, tenant_id, update_data):
+                    logger.error(f"Estado final {status} del trabajo {job_id} pendiente de escritura")
+                    return False
+                await _cache_job_status(job_id, tenant_id, status, progress, error, processing_stats)
+                return True
+            
+            # La caché se actualiza ya para que get_job_status vea el estado al momento;
+            # la escritura en Supabase se agrupa con las demás actualizaciones
+            await _cache_job_status(job_id, tenant_id, status, progress, error, processing_stats)
+            await writer.update_job(job_id, tenant_id, update_data)
+            return True
+        
         # Actualizar estado
         result = await supabase.table(get_table_name("processing_jobs")) \
             .update(update_data) \
@@ -152,24 +184,7 @@ async def update_processing_job(
             return False
         
         # Actualizar caché para futura referencia rápida
-        try:
-            # Usar CacheManager directamente
-            await CacheManager.set(
-                data_type="job_status",
-                resource_id=str(job_id),
-                value={
-                    "status": status,
-                    "progress": progress,
-                    "error": error,
-                    "stats": processing_stats
-                },
-                tenant_id=tenant_id,
-                ttl=24*60*60  # 24 horas (en segundos)
-            )
-            
-        except Exception as cache_error:
-            # No fallar si hay error de caché, solo registrar
-            logger.warning(f"Error actualizando caché para trabajo {job_id}: {str(cache_error)}")
+        await _cache_job_status(job_id, tenant_id, status, progress, error, processing_stats)
             
         return True
         
@@ -177,6 +192,34 @@ async def update_processing_job(
         logger.error(f"Error actualizando estado del trabajo: {str(e)}")
         return False
 
+async def _cache_job_status(
+    job_id: str,
+    tenant_id: str,
+    status: str,
+    progress: Optional[float],
+    error: Optional[str],
+    processing_stats: Optional[Dict[str, Any]]
+) -> None:
+    """Guarda el último estado de un trabajo en caché."""
+    try:
+        # Usar CacheManager directamente
+        await CacheManager.set(
+            data_type="job_status",
+            resource_id=str(job_id),
+            value={
+                "status": status,
+                "progress": progress,
+                "error": error,
+                "stats": processing_stats
+            },
+            tenant_id=tenant_id,
+            ttl=24*60*60  # 24 horas (en segundos)
+        )
+        
+    except Exception as cache_error:
+        # No fallar si hay error de caché, solo registrar
+        logger.warning(f"Error actualizando caché para trabajo {job_id}: {str(cache_error)}")
+
 @with_context(tenant=True)
 @handle_errors(error_type="service", log_traceback=False, convert_exceptions=False)
 async def invalidate_vector_store_cache(tenant_id: str, collection_id: str, ctx: Context = None) -> bool:
@@ -220,6 +263,30 @@ async def invalidate_vector_store_cache(tenant_id: str, collection_id: str, ctx:
         logger.error(f"Error en invalidación coordinada: {str(e)}")
         return False
 
+async def mark_collection_updated(tenant_id: str, collection_id: str):
+    """
+    Renueva la versión de una colección en la caché centralizada.
+    
+    El query-service compara esta versión con la de las respuestas de su
+    caché semántica y descarta las de colecciones modificadas.
+    
+    Args:
+        tenant_id: ID del tenant
+        collection_id: ID de la colección modificada
+    """
+    if not collection_id:
+        return
+    try:
+        await CacheManager.set(
+            data_type="collection_version",
+            resource_id=collection_id,
+            value=str(time.time()),
+            tenant_id=tenant_id,
+            ttl=CacheManager.ttl_extended
+        )
+    except Exception as e:
+        logger.warning(f"Error renovando versión de la colección {collection_id}: {str(e)}")
+
 @with_context(tenant=True)
 @handle_errors(error_type="service", log_traceback=True)
 async def get_document_with_cache(document_id: str, tenant_id: str, ctx: Context = None) -> Optional[Dict[str, Any]]:
@@ -413,3 +480,253 @@ async def download_file_from_storage(
         ctx.add_metric("file_cache_metrics", metrics)
     
     return file_path
+
+@with_context(tenant=True)
+@handle_errors(error_type="service", log_traceback=True)
+async def get_document_chunk_manifest(
+    document_id: str,
+    tenant_id: str,
+    collection_id: str,
+    ctx: Context = None
+) -> Dict[str, str]:
+    """
+    Obtiene el hash de contenido de cada chunk almacenado de un documento.
+    
+    El manifiesto se mantiene en caché tras cada almacenamiento y, si no está
+    disponible, se reconstruye a partir de los metadatos de document_chunks.
+    
+    Args:
+        document_id: ID del documento
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        ctx: Contexto de la operación
+        
+    Returns:
+        Dict[str, str]: Hash de contenido por chunk_id (vacío si no hay chunks)
+    """
+    async def fetch_manifest_from_db(resource_id, tenant_id, ctx=None):
+        try:
+            supabase = get_supabase_client()
+            result = await supabase.table(get_table_name("document_chunks")) \
+                .select("metadata") \
+                .eq("tenant_id", tenant_id) \
+                .eq("collection_id", collection_id) \
+                .filter("metadata->>document_id", "eq", document_id) \
+                .execute()
+                
+            if result.error:
+                logger.error(f"Error obteniendo chunks del documento: {result.error}")
+                return None
+            
+            manifest = {}
+            for row in result.data or []:
+                metadata = row.get("metadata") or {}
+                if metadata.get("chunk_id") and metadata.get("content_hash"):
+                    manifest[metadata["chunk_id"]] = metadata["content_hash"]
+            return manifest or None
+        except Exception as e:
+            logger.error(f"Error obteniendo manifiesto de chunks de Supabase: {str(e)}")
+            return None
+    
+    manifest, metrics = await get_with_cache_aside(
+        data_type="document_manifest",
+        resource_id=document_id,
+        tenant_id=tenant_id,
+        fetch_from_db_func=fetch_manifest_from_db,
+        generate_func=None,
+        ctx=ctx
+    )
+    
+    if ctx:
+        ctx.add_metric("document_manifest_cache_metrics", metrics)
+    
+    return manifest or {}
+
+async def save_document_chunk_manifest(
+    document_id: str,
+    tenant_id: str,
+    manifest: Dict[str, str]
+) -> None:
+    """
+    Guarda en caché el manifiesto de chunks de un documento.
+    
+    Args:
+        document_id: ID del documento
+        tenant_id: ID del tenant
+        manifest: Hash de contenido por chunk_id
+    """
+    try:
+        await CacheManager.set(
+            data_type="document_manifest",
+            resource_id=document_id,
+            value=manifest,
+            tenant_id=tenant_id,
+            ttl=CacheManager.ttl_extended
+        )
+    except Exception as cache_error:
+        logger.warning(f"Error guardando manifiesto de chunks para documento {document_id}: {str(cache_error)}")
+
+async def get_document_chunk_embeddings(
+    document_id: str,
+    tenant_id: str,
+    collection_id: str,
+    chunk_ids: List[str]
+) -> Dict[str, List[float]]:
+    """
+    Obtiene los vectores almacenados de chunks concretos de un documento.
+    
+    Permite reescribir un chunk desplazado con el vector que ya tenía su
+    contenido en lugar de volver a embeberlo. Los vectores se indexan por el
+    hash de contenido de la fila: si la fila ya se reescribió con otro
+    contenido su vector no se confunde con el buscado.
+    
+    Args:
+        document_id: ID del documento
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        chunk_ids: IDs de los chunks almacenados
+        
+    Returns:
+        Dict[str, List[float]]: Vector por hash de contenido (vacío si falla la consulta)
+    """
+    if not chunk_ids:
+        return {}
+    
+    try:
+        supabase = get_supabase_client()
+        result = await supabase.table(get_table_name("document_chunks")) \
+            .select("metadata, embedding") \
+            .eq("tenant_id", tenant_id) \
+            .eq("collection_id", collection_id) \
+            .filter("metadata->>document_id", "eq", document_id) \
+            .in_("metadata->>chunk_id", chunk_ids) \
+            .execute()
+        
+        if result.error:
+            logger.warning(f"Error obteniendo vectores de chunks del documento {document_id}: {result.error}")
+            return {}
+    except Exception as e:
+        logger.warning(f"Error obteniendo vectores de chunks del documento {document_id}: {str(e)}")
+        return {}
+    
+    return _embeddings_by_hash(result.data)
+
+async def get_collection_embeddings_by_hash(
+    tenant_id: str,
+    collection_id: str,
+    content_hashes: List[str],
+    embedding_model: str
+) -> Dict[str, List[float]]:
+    """
+    Obtiene los vectores ya almacenados en una colección para unos contenidos.
+    
+    Un chunk con el mismo hash de contenido y el mismo modelo que otro ya
+    almacenado en la colección (de cualquier documento) reutiliza su vector.
+    Los hashes se consultan por lotes, con una sola consulta por lote.
+    
+    Args:
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        content_hashes: Hashes de contenido buscados
+        embedding_model: Modelo de embeddings (los vectores no son intercambiables entre modelos)
+        
+    Returns:
+        Dict[str, List[float]]: Vector por hash de contenido (vacío si falla la consulta)
+    """
+    embeddings: Dict[str, List[float]] = {}
+    supabase = get_supabase_client()
+    for start in range(0, len(content_hashes), EMBEDDING_LOOKUP_BATCH):
+        batch = content_hashes[start:start + EMBEDDING_LOOKUP_BATCH]
+        try:
+            result = await supabase.table(get_table_name("document_chunks")) \
+                .select("metadata, embedding") \
+                .eq("tenant_id", tenant_id) \
+                .eq("collection_id", collection_id) \
+                .filter("metadata->>embedding_model", "eq", embedding_model) \
+                .in_("metadata->>content_hash", batch) \
+                .execute()
+            
+            if result.error:
+                logger.warning(f"Error buscando vectores por contenido en la colección {collection_id}: {result.error}")
+                return embeddings
+        except Exception as e:
+            logger.warning(f"Error buscando vectores por contenido en la colección {collection_id}: {str(e)}")
+            return embeddings
+        
+        embeddings.update(_embeddings_by_hash(result.data))
+    return embeddings
+
+def _embeddings_by_hash(rows: Optional[List[Dict[str, Any]]]) -> Dict[str, List[float]]:
+    """Vector de cada fila de document_chunks por su hash de contenido."""
+    embeddings = {}
+    for row in rows or []:
+        content_hash = (row.get("metadata") or {}).get("content_hash")
+        embedding = row.get("embedding")
+        # PostgREST devuelve las columnas vector como texto "[x, y, ...]"
+        if isinstance(embedding, str):
+            embedding = json.loads(embedding)
+        if content_hash and embedding:
+            embeddings.setdefault(content_hash, embedding)
+    return embeddings
+
+@with_context(tenant=True)
+@handle_errors(error_type="service", log_traceback=True)
+async def delete_document_chunks(
+    document_id: str,
+    tenant_id: str,
+    collection_id: str,
+    chunk_ids: List[str],
+    ctx: Context = None
+) -> int:
+    """
+    Elimina chunks concretos de un documento y sus entradas de caché.
+    
+    Args:
+        document_id: ID del documento
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        chunk_ids: IDs de los chunks a eliminar
+        ctx: Contexto de la operación
+        
+    Returns:
+        int: Número de chunks solicitados para eliminar
+    """
+    if not chunk_ids:
+        return 0
+    
+    supabase = get_supabase_client()
+    result = await supabase.table(get_table_name("document_chunks")) \
+        .delete() \
+        .eq("tenant_id", tenant_id) \
+        .eq("collection_id", collection_id) \
+        .filter("metadata->>document_id", "eq", document_id) \
+        .in_("metadata->>chunk_id", chunk_ids) \
+        .execute()
+        
+    if result.error:
+        raise ServiceError(
+            message=f"Error eliminando chunks del documento: {result.error}",
+            error_code=ErrorCode.VECTOR_STORE_ERROR,
+            details={"document_id": document_id, "chunks_count": len(chunk_ids)}
+        )
+    
+    await invalidate_chunk_cache(tenant_id, chunk_ids)
+    return len(chunk_ids)
+
+async def invalidate_chunk_cache(tenant_id: str, chunk_ids: List[str]) -> None:
+    """
+    Invalida únicamente las entradas de caché de los chunks indicados.
+    
+    Args:
+        tenant_id: ID del tenant
+        chunk_ids: IDs de los chunks modificados o eliminados
+    """
+    for chunk_id in chunk_ids:
+        try:
+            await CacheManager.invalidate(
+                data_type="chunk",
+                resource_id=chunk_id,
+                tenant_id=tenant_id
+            )
+        except Exception as cache_error:
+            logger.warning(f"Error invalidando caché del chunk {chunk_id}: {str(cache_error)}")
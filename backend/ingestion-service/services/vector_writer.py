@@ -0,0 +1,147 @@
+"""
+Escritura masiva de chunks con embeddings en la tabla document_chunks.
+
+Sustituye la construcción de un documento de LlamaIndex por chunk y la
+creación de un SupabaseVectorStore por llamada: los chunks se escriben con
+un único INSERT ... ON CONFLICT por lote (columnas pasadas como arrays y
+expandidas con unnest) sobre un pool de conexiones Postgres compartido, de
+modo que miles de chunks requieren unas pocas idas y vueltas.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+import asyncpg
+
+from common.db.tables import get_table_name
+from common.errors import ServiceError, ErrorCode
+
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Pool de conexiones compartido por el proceso
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+
+# Sentencia de upsert por tabla, construida una sola vez
+_upsert_sql: Dict[str, str] = {}
+
+
+async def get_vector_pool() -> asyncpg.Pool:
+    """
+    Obtiene el pool de conexiones a Postgres, creándolo la primera vez.
+
+    Returns:
+        asyncpg.Pool: Pool de conexiones compartido
+
+    Raises:
+        ServiceError: Si no hay cadena de conexión configurada
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    async with _pool_lock:
+        if _pool is None:
+            settings = get_settings()
+            if not settings.supabase_connection_string:
+                raise ServiceError(
+                    message="No hay cadena de conexión a Postgres configurada para la escritura vectorial",
+                    error_code=ErrorCode.VECTOR_STORE_ERROR
+                )
+
+            _pool = await asyncpg.create_pool(
+                dsn=settings.supabase_connection_string,
+                min_size=settings.vector_db_pool_min_size,
+                max_size=settings.vector_db_pool_max_size
+            )
+            logger.info(
+                f"Pool de conexiones vectoriales creado "
+                f"({settings.vector_db_pool_min_size}-{settings.vector_db_pool_max_size} conexiones)"
+            )
+    return _pool
+
+
+async def close_vector_pool():
+    """Cierra el pool de conexiones compartido."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _get_upsert_sql() -> str:
+    """Sentencia INSERT ... ON CONFLICT para un lote de chunks de un documento."""
+    table = get_table_name("document_chunks")
+    if table not in _upsert_sql:
+        _upsert_sql[table] = f"""
+            INSERT INTO {table}
+                (tenant_id, collection_id, document_id, chunk_index, content, embedding, metadata)
+            SELECT $1::uuid, $2::uuid, $3::text, t.chunk_index, t.content, t.embedding::vector, t.metadata::jsonb
+            FROM unnest($4::int[], $5::text[], $6::text[], $7::text[])
+                AS t(chunk_index, content, embedding, metadata)
+            ON CONFLICT (collection_id, document_id, chunk_index) DO UPDATE SET
+                content = EXCLUDED.content,
+                embedding = EXCLUDED.embedding,
+                metadata = EXCLUDED.metadata,
+                updated_at = now()
+        """
+    return _upsert_sql[table]
+
+
+def _chunk_index(chunk: Dict[str, Any], position: int) -> int:
+    """Índice del chunk dentro del documento según sus metadatos o su posición."""
+    index = (chunk.get("metadata") or {}).get("chunk_index")
+    return int(index) if index is not None else position
+
+
+async def bulk_upsert_chunks(
+    chunks: List[Dict[str, Any]],
+    tenant_id: str,
+    collection_id: str,
+    document_id: str,
+    batch_size: Optional[int] = None
+) -> int:
+    """
+    Escribe o actualiza chunks con embedding en document_chunks por lotes.
+
+    Todos los lotes de una llamada se escriben en una única transacción, así
+    que un documento no queda a medio escribir si falla un lote.
+
+    Args:
+        chunks: Chunks con texto, embedding y metadatos
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        document_id: ID del documento
+        batch_size: Chunks por sentencia
+
+    Returns:
+        int: Número de chunks escritos
+    """
+    if not chunks:
+        return 0
+
+    batch_size = batch_size or get_settings().vector_write_batch_size
+    sql = _get_upsert_sql()
+    pool = await get_vector_pool()
+
+    async with pool.acquire() as connection:
+        async with connection.transaction():
+            for start in range(0, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
+                await connection.execute(
+                    sql,
+                    tenant_id,
+                    collection_id,
+                    document_id,
+                    [_chunk_index(chunk, start + i) for i, chunk in enumerate(batch)],
+                    [chunk["text"] for chunk in batch],
+                    # pgvector acepta la representación textual '[x, y, ...]'
+                    [json.dumps(chunk["embedding"]) for chunk in batch],
+                    [json.dumps(chunk.get("metadata") or {}) for chunk in batch]
+                )
+
+    return len(chunks)
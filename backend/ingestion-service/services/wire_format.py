@@ -0,0 +1,60 @@
+"""
+Formato binario compacto de las respuestas del servicio de embeddings.
+
+Con la cabecera X-Embedding-Format el servicio de embeddings devuelve los
+vectores del lote en un único bloque base64 de floats little-endian
+(embeddings_b64) en lugar de un array JSON por vector: ocupa de 4 a 8 veces
+menos y se decodifica con NumPy sin parsear floats uno a uno.
+"""
+
+import base64
+from typing import Dict, Any, List
+
+import numpy as np
+
+from common.errors import EmbeddingGenerationError
+
+from config.settings import get_settings
+
+# Cabecera con la que se pide el formato binario
+EMBEDDING_FORMAT_HEADER = "X-Embedding-Format"
+
+# Formatos admitidos y su tipo NumPy little-endian
+SUPPORTED_FORMATS = {
+    "float32": "<f4",
+    "float16": "<f2"
+}
+
+
+def embedding_format_headers() -> Dict[str, str]:
+    """Cabeceras para pedir el formato binario configurado (vacías si es JSON)."""
+    embedding_format = get_settings().embedding_wire_format
+    if embedding_format in SUPPORTED_FORMATS:
+        return {EMBEDDING_FORMAT_HEADER: embedding_format}
+    return {}
+
+
+def decode_embeddings(response: Dict[str, Any]) -> List[List[float]]:
+    """
+    Vectores de una respuesta del servicio de embeddings en cualquiera de sus formatos.
+
+    Args:
+        response: Cuerpo de la respuesta (embeddings o embeddings_b64 + embedding_format)
+
+    Returns:
+        List[List[float]]: Un vector por texto
+    """
+    encoded = response.get("embeddings_b64")
+    if not encoded:
+        return response.get("embeddings") or []
+
+    embedding_format = response.get("embedding_format") or "float32"
+    dimensions = response.get("dimensions")
+    if embedding_format not in SUPPORTED_FORMATS or not dimensions:
+        raise EmbeddingGenerationError(
+            message=f"Respuesta binaria de embeddings no interpretable ({embedding_format})",
+            details={"embedding_format": embedding_format, "dimensions": dimensions}
+        )
+
+    vectors = np.frombuffer(base64.b64decode(encoded), dtype=SUPPORTED_FORMATS[embedding_format])
+    return vectors.astype(np.float32).reshape(-1, int(dimensions)).tolist()
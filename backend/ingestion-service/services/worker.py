@@ -5,7 +5,7 @@ import asyncio
 import logging
 import signal
 import time
-from typing import Set, Dict, Any
+from typing import Set, Dict, Any, Optional
 
 from common.errors import handle_errors, ServiceError, ErrorCode
 from common.context import with_context, Context
@@ -13,26 +13,26 @@ from config.settings import get_settings
 from config.constants import MAX_WORKERS, TIME_INTERVALS
 
 from .queue import process_next_job, initialize_queue, shutdown_queue
+from .pipeline import IngestionPipeline
+from .job_queue import get_job_queue
 
 logger = logging.getLogger(__name__)
 
 # Control de estado
 running = False
 workers: Set[asyncio.Task] = set()
+pipeline: Optional[IngestionPipeline] = None
 
 @handle_errors(error_type="service", log_traceback=True)
 async def worker_process(worker_id: int):
     """Proceso worker individual que procesa trabajos de la cola."""
     logger.info(f"Worker {worker_id} iniciado")
+    consumer_id = get_job_queue().consumer_id(f"worker-{worker_id}")
     
     while running:
         try:
-            # Intentar procesar el siguiente trabajo
-            job_processed = await process_next_job()
-            
-            if not job_processed:
-                # Si no hay trabajos, esperar un poco
-                await asyncio.sleep(1)
+            # Espera bloqueante en la cola: no hace falta dormir si no hay trabajos
+            await process_next_job(consumer_id)
         except Exception as e:
             logger.error(f"Error en worker {worker_id}: {str(e)}", exc_info=True)
             await asyncio.sleep(5)  # Esperar más tiempo si hay error
@@ -41,8 +41,13 @@ async def worker_process(worker_id: int):
 
 @handle_errors(error_type="service", log_traceback=True)
 async def start_worker_pool(num_workers: int = 3):
-    """Inicia un pool de workers para procesar trabajos."""
-    global running, workers
+    """
+    Inicia un pool de workers para procesar trabajos.
+    
+    Si el pipeline por etapas está habilitado en la configuración, se inicia
+    el pipeline con sus propios workers por etapa en lugar de workers secuenciales.
+    """
+    global running, workers, pipeline
     
     if running:
         logger.warning("Worker pool ya está en ejecución")
@@ -55,6 +60,11 @@ async def start_worker_pool(num_workers: int = 3):
     
     running = True
     
+    if get_settings().pipeline_enabled:
+        pipeline = IngestionPipeline()
+        await pipeline.start()
+        return
+    
     # Crear workers
     for i in range(num_workers):
         task = asyncio.create_task(worker_process(i+1))
@@ -67,13 +77,18 @@ async def start_worker_pool(num_workers: int = 3):
 @handle_errors(error_type="service", log_traceback=True)
 async def stop_worker_pool():
     """Detiene el pool de workers."""
-    global running, workers
+    global running, workers, pipeline
     
     if not running:
         return
     
     running = False
     
+    # Detener el pipeline esperando a que terminen los trabajos en curso
+    if pipeline:
+        await pipeline.stop()
+        pipeline = None
+    
     # Esperar a que todos los workers terminen
     if workers:
         logger.info(f"Esperando a que {len(workers)} workers terminen...")
@@ -83,3 +98,13 @@ async def stop_worker_pool():
     await shutdown_queue()
     
     logger.info("Worker pool detenido")
+
+
+def get_pipeline_stats() -> Optional[Dict[str, Any]]:
+    """
+    Obtiene las métricas del pipeline por etapas si está en ejecución.
+    
+    Returns:
+        Optional[Dict[str, Any]]: Métricas del pipeline o None si no está activo
+    """
+    return pipeline.get_stats() if pipeline else None
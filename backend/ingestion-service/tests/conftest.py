@@ -0,0 +1,13 @@
+"""
+Configuración común de las pruebas del Ingestion Service.
+
+Las pruebas importan los módulos del servicio como lo hace main.py, desde la
+raíz del servicio.
+"""
+
+import sys
+from pathlib import Path
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+if str(SERVICE_ROOT) not in sys.path:
+    sys.path.insert(0, str(SERVICE_ROOT))
@@ -0,0 +1,146 @@
+"""Pruebas del índice de contenido y de la comparación de chunks por hash."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import deduplication
+from services.deduplication import build_chunk_manifest, compute_chunk_hash, diff_chunks
+
+
+class FakeRedis:
+    """Subconjunto de Redis usado por el índice de documentos."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, xx=False, ex=None):
+        if (nx and key in self.data) or (xx and key not in self.data):
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = FakeRedis()
+
+    async def get_redis_client():
+        return client
+
+    settings = SimpleNamespace(dedup_enabled=True, dedup_index_ttl=60)
+    monkeypatch.setattr(deduplication, "get_redis_client", get_redis_client)
+    monkeypatch.setattr(deduplication, "get_settings", lambda: settings)
+    return client
+
+
+def _chunks(texts, document_id="doc-1"):
+    return [{"id": f"{document_id}_{i}", "text": text, "metadata": {}} for i, text in enumerate(texts)]
+
+
+def test_compute_chunk_hash_ignores_whitespace():
+    assert compute_chunk_hash("uno  dos\n tres ") == compute_chunk_hash("uno dos tres")
+    assert compute_chunk_hash("uno dos") != compute_chunk_hash("uno tres")
+
+
+def test_unchanged_document_has_nothing_to_store():
+    chunks = _chunks(["a", "b", "c"])
+    changed, moved, removed = diff_chunks(build_chunk_manifest(chunks), chunks)
+    assert (changed, moved, removed) == ([], {}, [])
+
+
+def test_without_previous_version_everything_changes():
+    chunks = _chunks(["a", "b"])
+    changed, moved, removed = diff_chunks({}, chunks)
+    assert changed == chunks
+    assert (moved, removed) == ({}, [])
+
+
+def test_edited_chunk_is_the_only_change():
+    previous = build_chunk_manifest(_chunks(["a", "b", "c"]))
+    chunks = _chunks(["a", "b editado", "c"])
+    changed, moved, removed = diff_chunks(previous, chunks)
+
+    assert [chunk["id"] for chunk in changed] == ["doc-1_1"]
+    assert (moved, removed) == ({}, [])
+
+
+def test_inserted_chunk_shifts_the_rest_without_re_embedding():
+    previous = build_chunk_manifest(_chunks(["a", "b", "c"]))
+    chunks = _chunks(["nuevo", "a", "b", "c"])
+    changed, moved, removed = diff_chunks(previous, chunks)
+
+    assert [chunk["id"] for chunk in changed] == ["doc-1_0"]
+    assert moved == {"doc-1_1": "doc-1_0", "doc-1_2": "doc-1_1", "doc-1_3": "doc-1_2"}
+    assert removed == []
+
+
+def test_deleted_chunks_are_reported_as_removed():
+    previous = build_chunk_manifest(_chunks(["a", "b", "c", "d"]))
+    chunks = _chunks(["b", "c"])
+    changed, moved, removed = diff_chunks(previous, chunks)
+
+    assert changed == []
+    assert moved == {"doc-1_0": "doc-1_1", "doc-1_1": "doc-1_2"}
+    assert removed == ["doc-1_2", "doc-1_3"]
+
+
+def test_duplicate_content_prefers_same_id_then_nearest():
+    previous = build_chunk_manifest(_chunks(["x", "a", "x", "b", "x"]))
+
+    # Mismo id con el mismo contenido: sin cambios
+    changed, moved, _ = diff_chunks(previous, _chunks(["x", "a", "x", "b", "x"]))
+    assert (changed, moved) == ([], {})
+
+    # Desplazados: cada uno toma el vector del almacenado más cercano
+    changed, moved, removed = diff_chunks(previous, _chunks(["a", "x", "b", "x"]))
+    assert changed == []
+    assert moved == {"doc-1_0": "doc-1_1", "doc-1_1": "doc-1_0", "doc-1_2": "doc-1_3", "doc-1_3": "doc-1_2"}
+    assert removed == ["doc-1_4"]
+
+
+def test_content_hash_from_metadata_is_used():
+    previous = {"doc-1_0": "hash-guardado"}
+    chunks = [{"id": "doc-1_0", "text": "texto", "metadata": {"content_hash": "hash-guardado"}}]
+    assert diff_chunks(previous, chunks) == ([], {}, [])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_uploads_of_the_same_file_claim_it_once(redis):
+    results = await asyncio.gather(
+        deduplication.claim_document_hash("t1", "c1", "hash", "doc-a"),
+        deduplication.claim_document_hash("t1", "c1", "hash", "doc-b")
+    )
+
+    assert results[0] is None
+    assert results[1]["document_id"] == "doc-a"
+
+
+@pytest.mark.asyncio
+async def test_released_hash_can_be_claimed_again(redis):
+    assert await deduplication.claim_document_hash("t1", "c1", "hash", "doc-a") is None
+    await deduplication.register_document_hash("t1", "c1", "hash", "doc-a", job_id="job-1")
+    assert (await deduplication.claim_document_hash("t1", "c1", "hash", "doc-b"))["job_id"] == "job-1"
+
+    await deduplication.release_document_hash("t1", "doc-a")
+
+    assert await deduplication.claim_document_hash("t1", "c1", "hash", "doc-b") is None
+
+
+@pytest.mark.asyncio
+async def test_release_keeps_a_hash_claimed_by_another_document(redis):
+    await deduplication.claim_document_hash("t1", "c1", "hash", "doc-a")
+    # La reserva de doc-a caduca y otra subida toma el hash
+    await redis.delete(deduplication._document_hash_key("t1", "c1", "hash"))
+    await deduplication.claim_document_hash("t1", "c1", "hash", "doc-b")
+
+    await deduplication.release_document_hash("t1", "doc-a")
+
+    assert (await deduplication.claim_document_hash("t1", "c1", "hash", "doc-c"))["document_id"] == "doc-b"
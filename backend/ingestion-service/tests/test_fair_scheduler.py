@@ -0,0 +1,113 @@
+"""Pruebas del reparto justo de la cola de ingesta entre tenants."""
+
+from collections import deque
+
+import pytest
+
+from services import queue as queue_module
+from services.job_queue import PRIORITY_LANE, STANDARD_LANE
+from services.queue import FairJobScheduler
+
+
+class FakeJobQueue:
+    """Carriles por tenant y lista de pendientes en memoria."""
+
+    def __init__(self):
+        self.lanes = {}
+        self.weights = {}
+        self.pending = []
+
+    def add(self, tenant_id, lane, count, weight=1.0):
+        jobs = self.lanes.setdefault((tenant_id, lane), deque())
+        jobs.extend(f"{tenant_id}-{lane}-{len(jobs) + i}" for i in range(count))
+        self.weights[tenant_id] = weight
+
+    async def acquire_dispatch_lock(self, ttl_ms):
+        return "token"
+
+    async def release_dispatch_lock(self, token):
+        pass
+
+    async def get_scheduling_state(self):
+        return len(self.pending), dict(self.weights)
+
+    async def promote(self, tenant_id, lane):
+        jobs = self.lanes.get((tenant_id, lane))
+        if not jobs:
+            return False
+        self.pending.append((tenant_id, lane, jobs.popleft()))
+        return True
+
+    async def retire_tenant(self, tenant_id):
+        if self.lanes.get((tenant_id, PRIORITY_LANE)) or self.lanes.get((tenant_id, STANDARD_LANE)):
+            return False
+        self.weights.pop(tenant_id, None)
+        return True
+
+    def consume(self):
+        """Los workers vacían la lista de pendientes."""
+        jobs, self.pending = self.pending, []
+        return jobs
+
+
+@pytest.fixture
+def fake_queue(monkeypatch):
+    fake = FakeJobQueue()
+    monkeypatch.setattr(queue_module, "get_job_queue", lambda: fake)
+    return fake
+
+
+async def _rounds(scheduler, fake_queue, count):
+    rounds = []
+    for _ in range(count):
+        await scheduler.dispatch_once()
+        rounds.append(fake_queue.consume())
+    return rounds
+
+
+def _tenants(jobs):
+    return [tenant_id for tenant_id, _, _ in jobs]
+
+
+@pytest.mark.asyncio
+async def test_small_tenant_is_not_stuck_behind_a_bulk_import(fake_queue):
+    fake_queue.add("bulk", STANDARD_LANE, 50)
+    fake_queue.add("small", STANDARD_LANE, 2)
+    scheduler = FairJobScheduler(dispatch_window=4, dispatch_interval_ms=100, priority_share=0.5)
+
+    first, second = await _rounds(scheduler, fake_queue, 2)
+
+    # Con 50 trabajos del lote delante, los dos del tenant pequeño entran en la primera ronda
+    assert _tenants(first).count("small") == 2
+    assert _tenants(second) == ["bulk"] * 4
+    # Sin trabajos en espera, el tenant pequeño se retira de los activos
+    assert "small" not in fake_queue.weights
+
+
+@pytest.mark.asyncio
+async def test_standard_lane_is_shared_by_weight(fake_queue):
+    fake_queue.add("heavy", STANDARD_LANE, 100, weight=2.0)
+    fake_queue.add("light", STANDARD_LANE, 100, weight=1.0)
+    scheduler = FairJobScheduler(dispatch_window=6, dispatch_interval_ms=100, priority_share=0.5)
+
+    promoted = [tenant for jobs in await _rounds(scheduler, fake_queue, 3) for tenant in _tenants(jobs)]
+
+    assert promoted.count("heavy") == 12
+    assert promoted.count("light") == 6
+
+
+@pytest.mark.asyncio
+async def test_priority_lane_is_capped_to_its_share(fake_queue):
+    fake_queue.add("importer", STANDARD_LANE, 20)
+    fake_queue.add("uploader", PRIORITY_LANE, 5)
+    scheduler = FairJobScheduler(dispatch_window=4, dispatch_interval_ms=100, priority_share=0.5)
+
+    rounds = await _rounds(scheduler, fake_queue, 4)
+    lanes = [[lane for _, lane, _ in jobs] for jobs in rounds]
+
+    # Las subidas pequeñas van primero, pero el lote sigue avanzando en cada ronda
+    assert lanes[0] == [PRIORITY_LANE, PRIORITY_LANE, STANDARD_LANE, STANDARD_LANE]
+    assert lanes[1] == [PRIORITY_LANE, PRIORITY_LANE, STANDARD_LANE, STANDARD_LANE]
+    # Sin trabajos prioritarios, sus huecos pasan al carril estándar
+    assert lanes[2] == [PRIORITY_LANE, STANDARD_LANE, STANDARD_LANE, STANDARD_LANE]
+    assert lanes[3] == [STANDARD_LANE] * 4
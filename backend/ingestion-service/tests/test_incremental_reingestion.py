@@ -0,0 +1,135 @@
+"""Pruebas de la reingesta incremental de documentos sin cambios o desplazados."""
+
+import inspect
+from types import SimpleNamespace
+
+import pytest
+
+from services import embedding
+from services.deduplication import build_chunk_manifest, get_chunk_hash
+
+TENANT_ID = "tenant-1"
+COLLECTION_ID = "collection-1"
+DOCUMENT_ID = "doc-1"
+
+
+def _chunks(texts):
+    return [{"id": f"{DOCUMENT_ID}_{i}", "text": text, "metadata": {}} for i, text in enumerate(texts)]
+
+
+async def _batches(chunks, size=2):
+    for start in range(0, len(chunks), size):
+        yield chunks[start:start + size]
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    """Sustituye el almacenamiento del documento y registra las llamadas."""
+    calls = {"stored": [], "deleted": [], "invalidated": [], "collection_updated": 0, "manifest": None}
+    state = {"previous": {}, "embeddings": {}}
+
+    async def get_document_chunk_manifest(document_id, tenant_id, collection_id, ctx=None):
+        return state["previous"]
+
+    async def get_document_chunk_embeddings(document_id, tenant_id, collection_id, chunk_ids):
+        return state["embeddings"]
+
+    async def store_chunks_in_vector_store(chunks, **kwargs):
+        calls["stored"].extend(chunks)
+        return {"chunks_stored": len(chunks)}
+
+    async def delete_document_chunks(document_id, tenant_id, collection_id, chunk_ids, ctx=None):
+        calls["deleted"].extend(chunk_ids)
+        return len(chunk_ids)
+
+    async def invalidate_chunk_cache(tenant_id, chunk_ids):
+        calls["invalidated"].extend(chunk_ids)
+
+    async def mark_collection_updated(tenant_id, collection_id):
+        calls["collection_updated"] += 1
+
+    async def save_document_chunk_manifest(document_id, tenant_id, manifest):
+        calls["manifest"] = manifest
+
+    settings = SimpleNamespace(incremental_reingestion_enabled=True, streaming_embed_batch_size=2)
+    monkeypatch.setattr(embedding, "get_settings", lambda: settings)
+    for function in (
+        get_document_chunk_manifest, get_document_chunk_embeddings, store_chunks_in_vector_store,
+        delete_document_chunks, invalidate_chunk_cache, mark_collection_updated, save_document_chunk_manifest
+    ):
+        monkeypatch.setattr(embedding, function.__name__, function)
+
+    return SimpleNamespace(calls=calls, state=state)
+
+
+# Sin los decoradores de contexto y errores, que validan el tenant
+store_chunk_stream = inspect.unwrap(embedding.store_chunk_stream)
+store_chunks_incremental = inspect.unwrap(embedding.store_chunks_incremental)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_streamed_document_stores_nothing(storage):
+    chunks = _chunks(["a", "b", "c"])
+    storage.state["previous"] = build_chunk_manifest(chunks)
+
+    stats = await store_chunk_stream(_batches(chunks), TENANT_ID, COLLECTION_ID, DOCUMENT_ID)
+
+    # La reingesta sin cambios no falla: el documento sigue teniendo sus chunks
+    assert stats["chunks_total"] == 3
+    assert stats["chunks_stored"] == 0
+    assert stats["chunks_unchanged"] == 3
+    assert storage.calls["stored"] == []
+    assert storage.calls["invalidated"] == []
+    assert storage.calls["collection_updated"] == 0
+    assert storage.calls["manifest"] == build_chunk_manifest(chunks)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_document_stores_nothing(storage):
+    chunks = _chunks(["a", "b", "c"])
+    storage.state["previous"] = build_chunk_manifest(chunks)
+
+    stats = await store_chunks_incremental(chunks, TENANT_ID, COLLECTION_ID, DOCUMENT_ID)
+
+    assert stats["chunks_total"] == 3
+    assert stats["chunks_stored"] == 0
+    assert stats["chunks_unchanged"] == 3
+    assert storage.calls["stored"] == []
+    assert storage.calls["collection_updated"] == 0
+
+
+@pytest.mark.asyncio
+async def test_inserted_chunk_reuses_stored_vectors(storage):
+    previous_chunks = _chunks(["a", "b"])
+    storage.state["previous"] = build_chunk_manifest(previous_chunks)
+    storage.state["embeddings"] = {
+        get_chunk_hash(previous_chunks[0]): [0.1, 0.2],
+        get_chunk_hash(previous_chunks[1]): [0.3, 0.4]
+    }
+
+    stats = await store_chunks_incremental(_chunks(["nuevo", "a", "b"]), TENANT_ID, COLLECTION_ID, DOCUMENT_ID)
+
+    stored = {chunk["id"]: chunk for chunk in storage.calls["stored"]}
+    assert set(stored) == {"doc-1_0", "doc-1_1", "doc-1_2"}
+    # Solo el chunk nuevo necesita embedding; los desplazados llevan su vector
+    assert "embedding" not in stored["doc-1_0"]
+    assert stored["doc-1_1"]["embedding"] == [0.1, 0.2]
+    assert stored["doc-1_2"]["embedding"] == [0.3, 0.4]
+    assert stats["chunks_moved"] == 2
+    assert stats["chunks_total"] == 3
+    assert sorted(storage.calls["invalidated"]) == ["doc-1_0", "doc-1_1", "doc-1_2"]
+    assert storage.calls["deleted"] == []
+    assert storage.calls["collection_updated"] == 1
+
+
+@pytest.mark.asyncio
+async def test_removed_chunks_are_deleted(storage):
+    storage.state["previous"] = build_chunk_manifest(_chunks(["a", "b", "c"]))
+
+    stats = await store_chunk_stream(_batches(_chunks(["a", "b"])), TENANT_ID, COLLECTION_ID, DOCUMENT_ID)
+
+    assert stats["chunks_total"] == 2
+    assert stats["chunks_stored"] == 0
+    assert stats["chunks_deleted"] == 1
+    assert storage.calls["deleted"] == ["doc-1_2"]
+    assert storage.calls["collection_updated"] == 1
@@ -0,0 +1,222 @@
+"""Pruebas de la cola fiable de trabajos: reentrega y plazo por trabajo."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services import job_queue
+from services.job_queue import ReliableJobQueue
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue_call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue_call
+
+    async def execute(self):
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    """Subconjunto de Redis usado por la cola (listas, hashes y los scripts de la cola)."""
+
+    def __init__(self):
+        self.lists = {}
+        self.hashes = {}
+        self.values = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _list(self, key):
+        return self.lists.setdefault(key, [])
+
+    async def lpush(self, key, value):
+        self._list(key).insert(0, value)
+
+    async def rpush(self, key, value):
+        self._list(key).append(value)
+
+    async def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    async def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value in items:
+            items.remove(value)
+            return 1
+        return 0
+
+    async def lmove(self, source, destination, src_side, dest_side):
+        items = self.lists.get(source)
+        if not items:
+            return None
+        value = items.pop(-1 if src_side == "RIGHT" else 0)
+        target = self._list(destination)
+        target.append(value) if dest_side == "RIGHT" else target.insert(0, value)
+        return value
+
+    async def blmove(self, source, destination, timeout, src_side, dest_side):
+        return await self.lmove(source, destination, src_side, dest_side)
+
+    async def hincrby(self, key, field, amount):
+        values = self.hashes.setdefault(key, {})
+        values[field] = int(values.get(field, 0)) + amount
+        return values[field]
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hdel(self, key, field):
+        return int(self.hashes.get(key, {}).pop(field, None) is not None)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def set(self, key, value, ex=None, nx=False, px=None):
+        self.values[key] = value
+        return True
+
+    async def exists(self, key):
+        return int(key in self.values)
+
+    async def delete(self, key):
+        return int(self.values.pop(key, None) is not None)
+
+    async def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        for key in list(self.lists):
+            if key.startswith(prefix) and self.lists[key]:
+                yield key
+
+    async def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == job_queue._ACK_SCRIPT:
+            if await self.lrem(keys[0], 1, argv[0]):
+                await self.hdel(keys[1], argv[1])
+                await self.hdel(keys[2], argv[1])
+                return 1
+            return 0
+        if script == job_queue._EXPIRE_LEASE_SCRIPT:
+            if await self.hget(keys[2], argv[1]) != argv[2]:
+                return 0
+            await self.hdel(keys[2], argv[1])
+            if await self.lrem(keys[0], 1, argv[0]):
+                await self.rpush(keys[1], argv[0])
+                return 1
+            return 0
+        raise NotImplementedError(script)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = FakeRedis()
+
+    async def get_redis_client():
+        return client
+
+    settings = SimpleNamespace(
+        jobs_queue_key="jobs",
+        queue_visibility_timeout=30,
+        queue_max_deliveries=3,
+        queue_block_timeout=0,
+        queue_recovery_interval=10,
+        queue_job_lease_timeout=60
+    )
+    monkeypatch.setattr(job_queue, "get_redis_client", get_redis_client)
+    monkeypatch.setattr(job_queue, "get_settings", lambda: settings)
+    return client
+
+
+def _queue(recovered=None):
+    async def on_recover(job):
+        recovered.append(job["job_id"])
+
+    return ReliableJobQueue(on_recover=on_recover if recovered is not None else None)
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_a_dead_consumer_are_redelivered(redis):
+    recovered = []
+    queue = _queue(recovered)
+    await queue.push({"job_id": "job-1", "tenant_id": "t1"})
+
+    dead = queue.consumer_id("worker-1")
+    job = await queue.pop(dead)
+    assert job["_deliveries"] == 1
+    # El consumidor vivo conserva sus trabajos
+    assert await queue.recover_abandoned() == 0
+
+    # El proceso muere: su latido expira
+    await redis.delete(f"{queue.heartbeat_prefix}{dead}")
+    assert await queue.recover_abandoned() == 1
+    assert recovered == ["job-1"]
+    assert await redis.llen(f"{queue.processing_prefix}{dead}") == 0
+
+    redelivered = await queue.pop(queue.consumer_id("worker-2"))
+    assert redelivered["job_id"] == "job-1"
+    assert redelivered["_deliveries"] == 2
+
+    await queue.ack(redelivered)
+    assert await redis.llen(f"{queue.processing_prefix}{queue.consumer_id('worker-2')}") == 0
+    assert redis.hashes[queue.deliveries_key] == {}
+    assert redis.hashes[queue.leases_key] == {}
+    assert queue.get_stats()["redelivered"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_redelivered_while_consumer_is_alive(redis):
+    recovered = []
+    queue = _queue(recovered)
+    await queue.push({"job_id": "job-1", "tenant_id": "t1"})
+
+    hung = queue.consumer_id("worker-1")
+    queue.lease_timeout = -1
+    stuck = await queue.pop(hung)
+    queue.lease_timeout = 60
+
+    # El latido sigue vivo, pero el plazo del trabajo venció
+    assert await queue.recover_abandoned() == 0
+    assert await queue.recover_expired_leases() == 1
+    assert recovered == ["job-1"]
+
+    healthy = queue.consumer_id("worker-2")
+    redelivered = await queue.pop(healthy)
+    assert redelivered["_deliveries"] == 2
+
+    # La confirmación tardía del consumidor bloqueado no toca la nueva entrega
+    await queue.ack(stuck)
+    assert await redis.llen(f"{queue.processing_prefix}{healthy}") == 1
+    lease = json.loads(redis.hashes[queue.leases_key]["job-1"])
+    assert lease["consumer"] == healthy
+
+    assert await queue.recover_expired_leases() == 0
+    await queue.ack(redelivered)
+    assert redis.hashes[queue.leases_key] == {}
+    assert queue.get_stats()["expired_leases"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_lease_of_a_released_job_is_discarded(redis):
+    queue = _queue()
+    await queue.push({"job_id": "job-1", "tenant_id": "t1"})
+
+    consumer = queue.consumer_id("worker-1")
+    queue.lease_timeout = -1
+    await queue.pop(consumer)
+    assert await queue.release_consumer(consumer) == 1
+
+    # El trabajo ya volvió a la cola: el plazo vencido no lo duplica
+    assert await queue.recover_expired_leases() == 0
+    assert await redis.llen(queue.pending_key) == 1
+    assert redis.hashes[queue.leases_key] == {}
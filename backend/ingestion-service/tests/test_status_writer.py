@@ -0,0 +1,147 @@
+"""Pruebas del buffer de escritura diferida de estados."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from services import status_writer
+from services.status_writer import StatusWriteBuffer
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.fields = None
+        self.filters = {}
+
+    def update(self, fields):
+        self.fields = fields
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    async def execute(self):
+        if self.client.fail(self.table, self.fields):
+            return SimpleNamespace(error="rechazado", data=None)
+        self.client.updates.append((self.table, dict(self.filters), dict(self.fields)))
+        return SimpleNamespace(error=None, data=[])
+
+
+class FakeSupabase:
+    """Cliente que registra las actualizaciones y falla según un predicado."""
+
+    def __init__(self):
+        self.updates = []
+        self.fail = lambda table, fields: False
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    client = FakeSupabase()
+    settings = SimpleNamespace(
+        status_flush_interval_ms=60_000,
+        status_flush_max_batch=200,
+        status_write_max_attempts=3,
+        supabase_connection_string=None
+    )
+    monkeypatch.setattr(status_writer, "get_settings", lambda: settings)
+    monkeypatch.setattr(status_writer, "get_supabase_client", lambda: client)
+    monkeypatch.setattr(status_writer, "get_table_name", lambda table: table)
+
+    async def invalidate_documents(self, keys):
+        client.invalidated = list(keys)
+
+    monkeypatch.setattr(StatusWriteBuffer, "_invalidate_documents", invalidate_documents)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_updates_are_merged_until_the_flush(supabase):
+    writer = StatusWriteBuffer()
+
+    assert await writer.update_job("job-1", "t1", {"status": "processing", "progress": 10})
+    assert await writer.update_job("job-1", "t1", {"progress": 50, "message": "chunking"})
+    assert supabase.updates == []
+    assert writer.get_stats()["pending_rows"] == 1
+
+    assert await writer.flush() == 1
+    assert supabase.updates == [
+        ("processing_jobs", {"job_id": "job-1", "tenant_id": "t1"},
+         {"status": "processing", "progress": 50, "message": "chunking"})
+    ]
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_terminal_status_is_written_immediately(supabase):
+    writer = StatusWriteBuffer()
+    await writer.update_document("doc-1", "t1", {"status": "processing"})
+
+    assert await writer.update_document("doc-1", "t1", {"status": "completed", "chunk_count": 4})
+
+    assert supabase.updates == [
+        ("documents", {"document_id": "doc-1", "tenant_id": "t1"}, {"status": "completed", "chunk_count": 4})
+    ]
+    assert supabase.invalidated == [("t1", "doc-1")]
+    assert writer.get_stats()["pending_rows"] == 0
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_terminal_status_is_kept_and_reported(supabase):
+    writer = StatusWriteBuffer()
+    supabase.fail = lambda table, fields: True
+
+    assert not await writer.update_job("job-1", "t1", {"status": "failed", "error": "x"})
+    assert writer.get_stats()["pending_rows"] == 1
+    assert supabase.invalidated == []
+
+    # Una actualización posterior no pisa los campos más recientes
+    await writer.update_job("job-1", "t1", {"error": "y"})
+    supabase.fail = lambda table, fields: False
+    assert await writer.flush() == 1
+    assert supabase.updates[-1][2] == {"status": "failed", "error": "y"}
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_poison_row_is_dropped_after_max_attempts(supabase):
+    writer = StatusWriteBuffer()
+    supabase.fail = lambda table, fields: fields.get("progress") == "no es un número"
+
+    await writer.update_job("job-1", "t1", {"progress": "no es un número"})
+    await writer.update_job("job-2", "t1", {"progress": 20})
+    for _ in range(3):
+        await writer.flush()
+
+    stats = writer.get_stats()
+    assert stats["dropped_rows"] == 1
+    assert stats["pending_rows"] == 0
+    assert [update[1]["job_id"] for update in supabase.updates] == ["job-2"]
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_rows_with_unsafe_columns_skip_the_bulk_statement(supabase, monkeypatch):
+    status_writer.get_settings().supabase_connection_string = "postgresql://test"
+    bulk_rows = []
+
+    async def write_bulk(self, table, items):
+        bulk_rows.extend(key for key, _ in items)
+        return len(items)
+
+    monkeypatch.setattr(StatusWriteBuffer, "_write_bulk", write_bulk)
+    writer = StatusWriteBuffer()
+    await writer.update_job("job-1", "t1", {"progress": 10})
+    await writer.update_job("job-2", "t1", {'progress"; --': 10})
+
+    assert await writer.flush() == 2
+    assert bulk_rows == [("t1", "job-1")]
+    assert [update[1]["job_id"] for update in supabase.updates] == ["job-2"]
+    await writer.close()
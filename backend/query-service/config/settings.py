@@ -2,7 +2,7 @@
 Configuración simplificada del Query Service.
 """
 
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from pydantic import Field
 from common.config import Settings as BaseSettings
 from common.config import get_service_settings as get_base_settings
@@ -48,6 +48,60 @@ class QueryServiceSettings(BaseSettings):
     llm_temperature: float = Field(0.7, description="Temperatura LLM")
     llm_max_tokens: int = Field(4096, description="Tokens máximos de respuesta")
 
+    # Caché semántica de respuestas
+    semantic_cache_enabled: bool = Field(True, description="Permitir la caché semántica a las consultas que la soliciten")
+    semantic_cache_max_distance: float = Field(0.05, description="Distancia coseno máxima para reutilizar una respuesta")
+    semantic_cache_max_entries: int = Field(200, description="Respuestas guardadas por tenant, colección, modelo y parámetros")
+    semantic_cache_max_keys: int = Field(1000, description="Claves de caché semántica en memoria (LRU)")
+    semantic_cache_ttl: int = Field(3600, description="Vigencia en segundos de una respuesta guardada")
+
+    # Réplica local de embeddings (colecciones calientes)
+    ann_index_enabled: bool = Field(True, description="Resolver en memoria las búsquedas de colecciones calientes")
+    ann_memory_budget_mb: int = Field(512, description="Memoria máxima de las réplicas locales (LRU)")
+    ann_hot_threshold: int = Field(3, description="Búsquedas remotas tras las que se replica una colección")
+    ann_max_collection_chunks: int = Field(20000, description="Chunks máximos de una colección replicable")
+    ann_load_page_size: int = Field(1000, description="Chunks por página al cargar una réplica")
+    ann_version_check_interval: float = Field(2.0, description="Segundos entre comprobaciones de versión de una réplica")
+
+    # Recuperación híbrida (léxica + vectorial)
+    hybrid_candidates: int = Field(20, description="Candidatos de cada búsqueda antes de la fusión")
+    hybrid_rrf_k: int = Field(60, description="Constante k de Reciprocal Rank Fusion")
+    text_search_config: str = Field("simple", description="Configuración de texto completo de Postgres (debe coincidir con la del índice idx_document_chunks_content_fts)")
+
+    # Empaquetado del contexto RAG
+    context_max_tokens: int = Field(6000, description="Tokens máximos de contexto por consulta")
+    context_reserved_tokens: int = Field(1024, description="Tokens reservados para instrucciones y pregunta")
+    context_max_overlap_chars: int = Field(400, description="Solapamiento máximo buscado entre chunks adyacentes")
+
+    # Filtrado de metadatos en la búsqueda vectorial
+    filtered_search_probes: int = Field(10, description="Listas ivfflat exploradas en las búsquedas con filtro de metadatos")
+
+    # Agrupación de consultas idénticas concurrentes
+    query_coalescing_enabled: bool = Field(True, description="Compartir el cálculo de consultas RAG idénticas en curso")
+
+    # Búsqueda por lotes
+    batch_search_max_queries: int = Field(1000, description="Búsquedas máximas por petición de lote")
+    batch_search_concurrency: int = Field(16, description="Búsquedas simultáneas por petición de lote")
+
+    # Control de admisión de llamadas a Groq (por modelo)
+    groq_requests_per_minute: int = Field(1000, description="Peticiones por minuto admitidas por modelo")
+    groq_tokens_per_minute: int = Field(250000, description="Tokens (prompt + max_tokens) por minuto admitidos por modelo")
+    groq_model_rate_limits: Dict[str, Dict[str, int]] = Field(
+        default_factory=dict,
+        description="Límites por modelo que sustituyen a los generales: {modelo: {requests_per_minute, tokens_per_minute}}"
+    )
+    groq_max_concurrency: int = Field(32, description="Llamadas simultáneas máximas a Groq por modelo")
+    groq_max_queue_size: int = Field(200, description="Peticiones en espera máximas por modelo")
+    groq_queue_timeout_seconds: float = Field(10.0, description="Espera máxima en cola antes de rechazar una petición")
+    query_timeout_seconds: float = Field(30.0, description="Plazo de una consulta RAG si el llamante no indica el suyo")
+    
+    # Dimensión reducida por colección (Matryoshka)
+    collection_embedding_dimensions: List[int] = Field(
+        default_factory=lambda: [256, 512, 1024, 1536],
+        description="Dimensiones de embedding que puede declarar una colección"
+    )
+    collection_dimensions_ttl: int = Field(300, description="Segundos que se recuerda la dimensión de una colección")
+    
     # Timeouts
     groq_timeout_seconds: int = Field(30, description="Timeout para Groq API")
     vector_search_timeout: int = Field(10, description="Timeout búsqueda vectorial")
@@ -13,6 +13,7 @@ from common.utils.logging import init_logging
 from common.db.supabase import init_supabase
 from common.helpers.health import register_health_routes
 from config.settings import get_settings
+from services.ann_index import shutdown_ann_index
 
 settings = get_settings()
 logger = logging.getLogger("query-service")
@@ -23,6 +24,7 @@ async def lifespan(app: FastAPI):
     logger.info("Iniciando Query Service")
     await init_supabase()
     yield
+    await shutdown_ann_index()
     logger.info("Query Service detenido")
 
 # Inicializar la aplicación FastAPI
@@ -3,13 +3,28 @@ Modelos de datos para Query Service.
 """
 
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
-class InternalQueryRequest(BaseModel):
+class EmbeddingInputMixin(BaseModel):
+    """
+    Embedding de la consulta como array JSON o en base64.
+    
+    query_embedding_b64 lleva los floats little-endian del vector en base64;
+    su tipo (float32 o float16) se indica en la cabecera X-Embedding-Format.
+    """
+    query_embedding: Optional[List[float]] = Field(None, description="Embedding pre-calculado del query")
+    query_embedding_b64: Optional[str] = Field(None, description="Embedding en base64 (formato binario compacto)")
+    
+    @model_validator(mode="after")
+    def check_embedding(self):
+        if self.query_embedding is None and not self.query_embedding_b64:
+            raise ValueError("Se requiere query_embedding o query_embedding_b64")
+        return self
+
+class InternalQueryRequest(EmbeddingInputMixin):
     """Request para consultas RAG internas."""
     tenant_id: str
     query: str
-    query_embedding: List[float] = Field(..., description="Embedding pre-calculado del query")
     collection_id: str
     agent_id: Optional[str] = None
     conversation_id: Optional[str] = None
@@ -24,16 +39,42 @@ class InternalQueryRequest(BaseModel):
     agent_description: Optional[str] = None
     fallback_behavior: str = "agent_knowledge"  # Opciones: "agent_knowledge", "reject_query", "generic_response"
     relevance_threshold: float = 0.75  # Umbral para considerar documentos realmente relevantes
+    
+    # Recuperación: "vector" (solo similitud) o "hybrid" (texto completo + vectorial con RRF)
+    retrieval_mode: str = "vector"
+    
+    # Caché semántica (opt-in): reutilizar la respuesta de una consulta casi idéntica
+    semantic_cache: bool = False
+    semantic_cache_max_distance: Optional[float] = None
+    
+    # Tiempo que le queda al llamante para recibir la respuesta (None = query_timeout_seconds)
+    timeout_seconds: Optional[float] = Field(None, gt=0)
 
-class InternalSearchRequest(BaseModel):
+class InternalSearchRequest(EmbeddingInputMixin):
     """Request para búsqueda sin generación."""
     tenant_id: str
-    query_embedding: List[float]
     collection_id: str
     limit: int = 5
     similarity_threshold: float = 0.7
     metadata_filter: Optional[Dict[str, Any]] = None
 
+class BatchSearchQuery(EmbeddingInputMixin):
+    """Búsqueda individual dentro de una petición por lotes."""
+    collection_id: Optional[str] = None  # Por defecto, la colección de la petición
+    limit: Optional[int] = None
+    similarity_threshold: Optional[float] = None
+    metadata_filter: Optional[Dict[str, Any]] = None  # Por defecto, el filtro de la petición
+
+class InternalBatchSearchRequest(BaseModel):
+    """Request para varias búsquedas sin generación en una sola llamada."""
+    tenant_id: str
+    queries: List[BatchSearchQuery] = Field(..., min_length=1)
+    collection_id: Optional[str] = None
+    limit: int = 5
+    similarity_threshold: float = 0.7
+    metadata_filter: Optional[Dict[str, Any]] = None
+    max_concurrency: Optional[int] = None
+
 class DocumentMatch(BaseModel):
     """Documento encontrado por similitud."""
     id: str
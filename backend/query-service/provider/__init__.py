@@ -10,6 +10,8 @@ from .groq import (
     GroqLLM,
     get_groq_client,
     get_async_groq_client,
+    get_admission_controller,
+    get_admission_stats,
     GROQ_MODELS
 )
 
@@ -17,5 +19,7 @@ __all__ = [
     "GroqLLM",
     "get_groq_client",
     "get_async_groq_client",
+    "get_admission_controller",
+    "get_admission_stats",
     "GROQ_MODELS"
 ]
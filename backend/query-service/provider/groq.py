@@ -1,9 +1,19 @@
 """
 Cliente Groq simplificado.
+
+Todas las llamadas pasan por un control de admisión por modelo que respeta
+los presupuestos de peticiones y tokens por minuto de Groq y un máximo de
+llamadas simultáneas. Las peticiones que no caben esperan en una cola FIFO;
+si la espera prevista supera su plazo se rechazan de inmediato en lugar de
+acabar todas a la vez en errores 429.
 """
 
+import asyncio
 import logging
-from typing import Optional, AsyncGenerator, List, Dict, Any
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional, AsyncGenerator, AsyncIterator, Deque, List, Dict, Any
 from groq import AsyncGroq, Groq
 
 from common.errors import ServiceError
@@ -36,12 +46,274 @@ def get_async_groq_client(api_key: Optional[str] = None) -> AsyncGroq:
         _async_client = AsyncGroq(api_key=key)
     return _async_client
 
+# Ventana de los presupuestos por minuto (segundos)
+RATE_WINDOW = 60.0
+
+# Caracteres por token para estimar el tamaño del prompt sin tokenizar
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Tokens que consumirá una llamada: prompt estimado + max_tokens."""
+    prompt_chars = sum(len(message["content"]) for message in messages)
+    return prompt_chars // CHARS_PER_TOKEN + max_tokens
+
+class _Reservation:
+    """Consumo de una llamada admitida dentro de la ventana de un minuto."""
+    
+    __slots__ = ("timestamp", "tokens")
+    
+    def __init__(self, timestamp: float, tokens: int):
+        self.timestamp = timestamp
+        self.tokens = tokens
+
+class _Waiter:
+    """Petición en cola a la espera de presupuesto."""
+    
+    __slots__ = ("tokens", "future")
+    
+    def __init__(self, tokens: int, future: asyncio.Future):
+        self.tokens = tokens
+        self.future = future
+
+class GroqAdmissionController:
+    """
+    Control de admisión de las llamadas a un modelo de Groq.
+    
+    Lleva en una ventana deslizante de un minuto las peticiones y tokens
+    admitidos, limita las llamadas simultáneas y encola por orden de llegada
+    las que no caben. Una petición se rechaza sin esperar cuando la cola está
+    llena o cuando el presupuesto no se liberaría dentro de su plazo.
+    """
+    
+    def __init__(
+        self,
+        model: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        max_queue_size: int
+    ):
+        self.model = model
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        
+        self._window: Deque[_Reservation] = deque()
+        self._window_tokens = 0
+        self._in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._queued_tokens = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._metrics = {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0, "max_queue_depth": 0}
+    
+    @asynccontextmanager
+    async def slot(self, tokens: int, timeout: float) -> AsyncIterator[_Reservation]:
+        """
+        Reserva presupuesto para una llamada durante el bloque.
+        
+        Args:
+            tokens: Tokens estimados de la llamada (prompt + max_tokens)
+            timeout: Espera máxima en cola en segundos
+        """
+        reservation = await self.acquire(tokens, timeout)
+        try:
+            yield reservation
+        finally:
+            self.release()
+    
+    async def acquire(self, tokens: int, timeout: float) -> _Reservation:
+        """Espera a que la llamada quepa en los presupuestos y la registra."""
+        # Una llamada mayor que el presupuesto entero se admite con la ventana vacía
+        tokens = min(tokens, self.tokens_per_minute)
+        
+        now = time.monotonic()
+        self._expire(now)
+        if not self._waiters and self._fits(tokens):
+            return self._admit(tokens, now)
+        
+        if len(self._waiters) >= self.max_queue_size:
+            self._metrics["shed"] += 1
+            raise ServiceError(
+                f"Demasiadas peticiones en espera para el modelo {self.model}, inténtelo más tarde"
+            )
+        
+        expected_wait = self._estimate_wait(tokens, now)
+        if expected_wait > timeout:
+            self._metrics["shed"] += 1
+            raise ServiceError(
+                f"Límite de uso del modelo {self.model} alcanzado: espera estimada de "
+                f"{expected_wait:.1f}s (máximo {timeout:.1f}s), inténtelo más tarde"
+            )
+        
+        waiter = _Waiter(tokens, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._queued_tokens += tokens
+        self._metrics["queued"] += 1
+        self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], len(self._waiters))
+        self._schedule_wakeup()
+        
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitida justo al vencer el plazo: se devuelve el hueco
+                self.release()
+            else:
+                waiter.future.cancel()
+                self._remove_waiter(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._metrics["timed_out"] += 1
+            raise ServiceError(
+                f"Tiempo de espera agotado en la cola del modelo {self.model} ({timeout:.1f}s)"
+            )
+    
+    def release(self):
+        """Libera el hueco de concurrencia de una llamada terminada."""
+        self._in_flight -= 1
+        self._dispatch()
+    
+    def settle(self, reservation: _Reservation, actual_tokens: Optional[int]):
+        """Sustituye la estimación de una llamada por los tokens que informó Groq."""
+        if actual_tokens is None or reservation not in self._window:
+            return
+        self._window_tokens += actual_tokens - reservation.tokens
+        reservation.tokens = actual_tokens
+        self._dispatch()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de admisión y profundidad de la cola."""
+        self._expire(time.monotonic())
+        return {
+            **self._metrics,
+            "model": self.model,
+            "queue_depth": len(self._waiters),
+            "queued_tokens": self._queued_tokens,
+            "in_flight": self._in_flight,
+            "requests_last_minute": len(self._window),
+            "tokens_last_minute": self._window_tokens
+        }
+    
+    def _fits(self, tokens: int) -> bool:
+        return (
+            self._in_flight < self.max_concurrency
+            and len(self._window) < self.requests_per_minute
+            and self._window_tokens + tokens <= self.tokens_per_minute
+        )
+    
+    def _admit(self, tokens: int, now: float) -> _Reservation:
+        reservation = _Reservation(now, tokens)
+        self._window.append(reservation)
+        self._window_tokens += tokens
+        self._in_flight += 1
+        self._metrics["admitted"] += 1
+        return reservation
+    
+    def _expire(self, now: float):
+        """Saca de la ventana las llamadas de hace más de un minuto."""
+        while self._window and now - self._window[0].timestamp >= RATE_WINDOW:
+            self._window_tokens -= self._window.popleft().tokens
+    
+    def _estimate_wait(self, tokens: int, now: float) -> float:
+        """
+        Segundos hasta que la ventana deje sitio a esta petición y a las que
+        ya esperan delante (sin contar el límite de concurrencia).
+        """
+        excess_requests = len(self._window) + len(self._waiters) + 1 - self.requests_per_minute
+        excess_tokens = self._window_tokens + self._queued_tokens + tokens - self.tokens_per_minute
+        if excess_requests <= 0 and excess_tokens <= 0:
+            return 0.0
+        
+        freed_requests = freed_tokens = 0
+        for reservation in self._window:
+            freed_requests += 1
+            freed_tokens += reservation.tokens
+            if freed_requests >= excess_requests and freed_tokens >= excess_tokens:
+                return reservation.timestamp + RATE_WINDOW - now
+        
+        # La demanda supera una ventana completa: minutos adicionales a ritmo constante
+        extra_windows = max(
+            (excess_requests - freed_requests) / self.requests_per_minute,
+            (excess_tokens - freed_tokens) / self.tokens_per_minute
+        )
+        oldest = self._window[0].timestamp if self._window else now
+        return oldest + RATE_WINDOW * (1 + extra_windows) - now
+    
+    def _dispatch(self):
+        """Admite por orden de llegada las peticiones en cola que ya caben."""
+        now = time.monotonic()
+        self._expire(now)
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.future.done():
+                self._waiters.popleft()
+                self._queued_tokens -= waiter.tokens
+                continue
+            if not self._fits(waiter.tokens):
+                break
+            self._waiters.popleft()
+            self._queued_tokens -= waiter.tokens
+            waiter.future.set_result(self._admit(waiter.tokens, now))
+        self._schedule_wakeup()
+    
+    def _schedule_wakeup(self):
+        """Programa un nuevo intento cuando caduque la llamada más antigua."""
+        if self._wakeup:
+            self._wakeup.cancel()
+            self._wakeup = None
+        if self._waiters and self._window:
+            delay = max(self._window[0].timestamp + RATE_WINDOW - time.monotonic(), 0.0)
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+    
+    def _remove_waiter(self, waiter: _Waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            return
+        self._queued_tokens -= waiter.tokens
+        self._dispatch()
+
+# Controles de admisión por modelo
+_admission_controllers: Dict[str, GroqAdmissionController] = {}
+
+def get_admission_controller(model: str) -> GroqAdmissionController:
+    """Control de admisión compartido de un modelo."""
+    controller = _admission_controllers.get(model)
+    if controller is None:
+        limits = settings.groq_model_rate_limits.get(model, {})
+        controller = GroqAdmissionController(
+            model=model,
+            requests_per_minute=limits.get("requests_per_minute", settings.groq_requests_per_minute),
+            tokens_per_minute=limits.get("tokens_per_minute", settings.groq_tokens_per_minute),
+            max_concurrency=settings.groq_max_concurrency,
+            max_queue_size=settings.groq_max_queue_size
+        )
+        _admission_controllers[model] = controller
+    return controller
+
+def get_admission_stats() -> Dict[str, Dict[str, Any]]:
+    """Métricas de admisión de cada modelo usado."""
+    return {model: controller.get_stats() for model, controller in _admission_controllers.items()}
+
 class GroqLLM:
     """Cliente simplificado para Groq."""
     
-    def __init__(self, model: Optional[str] = None):
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        queue_timeout: Optional[float] = None,
+        deadline: Optional[float] = None
+    ):
         self.model = model or settings.default_groq_model
         self.client = get_async_groq_client()
+        self.admission = get_admission_controller(self.model)
+        # Espera máxima en la cola de admisión antes de rechazar la llamada
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.groq_queue_timeout_seconds
+        # Plazo de la petición (time.monotonic()): la espera en cola no puede superarlo
+        self.deadline = deadline
+        # Uso de tokens de la última respuesta en streaming (si Groq lo informa)
+        self.last_usage: Optional[Dict[str, int]] = None
         
     async def generate(
         self,
@@ -55,20 +327,35 @@ class GroqLLM:
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
+        max_tokens = max_tokens or settings.llm_max_tokens
         
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=temperature or settings.llm_temperature,
-            max_tokens=max_tokens or settings.llm_max_tokens
-        )
+        async with self.admission.slot(estimate_tokens(messages, max_tokens), self._admission_timeout()) as reservation:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature or settings.llm_temperature,
+                max_tokens=max_tokens
+            )
+            usage = getattr(response, "usage", None)
+            self.admission.settle(reservation, usage.total_tokens if usage else None)
         
         return response.choices[0].message.content
     
+    def _admission_timeout(self) -> float:
+        """Espera máxima en cola: la configurada, acotada por el plazo de la petición."""
+        if self.deadline is None:
+            return self.queue_timeout
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise ServiceError(f"Plazo de la petición agotado antes de llamar al modelo {self.model}")
+        return min(self.queue_timeout, remaining)
+    
     async def stream(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Genera respuesta en streaming."""
@@ -77,13 +364,30 @@ class GroqLLM:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
         
-        stream = await self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            stream=True,
-            **kwargs
-        )
+        self.last_usage = None
+        max_tokens = max_tokens or settings.llm_max_tokens
         
-        async for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        # El hueco de concurrencia se mantiene mientras dura el stream
+        async with self.admission.slot(estimate_tokens(messages, max_tokens), self._admission_timeout()) as reservation:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature or settings.llm_temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                **kwargs
+            )
+            
+            async for chunk in stream:
+                # Groq adjunta el uso de tokens al último fragmento (x_groq.usage)
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                if usage:
+                    self.last_usage = {
+                        "prompt_tokens": usage.prompt_tokens,
+                        "completion_tokens": usage.completion_tokens,
+                        "total_tokens": usage.total_tokens
+                    }
+                    self.admission.settle(reservation, usage.total_tokens)
+                
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
@@ -30,6 +30,9 @@ from common.cache import CacheManager, invalidate_document_update
 from common.db.supabase import get_supabase_client
 from common.db.tables import get_table_name, get_tenant_collections
 
+from services.semantic_cache import mark_collection_updated
+from services.collection_dimensions import forget_collection_dimensions
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
@@ -96,6 +99,7 @@ async def list_collections(
 async def create_collection(
     name: str,
     description: Optional[str] = None,
+    embedding_dimensions: Optional[int] = None,
     tenant_info: TenantInfo = Depends(verify_tenant),
     ctx: Context = None
 ):
@@ -105,12 +109,21 @@ async def create_collection(
     Args:
         name: Nombre de la colección
         description: Descripción opcional
+        embedding_dimensions: Dimensión reducida de sus embeddings (None = la
+            nativa del modelo). No se puede cambiar sin reindexar la colección.
         tenant_info: Información del tenant
         
     Returns:
         CollectionCreationResponse: Datos de la colección creada
     """
     try:
+        settings = get_settings()
+        if embedding_dimensions is not None and embedding_dimensions not in settings.collection_embedding_dimensions:
+            raise InvalidQueryParamsError(
+                message=f"Dimensión de embedding no soportada: {embedding_dimensions}",
+                details={"allowed": settings.collection_embedding_dimensions}
+            )
+        
         # Generar UUID para la colección
         collection_id = str(uuid.uuid4())
         
@@ -120,6 +133,7 @@ async def create_collection(
             "tenant_id": tenant_info.tenant_id,
             "name": name,
             "description": description or "",
+            "embedding_dimensions": embedding_dimensions,
             "is_active": True
         }
         
@@ -223,6 +237,9 @@ async def update_collection(
                 error_code="COLLECTION_UPDATE_ERROR"
             )
         
+        # Descartar las respuestas cacheadas de la colección
+        await mark_collection_updated(tenant_info.tenant_id, collection_id)
+        
         # Extraer datos de la respuesta
         updated_collection = result.data[0] if result.data else {**check_result.data[0], **update_data}
         
@@ -309,6 +326,9 @@ async def delete_collection(
             .eq("collection_id", collection_id) \
             .eq("tenant_id", tenant_info.tenant_id) \
             .execute()
+        
+        await mark_collection_updated(tenant_info.tenant_id, collection_id)
+        forget_collection_dimensions(tenant_info.tenant_id, collection_id)
             
         return DeleteCollectionResponse(
             success=True,
@@ -2,23 +2,34 @@
 Endpoints internos para Agent Service.
 """
 
+import json
 import logging
 import time
-from fastapi import APIRouter, Body
+from typing import Any, AsyncGenerator
+from fastapi import APIRouter, Body, Request
+from fastapi.responses import StreamingResponse
 
-from models.query import InternalQueryRequest, InternalSearchRequest, QueryResponse
-from services.query_processor import process_rag_query, search_documents
+from models.query import InternalQueryRequest, InternalSearchRequest, InternalBatchSearchRequest, QueryResponse
+from services.query_processor import process_rag_query, stream_rag_query, search_documents, search_documents_batch
+from services.semantic_cache import get_semantic_cache
+from services.ann_index import get_ann_index
+from services.single_flight import get_query_coalescer
+from provider.groq import get_admission_stats
+from config.settings import get_settings
+from utils.wire_format import EMBEDDING_FORMAT_HEADER, resolve_embedding
 from common.errors import handle_errors, ServiceError
 from common.context import with_context, Context
 from common.tracking import track_token_usage, TOKEN_TYPE_LLM, OPERATION_QUERY
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 @router.post("/internal/query", response_model=QueryResponse)
 @handle_errors(error_type="service", log_traceback=True)
 @with_context
 async def internal_query(
+    http_request: Request,
     request: InternalQueryRequest = Body(...),
     ctx: Context = None
 ) -> QueryResponse:
@@ -31,7 +42,11 @@ async def internal_query(
         # Procesar consulta
         result = await process_rag_query(
             query=request.query,
-            query_embedding=request.query_embedding,
+            query_embedding=resolve_embedding(
+                request.query_embedding,
+                request.query_embedding_b64,
+                http_request.headers.get(EMBEDDING_FORMAT_HEADER)
+            ),
             tenant_id=request.tenant_id,
             collection_id=request.collection_id,
             agent_id=request.agent_id,
@@ -42,7 +57,12 @@ async def internal_query(
             # Nuevos parámetros para manejo de fallback
             agent_description=request.agent_description,
             fallback_behavior=request.fallback_behavior,
-            relevance_threshold=request.relevance_threshold
+            relevance_threshold=request.relevance_threshold,
+            retrieval_mode=request.retrieval_mode,
+            metadata_filter=request.context_filter,
+            use_semantic_cache=request.semantic_cache,
+            semantic_cache_max_distance=request.semantic_cache_max_distance,
+            timeout_seconds=request.timeout_seconds
         )
         
         # Limitar fuentes si es necesario
@@ -78,10 +98,87 @@ async def internal_query(
             }
         )
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+def _format_event(event: str, data: Any, media_type: str) -> str:
+    """Serializa un evento del stream como SSE o como una línea NDJSON."""
+    if media_type == NDJSON_MEDIA_TYPE:
+        return json.dumps({"event": event, "data": data}, default=str) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/internal/query/stream")
+@handle_errors(error_type="service", log_traceback=True)
+@with_context
+async def internal_query_stream(
+    http_request: Request,
+    request: InternalQueryRequest = Body(...),
+    ctx: Context = None
+) -> StreamingResponse:
+    """
+    Procesa consulta RAG devolviendo la respuesta en streaming.
+    
+    Envía primero las fuentes recuperadas ("sources"), después los fragmentos
+    de texto según los genera el LLM ("token") y al final los metadatos con
+    tiempos y uso de tokens ("done"). Usa SSE por defecto y NDJSON si el
+    cliente lo pide en la cabecera Accept.
+    """
+    start_time = time.time()
+    media_type = NDJSON_MEDIA_TYPE if NDJSON_MEDIA_TYPE in http_request.headers.get("accept", "") else SSE_MEDIA_TYPE
+    query_embedding = resolve_embedding(
+        request.query_embedding,
+        request.query_embedding_b64,
+        http_request.headers.get(EMBEDDING_FORMAT_HEADER)
+    )
+    
+    async def event_stream() -> AsyncGenerator[str, None]:
+        try:
+            async for event, data in stream_rag_query(
+                query=request.query,
+                query_embedding=query_embedding,
+                tenant_id=request.tenant_id,
+                collection_id=request.collection_id,
+                similarity_top_k=request.similarity_top_k,
+                llm_model=request.llm_model,
+                include_sources=request.include_sources,
+                max_sources=request.max_sources,
+                agent_description=request.agent_description,
+                fallback_behavior=request.fallback_behavior,
+                relevance_threshold=request.relevance_threshold,
+                retrieval_mode=request.retrieval_mode,
+                metadata_filter=request.context_filter,
+                use_semantic_cache=request.semantic_cache,
+                semantic_cache_max_distance=request.semantic_cache_max_distance,
+                timeout_seconds=request.timeout_seconds
+            ):
+                if event == "done":
+                    data = {
+                        **data,
+                        "total_time": time.time() - start_time,
+                        "agent_id": request.agent_id,
+                        "conversation_id": request.conversation_id
+                    }
+                yield _format_event(event, data, media_type)
+        except Exception as e:
+            # La respuesta ya empezó: el error viaja como último evento del stream
+            logger.error(f"Error en consulta en streaming: {str(e)}")
+            yield _format_event("error", {
+                "type": type(e).__name__,
+                "message": str(e),
+                "error_time": time.time() - start_time
+            }, media_type)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/internal/search", response_model=QueryResponse)
 @handle_errors(error_type="service", log_traceback=True)
 @with_context
 async def internal_search(
+    http_request: Request,
     request: InternalSearchRequest = Body(...),
     ctx: Context = None
 ) -> QueryResponse:
@@ -93,11 +190,16 @@ async def internal_search(
     try:
         # Buscar documentos
         documents = await search_documents(
-            query_embedding=request.query_embedding,
+            query_embedding=resolve_embedding(
+                request.query_embedding,
+                request.query_embedding_b64,
+                http_request.headers.get(EMBEDDING_FORMAT_HEADER)
+            ),
             tenant_id=request.tenant_id,
             collection_id=request.collection_id,
             limit=request.limit,
-            threshold=request.similarity_threshold
+            threshold=request.similarity_threshold,
+            metadata_filter=request.metadata_filter
         )
         
         return QueryResponse(
@@ -124,3 +226,101 @@ async def internal_search(
                 "message": str(e)
             }
         )
+
+@router.post("/internal/search/batch", response_model=QueryResponse)
+@handle_errors(error_type="service", log_traceback=True)
+@with_context
+async def internal_search_batch(
+    http_request: Request,
+    request: InternalBatchSearchRequest = Body(...),
+    ctx: Context = None
+) -> QueryResponse:
+    """
+    Ejecuta varias búsquedas sin generar respuesta, en paralelo acotado.
+    
+    Los resultados se devuelven en el orden de las búsquedas recibidas; el
+    fallo de una búsqueda se informa en su resultado sin afectar al resto.
+    """
+    start_time = time.time()
+    
+    try:
+        if len(request.queries) > settings.batch_search_max_queries:
+            raise ServiceError(
+                f"El lote admite como máximo {settings.batch_search_max_queries} búsquedas"
+            )
+        
+        embedding_format = http_request.headers.get(EMBEDDING_FORMAT_HEADER)
+        queries = []
+        for index, query in enumerate(request.queries):
+            collection_id = query.collection_id or request.collection_id
+            if not collection_id:
+                raise ServiceError(f"La búsqueda {index} del lote no indica colección")
+            queries.append({
+                "query_embedding": resolve_embedding(query.query_embedding, query.query_embedding_b64, embedding_format),
+                "collection_id": collection_id,
+                "limit": query.limit or request.limit,
+                "threshold": query.similarity_threshold if query.similarity_threshold is not None else request.similarity_threshold,
+                "metadata_filter": query.metadata_filter if query.metadata_filter is not None else request.metadata_filter
+            })
+        
+        results = await search_documents_batch(
+            tenant_id=request.tenant_id,
+            queries=queries,
+            max_concurrency=min(
+                request.max_concurrency or settings.batch_search_concurrency,
+                settings.batch_search_concurrency
+            )
+        )
+        
+        failed = sum(1 for result in results if result["error"])
+        return QueryResponse(
+            success=True,
+            message="Búsquedas completadas" if not failed else f"Búsquedas completadas ({failed} con error)",
+            data={
+                "results": [
+                    {**result, "documents": [doc.dict() for doc in result["documents"]]}
+                    for result in results
+                ],
+                "count": len(results)
+            },
+            metadata={
+                "search_time": time.time() - start_time,
+                "queries": len(results),
+                "failed_queries": failed
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Error en búsqueda por lotes: {str(e)}")
+        return QueryResponse(
+            success=False,
+            message="Error en búsqueda por lotes",
+            data={},
+            metadata={"error_time": time.time() - start_time},
+            error={
+                "type": type(e).__name__,
+                "message": str(e)
+            }
+        )
+
+@router.get("/internal/metrics", response_model=QueryResponse)
+@handle_errors(error_type="service", log_traceback=True)
+async def internal_metrics() -> QueryResponse:
+    """
+    Métricas de los componentes en memoria del servicio.
+    
+    Incluye la admisión a Groq por modelo (cola, rechazos y esperas
+    agotadas), la caché semántica, las réplicas ANN locales y la agrupación
+    de consultas idénticas.
+    """
+    return QueryResponse(
+        success=True,
+        message="Métricas del servicio",
+        data={
+            "groq_admission": get_admission_stats(),
+            "semantic_cache": get_semantic_cache().get_stats(),
+            "ann_index": get_ann_index().get_stats(),
+            "query_coalescing": get_query_coalescer().get_stats()
+        },
+        metadata={"timestamp": time.time()}
+    )
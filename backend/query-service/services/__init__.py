@@ -7,7 +7,9 @@ y búsqueda vectorial del servicio refactorizado.
 
 from .query_processor import (
     process_rag_query,
-    search_documents
+    stream_rag_query,
+    search_documents,
+    search_documents_batch
 )
 from .vector_store import (
     search_by_embedding,
@@ -16,7 +18,9 @@ from .vector_store import (
 
 __all__ = [
     "process_rag_query",
+    "stream_rag_query",
     "search_documents",
+    "search_documents_batch",
     "search_by_embedding",
     "get_collection_info"
 ]
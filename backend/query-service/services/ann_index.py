@@ -0,0 +1,338 @@
+"""
+Réplica en memoria de los embeddings de las colecciones más consultadas.
+
+Cada búsqueda por similitud va por red a la función match_documents de
+Supabase. Para las colecciones pequeñas y medianas con tráfico, el servicio
+mantiene una copia local de sus chunks (matriz float32 normalizada) y
+resuelve el top-k con un producto matricial, sin salir del proceso.
+
+- Carga perezosa: una colección se replica en segundo plano cuando acumula
+  ann_hot_threshold búsquedas; mientras tanto se sigue usando la RPC.
+- Presupuesto de memoria: las réplicas se desalojan por LRU cuando su tamaño
+  total supera ann_memory_budget_mb.
+- Frescura: ingestion-service renueva la versión de la colección en la caché
+  centralizada con cada cambio (ver services.semantic_cache). Si la versión
+  cambia, la réplica se descarta y se vuelve a cargar.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from common.db.supabase import get_supabase_client
+from common.db.tables import get_table_name
+
+from config.settings import get_settings
+from services.semantic_cache import get_collection_version
+from services.metadata_filter import filter_key, metadata_matches
+
+logger = logging.getLogger(__name__)
+
+CollectionKey = Tuple[str, str]
+
+# Máscaras de filtros de metadatos recordadas por réplica
+MAX_CACHED_MASKS = 32
+
+# Colecciones no replicadas cuyo contador de búsquedas (o tamaño excesivo) se recuerda
+MAX_TRACKED_COLLECTIONS = 4096
+
+
+def _parse_embedding(value: Any) -> Optional[List[float]]:
+    """pgvector llega por PostgREST como texto '[0.1,0.2,...]'."""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return value or None
+
+
+class CollectionIndex:
+    """Chunks de una colección con sus embeddings normalizados."""
+
+    def __init__(self, version: Optional[str], rows: List[Dict[str, Any]], matrix: np.ndarray):
+        self.version = version
+        self.rows = rows
+        self.matrix = matrix
+        self.checked_at = time.time()
+        self.memory_bytes = matrix.nbytes + sum(len(row["content"] or "") for row in rows)
+        self._masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def filter_mask(self, metadata_filter: Dict[str, Any]) -> np.ndarray:
+        """Filas que cumplen un filtro de metadatos (calculado una vez por filtro)."""
+        key = filter_key(metadata_filter)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter(
+                (metadata_matches(row["metadata"], metadata_filter) for row in self.rows),
+                dtype=bool,
+                count=len(self.rows)
+            )
+            self._masks[key] = mask
+            if len(self._masks) > MAX_CACHED_MASKS:
+                self._masks.popitem(last=False)
+        else:
+            self._masks.move_to_end(key)
+        return mask
+
+    def search(
+        self,
+        embedding: np.ndarray,
+        top_k: int,
+        threshold: float,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Top-k por similitud coseno, con el mismo formato que match_documents."""
+        if not self.rows:
+            return []
+
+        similarities = self.matrix @ embedding
+        if metadata_filter:
+            mask = self.filter_mask(metadata_filter)
+            if not mask.any():
+                return []
+            # Las filas excluidas quedan por debajo de cualquier umbral
+            similarities = np.where(mask, similarities, -np.inf)
+
+        k = min(top_k, len(self.rows))
+        candidates = np.argpartition(-similarities, k - 1)[:k]
+        candidates = candidates[np.argsort(-similarities[candidates])]
+
+        return [
+            {**self.rows[i], "similarity": float(similarities[i])}
+            for i in candidates
+            if similarities[i] >= threshold
+        ]
+
+
+class ANNIndexManager:
+    """
+    Réplicas locales por (tenant, colección) con presupuesto de memoria LRU.
+
+    search() devuelve None cuando la colección no está replicada (o no puede
+    estarlo) y el llamador debe recurrir a la búsqueda en base de datos.
+    """
+
+    def __init__(self):
+        settings = get_settings()
+        self.memory_budget = settings.ann_memory_budget_mb * 1024 * 1024
+        self.hot_threshold = settings.ann_hot_threshold
+        self.max_chunks = settings.ann_max_collection_chunks
+        self.page_size = settings.ann_load_page_size
+        self.version_check_interval = settings.ann_version_check_interval
+
+        self._indexes: "OrderedDict[CollectionKey, CollectionIndex]" = OrderedDict()
+        # Búsquedas remotas por colección no replicada (LRU acotado)
+        self._search_counts: "OrderedDict[CollectionKey, int]" = OrderedDict()
+        # Colecciones demasiado grandes para replicar: versión descartada y
+        # momento de la última comprobación (LRU acotado)
+        self._oversized: "OrderedDict[CollectionKey, Tuple[Optional[str], float]]" = OrderedDict()
+        self._loading: Dict[CollectionKey, asyncio.Task] = {}
+        self._metrics = {"local_searches": 0, "fallbacks": 0, "loads": 0, "evictions": 0, "refreshes": 0}
+
+    async def search(
+        self,
+        tenant_id: str,
+        collection_id: str,
+        query_embedding: List[float],
+        top_k: int,
+        threshold: float,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Busca en la réplica local de la colección.
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: Documentos similares, o None si la
+            búsqueda debe hacerse en base de datos
+        """
+        key = (tenant_id, collection_id)
+        index = await self._get_fresh_index(key)
+
+        if index is None:
+            self._metrics["fallbacks"] += 1
+            self._track_search(key)
+            return None
+
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm or vector.shape[0] != index.matrix.shape[1]:
+            self._metrics["fallbacks"] += 1
+            return None
+
+        self._indexes.move_to_end(key)
+        self._metrics["local_searches"] += 1
+        return index.search(vector / norm, top_k, threshold, metadata_filter)
+
+    def invalidate(self, tenant_id: str, collection_id: str):
+        """Descarta la réplica de una colección (se recargará si sigue en uso)."""
+        key = (tenant_id, collection_id)
+        self._indexes.pop(key, None)
+        self._oversized.pop(key, None)
+
+    async def close(self):
+        """Cancela las cargas en curso y libera las réplicas."""
+        for task in self._loading.values():
+            task.cancel()
+        await asyncio.gather(*self._loading.values(), return_exceptions=True)
+        self._loading.clear()
+        self._indexes.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de las réplicas locales."""
+        return {
+            **self._metrics,
+            "collections": len(self._indexes),
+            "chunks": sum(len(index.rows) for index in self._indexes.values()),
+            "memory_mb": round(sum(index.memory_bytes for index in self._indexes.values()) / (1024 * 1024), 2),
+            "loading": len(self._loading),
+            "oversized": len(self._oversized),
+            "tracked": len(self._search_counts)
+        }
+
+    async def _get_fresh_index(self, key: CollectionKey) -> Optional[CollectionIndex]:
+        """Réplica de la colección, descartándola si su versión ha cambiado."""
+        index = self._indexes.get(key)
+        if index is None or time.time() - index.checked_at < self.version_check_interval:
+            return index
+
+        version = await get_collection_version(*key)
+        if version != index.version:
+            logger.info(f"Colección {key[1]} modificada, se recarga su réplica local")
+            del self._indexes[key]
+            self._metrics["refreshes"] += 1
+            self._schedule_load(key)
+            return None
+
+        index.checked_at = time.time()
+        return index
+
+    def _track_search(self, key: CollectionKey):
+        """Cuenta las búsquedas remotas y programa la carga al volverse caliente."""
+        oversized = self._oversized.get(key)
+        if oversized and time.time() - oversized[1] < self.version_check_interval:
+            # Demasiado grande en su versión actual: no se reintenta hasta la siguiente comprobación
+            return
+
+        count = self._search_counts.pop(key, 0) + 1
+        if count < self.hot_threshold:
+            self._search_counts[key] = count
+            while len(self._search_counts) > MAX_TRACKED_COLLECTIONS:
+                self._search_counts.popitem(last=False)
+            return
+        self._schedule_load(key)
+
+    def _schedule_load(self, key: CollectionKey):
+        if key in self._loading:
+            return
+        task = asyncio.create_task(self._load(key))
+        self._loading[key] = task
+        task.add_done_callback(lambda _: self._loading.pop(key, None))
+
+    async def _load(self, key: CollectionKey):
+        """Carga en memoria los chunks de una colección."""
+        tenant_id, collection_id = key
+        try:
+            version = await get_collection_version(tenant_id, collection_id)
+            oversized = self._oversized.get(key)
+            if oversized and oversized[0] == version:
+                # Misma versión que la descartada: solo se renueva la comprobación
+                self._oversized[key] = (version, time.time())
+                return
+
+            start_time = time.time()
+            rows, embeddings = await self._fetch_chunks(tenant_id, collection_id)
+            if rows is None:
+                self._oversized.pop(key, None)
+                self._oversized[key] = (version, time.time())
+                while len(self._oversized) > MAX_TRACKED_COLLECTIONS:
+                    self._oversized.popitem(last=False)
+                logger.info(f"Colección {collection_id} supera {self.max_chunks} chunks, no se replica")
+                return
+
+            matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(rows), -1)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+
+            self._indexes[key] = CollectionIndex(version, rows, matrix)
+            self._oversized.pop(key, None)
+            self._metrics["loads"] += 1
+            self._evict()
+            logger.info(
+                f"Réplica local de la colección {collection_id} cargada: "
+                f"{len(rows)} chunks en {time.time() - start_time:.2f}s"
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Error cargando la réplica local de la colección {collection_id}: {str(e)}")
+
+    async def _fetch_chunks(
+        self,
+        tenant_id: str,
+        collection_id: str
+    ) -> Tuple[Optional[List[Dict[str, Any]]], List[List[float]]]:
+        """Lee los chunks paginando; None si la colección excede el máximo."""
+        supabase = await get_supabase_client()
+        table = get_table_name("document_chunks")
+        rows: List[Dict[str, Any]] = []
+        embeddings: List[List[float]] = []
+
+        offset = 0
+        while True:
+            response = await supabase.table(table) \
+                .select("id, content, metadata, embedding") \
+                .eq("tenant_id", tenant_id) \
+                .eq("collection_id", collection_id) \
+                .order("id") \
+                .range(offset, offset + self.page_size - 1) \
+                .execute()
+
+            page = response.data or []
+            for chunk in page:
+                embedding = _parse_embedding(chunk.get("embedding"))
+                if embedding is None:
+                    continue
+                rows.append({
+                    "id": chunk["id"],
+                    "content": chunk["content"],
+                    "metadata": chunk.get("metadata") or {}
+                })
+                embeddings.append(embedding)
+
+            if len(rows) > self.max_chunks:
+                return None, []
+            if len(page) < self.page_size:
+                return rows, embeddings
+            offset += self.page_size
+
+    def _evict(self):
+        """Desaloja las réplicas menos usadas hasta respetar el presupuesto."""
+        total = sum(index.memory_bytes for index in self._indexes.values())
+        while total > self.memory_budget and len(self._indexes) > 1:
+            key, index = self._indexes.popitem(last=False)
+            total -= index.memory_bytes
+            self._metrics["evictions"] += 1
+            logger.info(f"Réplica local de la colección {key[1]} desalojada por presupuesto de memoria")
+
+
+# Instancia compartida de las réplicas
+_manager: Optional[ANNIndexManager] = None
+
+
+def get_ann_index() -> ANNIndexManager:
+    """Obtiene la instancia compartida de las réplicas locales."""
+    global _manager
+    if _manager is None:
+        _manager = ANNIndexManager()
+    return _manager
+
+
+async def shutdown_ann_index():
+    """Libera las réplicas locales."""
+    global _manager
+    if _manager:
+        await _manager.close()
+        _manager = None
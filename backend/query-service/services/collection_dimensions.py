@@ -0,0 +1,75 @@
+"""
+Dimensión de los embeddings de cada colección (Matryoshka).
+
+Una colección puede guardar sus chunks con vectores reducidos
+(ai.collections.embedding_dimensions, p. ej. 256 o 512). El embedding de la
+consulta tiene que estar en esa misma dimensión: si llega completo se trunca
+y se vuelve a normalizar (equivale a pedirlo reducido al servicio de
+embeddings), y si llega más corto que la colección la búsqueda se rechaza.
+"""
+
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from common.db.supabase import get_supabase_client
+from common.db.tables import get_table_name
+from common.errors import ServiceError
+
+from config.settings import get_settings
+from utils.wire_format import Embedding
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Dimensión de cada colección y momento de la consulta
+_collection_dimensions: Dict[Tuple[str, str], Tuple[Optional[int], float]] = {}
+
+
+async def get_collection_dimensions(tenant_id: str, collection_id: str) -> Optional[int]:
+    """Dimensión declarada por una colección (None = la nativa del modelo)."""
+    key = (tenant_id, collection_id)
+    cached = _collection_dimensions.get(key)
+    if cached and time.time() - cached[1] < settings.collection_dimensions_ttl:
+        return cached[0]
+
+    try:
+        supabase = await get_supabase_client()
+        response = await supabase.table(get_table_name("collections")) \
+            .select("embedding_dimensions") \
+            .eq("tenant_id", tenant_id) \
+            .eq("collection_id", collection_id) \
+            .limit(1) \
+            .execute()
+    except Exception as e:
+        # Sin la dimensión se busca con el vector tal como llega
+        logger.warning(f"Error obteniendo la dimensión de la colección {collection_id}: {str(e)}")
+        return None
+
+    dimensions = response.data[0].get("embedding_dimensions") if response.data else None
+    _collection_dimensions[key] = (dimensions, time.time())
+    return dimensions
+
+
+def forget_collection_dimensions(tenant_id: str, collection_id: str):
+    """Olvida la dimensión recordada de una colección."""
+    _collection_dimensions.pop((tenant_id, collection_id), None)
+
+
+async def fit_query_embedding(tenant_id: str, collection_id: str, query_embedding: Embedding) -> Embedding:
+    """Ajusta el embedding de una consulta a la dimensión de la colección."""
+    dimensions = await get_collection_dimensions(tenant_id, collection_id)
+    if not dimensions or len(query_embedding) == dimensions:
+        return query_embedding
+
+    if len(query_embedding) < dimensions:
+        raise ServiceError(
+            f"El embedding de la consulta tiene {len(query_embedding)} dimensiones "
+            f"y la colección {collection_id} usa {dimensions}"
+        )
+
+    vector = np.asarray(query_embedding, dtype=np.float32)[:dimensions]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
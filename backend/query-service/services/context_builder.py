@@ -0,0 +1,174 @@
+"""
+Construcción del contexto RAG con presupuesto de tokens.
+
+Los chunks adyacentes de un mismo documento comparten un solapamiento de
+texto (CHUNK_OVERLAP de la ingesta) y los chunks largos pueden superar la
+ventana de contexto del modelo. El constructor:
+
+1. Recorre los documentos por relevancia y recorta de cada chunk el texto
+   que ya aporta un chunk vecino (chunk_index ± 1) del mismo documento.
+2. Cuenta tokens con un codificador tiktoken compartido y se detiene (o
+   trunca el último chunk) al agotar el presupuesto del modelo.
+3. Presenta juntos, en orden de lectura, los chunks del mismo documento.
+
+El codificador cl100k_base no es el de los modelos Llama de Groq: el recuento
+es una estimación, compensada con el margen reservado para el resto del prompt.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+import tiktoken
+
+from config.settings import get_settings, GROQ_MODELS
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Por debajo de este presupuesto restante no merece la pena truncar un chunk
+MIN_TRUNCATED_TOKENS = 64
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """Codificador compartido para contar tokens (cargarlo es costoso)."""
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Número de tokens de un texto."""
+    return len(_get_encoder().encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Recorta un texto a un número máximo de tokens."""
+    encoder = _get_encoder()
+    tokens = encoder.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens])
+
+
+def context_budget(model: Optional[str] = None) -> int:
+    """
+    Tokens disponibles para el contexto con un modelo.
+
+    Ventana de contexto del modelo menos los tokens reservados para la
+    respuesta y para el resto del prompt, limitado por context_max_tokens.
+    """
+    model_info = GROQ_MODELS.get(model or settings.default_groq_model, {})
+    context_window = model_info.get("context_window", 8192)
+    response_tokens = min(settings.llm_max_tokens, model_info.get("max_tokens", settings.llm_max_tokens))
+    available = context_window - response_tokens - settings.context_reserved_tokens
+    return max(0, min(available, settings.context_max_tokens))
+
+
+def overlap_length(previous: str, current: str, max_overlap: int, min_overlap: int = 20) -> int:
+    """Longitud del sufijo de previous con el que empieza current."""
+    for length in range(min(max_overlap, len(previous), len(current)), min_overlap - 1, -1):
+        if previous.endswith(current[:length]):
+            return length
+    return 0
+
+
+def _chunk_position(doc: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
+    metadata = doc.get("metadata") or {}
+    chunk_index = metadata.get("chunk_index")
+    return metadata.get("document_id"), int(chunk_index) if chunk_index is not None else None
+
+
+def build_context(
+    docs: List[Dict[str, Any]],
+    model: Optional[str] = None,
+    max_tokens: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Construye el texto de contexto de los documentos dentro del presupuesto.
+
+    Args:
+        docs: Documentos ordenados por relevancia
+        model: Modelo Groq que recibirá el prompt
+        max_tokens: Presupuesto explícito (por defecto, el del modelo)
+
+    Returns:
+        Dict con el contexto, los documentos usados, los tokens consumidos,
+        el presupuesto y los caracteres de solapamiento eliminados
+    """
+    budget = context_budget(model) if max_tokens is None else max_tokens
+    max_overlap = settings.context_max_overlap_chars
+
+    selected: List[Dict[str, Any]] = []
+    by_position: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    used_tokens = 0
+    overlap_removed = 0
+    truncated = False
+
+    for doc in docs:
+        text = doc["content"] or ""
+        document_id, chunk_index = _chunk_position(doc)
+
+        if document_id is not None and chunk_index is not None:
+            # El texto compartido con un vecino ya seleccionado se omite
+            previous = by_position.get((document_id, chunk_index - 1))
+            if previous:
+                cut = overlap_length(previous["content"], text, max_overlap)
+                text = text[cut:]
+                overlap_removed += cut
+            following = by_position.get((document_id, chunk_index + 1))
+            if following:
+                cut = overlap_length(text, following["content"], max_overlap)
+                text = text[:len(text) - cut]
+                overlap_removed += cut
+
+        if not text.strip():
+            continue
+
+        tokens = count_tokens(text)
+        remaining = budget - used_tokens
+        if tokens > remaining:
+            if remaining >= MIN_TRUNCATED_TOKENS or not selected:
+                text = truncate_to_tokens(text, remaining)
+                tokens = count_tokens(text)
+                truncated = True
+            else:
+                break
+
+        if not text:
+            break
+
+        entry = {"doc": doc, "text": text, "rank": len(selected)}
+        selected.append(entry)
+        if document_id is not None and chunk_index is not None:
+            by_position[(document_id, chunk_index)] = {"content": doc["content"]}
+        used_tokens += tokens
+
+        if truncated:
+            break
+
+    # Agrupar por documento (en el orden del chunk más relevante) y por posición
+    group_rank: Dict[Any, int] = {}
+    for entry in selected:
+        document_id, _ = _chunk_position(entry["doc"])
+        key = document_id if document_id is not None else ("__rank__", entry["rank"])
+        group_rank.setdefault(key, entry["rank"])
+        entry["group"] = group_rank[key]
+
+    selected.sort(key=lambda entry: (entry["group"], _chunk_position(entry["doc"])[1] or 0, entry["rank"]))
+
+    context = "\n".join(f"[Documento {i+1}]:\n{entry['text']}\n" for i, entry in enumerate(selected))
+
+    if len(selected) < len(docs) or truncated:
+        logger.info(
+            f"Contexto ajustado al presupuesto de {budget} tokens: "
+            f"{len(selected)}/{len(docs)} documentos{' (último truncado)' if truncated else ''}"
+        )
+
+    return {
+        "context": context,
+        "documents": [entry["doc"] for entry in selected],
+        "tokens": used_tokens,
+        "budget": budget,
+        "truncated": truncated,
+        "overlap_chars_removed": overlap_removed
+    }
@@ -0,0 +1,188 @@
+"""
+Recuperación híbrida: búsqueda léxica y vectorial fusionadas con RRF.
+
+La similitud densa recupera mal los identificadores exactos (referencias,
+códigos de error), que llegan con baja similitud y activan el fallback de
+baja relevancia. La búsqueda híbrida ejecuta a la vez la búsqueda vectorial
+y una búsqueda por texto completo, ordena los candidatos léxicos con BM25 y
+combina ambas listas con Reciprocal Rank Fusion:
+
+    rrf(d) = Σ 1 / (k + rango_i(d))
+
+Los documentos conservan su similitud coseno real y se marcan con exact_match
+cuando contienen todos los identificadores de la consulta. La búsqueda léxica
+no trae vectores: solo se piden los de los documentos encontrados únicamente
+por texto que sobreviven a la fusión, para puntuarlos localmente.
+"""
+
+import asyncio
+import logging
+import math
+import re
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from config.settings import get_settings
+from services.vector_store import (
+    search_by_embedding,
+    search_by_text,
+    get_chunk_embeddings,
+    query_terms,
+    tokenize
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Identificadores: términos con dígitos o con separadores internos (AB-1234, E_42)
+_IDENTIFIER_RE = re.compile(r"\d|[\w][\-_.][\w]")
+
+
+def identifier_terms(query: str) -> List[str]:
+    """Términos de la consulta con aspecto de identificador."""
+    return [term for term in query_terms(query) if _IDENTIFIER_RE.search(term)]
+
+
+def bm25_rank(docs: List[Dict[str, Any]], terms: List[str], k1: float = 1.2, b: float = 0.75) -> List[Dict[str, Any]]:
+    """
+    Ordena candidatos léxicos con BM25 calculado sobre el propio conjunto.
+
+    Returns:
+        Documentos con "lexical_score", de mayor a menor puntuación
+    """
+    if not docs or not terms:
+        return []
+
+    tokenized = [tokenize(doc["content"]) for doc in docs]
+    lengths = [len(tokens) or 1 for tokens in tokenized]
+    avg_length = sum(lengths) / len(lengths)
+
+    frequencies = [{} for _ in docs]
+    for tokens, freq in zip(tokenized, frequencies):
+        for token in tokens:
+            freq[token] = freq.get(token, 0) + 1
+
+    scored = []
+    for doc, freq, length in zip(docs, frequencies, lengths):
+        score = 0.0
+        for term in terms:
+            tf = freq.get(term, 0)
+            if not tf:
+                continue
+            df = sum(1 for other in frequencies if term in other)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+        if score > 0:
+            scored.append({**doc, "lexical_score": score})
+
+    return sorted(scored, key=lambda doc: doc["lexical_score"], reverse=True)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Fusiona listas ordenadas de documentos por su identificador.
+
+    Returns:
+        Documentos con "rrf_score", de mayor a menor puntuación
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            entry = fused.setdefault(doc["id"], {**doc, "rrf_score": 0.0})
+            entry.update({key: value for key, value in doc.items() if key not in entry})
+            entry["rrf_score"] += 1.0 / (k + rank)
+
+    return sorted(fused.values(), key=lambda doc: doc["rrf_score"], reverse=True)
+
+
+def _cosine_similarity(query_embedding: List[float], embedding: List[float]) -> float:
+    query_vector = np.asarray(query_embedding, dtype=np.float32)
+    doc_vector = np.asarray(embedding, dtype=np.float32)
+    if query_vector.shape != doc_vector.shape:
+        return 0.0
+    norm = np.linalg.norm(query_vector) * np.linalg.norm(doc_vector)
+    return float(query_vector @ doc_vector / norm) if norm else 0.0
+
+
+async def hybrid_search(
+    tenant_id: str,
+    collection_id: str,
+    query: str,
+    query_embedding: List[float],
+    top_k: int = 4,
+    threshold: float = 0.7,
+    metadata_filter: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Busca documentos combinando búsqueda vectorial y por texto completo.
+
+    Args:
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        query: Texto de la consulta
+        query_embedding: Vector de búsqueda
+        top_k: Número de resultados
+        threshold: Umbral mínimo de similitud de la parte vectorial
+        metadata_filter: Contención JSONB exigida a los metadatos del chunk
+
+    Returns:
+        Lista de documentos con similitud, ordenada por RRF
+    """
+    candidates = max(top_k, settings.hybrid_candidates)
+    vector_docs, text_docs = await asyncio.gather(
+        search_by_embedding(
+            tenant_id=tenant_id,
+            collection_id=collection_id,
+            query_embedding=query_embedding,
+            top_k=candidates,
+            threshold=threshold,
+            metadata_filter=metadata_filter
+        ),
+        search_by_text(
+            tenant_id=tenant_id,
+            collection_id=collection_id,
+            query=query,
+            limit=candidates,
+            metadata_filter=metadata_filter
+        ),
+        return_exceptions=True
+    )
+
+    # Una búsqueda fallida no impide usar la otra
+    if isinstance(vector_docs, Exception):
+        if isinstance(text_docs, Exception):
+            raise vector_docs
+        logger.warning(f"Búsqueda híbrida sin parte vectorial: {str(vector_docs)}")
+        vector_docs = []
+    if isinstance(text_docs, Exception):
+        logger.warning(f"Búsqueda híbrida sin parte léxica: {str(text_docs)}")
+        text_docs = []
+
+    lexical_docs = bm25_rank(text_docs, query_terms(query))
+    fused = reciprocal_rank_fusion([vector_docs, lexical_docs], k=settings.hybrid_rrf_k)[:top_k]
+
+    # Vectores solo de los documentos léxicos que entran en el resultado
+    lexical_only = [doc["id"] for doc in fused if "similarity" not in doc]
+    embeddings = {}
+    if lexical_only:
+        try:
+            embeddings = await get_chunk_embeddings(tenant_id, collection_id, lexical_only)
+        except Exception as e:
+            logger.warning(f"Búsqueda híbrida sin similitud de los documentos léxicos: {str(e)}")
+
+    identifiers = identifier_terms(query)
+    results = []
+    for doc in fused:
+        if "similarity" not in doc:
+            embedding = embeddings.get(doc["id"])
+            doc["similarity"] = _cosine_similarity(query_embedding, embedding) if embedding else 0.0
+        content = doc["content"].lower()
+        doc["exact_match"] = bool(identifiers) and all(term in content for term in identifiers)
+        results.append(doc)
+
+    logger.info(
+        f"Búsqueda híbrida: {len(vector_docs)} vectoriales, {len(lexical_docs)} léxicos, "
+        f"{len(results)} fusionados"
+    )
+    return results
@@ -0,0 +1,49 @@
+"""
+Filtros de metadatos de chunks con la semántica de contención JSONB (@>).
+
+match_documents aplica el filtro en base de datos como metadata @> filtro;
+estas funciones reproducen esa semántica para las búsquedas que se resuelven
+en memoria (réplica local de la colección).
+"""
+
+import json
+from typing import Dict, Any, Optional
+
+# Claves de alcance que fija siempre el servicio: un filtro no puede cambiarlas
+SCOPE_KEYS = ("tenant_id", "collection_id")
+
+
+def normalize_filter(metadata_filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Filtro sin claves de alcance; None si no filtra nada."""
+    if not metadata_filter:
+        return None
+    cleaned = {key: value for key, value in metadata_filter.items() if key not in SCOPE_KEYS}
+    return cleaned or None
+
+
+def filter_key(metadata_filter: Optional[Dict[str, Any]]) -> str:
+    """Representación canónica de un filtro (para cachés y huellas)."""
+    return json.dumps(metadata_filter or {}, sort_keys=True, default=str)
+
+
+def contains(value: Any, expected: Any) -> bool:
+    """
+    Comprueba si value contiene a expected como lo haría jsonb @>.
+
+    Los objetos contienen a otro si contienen cada una de sus claves; los
+    arrays, si cada elemento esperado está contenido en alguno de los suyos.
+    """
+    if isinstance(expected, dict):
+        return isinstance(value, dict) and all(
+            key in value and contains(value[key], item) for key, item in expected.items()
+        )
+    if isinstance(expected, list):
+        return isinstance(value, list) and all(
+            any(contains(candidate, item) for candidate in value) for item in expected
+        )
+    return value == expected
+
+
+def metadata_matches(metadata: Optional[Dict[str, Any]], metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    """Indica si los metadatos de un chunk cumplen el filtro."""
+    return not metadata_filter or contains(metadata or {}, metadata_filter)
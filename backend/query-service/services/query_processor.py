@@ -2,64 +2,69 @@
 Procesador de consultas RAG simplificado.
 """
 
+import asyncio
 import logging
 import time
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncGenerator, Tuple
 
 from models.query import DocumentMatch
 from provider.groq import GroqLLM
 from services.vector_store import search_by_embedding
+from services.hybrid_search import hybrid_search
+from services.context_builder import build_context
+from services.single_flight import get_query_coalescer, coalescing_key
+from services.semantic_cache import get_semantic_cache, query_fingerprint
+from services.collection_dimensions import fit_query_embedding
 from config.settings import get_settings
 from common.tracking import track_token_usage, TOKEN_TYPE_LLM, OPERATION_QUERY
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-async def process_rag_query(
+async def prepare_rag_context(
     query: str,
     query_embedding: List[float],
     tenant_id: str,
     collection_id: str,
-    agent_id: Optional[str] = None,
-    conversation_id: Optional[str] = None,
     similarity_top_k: int = 4,
-    llm_model: Optional[str] = None,
     include_sources: bool = True,
     agent_description: Optional[str] = None,
     fallback_behavior: str = "agent_knowledge",
-    relevance_threshold: float = 0.75
+    relevance_threshold: float = 0.75,
+    retrieval_mode: str = "vector",
+    llm_model: Optional[str] = None,
+    metadata_filter: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
-    Procesa consulta RAG con embedding pre-calculado y manejo de fallback inteligente.
+    Recupera los documentos de una consulta RAG y construye los prompts.
+    
+    Es la parte común de la respuesta completa y de la respuesta en streaming.
     
-    Args:
-        query: Texto de la consulta
-        query_embedding: Embedding del query (desde Embedding Service)
-        tenant_id: ID del tenant
-        collection_id: ID de la colección
-        agent_id: ID del agente (opcional)
-        conversation_id: ID de la conversación (opcional)
-        similarity_top_k: Número de documentos similares
-        llm_model: Modelo LLM a usar
-        include_sources: Si incluir fuentes en respuesta
-        agent_description: Descripción del agente para casos de fallback
-        fallback_behavior: Estrategia para casos sin resultados relevantes
-        relevance_threshold: Umbral para considerar documentos realmente relevantes
-        
     Returns:
-        Dict con respuesta y metadatos
+        Dict con los documentos encontrados, las fuentes, la calidad de las
+        fuentes, los prompts y, si la consulta se rechaza, la respuesta fija
     """
-    start_time = time.time()
-    
     # 1. Buscar documentos similares
     logger.info(f"Buscando documentos similares en colección {collection_id}")
-    similar_docs = await search_by_embedding(
-        tenant_id=tenant_id,
-        collection_id=collection_id,
-        query_embedding=query_embedding,
-        top_k=similarity_top_k,
-        threshold=settings.similarity_threshold
-    )
+    if retrieval_mode == "hybrid":
+        similar_docs = await hybrid_search(
+            tenant_id=tenant_id,
+            collection_id=collection_id,
+            query=query,
+            query_embedding=query_embedding,
+            top_k=similarity_top_k,
+            threshold=settings.similarity_threshold,
+            metadata_filter=metadata_filter
+        )
+    else:
+        similar_docs = await search_by_embedding(
+            tenant_id=tenant_id,
+            collection_id=collection_id,
+            query_embedding=query_embedding,
+            top_k=similarity_top_k,
+            threshold=settings.similarity_threshold,
+            metadata_filter=metadata_filter
+        )
     
     # 2. Determinar si hay documentos realmente relevantes
     has_relevant_docs = False
@@ -67,7 +72,11 @@ async def process_rag_query(
     
     if similar_docs:
         # Verificar si al menos un documento supera el umbral de relevancia estricto
-        has_relevant_docs = any(doc['similarity'] > relevance_threshold for doc in similar_docs)
+        # o contiene literalmente los identificadores de la consulta (modo híbrido)
+        has_relevant_docs = any(
+            doc['similarity'] > relevance_threshold or doc.get('exact_match')
+            for doc in similar_docs
+        )
         
         if has_relevant_docs:
             source_quality = "high"
@@ -87,18 +96,21 @@ async def process_rag_query(
                 "similarity": doc['similarity']
             })
     
+    rag_context = {
+        "similar_docs": similar_docs,
+        "sources": sources,
+        "source_quality": source_quality,
+        "system_prompt": None,
+        "prompt": None,
+        "rejected_response": None,
+        "context_stats": None
+    }
+    
     # 4. Determinar comportamiento según disponibilidad de información
     if not similar_docs and fallback_behavior == "reject_query":
         # Caso 1: No hay documentos y política es rechazar
-        return {
-            "response": "No dispongo de información para responder a esta pregunta.",
-            "sources": [],
-            "metadata": {
-                "found_documents": 0,
-                "processing_time": time.time() - start_time,
-                "source_quality": source_quality
-            }
-        }
+        rag_context["rejected_response"] = "No dispongo de información para responder a esta pregunta."
+        return rag_context
     
     # 5. Construir prompt y system prompt según escenario
     system_prompt = """"""
@@ -121,7 +133,9 @@ async def process_rag_query(
         Si no puedes responder con confianza, indícalo claramente."""
         
         # Incluimos el contexto de todas formas, pero indicamos que podría no ser muy relevante
-        context = "\n".join(f"[Documento {i+1}]:\n{doc['content']}\n" for i, doc in enumerate(similar_docs[:similarity_top_k]))
+        packed = build_context(similar_docs[:similarity_top_k], llm_model)
+        context = packed["context"]
+        rag_context["context_stats"] = packed
         prompt = f"""Contexto (posiblemente no directamente relevante):
 {context}
 
@@ -134,12 +148,10 @@ Responde basándote principalmente en tu conocimiento del agente, usando el cont
         system_prompt = """Eres un asistente útil que responde preguntas basándose ÚNICAMENTE en el contexto proporcionado. 
 Si la información no está en el contexto, di que no tienes esa información."""
         
-        # Construir contexto como lo hacemos actualmente
-        context_parts = []
-        for i, doc in enumerate(similar_docs[:similarity_top_k]):
-            context_parts.append(f"[Documento {i+1}]:\n{doc['content']}\n")
-        
-        context = "\n".join(context_parts)
+        # Construir contexto dentro del presupuesto de tokens del modelo
+        packed = build_context(similar_docs[:similarity_top_k], llm_model)
+        context = packed["context"]
+        rag_context["context_stats"] = packed
         prompt = f"""Contexto:
 {context}
 
@@ -147,11 +159,164 @@ Pregunta: {query}
 
 Responde basándote SOLO en el contexto anterior:"""
     
+    rag_context["system_prompt"] = system_prompt
+    rag_context["prompt"] = prompt
+    return rag_context
+
+def _rag_metadata(rag_context: Dict[str, Any], similarity_top_k: int, model: Optional[str]) -> Dict[str, Any]:
+    """Metadatos de documentos usados comunes a ambas variantes de respuesta."""
+    similar_docs = rag_context["similar_docs"]
+    metadata = {
+        "found_documents": len(similar_docs) if similar_docs else 0,
+        "source_quality": rag_context["source_quality"]
+    }
+    if rag_context["rejected_response"] is None:
+        metadata.update({
+            "model": model,
+            "used_documents": min(similarity_top_k, len(similar_docs)) if similar_docs else 0,
+            "avg_similarity": sum(d['similarity'] for d in similar_docs) / len(similar_docs) if similar_docs else 0.0
+        })
+    
+    packed = rag_context["context_stats"]
+    if packed:
+        metadata.update({
+            "used_documents": len(packed["documents"]),
+            "context_tokens": packed["tokens"],
+            "context_budget": packed["budget"],
+            "context_truncated": packed["truncated"],
+            "overlap_chars_removed": packed["overlap_chars_removed"]
+        })
+    return metadata
+
+async def _lookup_semantic_cache(
+    enabled: bool,
+    tenant_id: str,
+    collection_id: str,
+    llm_model: Optional[str],
+    query_embedding: List[float],
+    max_distance: Optional[float],
+    **params: Any
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Consulta la caché semántica si la petición la solicita.
+    
+    Returns:
+        Tuple: Huella de los parámetros (None si la caché no aplica) y la
+        entrada encontrada, si la hay
+    """
+    if not enabled or not settings.semantic_cache_enabled:
+        return None, None
+    
+    fingerprint = query_fingerprint(**params)
+    cached = await get_semantic_cache().lookup(
+        tenant_id=tenant_id,
+        collection_id=collection_id,
+        model=llm_model or settings.default_groq_model,
+        fingerprint=fingerprint,
+        query_embedding=query_embedding,
+        max_distance=max_distance
+    )
+    if cached:
+        logger.info(f"Respuesta reutilizada de la caché semántica (distancia {cached['distance']:.4f})")
+    return fingerprint, cached
+
+async def _process_rag_query(
+    query: str,
+    query_embedding: List[float],
+    tenant_id: str,
+    collection_id: str,
+    agent_id: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+    similarity_top_k: int = 4,
+    llm_model: Optional[str] = None,
+    include_sources: bool = True,
+    agent_description: Optional[str] = None,
+    fallback_behavior: str = "agent_knowledge",
+    relevance_threshold: float = 0.75,
+    retrieval_mode: str = "vector",
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    use_semantic_cache: bool = False,
+    semantic_cache_max_distance: Optional[float] = None,
+    deadline: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Procesa consulta RAG con embedding pre-calculado y manejo de fallback inteligente.
+    
+    Args:
+        query: Texto de la consulta
+        query_embedding: Embedding del query (desde Embedding Service)
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        agent_id: ID del agente (opcional)
+        conversation_id: ID de la conversación (opcional)
+        similarity_top_k: Número de documentos similares
+        llm_model: Modelo LLM a usar
+        include_sources: Si incluir fuentes en respuesta
+        agent_description: Descripción del agente para casos de fallback
+        fallback_behavior: Estrategia para casos sin resultados relevantes
+        relevance_threshold: Umbral para considerar documentos realmente relevantes
+        retrieval_mode: "vector" o "hybrid" (texto completo + vectorial con RRF)
+        metadata_filter: Contención JSONB exigida a los metadatos de los chunks
+        use_semantic_cache: Reutilizar la respuesta de una consulta casi idéntica
+        semantic_cache_max_distance: Distancia coseno máxima (None = configurada)
+        deadline: Plazo de la petición (time.monotonic()) para la cola de Groq
+        
+    Returns:
+        Dict con respuesta y metadatos
+    """
+    start_time = time.time()
+    
+    fingerprint, cached = await _lookup_semantic_cache(
+        use_semantic_cache, tenant_id, collection_id, llm_model, query_embedding, semantic_cache_max_distance,
+        similarity_top_k=similarity_top_k,
+        include_sources=include_sources,
+        agent_description=agent_description,
+        fallback_behavior=fallback_behavior,
+        relevance_threshold=relevance_threshold,
+        retrieval_mode=retrieval_mode,
+        metadata_filter=metadata_filter
+    )
+    if cached:
+        return {
+            "response": cached["response"],
+            "sources": cached["sources"],
+            "metadata": {
+                **cached["metadata"],
+                "processing_time": time.time() - start_time,
+                "semantic_cache": {"hit": True, "distance": cached["distance"]}
+            }
+        }
+    
+    rag_context = await prepare_rag_context(
+        query=query,
+        query_embedding=query_embedding,
+        tenant_id=tenant_id,
+        collection_id=collection_id,
+        similarity_top_k=similarity_top_k,
+        include_sources=include_sources,
+        agent_description=agent_description,
+        fallback_behavior=fallback_behavior,
+        relevance_threshold=relevance_threshold,
+        retrieval_mode=retrieval_mode,
+        llm_model=llm_model,
+        metadata_filter=metadata_filter
+    )
+    
+    if rag_context["rejected_response"] is not None:
+        return {
+            "response": rag_context["rejected_response"],
+            "sources": [],
+            "metadata": {
+                **_rag_metadata(rag_context, similarity_top_k, None),
+                "processing_time": time.time() - start_time
+            }
+        }
+    
     # 6. Generar respuesta con Groq
-    llm = GroqLLM(model=llm_model)
+    llm = GroqLLM(model=llm_model, deadline=deadline)
     response = await llm.generate(
-        prompt=prompt,
-        system_prompt=system_prompt
+        prompt=rag_context["prompt"],
+        system_prompt=rag_context["system_prompt"]
     )
     
     # 7. Registrar uso de tokens (pendiente implementación completa)
@@ -159,26 +324,281 @@ Responde basándote SOLO en el contexto anterior:"""
     
     # 8. Preparar respuesta
     processing_time = time.time() - start_time
+    sources = rag_context["sources"] if include_sources else []
+    metadata = _rag_metadata(rag_context, similarity_top_k, llm.model)
+    
+    if fingerprint:
+        await get_semantic_cache().store(
+            tenant_id, collection_id, llm.model, fingerprint, query_embedding, response, sources, metadata
+        )
     
     return {
         "response": response,
-        "sources": sources if include_sources else [],
+        "sources": sources,
         "metadata": {
-            "model": llm.model,
-            "found_documents": len(similar_docs) if similar_docs else 0,
-            "used_documents": min(similarity_top_k, len(similar_docs)) if similar_docs else 0,
-            "processing_time": processing_time,
-            "source_quality": source_quality,
-            "avg_similarity": sum(d['similarity'] for d in similar_docs) / len(similar_docs) if similar_docs else 0.0
+            **metadata,
+            "processing_time": processing_time
+        }
+    }
+
+async def _stream_rag_query(
+    query: str,
+    query_embedding: List[float],
+    tenant_id: str,
+    collection_id: str,
+    similarity_top_k: int = 4,
+    llm_model: Optional[str] = None,
+    include_sources: bool = True,
+    max_sources: Optional[int] = None,
+    agent_description: Optional[str] = None,
+    fallback_behavior: str = "agent_knowledge",
+    relevance_threshold: float = 0.75,
+    retrieval_mode: str = "vector",
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    use_semantic_cache: bool = False,
+    semantic_cache_max_distance: Optional[float] = None,
+    deadline: Optional[float] = None
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """
+    Procesa consulta RAG emitiendo la respuesta a medida que se genera.
+    
+    Emite, en orden, un evento "sources" con las fuentes recuperadas, un
+    evento "token" por cada fragmento de texto del LLM y un evento "done"
+    con los metadatos finales (tiempos y uso de tokens).
+    
+    Yields:
+        Tuple[str, Any]: Tipo de evento y su contenido
+    """
+    start_time = time.time()
+    
+    fingerprint, cached = await _lookup_semantic_cache(
+        use_semantic_cache, tenant_id, collection_id, llm_model, query_embedding, semantic_cache_max_distance,
+        similarity_top_k=similarity_top_k,
+        include_sources=include_sources,
+        agent_description=agent_description,
+        fallback_behavior=fallback_behavior,
+        relevance_threshold=relevance_threshold,
+        retrieval_mode=retrieval_mode,
+        metadata_filter=metadata_filter
+    )
+    if cached:
+        sources = cached["sources"][:max_sources] if max_sources else cached["sources"]
+        yield "sources", sources
+        yield "token", cached["response"]
+        yield "done", {
+            **cached["metadata"],
+            "processing_time": time.time() - start_time,
+            "semantic_cache": {"hit": True, "distance": cached["distance"]}
+        }
+        return
+    
+    rag_context = await prepare_rag_context(
+        query=query,
+        query_embedding=query_embedding,
+        tenant_id=tenant_id,
+        collection_id=collection_id,
+        similarity_top_k=similarity_top_k,
+        include_sources=include_sources,
+        agent_description=agent_description,
+        fallback_behavior=fallback_behavior,
+        relevance_threshold=relevance_threshold,
+        retrieval_mode=retrieval_mode,
+        llm_model=llm_model,
+        metadata_filter=metadata_filter
+    )
+    retrieval_time = time.time() - start_time
+    
+    sources = rag_context["sources"] if include_sources else []
+    if max_sources and len(sources) > max_sources:
+        sources = sources[:max_sources]
+    yield "sources", sources
+    
+    if rag_context["rejected_response"] is not None:
+        yield "token", rag_context["rejected_response"]
+        yield "done", {
+            **_rag_metadata(rag_context, similarity_top_k, None),
+            "retrieval_time": retrieval_time,
+            "processing_time": time.time() - start_time
         }
+        return
+    
+    llm = GroqLLM(model=llm_model, deadline=deadline)
+    first_token_time = None
+    chunks = []
+    
+    async for text in llm.stream(
+        prompt=rag_context["prompt"],
+        system_prompt=rag_context["system_prompt"]
+    ):
+        if first_token_time is None:
+            first_token_time = time.time() - start_time
+        chunks.append(text)
+        yield "token", text
+    
+    metadata = _rag_metadata(rag_context, similarity_top_k, llm.model)
+    if fingerprint:
+        # Se guarda con todas las fuentes: max_sources se aplica al servir
+        await get_semantic_cache().store(
+            tenant_id, collection_id, llm.model, fingerprint, query_embedding,
+            "".join(chunks), rag_context["sources"] if include_sources else [], metadata
+        )
+    
+    yield "done", {
+        **metadata,
+        "retrieval_time": retrieval_time,
+        "time_to_first_token": first_token_time,
+        "processing_time": time.time() - start_time,
+        "streamed_chunks": len(chunks),
+        "token_usage": llm.last_usage
     }
 
+async def process_rag_query(
+    query: str,
+    query_embedding: List[float],
+    tenant_id: str,
+    collection_id: str,
+    agent_id: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+    similarity_top_k: int = 4,
+    llm_model: Optional[str] = None,
+    include_sources: bool = True,
+    agent_description: Optional[str] = None,
+    fallback_behavior: str = "agent_knowledge",
+    relevance_threshold: float = 0.75,
+    retrieval_mode: str = "vector",
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    use_semantic_cache: bool = False,
+    semantic_cache_max_distance: Optional[float] = None,
+    timeout_seconds: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Procesa consulta RAG, agrupando las consultas idénticas concurrentes.
+    
+    Las peticiones con la misma clave (tenant, colección, consulta
+    normalizada, modelo, top_k y parámetros de respuesta) que llegan mientras
+    otra está en curso reciben su resultado en lugar de repetir la búsqueda y
+    la llamada a Groq. timeout_seconds es el tiempo que le queda al llamante
+    (None = query_timeout_seconds); el resto de parámetros como en
+    _process_rag_query.
+    """
+    deadline = time.monotonic() + (timeout_seconds or settings.query_timeout_seconds)
+    query_embedding = await fit_query_embedding(tenant_id, collection_id, query_embedding)
+    params = dict(
+        query=query,
+        query_embedding=query_embedding,
+        tenant_id=tenant_id,
+        collection_id=collection_id,
+        agent_id=agent_id,
+        conversation_id=conversation_id,
+        similarity_top_k=similarity_top_k,
+        llm_model=llm_model,
+        include_sources=include_sources,
+        agent_description=agent_description,
+        fallback_behavior=fallback_behavior,
+        relevance_threshold=relevance_threshold,
+        retrieval_mode=retrieval_mode,
+        metadata_filter=metadata_filter,
+        use_semantic_cache=use_semantic_cache,
+        semantic_cache_max_distance=semantic_cache_max_distance,
+        deadline=deadline
+    )
+    if not settings.query_coalescing_enabled:
+        return await _process_rag_query(**params)
+    
+    key = coalescing_key(
+        tenant_id, collection_id, query, llm_model or settings.default_groq_model, similarity_top_k,
+        include_sources=include_sources,
+        agent_description=agent_description,
+        fallback_behavior=fallback_behavior,
+        relevance_threshold=relevance_threshold,
+        retrieval_mode=retrieval_mode,
+        metadata_filter=metadata_filter,
+        use_semantic_cache=use_semantic_cache,
+        semantic_cache_max_distance=semantic_cache_max_distance
+    )
+    result, shared = await get_query_coalescer().run(key, lambda: _process_rag_query(**params))
+    if shared:
+        logger.info("Consulta agrupada con una idéntica en curso")
+    
+    # Copia por petición: el resultado compartido no debe modificarse
+    return {**result, "metadata": {**result["metadata"], "coalesced": shared}}
+
+async def stream_rag_query(
+    query: str,
+    query_embedding: List[float],
+    tenant_id: str,
+    collection_id: str,
+    similarity_top_k: int = 4,
+    llm_model: Optional[str] = None,
+    include_sources: bool = True,
+    max_sources: Optional[int] = None,
+    agent_description: Optional[str] = None,
+    fallback_behavior: str = "agent_knowledge",
+    relevance_threshold: float = 0.75,
+    retrieval_mode: str = "vector",
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    use_semantic_cache: bool = False,
+    semantic_cache_max_distance: Optional[float] = None,
+    timeout_seconds: Optional[float] = None
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """
+    Procesa consulta RAG en streaming, compartiendo el stream entre consultas
+    idénticas concurrentes.
+    
+    Una petición que se suma a un stream en curso recibe primero los eventos
+    ya emitidos y después los nuevos. Eventos como en _stream_rag_query;
+    timeout_seconds como en process_rag_query.
+    """
+    deadline = time.monotonic() + (timeout_seconds or settings.query_timeout_seconds)
+    query_embedding = await fit_query_embedding(tenant_id, collection_id, query_embedding)
+    params = dict(
+        query=query,
+        query_embedding=query_embedding,
+        tenant_id=tenant_id,
+        collection_id=collection_id,
+        similarity_top_k=similarity_top_k,
+        llm_model=llm_model,
+        include_sources=include_sources,
+        max_sources=max_sources,
+        agent_description=agent_description,
+        fallback_behavior=fallback_behavior,
+        relevance_threshold=relevance_threshold,
+        retrieval_mode=retrieval_mode,
+        metadata_filter=metadata_filter,
+        use_semantic_cache=use_semantic_cache,
+        semantic_cache_max_distance=semantic_cache_max_distance,
+        deadline=deadline
+    )
+    if not settings.query_coalescing_enabled:
+        async for event in _stream_rag_query(**params):
+            yield event
+        return
+    
+    key = coalescing_key(
+        tenant_id, collection_id, query, llm_model or settings.default_groq_model, similarity_top_k,
+        stream=True,
+        include_sources=include_sources,
+        max_sources=max_sources,
+        agent_description=agent_description,
+        fallback_behavior=fallback_behavior,
+        relevance_threshold=relevance_threshold,
+        retrieval_mode=retrieval_mode,
+        metadata_filter=metadata_filter,
+        use_semantic_cache=use_semantic_cache,
+        semantic_cache_max_distance=semantic_cache_max_distance
+    )
+    async for (event, data), shared in get_query_coalescer().stream(key, lambda: _stream_rag_query(**params)):
+        if event == "done":
+            data = {**data, "coalesced": shared}
+        yield event, data
+
 async def search_documents(
     query_embedding: List[float],
     tenant_id: str,
     collection_id: str,
     limit: int = 5,
-    threshold: float = 0.7
+    threshold: float = 0.7,
+    metadata_filter: Optional[Dict[str, Any]] = None
 ) -> List[DocumentMatch]:
     """
     Busca documentos sin generar respuesta.
@@ -189,6 +609,7 @@ async def search_documents(
         collection_id: ID de la colección
         limit: Número máximo de resultados
         threshold: Umbral de similitud
+        metadata_filter: Contención JSONB exigida a los metadatos de los chunks
         
     Returns:
         Lista de documentos encontrados
@@ -196,9 +617,10 @@ async def search_documents(
     docs = await search_by_embedding(
         tenant_id=tenant_id,
         collection_id=collection_id,
-        query_embedding=query_embedding,
+        query_embedding=await fit_query_embedding(tenant_id, collection_id, query_embedding),
         top_k=limit,
-        threshold=threshold
+        threshold=threshold,
+        metadata_filter=metadata_filter
     )
     
     return [
@@ -210,3 +632,45 @@ async def search_documents(
         )
         for doc in docs
     ]
+
+async def search_documents_batch(
+    tenant_id: str,
+    queries: List[Dict[str, Any]],
+    max_concurrency: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Ejecuta varias búsquedas concurrentemente con paralelismo acotado.
+    
+    Args:
+        tenant_id: ID del tenant
+        queries: Búsquedas con query_embedding, collection_id, limit, threshold
+            y metadata_filter
+        max_concurrency: Búsquedas simultáneas (por defecto, la configurada)
+        
+    Returns:
+        Resultado de cada búsqueda en el orden recibido: documentos encontrados
+        o el error que impidió completarla
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or settings.batch_search_concurrency)
+    
+    async def run(query: Dict[str, Any]) -> List[DocumentMatch]:
+        async with semaphore:
+            return await search_documents(
+                query_embedding=query["query_embedding"],
+                tenant_id=tenant_id,
+                collection_id=query["collection_id"],
+                limit=query["limit"],
+                threshold=query["threshold"],
+                metadata_filter=query.get("metadata_filter")
+            )
+    
+    outcomes = await asyncio.gather(*(run(query) for query in queries), return_exceptions=True)
+    
+    results = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning(f"Error en la búsqueda {index} del lote: {str(outcome)}")
+            results.append({"index": index, "documents": [], "count": 0, "error": str(outcome)})
+        else:
+            results.append({"index": index, "documents": outcome, "count": len(outcome), "error": None})
+    return results
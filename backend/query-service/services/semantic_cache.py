@@ -0,0 +1,263 @@
+"""
+Caché semántica de respuestas RAG.
+
+Guarda, por tenant, colección, modelo y parámetros de la consulta, los
+embeddings de las consultas ya respondidas junto con su respuesta y sus
+fuentes. Una consulta nueva cuyo embedding está a menos de la distancia
+coseno configurada de una guardada reutiliza esa respuesta, sin búsqueda
+vectorial ni llamada al LLM.
+
+Las entradas viven en memoria del proceso (matriz NumPy normalizada por
+clave). Cada colección tiene en la caché centralizada una versión que el
+servicio de ingestión y las rutas de colecciones renuevan al modificarla;
+si la versión cambia, las respuestas guardadas de esa colección se descartan.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from common.cache import CacheManager
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Versión de cada colección en la caché centralizada (compartida con ingestion-service)
+COLLECTION_VERSION_DATA_TYPE = "collection_version"
+
+CacheKey = Tuple[str, str, str, str]
+
+
+class _AnswerIndex:
+    """Respuestas guardadas para una clave y sus embeddings normalizados."""
+
+    def __init__(self, version: Optional[str]):
+        self.version = version
+        self.embeddings: Optional[np.ndarray] = None
+        self.entries: List[Dict[str, Any]] = []
+
+    def search(self, embedding: np.ndarray) -> Tuple[Optional[int], float]:
+        """Índice y distancia coseno de la entrada más cercana."""
+        if self.embeddings is None or not len(self.entries):
+            return None, 1.0
+        if embedding.shape[0] != self.embeddings.shape[1]:
+            # Embedding de otra dimensión (p. ej. la colección cambió de modelo): fallo de caché
+            return None, 1.0
+        similarities = self.embeddings @ embedding
+        best = int(np.argmax(similarities))
+        return best, 1.0 - float(similarities[best])
+
+    def add(self, embedding: np.ndarray, entry: Dict[str, Any], max_entries: int):
+        """
+        Añade una entrada descartando la más antigua si se supera el máximo.
+
+        Si la dimensión del embedding no coincide con la de las entradas
+        guardadas, estas se descartan: no son comparables con las nuevas.
+        """
+        if self.embeddings is not None and embedding.shape[0] != self.embeddings.shape[1]:
+            self.embeddings = None
+            self.entries = []
+        row = embedding[np.newaxis, :]
+        self.embeddings = row if self.embeddings is None else np.vstack([self.embeddings, row])
+        self.entries.append(entry)
+        if len(self.entries) > max_entries:
+            self.embeddings = self.embeddings[1:]
+            self.entries = self.entries[1:]
+
+    def drop(self, position: int):
+        """Elimina una entrada (caducada)."""
+        self.embeddings = np.delete(self.embeddings, position, axis=0)
+        del self.entries[position]
+
+
+def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def query_fingerprint(**params: Any) -> str:
+    """
+    Resume los parámetros que cambian la respuesta a una misma pregunta.
+
+    Dos consultas solo comparten respuesta si coinciden en estos parámetros
+    (documentos a recuperar, política de fallback, descripción del agente...).
+    """
+    return hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas por proximidad del embedding de la consulta.
+
+    Mantiene como mucho max_keys claves (LRU) y max_entries respuestas por
+    clave; las respuestas caducan a los ttl segundos.
+    """
+
+    def __init__(
+        self,
+        max_distance: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_keys: Optional[int] = None,
+        ttl: Optional[int] = None
+    ):
+        settings = get_settings()
+        self.max_distance = max_distance if max_distance is not None else settings.semantic_cache_max_distance
+        self.max_entries = max_entries or settings.semantic_cache_max_entries
+        self.max_keys = max_keys or settings.semantic_cache_max_keys
+        self.ttl = ttl or settings.semantic_cache_ttl
+
+        self._indexes: "OrderedDict[CacheKey, _AnswerIndex]" = OrderedDict()
+        self._metrics = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    async def lookup(
+        self,
+        tenant_id: str,
+        collection_id: str,
+        model: str,
+        fingerprint: str,
+        query_embedding: List[float],
+        max_distance: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta guardada para una consulta cercana.
+
+        Returns:
+            Optional[Dict[str, Any]]: Respuesta, fuentes, metadatos y distancia
+            de la entrada encontrada, o None
+        """
+        key = (tenant_id, collection_id, model, fingerprint)
+        index = await self._get_index(key, tenant_id, collection_id)
+        embedding = _normalize(query_embedding)
+        if index is None or embedding is None:
+            self._metrics["misses"] += 1
+            return None
+
+        position, distance = index.search(embedding)
+        max_distance = self.max_distance if max_distance is None else max_distance
+        if position is None or distance > max_distance:
+            self._metrics["misses"] += 1
+            return None
+
+        entry = index.entries[position]
+        if time.time() - entry["created_at"] > self.ttl:
+            index.drop(position)
+            self._metrics["misses"] += 1
+            return None
+
+        self._metrics["hits"] += 1
+        return {**entry, "distance": distance}
+
+    async def store(
+        self,
+        tenant_id: str,
+        collection_id: str,
+        model: str,
+        fingerprint: str,
+        query_embedding: List[float],
+        response: str,
+        sources: List[Dict[str, Any]],
+        metadata: Dict[str, Any]
+    ):
+        """Guarda la respuesta de una consulta."""
+        embedding = _normalize(query_embedding)
+        if embedding is None:
+            return
+
+        key = (tenant_id, collection_id, model, fingerprint)
+        index = await self._get_index(key, tenant_id, collection_id, create=True)
+        index.add(embedding, {
+            "response": response,
+            "sources": sources,
+            "metadata": metadata,
+            "created_at": time.time()
+        }, self.max_entries)
+        self._metrics["stores"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de la caché semántica."""
+        lookups = self._metrics["hits"] + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "hit_ratio": round(self._metrics["hits"] / lookups, 4) if lookups else 0.0,
+            "keys": len(self._indexes),
+            "entries": sum(len(index.entries) for index in self._indexes.values())
+        }
+
+    async def _get_index(
+        self,
+        key: CacheKey,
+        tenant_id: str,
+        collection_id: str,
+        create: bool = False
+    ) -> Optional[_AnswerIndex]:
+        """Obtiene el índice de una clave, descartándolo si la colección cambió."""
+        version = await get_collection_version(tenant_id, collection_id)
+        index = self._indexes.get(key)
+
+        if index is not None and index.version != version:
+            del self._indexes[key]
+            self._metrics["invalidations"] += 1
+            index = None
+
+        if index is None:
+            if not create:
+                return None
+            index = _AnswerIndex(version)
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_keys:
+                self._indexes.popitem(last=False)
+
+        self._indexes.move_to_end(key)
+        return index
+
+
+async def get_collection_version(tenant_id: str, collection_id: str) -> Optional[str]:
+    """Versión actual de una colección (None si nunca se ha modificado)."""
+    try:
+        version = await CacheManager.get(
+            data_type=COLLECTION_VERSION_DATA_TYPE,
+            resource_id=collection_id,
+            tenant_id=tenant_id
+        )
+        return str(version) if version is not None else None
+    except Exception as e:
+        logger.debug(f"Error leyendo versión de la colección {collection_id}: {str(e)}")
+        return None
+
+
+async def mark_collection_updated(tenant_id: str, collection_id: str):
+    """
+    Renueva la versión de una colección para invalidar sus respuestas guardadas.
+
+    Args:
+        tenant_id: ID del tenant
+        collection_id: ID de la colección modificada
+    """
+    try:
+        await CacheManager.set(
+            data_type=COLLECTION_VERSION_DATA_TYPE,
+            resource_id=collection_id,
+            value=str(time.time()),
+            tenant_id=tenant_id,
+            ttl=CacheManager.ttl_extended
+        )
+    except Exception as e:
+        logger.warning(f"Error renovando versión de la colección {collection_id}: {str(e)}")
+
+
+# Instancia compartida de la caché
+_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_semantic_cache() -> SemanticAnswerCache:
+    """Obtiene la instancia compartida de la caché semántica."""
+    global _cache
+    if _cache is None:
+        _cache = SemanticAnswerCache()
+    return _cache
@@ -0,0 +1,213 @@
+"""
+Agrupación (single-flight) de consultas RAG idénticas concurrentes.
+
+Cuando muchos usuarios hacen la misma pregunta a la vez (un widget en una
+página popular), cada petición buscaría documentos y llamaría a Groq por su
+cuenta. Con la agrupación, la primera petición de una clave lanza el cálculo
+y las que llegan mientras está en curso esperan ese mismo resultado.
+
+- Respuestas completas: todas las peticiones reciben el resultado de una
+  única tarea compartida.
+- Respuestas en streaming: la tarea compartida publica cada evento en un
+  difusor; cada petición reproduce los eventos ya emitidos y recibe los
+  siguientes a medida que llegan.
+
+El cálculo compartido se ejecuta en su propia tarea: si la petición que lo
+inició se cancela (el cliente se desconecta), las demás siguen esperándolo.
+Un stream se cancela cuando se desconecta su último suscriptor, para no
+seguir generando (y consumiendo tokens) sin nadie que lo reciba.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from typing import Dict, Any, List, Optional, Set, Tuple, Callable, Awaitable, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Any]
+
+
+def normalize_query(query: str) -> str:
+    """Consulta en minúsculas y con los espacios colapsados."""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def coalescing_key(
+    tenant_id: str,
+    collection_id: str,
+    query: str,
+    model: str,
+    top_k: int,
+    **params: Any
+) -> str:
+    """
+    Clave de agrupación de una consulta.
+
+    Además de tenant, colección, consulta normalizada, modelo y top_k incluye
+    los parámetros que cambian la respuesta (fallback, filtros, modo de
+    recuperación...).
+    """
+    payload = json.dumps(
+        {
+            "tenant_id": tenant_id,
+            "collection_id": collection_id,
+            "query": normalize_query(query),
+            "model": model,
+            "top_k": top_k,
+            **params
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+class _Broadcast:
+    """Eventos de un stream compartido, reproducibles desde el principio."""
+
+    def __init__(self):
+        self.events: List[Event] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.pump: Optional[asyncio.Task] = None
+        self._condition = asyncio.Condition()
+
+    async def publish(self, event: Event):
+        async with self._condition:
+            self.events.append(event)
+            self._condition.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._condition:
+            self.finished = True
+            self.error = error
+            self._condition.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Event]:
+        position = 0
+        while True:
+            async with self._condition:
+                while position >= len(self.events) and not self.finished:
+                    await self._condition.wait()
+                pending = self.events[position:]
+                position = len(self.events)
+                finished, error = self.finished, self.error
+
+            for event in pending:
+                yield event
+
+            if finished and position >= len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+
+class QueryCoalescer:
+    """Cálculos en curso por clave, compartidos entre peticiones concurrentes."""
+
+    def __init__(self):
+        self._results: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._pumps: Set[asyncio.Task] = set()
+        self._metrics = {
+            "leaders": 0,
+            "followers": 0,
+            "stream_leaders": 0,
+            "stream_followers": 0,
+            "streams_cancelled": 0
+        }
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecuta compute una sola vez por clave entre peticiones concurrentes.
+
+        Returns:
+            Tuple[Any, bool]: Resultado y si se obtuvo de un cálculo ya en curso
+        """
+        task = self._results.get(key)
+        shared = task is not None
+        if shared:
+            self._metrics["followers"] += 1
+        else:
+            self._metrics["leaders"] += 1
+            task = asyncio.create_task(compute())
+            self._results[key] = task
+            task.add_done_callback(lambda _: self._results.pop(key, None))
+
+        # shield: cancelar una petición no cancela el cálculo de las demás
+        return await asyncio.shield(task), shared
+
+    async def stream(self, key: str, produce: Callable[[], AsyncIterator[Event]]) -> AsyncIterator[Tuple[Event, bool]]:
+        """
+        Comparte un stream de eventos entre peticiones concurrentes.
+
+        Yields:
+            Tuple[Event, bool]: Evento y si procede de un stream ya en curso
+        """
+        broadcast = self._streams.get(key)
+        shared = broadcast is not None
+        if shared:
+            self._metrics["stream_followers"] += 1
+        else:
+            self._metrics["stream_leaders"] += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.pump = asyncio.create_task(self._pump(key, broadcast, produce))
+            self._pumps.add(broadcast.pump)
+            broadcast.pump.add_done_callback(self._pumps.discard)
+
+        broadcast.subscribers += 1
+        try:
+            async for event in broadcast.subscribe():
+                yield event, shared
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.pump.done():
+                # Sin suscriptores: las peticiones nuevas empiezan otro stream
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+                broadcast.pump.cancel()
+                self._metrics["streams_cancelled"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de agrupación."""
+        return {
+            **self._metrics,
+            "in_flight": len(self._results),
+            "streams_in_flight": len(self._streams)
+        }
+
+    async def _pump(self, key: str, broadcast: _Broadcast, produce: Callable[[], AsyncIterator[Event]]):
+        """Consume el stream original y publica sus eventos."""
+        error: Optional[BaseException] = None
+        events = produce()
+        try:
+            async for event in events:
+                await broadcast.publish(event)
+        except asyncio.CancelledError as e:
+            error = e
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            # Las peticiones nuevas ya no se suman a un stream terminado
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            await events.aclose()
+            await broadcast.finish(error)
+
+
+# Instancia compartida
+_coalescer: Optional[QueryCoalescer] = None
+
+
+def get_query_coalescer() -> QueryCoalescer:
+    """Obtiene la instancia compartida de agrupación de consultas."""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = QueryCoalescer()
+    return _coalescer
@@ -2,23 +2,72 @@
 Gestión de búsqueda vectorial.
 """
 
+import json
 import logging
+import re
 from typing import List, Dict, Any, Optional
 
 from common.db.supabase import get_supabase_client
 from common.db.tables import get_table_name
 from common.errors import ServiceError
 from config.settings import get_settings
+from services.ann_index import get_ann_index
+from services.metadata_filter import normalize_filter
+from utils.wire_format import to_pgvector
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+async def _match_documents(
+    tenant_id: str,
+    collection_id: str,
+    query_embedding: List[float],
+    match_count: int,
+    threshold: float,
+    metadata_filter: Optional[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Llama a match_documents con el filtro de metadatos en la contención JSONB.
+    
+    El índice ivfflat filtra después de explorar sus listas: con un filtro de
+    metadatos se exploran filtered_search_probes listas para no perder los
+    chunks que lo cumplen (pedir más filas no cambiaría el resultado).
+    """
+    supabase = await get_supabase_client()
+    
+    # El alcance del tenant y la colección prevalece sobre el filtro recibido
+    response = await supabase.rpc(
+        'match_documents',
+        {
+            'query_embedding': to_pgvector(query_embedding),
+            'match_count': match_count,
+            'filter': {
+                **(metadata_filter or {}),
+                'tenant_id': tenant_id,
+                'collection_id': collection_id
+            },
+            'threshold': threshold,
+            'probes': settings.filtered_search_probes if metadata_filter else None
+        }
+    ).execute()
+    
+    return [
+        {
+            'id': doc['id'],
+            'content': doc['content'],
+            'metadata': doc.get('metadata', {}),
+            'similarity': doc['similarity']
+        }
+        for doc in response.data or []
+    ]
+
 async def search_by_embedding(
     tenant_id: str,
     collection_id: str,
     query_embedding: List[float],
     top_k: int = 4,
-    threshold: float = 0.7
+    threshold: float = 0.7,
+    metadata_filter: Optional[Dict[str, Any]] = None
 ) -> List[Dict[str, Any]]:
     """
     Busca documentos por similitud vectorial.
@@ -29,46 +78,137 @@ async def search_by_embedding(
         query_embedding: Vector de búsqueda
         top_k: Número de resultados
         threshold: Umbral mínimo de similitud
+        metadata_filter: Contención JSONB exigida a los metadatos del chunk
         
     Returns:
         Lista de documentos con similitud
     """
+    metadata_filter = normalize_filter(metadata_filter)
+    
+    if settings.ann_index_enabled:
+        local_results = await get_ann_index().search(
+            tenant_id, collection_id, query_embedding, top_k, threshold, metadata_filter
+        )
+        if local_results is not None:
+            logger.info(f"Encontrados {len(local_results)} documentos similares (réplica local)")
+            return local_results
+    
+    try:
+        results = await _match_documents(
+            tenant_id, collection_id, query_embedding, top_k, threshold, metadata_filter
+        )
+        
+        logger.info(f"Encontrados {len(results)} documentos similares")
+        return results
+        
+    except Exception as e:
+        logger.error(f"Error en búsqueda vectorial: {str(e)}")
+        raise ServiceError(f"Error buscando documentos: {str(e)}")
+
+# Términos de una consulta utilizables en una tsquery (sin operadores)
+_TERM_RE = re.compile(r"\w[\w\-.]*\w|\w", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Términos de un texto en minúsculas."""
+    return _TERM_RE.findall(text.lower())
+
+def query_terms(query: str, max_terms: int = 16) -> List[str]:
+    """Términos únicos de la consulta, en orden de aparición."""
+    terms = []
+    for term in tokenize(query):
+        if term not in terms:
+            terms.append(term)
+    return terms[:max_terms]
+
+async def search_by_text(
+    tenant_id: str,
+    collection_id: str,
+    query: str,
+    limit: int = 20,
+    metadata_filter: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Busca chunks por texto completo (tsvector) con cualquiera de los términos.
+    
+    Args:
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        query: Texto de la consulta
+        limit: Número máximo de candidatos
+        metadata_filter: Contención JSONB exigida a los metadatos del chunk
+        
+    Returns:
+        Lista de chunks (id, content, metadata) sin ordenar
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    metadata_filter = normalize_filter(metadata_filter)
+    
     try:
         supabase = await get_supabase_client()
         
-        # Usar RPC para búsqueda vectorial
-        response = await supabase.rpc(
-            'match_documents',
-            {
-                'query_embedding': query_embedding,
-                'match_count': top_k,
-                'filter': {
-                    'tenant_id': tenant_id,
-                    'collection_id': collection_id
-                },
-                'threshold': threshold
-            }
-        ).execute()
+        request = supabase.table(get_table_name("document_chunks")) \
+            .select("id, content, metadata") \
+            .eq("tenant_id", tenant_id) \
+            .eq("collection_id", collection_id) \
+            .text_search("content", " | ".join(terms), options={"config": settings.text_search_config})
+        if metadata_filter:
+            request = request.contains("metadata", metadata_filter)
         
-        if not response.data:
-            return []
+        response = await request.limit(limit).execute()
         
-        # Formatear resultados
-        results = []
-        for doc in response.data:
-            results.append({
+        return [
+            {
                 'id': doc['id'],
                 'content': doc['content'],
-                'metadata': doc.get('metadata', {}),
-                'similarity': doc['similarity']
-            })
+                'metadata': doc.get('metadata', {})
+            }
+            for doc in response.data or []
+        ]
         
-        logger.info(f"Encontrados {len(results)} documentos similares")
-        return results
+    except Exception as e:
+        logger.error(f"Error en búsqueda por texto: {str(e)}")
+        raise ServiceError(f"Error buscando documentos por texto: {str(e)}")
+
+async def get_chunk_embeddings(
+    tenant_id: str,
+    collection_id: str,
+    chunk_ids: List[Any]
+) -> Dict[Any, List[float]]:
+    """
+    Obtiene los vectores de chunks concretos de una colección.
+    
+    Args:
+        tenant_id: ID del tenant
+        collection_id: ID de la colección
+        chunk_ids: IDs (document_chunks.id) de los chunks
+        
+    Returns:
+        Vector por id de chunk
+    """
+    if not chunk_ids:
+        return {}
+    
+    try:
+        supabase = await get_supabase_client()
+        response = await supabase.table(get_table_name("document_chunks")) \
+            .select("id, embedding") \
+            .eq("tenant_id", tenant_id) \
+            .eq("collection_id", collection_id) \
+            .in_("id", chunk_ids) \
+            .execute()
+        
+        embeddings = {}
+        for doc in response.data or []:
+            embedding = doc.get('embedding')
+            if embedding:
+                embeddings[doc['id']] = json.loads(embedding) if isinstance(embedding, str) else embedding
+        return embeddings
         
     except Exception as e:
-        logger.error(f"Error en búsqueda vectorial: {str(e)}")
-        raise ServiceError(f"Error buscando documentos: {str(e)}")
+        logger.error(f"Error obteniendo vectores de chunks: {str(e)}")
+        raise ServiceError(f"Error obteniendo vectores de chunks: {str(e)}")
 
 async def get_collection_info(tenant_id: str, collection_id: str) -> Optional[Dict[str, Any]]:
     """Obtiene información de una colección."""
@@ -0,0 +1,16 @@
+"""
+Configuración común de las pruebas del Query Service.
+
+Las pruebas importan los módulos del servicio como lo hace main.py, desde la
+raíz del servicio, con la configuración mínima para cargar los settings.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+if str(SERVICE_ROOT) not in sys.path:
+    sys.path.insert(0, str(SERVICE_ROOT))
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
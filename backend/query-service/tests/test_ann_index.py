@@ -0,0 +1,112 @@
+"""Pruebas de las réplicas locales de colecciones (ANN en memoria)."""
+
+import asyncio
+
+import services.ann_index as ann_index
+from services.ann_index import ANNIndexManager
+
+KEY = ("tenant-1", "collection-1")
+
+
+def _manager(hot_threshold=2, version_check_interval=60.0):
+    manager = ANNIndexManager()
+    manager.hot_threshold = hot_threshold
+    manager.version_check_interval = version_check_interval
+    manager.max_chunks = 10
+    manager.memory_budget = 1024 * 1024
+    return manager
+
+
+def _fake_versions(monkeypatch, versions):
+    calls = []
+
+    async def get_collection_version(tenant_id, collection_id):
+        calls.append((tenant_id, collection_id))
+        return versions[-1]
+
+    monkeypatch.setattr(ann_index, "get_collection_version", get_collection_version)
+    return calls
+
+
+async def _remote_searches(manager, count):
+    for _ in range(count):
+        assert await manager.search(*KEY, [1.0, 0.0], top_k=3, threshold=0.0) is None
+        await asyncio.gather(*list(manager._loading.values()))
+
+
+def test_oversized_collection_is_not_reloaded_until_its_version_changes(monkeypatch):
+    versions = ["v1"]
+    version_calls = _fake_versions(monkeypatch, versions)
+    fetches = []
+
+    async def scenario():
+        manager = _manager()
+
+        async def fetch_chunks(tenant_id, collection_id):
+            fetches.append(collection_id)
+            return None, []
+
+        manager._fetch_chunks = fetch_chunks
+
+        await _remote_searches(manager, 10)
+        assert len(fetches) == 1
+        assert len(version_calls) == 1
+
+        # Vencida la comprobación, la misma versión no vuelve a leer los chunks
+        manager._oversized[KEY] = ("v1", 0.0)
+        await _remote_searches(manager, 10)
+        assert len(fetches) == 1
+        assert len(version_calls) == 2
+
+        # Con una versión nueva se vuelve a intentar la carga
+        versions.append("v2")
+        manager._oversized[KEY] = ("v1", 0.0)
+        await _remote_searches(manager, 2)
+        assert len(fetches) == 2
+        return manager.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["oversized"] == 1
+    assert stats["collections"] == 0
+
+
+def test_search_counts_are_bounded(monkeypatch):
+    monkeypatch.setattr(ann_index, "MAX_TRACKED_COLLECTIONS", 3)
+    manager = _manager(hot_threshold=10)
+
+    for i in range(5):
+        manager._track_search(("tenant-1", f"collection-{i}"))
+    manager._track_search(("tenant-1", "collection-2"))
+
+    assert list(manager._search_counts) == [
+        ("tenant-1", "collection-3"),
+        ("tenant-1", "collection-4"),
+        ("tenant-1", "collection-2"),
+    ]
+    assert manager._search_counts[("tenant-1", "collection-2")] == 2
+
+
+def test_hot_collection_is_served_locally(monkeypatch):
+    _fake_versions(monkeypatch, ["v1"])
+
+    async def scenario():
+        manager = _manager()
+
+        async def fetch_chunks(tenant_id, collection_id):
+            rows = [
+                {"id": "a", "content": "contrato", "metadata": {}},
+                {"id": "b", "content": "factura", "metadata": {}},
+            ]
+            return rows, [[1.0, 0.0], [0.0, 1.0]]
+
+        manager._fetch_chunks = fetch_chunks
+
+        await _remote_searches(manager, 2)
+        results = await manager.search(*KEY, [0.9, 0.1], top_k=1, threshold=0.5)
+        return results, manager.get_stats()
+
+    results, stats = asyncio.run(scenario())
+    assert [row["id"] for row in results] == ["a"]
+    assert stats["local_searches"] == 1
+    assert stats["loads"] == 1
+    assert stats["tracked"] == 0
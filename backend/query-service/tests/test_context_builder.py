@@ -0,0 +1,75 @@
+"""Pruebas del constructor de contexto con presupuesto de tokens."""
+
+from services.context_builder import build_context, count_tokens, overlap_length
+
+SHARED = "texto compartido entre los dos chunks vecinos"
+
+
+def _doc(doc_id, content, document_id="doc-1", chunk_index=None):
+    metadata = {"document_id": document_id}
+    if chunk_index is not None:
+        metadata["chunk_index"] = chunk_index
+    return {"id": doc_id, "content": content, "metadata": metadata}
+
+
+def test_overlap_length_finds_shared_suffix():
+    previous = "Primera parte del documento. " + SHARED
+    current = SHARED + " y la continuación del segundo chunk."
+    assert overlap_length(previous, current, max_overlap=200) == len(SHARED)
+
+
+def test_overlap_length_respects_bounds():
+    previous = "inicio " + SHARED
+    current = SHARED + " final"
+    # Solapamiento mayor que el máximo permitido
+    assert overlap_length(previous, current, max_overlap=10) == 0
+    # Solapamientos por debajo del mínimo no cuentan
+    assert overlap_length("abc corto", "corto def", max_overlap=100) == 0
+    assert overlap_length("abc corto", "corto def", max_overlap=100, min_overlap=5) == 5
+
+
+def test_build_context_removes_overlap_and_orders_chunks():
+    first = _doc(1, "Primera parte del documento. " + SHARED, chunk_index=0)
+    second = _doc(2, SHARED + " y la continuación del segundo chunk.", chunk_index=1)
+
+    # El segundo chunk es el más relevante, pero se presentan en orden de lectura
+    result = build_context([second, first], max_tokens=1000)
+
+    assert result["documents"] == [first, second]
+    assert result["overlap_chars_removed"] == len(SHARED)
+    assert result["context"].count(SHARED) == 1
+    assert result["context"].index("Primera parte") < result["context"].index("continuación")
+    assert not result["truncated"]
+    assert result["budget"] == 1000
+
+
+def test_build_context_groups_chunks_by_document():
+    docs = [
+        _doc(1, "uno del documento A", document_id="A", chunk_index=3),
+        _doc(2, "uno del documento B", document_id="B", chunk_index=0),
+        _doc(3, "otro del documento A", document_id="A", chunk_index=1),
+    ]
+    result = build_context(docs, max_tokens=1000)
+    assert [doc["id"] for doc in result["documents"]] == [3, 1, 2]
+
+
+def test_build_context_truncates_last_chunk_to_budget():
+    long_text = " ".join(f"palabra{i}" for i in range(400))
+    result = build_context([_doc(1, long_text, chunk_index=0)], max_tokens=100)
+
+    assert result["truncated"]
+    assert result["tokens"] <= 100
+    assert count_tokens(result["context"]) > 0
+    assert result["documents"][0]["id"] == 1
+
+
+def test_build_context_stops_when_budget_is_spent():
+    text = " ".join(f"palabra{i}" for i in range(40))
+    tokens = count_tokens(text)
+    docs = [_doc(i, f"{i} {text}", document_id=f"doc-{i}") for i in range(3)]
+
+    # Cabe el primero; lo que queda no alcanza MIN_TRUNCATED_TOKENS
+    result = build_context(docs, max_tokens=tokens + 10)
+
+    assert [doc["id"] for doc in result["documents"]] == [0]
+    assert not result["truncated"]
@@ -0,0 +1,142 @@
+"""Pruebas del control de admisión de llamadas a Groq."""
+
+import asyncio
+import time
+
+import pytest
+
+import provider.groq as groq
+from common.errors import ServiceError
+from provider.groq import GroqAdmissionController, GroqLLM, estimate_tokens
+
+
+def _controller(**overrides):
+    options = {
+        "model": "test-model",
+        "requests_per_minute": 100,
+        "tokens_per_minute": 10_000,
+        "max_concurrency": 2,
+        "max_queue_size": 2
+    }
+    options.update(overrides)
+    return GroqAdmissionController(**options)
+
+
+def test_estimate_tokens():
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert estimate_tokens(messages, max_tokens=50) == 150
+
+
+def test_admits_within_budget():
+    async def scenario():
+        controller = _controller()
+        async with controller.slot(100, timeout=1):
+            stats = controller.get_stats()
+            assert stats["in_flight"] == 1
+            assert stats["tokens_last_minute"] == 100
+        return controller.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == 1
+
+
+def test_queues_until_concurrency_slot_is_released():
+    async def scenario():
+        controller = _controller(max_concurrency=1)
+        await controller.acquire(10, timeout=1)
+
+        waiter = asyncio.create_task(controller.acquire(10, timeout=1))
+        await asyncio.sleep(0)
+        assert controller.get_stats()["queue_depth"] == 1
+        assert not waiter.done()
+
+        controller.release()
+        await asyncio.wait_for(waiter, 1)
+        return controller.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["queued"] == 1
+    assert stats["admitted"] == 2
+    assert stats["queue_depth"] == 0
+
+
+def test_sheds_when_queue_is_full():
+    async def scenario():
+        controller = _controller(max_concurrency=1, max_queue_size=1)
+        await controller.acquire(10, timeout=1)
+        waiter = asyncio.create_task(controller.acquire(10, timeout=1))
+        await asyncio.sleep(0)
+
+        with pytest.raises(ServiceError):
+            await controller.acquire(10, timeout=1)
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return controller.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_sheds_when_token_budget_would_not_free_in_time():
+    async def scenario():
+        controller = _controller(tokens_per_minute=1000)
+        await controller.acquire(900, timeout=1)
+        # La ventana no libera tokens hasta dentro de un minuto
+        with pytest.raises(ServiceError):
+            await controller.acquire(500, timeout=1)
+        return controller.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed"] == 1
+    assert stats["queued"] == 0
+
+
+def test_times_out_in_queue_and_frees_position():
+    async def scenario():
+        controller = _controller(max_concurrency=1)
+        await controller.acquire(10, timeout=1)
+        with pytest.raises(ServiceError):
+            await controller.acquire(10, timeout=0.05)
+        return controller.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["timed_out"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["queued_tokens"] == 0
+
+
+def test_settle_replaces_estimate_with_actual_usage():
+    async def scenario():
+        controller = _controller()
+        reservation = await controller.acquire(500, timeout=1)
+        controller.settle(reservation, 120)
+        controller.release()
+        return controller.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["tokens_last_minute"] == 120
+
+
+def test_oversized_call_is_capped_to_the_budget():
+    async def scenario():
+        controller = _controller(tokens_per_minute=1000)
+        reservation = await controller.acquire(5000, timeout=1)
+        return reservation.tokens
+
+    assert asyncio.run(scenario()) == 1000
+
+
+def test_queue_wait_is_bounded_by_request_deadline(monkeypatch):
+    monkeypatch.setattr(groq, "get_async_groq_client", lambda: None)
+
+    llm = GroqLLM(model="test-model", queue_timeout=10, deadline=time.monotonic() + 2)
+    assert 0 < llm._admission_timeout() <= 2
+
+    assert GroqLLM(model="test-model", queue_timeout=10)._admission_timeout() == 10
+
+    expired = GroqLLM(model="test-model", queue_timeout=10, deadline=time.monotonic() - 1)
+    with pytest.raises(ServiceError):
+        expired._admission_timeout()
@@ -0,0 +1,65 @@
+"""Pruebas del ranking BM25 y de la fusión RRF de la búsqueda híbrida."""
+
+import pytest
+
+from services.hybrid_search import bm25_rank, identifier_terms, reciprocal_rank_fusion
+
+
+def _doc(doc_id, content):
+    return {"id": doc_id, "content": content}
+
+
+def test_bm25_rank_orders_by_term_relevance():
+    docs = [
+        _doc(1, "el contrato de arrendamiento"),
+        _doc(2, "error E-4021 en el contrato E-4021"),
+        _doc(3, "manual de usuario"),
+    ]
+    ranked = bm25_rank(docs, ["e-4021", "contrato"])
+
+    assert [doc["id"] for doc in ranked] == [2, 1]
+    assert ranked[0]["lexical_score"] > ranked[1]["lexical_score"] > 0
+    # Los documentos sin ningún término no se devuelven
+    assert all(doc["id"] != 3 for doc in ranked)
+
+
+def test_bm25_rank_rare_terms_weigh_more():
+    docs = [
+        _doc(1, "factura pendiente"),
+        _doc(2, "factura pagada"),
+        _doc(3, "factura anulada"),
+        _doc(4, "recibo pendiente"),
+    ]
+    ranked = bm25_rank(docs, ["factura", "anulada"])
+    assert ranked[0]["id"] == 3
+
+
+def test_bm25_rank_empty_inputs():
+    assert bm25_rank([], ["contrato"]) == []
+    assert bm25_rank([_doc(1, "contrato")], []) == []
+
+
+def test_reciprocal_rank_fusion_combines_rankings():
+    vector = [_doc(1, "a"), _doc(2, "b"), _doc(3, "c")]
+    lexical = [_doc(3, "c"), _doc(4, "d")]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+
+    assert [doc["id"] for doc in fused] == [3, 1, 2, 4]
+    assert fused[0]["rrf_score"] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[1]["rrf_score"] == pytest.approx(1 / 61)
+    assert fused[-1]["rrf_score"] == pytest.approx(1 / 62)
+
+
+def test_reciprocal_rank_fusion_keeps_first_fields_and_adds_missing():
+    vector = [{"id": 1, "content": "a", "similarity": 0.8}]
+    lexical = [{"id": 1, "content": "a", "lexical_score": 2.5, "similarity": 0.0}]
+    fused = reciprocal_rank_fusion([vector, lexical])
+
+    assert len(fused) == 1
+    assert fused[0]["similarity"] == 0.8
+    assert fused[0]["lexical_score"] == 2.5
+
+
+def test_identifier_terms():
+    assert identifier_terms("Error AB-1234 al firmar el contrato v2") == ["ab-1234", "v2"]
+    assert identifier_terms("contrato de arrendamiento") == []
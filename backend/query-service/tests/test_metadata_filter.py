@@ -0,0 +1,51 @@
+"""Pruebas de los filtros de metadatos con semántica jsonb @>."""
+
+from services.metadata_filter import contains, filter_key, metadata_matches, normalize_filter
+
+
+def test_contains_scalars():
+    assert contains("pdf", "pdf")
+    assert not contains("pdf", "docx")
+    assert not contains(1, "1")
+
+
+def test_contains_nested_objects():
+    metadata = {"source": {"type": "web", "lang": "es"}, "page": 3}
+    assert contains(metadata, {"source": {"type": "web"}})
+    assert contains(metadata, {"page": 3, "source": {}})
+    assert not contains(metadata, {"source": {"type": "pdf"}})
+    assert not contains(metadata, {"author": "ana"})
+    assert not contains({"source": "web"}, {"source": {"type": "web"}})
+
+
+def test_contains_arrays_are_subsets_in_any_order():
+    metadata = {"tags": ["legal", "contratos", "2024"]}
+    assert contains(metadata, {"tags": ["2024", "legal"]})
+    assert contains(metadata, {"tags": []})
+    assert not contains(metadata, {"tags": ["fiscal"]})
+    # Un escalar no está contenido en un array (a diferencia de @> en la raíz)
+    assert not contains(metadata, {"tags": "legal"})
+
+
+def test_contains_arrays_of_objects():
+    metadata = {"authors": [{"name": "ana", "role": "editor"}, {"name": "luis"}]}
+    assert contains(metadata, {"authors": [{"name": "ana"}]})
+    assert not contains(metadata, {"authors": [{"name": "ana", "role": "autor"}]})
+
+
+def test_normalize_filter_drops_scope_keys():
+    assert normalize_filter(None) is None
+    assert normalize_filter({}) is None
+    assert normalize_filter({"tenant_id": "t1", "collection_id": "c1"}) is None
+    assert normalize_filter({"tenant_id": "t1", "lang": "es"}) == {"lang": "es"}
+
+
+def test_metadata_matches_without_filter():
+    assert metadata_matches(None, None)
+    assert metadata_matches({"lang": "es"}, {})
+    assert not metadata_matches(None, {"lang": "es"})
+
+
+def test_filter_key_is_order_independent():
+    assert filter_key({"a": 1, "b": 2}) == filter_key({"b": 2, "a": 1})
+    assert filter_key(None) == filter_key({})
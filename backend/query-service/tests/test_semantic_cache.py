@@ -0,0 +1,76 @@
+"""Pruebas de la caché semántica de respuestas."""
+
+import asyncio
+
+import pytest
+
+import services.semantic_cache as semantic_cache
+from services.semantic_cache import SemanticAnswerCache
+
+KEY = ("tenant-1", "collection-1", "test-model", "fingerprint")
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    versions = ["v1"]
+
+    async def get_collection_version(tenant_id, collection_id):
+        return versions[-1]
+
+    monkeypatch.setattr(semantic_cache, "get_collection_version", get_collection_version)
+    return versions
+
+
+def _cache():
+    return SemanticAnswerCache(max_distance=0.05, max_entries=4, max_keys=8, ttl=60)
+
+
+async def _store(cache, embedding, response):
+    await cache.store(*KEY, embedding, response, [], {})
+
+
+def test_close_query_reuses_answer(versions):
+    async def scenario():
+        cache = _cache()
+        await _store(cache, [1.0, 0.0, 0.0], "respuesta")
+        hit = await cache.lookup(*KEY, [0.99, 0.05, 0.0])
+        miss = await cache.lookup(*KEY, [0.0, 1.0, 0.0])
+        return hit, miss, cache.get_stats()
+
+    hit, miss, stats = asyncio.run(scenario())
+    assert hit["response"] == "respuesta"
+    assert hit["distance"] < 0.05
+    assert miss is None
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_collection_change_invalidates_answers(versions):
+    async def scenario():
+        cache = _cache()
+        await _store(cache, [1.0, 0.0], "respuesta")
+        versions.append("v2")
+        return await cache.lookup(*KEY, [1.0, 0.0]), cache.get_stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result is None
+    assert stats["invalidations"] == 1
+
+
+def test_embedding_of_another_dimension_is_a_miss(versions):
+    async def scenario():
+        cache = _cache()
+        await _store(cache, [1.0, 0.0, 0.0], "respuesta 3d")
+        miss = await cache.lookup(*KEY, [1.0, 0.0])
+
+        # Guardar con la nueva dimensión sustituye las entradas anteriores
+        await _store(cache, [1.0, 0.0], "respuesta 2d")
+        hit = await cache.lookup(*KEY, [1.0, 0.0])
+        old = await cache.lookup(*KEY, [1.0, 0.0, 0.0])
+        return miss, hit, old, cache.get_stats()
+
+    miss, hit, old, stats = asyncio.run(scenario())
+    assert miss is None
+    assert hit["response"] == "respuesta 2d"
+    assert old is None
+    assert stats["entries"] == 1
@@ -0,0 +1,145 @@
+"""Pruebas de la agrupación de consultas RAG idénticas concurrentes."""
+
+import asyncio
+
+from services.single_flight import QueryCoalescer, coalescing_key
+
+
+def test_coalescing_key_normalizes_query_and_includes_params():
+    key = coalescing_key("t", "c", "  ¿Qué es   RAG? ", "model", 4, retrieval_mode="vector")
+    assert key == coalescing_key("t", "c", "¿qué es rag?", "model", 4, retrieval_mode="vector")
+    assert key != coalescing_key("t", "c", "¿qué es rag?", "model", 4, retrieval_mode="hybrid")
+
+
+def test_concurrent_requests_share_one_computation():
+    calls = []
+
+    async def scenario():
+        coalescer = QueryCoalescer()
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return {"response": "ok"}
+
+        first = asyncio.create_task(coalescer.run("key", compute))
+        second = asyncio.create_task(coalescer.run("key", compute))
+        await asyncio.sleep(0)
+        release.set()
+        return await first, await second, coalescer.get_stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert first == ({"response": "ok"}, False)
+    assert second == ({"response": "ok"}, True)
+    assert stats["leaders"] == 1
+    assert stats["followers"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        coalescer = QueryCoalescer()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "respuesta"
+
+        leader = asyncio.create_task(coalescer.run("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(coalescer.run("key", compute))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        release.set()
+        return leader.cancelled(), await follower
+
+    leader_cancelled, follower_result = asyncio.run(scenario())
+    assert leader_cancelled
+    assert follower_result == ("respuesta", True)
+
+
+def test_stream_follower_replays_emitted_events():
+    async def scenario():
+        coalescer = QueryCoalescer()
+        step = asyncio.Event()
+
+        async def produce():
+            yield "sources", []
+            await step.wait()
+            yield "token", "hola"
+            yield "done", {}
+
+        leader_events = []
+        leader = coalescer.stream("key", produce)
+        leader_events.append(await leader.__anext__())
+
+        follower_task = asyncio.create_task(_collect(coalescer.stream("key", produce)))
+        await asyncio.sleep(0)
+        step.set()
+        async for event in leader:
+            leader_events.append(event)
+        return leader_events, await follower_task
+
+    leader_events, follower_events = asyncio.run(scenario())
+    events = [("sources", []), ("token", "hola"), ("done", {})]
+    assert leader_events == [(event, False) for event in events]
+    assert follower_events == [(event, True) for event in events]
+
+
+def test_stream_is_cancelled_when_last_subscriber_leaves():
+    closed = []
+
+    async def scenario():
+        coalescer = QueryCoalescer()
+
+        async def produce():
+            try:
+                yield "sources", []
+                await asyncio.Event().wait()
+                yield "token", "nunca"
+            finally:
+                closed.append(True)
+
+        first = coalescer.stream("key", produce)
+        second = coalescer.stream("key", produce)
+        await first.__anext__()
+        await second.__anext__()
+
+        await first.aclose()
+        assert coalescer.get_stats()["streams_cancelled"] == 0
+
+        await second.aclose()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return coalescer.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert closed == [True]
+    assert stats["streams_cancelled"] == 1
+    assert stats["streams_in_flight"] == 0
+
+
+def test_stream_error_reaches_every_subscriber():
+    async def scenario():
+        coalescer = QueryCoalescer()
+
+        async def produce():
+            yield "sources", []
+            raise RuntimeError("fallo del modelo")
+
+        return await asyncio.gather(
+            _collect(coalescer.stream("key", produce)),
+            _collect(coalescer.stream("key", produce)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def _collect(events):
+    return [event async for event in events]
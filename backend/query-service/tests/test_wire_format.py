@@ -0,0 +1,49 @@
+"""Pruebas de la decodificación de embeddings en base64."""
+
+import base64
+
+import numpy as np
+import pytest
+
+from common.errors import ServiceError
+from utils.wire_format import decode_embedding, resolve_embedding, to_pgvector
+
+
+def _encode(values, dtype):
+    return base64.b64encode(np.asarray(values, dtype=dtype).tobytes()).decode("ascii")
+
+
+def test_decode_float32_round_trip():
+    values = [0.1, -0.25, 3.5, 0.0]
+    decoded = decode_embedding(_encode(values, "<f4"))
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, np.asarray(values, dtype=np.float32))
+
+
+def test_decode_float16_round_trip():
+    values = [0.1, -0.25, 3.5]
+    decoded = decode_embedding(_encode(values, "<f2"), " Float16 ")
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, values, rtol=1e-3)
+
+
+def test_decode_rejects_unknown_format_and_bad_payload():
+    with pytest.raises(ServiceError):
+        decode_embedding(_encode([1.0], "<f4"), "float64")
+    with pytest.raises(ServiceError):
+        decode_embedding("no es base64!")
+    # Longitud que no es múltiplo del tamaño del tipo
+    with pytest.raises(ServiceError):
+        decode_embedding(base64.b64encode(b"\x00\x01\x02").decode("ascii"))
+
+
+def test_resolve_embedding_prefers_binary_payload():
+    encoded = _encode([1.0, 2.0], "<f4")
+    np.testing.assert_array_equal(resolve_embedding([9.0], encoded), [1.0, 2.0])
+    assert resolve_embedding([0.5, 0.25], None) == [0.5, 0.25]
+    with pytest.raises(ServiceError):
+        resolve_embedding(None, None)
+
+
+def test_to_pgvector_uses_float32_precision():
+    assert to_pgvector([0.1, 1.0, -2.5]) == "[0.1,1,-2.5]"
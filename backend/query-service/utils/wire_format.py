@@ -0,0 +1,72 @@
+"""
+Formato binario compacto de embeddings en las peticiones al servicio.
+
+Además del array JSON query_embedding, las peticiones pueden enviar el vector
+en query_embedding_b64: floats little-endian en base64, con el tipo indicado
+en la cabecera X-Embedding-Format (float32 por defecto, o float16). El vector
+se decodifica directamente a un array NumPy, sin pasar por floats de Python.
+"""
+
+import base64
+from typing import List, Optional, Union
+
+import numpy as np
+
+from common.errors import ServiceError
+
+# Cabecera que indica el tipo de los embeddings en base64
+EMBEDDING_FORMAT_HEADER = "X-Embedding-Format"
+
+# Formatos admitidos y su tipo NumPy little-endian
+SUPPORTED_FORMATS = {
+    "float32": "<f4",
+    "float16": "<f2"
+}
+
+Embedding = Union[List[float], np.ndarray]
+
+
+def decode_embedding(encoded: str, embedding_format: Optional[str] = None) -> np.ndarray:
+    """
+    Decodifica un embedding en base64 a un vector float32.
+
+    Args:
+        encoded: Bytes del vector en base64
+        embedding_format: float32 (por defecto) o float16
+
+    Returns:
+        np.ndarray: Vector float32
+    """
+    embedding_format = (embedding_format or "float32").strip().lower()
+    if embedding_format not in SUPPORTED_FORMATS:
+        raise ServiceError(f"Formato de embedding no soportado: {embedding_format}")
+
+    try:
+        raw = base64.b64decode(encoded, validate=True)
+        return np.frombuffer(raw, dtype=SUPPORTED_FORMATS[embedding_format]).astype(np.float32)
+    except ValueError as e:
+        raise ServiceError(f"Embedding en base64 inválido: {str(e)}")
+
+
+def resolve_embedding(
+    embedding: Optional[List[float]],
+    encoded: Optional[str],
+    embedding_format: Optional[str] = None
+) -> Embedding:
+    """Vector de una petición, venga como array JSON o en base64."""
+    if encoded:
+        return decode_embedding(encoded, embedding_format)
+    if embedding is None:
+        raise ServiceError("La petición no incluye query_embedding ni query_embedding_b64")
+    return embedding
+
+
+def to_pgvector(embedding: Embedding) -> str:
+    """
+    Representación textual de pgvector con precisión float32.
+
+    Más corta que el array JSON de floats de Python (17 dígitos por valor)
+    y válida como argumento vector de una RPC.
+    """
+    values = np.asarray(embedding, dtype=np.float32)
+    return "[" + ",".join(f"{value:.7g}" for value in values.tolist()) + "]"
@@ -0,0 +1,144 @@
+-- =============================================
+-- INIT_9_VECTOR_SEARCH.SQL - BÚSQUEDA VECTORIAL CON DIMENSIÓN POR COLECCIÓN
+-- =============================================
+-- Este archivo define la función RPC match_documents para document_chunks con
+-- embeddings de dimensión variable (Matryoshka y modelos locales) y migra las
+-- bases de datos creadas con la columna embedding vector(1536).
+-- Fecha: 2026-10-16
+
+-- ===========================================
+-- PARTE 1: MIGRACIÓN DE LA COLUMNA EMBEDDING
+-- ===========================================
+
+-- Dimensión reducida (Matryoshka) de los vectores de cada colección;
+-- NULL = la nativa del modelo
+ALTER TABLE ai.collections
+ADD COLUMN IF NOT EXISTS embedding_dimensions INTEGER;
+
+-- init_2 crea embedding vector(1536) con un índice ivfflat sobre la columna:
+-- el índice depende del tipo, así que se elimina, se cambia la columna a
+-- vector sin dimensión y se crean los índices parciales. Si la migración ya
+-- se aplicó, la columna es vector y no se toca.
+DO $$
+BEGIN
+    IF (
+        SELECT format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = 'ai.document_chunks'::regclass
+          AND attname = 'embedding'
+    ) = 'vector(1536)' THEN
+        DROP INDEX IF EXISTS ai.idx_document_chunks_embedding;
+        ALTER TABLE ai.document_chunks ALTER COLUMN embedding TYPE vector;
+    END IF;
+END;
+$$;
+
+-- Índices de similitud coseno, uno por dimensión admitida (ivfflat exige
+-- dimensión fija).
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding
+ON ai.document_chunks
+USING ivfflat ((embedding::vector(1536)) vector_cosine_ops)
+WITH (lists = 100)
+WHERE vector_dims(embedding) = 1536;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_1024
+ON ai.document_chunks
+USING ivfflat ((embedding::vector(1024)) vector_cosine_ops)
+WITH (lists = 100)
+WHERE vector_dims(embedding) = 1024;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_512
+ON ai.document_chunks
+USING ivfflat ((embedding::vector(512)) vector_cosine_ops)
+WITH (lists = 100)
+WHERE vector_dims(embedding) = 512;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_384
+ON ai.document_chunks
+USING ivfflat ((embedding::vector(384)) vector_cosine_ops)
+WITH (lists = 100)
+WHERE vector_dims(embedding) = 384;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_256
+ON ai.document_chunks
+USING ivfflat ((embedding::vector(256)) vector_cosine_ops)
+WITH (lists = 100)
+WHERE vector_dims(embedding) = 256;
+
+-- Índice para los filtros de metadatos por contención (metadata @> filtro)
+-- de match_documents
+CREATE INDEX IF NOT EXISTS idx_document_chunks_metadata
+ON ai.document_chunks
+USING gin (metadata jsonb_path_ops);
+
+-- Índice para reutilizar los vectores ya almacenados de un contenido
+-- (ingestion-service busca por colección y metadata->>'content_hash')
+CREATE INDEX IF NOT EXISTS idx_document_chunks_content_hash
+ON ai.document_chunks (collection_id, (metadata->>'content_hash'));
+
+-- ===========================================
+-- PARTE 2: FUNCIÓN DE BÚSQUEDA
+-- ===========================================
+
+-- La versión anterior de la función no tenía el parámetro probes: se elimina
+-- para que la RPC no quede ambigua entre dos sobrecargas.
+DROP FUNCTION IF EXISTS match_documents(vector, INTEGER, JSONB, FLOAT);
+
+-- Chunks más similares a un embedding, con filtro de metadatos por contención.
+-- La dimensión se toma de la consulta y se escribe como literal en la
+-- sentencia: solo así el planificador reconoce el índice parcial de esa
+-- dimensión, y las filas de otras dimensiones nunca se comparan (evita el
+-- error "different vector dimensions"). Una dimensión sin índice propio se
+-- resuelve con un recorrido secuencial de sus filas.
+--
+-- ivfflat solo explora ivfflat.probes listas y el filtro se aplica después:
+-- con un filtro selectivo pedir más filas (LIMIT) no devuelve más resultados.
+-- Las búsquedas con filtro indican en probes cuántas listas explorar; el
+-- ajuste es local a la transacción de la llamada.
+CREATE OR REPLACE FUNCTION match_documents(
+    query_embedding vector,
+    match_count INTEGER DEFAULT 4,
+    filter JSONB DEFAULT '{}'::jsonb,
+    threshold FLOAT DEFAULT 0.0,
+    probes INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    id INTEGER,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    dims INTEGER := vector_dims(query_embedding);
+BEGIN
+    IF probes IS NOT NULL AND probes > 0 THEN
+        PERFORM set_config('ivfflat.probes', probes::text, true);
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'SELECT dc.id, dc.content, dc.metadata,
+                (1 - (dc.embedding::vector(%1$s) <=> $1::vector(%1$s)))::float AS similarity
+         FROM ai.document_chunks dc
+         WHERE vector_dims(dc.embedding) = %1$s
+           AND dc.metadata @> $2
+           AND 1 - (dc.embedding::vector(%1$s) <=> $1::vector(%1$s)) >= $3
+         ORDER BY dc.embedding::vector(%1$s) <=> $1::vector(%1$s)
+         LIMIT $4',
+        dims
+    )
+    USING query_embedding, filter, threshold, match_count;
+END;
+$$;
+
+-- ===========================================
+-- PARTE 3: BÚSQUEDA POR TEXTO COMPLETO
+-- ===========================================
+
+-- Índice de texto completo para la búsqueda léxica de la recuperación híbrida.
+-- La configuración ('simple') debe coincidir con text_search_config del
+-- query-service para que la consulta use el índice.
+CREATE INDEX IF NOT EXISTS idx_document_chunks_content_fts
+ON ai.document_chunks
+USING gin (to_tsvector('simple', content));